@@ -0,0 +1,478 @@
+"""
+JSON API.
+
+Rooms, availability, bookings and customers for other programs (such as
+a channel manager), under /api/v1, behind the same login as the site.
+Lists are serialized compactly: {"fields": [...], "rows": [[...], ...]}
+with no whitespace, plus "next" (a cursor for ?after=) when there are more.
+
+Every GET answers conditionally.  Its ETag and Last-Modified come from the
+table_versions counters of the tables it reads (bumped by triggers on
+every write, with the time of the last one in updated_at) and the request
+itself, so a client polling with If-None-Match or If-Modified-Since gets a
+304 when nothing it depends on has changed.  Last-Modified only has whole
+seconds, so it is left out for a second or two after a change, until no
+later change can carry the same one.  The counters are read at most
+every API_VERSION_TTL seconds, which makes a 304 free of any query, and
+re-read after every write this process makes; a write made by another
+worker process shows up within API_VERSION_TTL.  Responses are also kept
+serialized by ETag, so a new client polling unchanged data is answered
+without building the response again.
+
+    GET  /api/v1/rooms                  ?room_type= &min_price= &max_price= &sort=
+    GET  /api/v1/rooms/<room_id>
+    GET  /api/v1/availability           ?check_in= &check_out= [&room_type=]  (with each room's total)
+    GET  /api/v1/bookings               ?after= &per_page=  (a guest sees their own)
+    GET  /api/v1/bookings/<booking_id>
+    POST /api/v1/bookings               {"room_id" | "room_type", "check_in", "check_out"}
+    POST /api/v1/group-bookings         {"name", "rooms": [{"room_id" | "room_type", "count",
+                                                             "check_in", "check_out"}, ...]}
+    GET  /api/v1/group-bookings/<group_id>
+    GET  /api/v1/customers              ?name= (prefix) | ?q= (search), ?after= &per_page=
+    POST /api/v1/customers              {"name", "email", "phone", "address"}
+
+Errors are {"error": message} with a 4xx status.
+
+Configuration (app.config):
+    API_VERSION_TTL   seconds the table versions are reused without reading them (default 1)
+    API_CACHE_SIZE    serialized responses kept per process (default 256)
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+
+from flask import Blueprint, Response, current_app, request, session, url_for
+
+import assignment
+import groups
+import pricing
+import search
+from archive import across
+from availability import get_availability
+from booking import BookingConflict, BookingError
+from catalog import get_catalog
+from db import extension, get_db
+from pagination import decode_cursor, fetch_page, page_size_from_request, prefix_range
+from writer import get_writer
+
+DEFAULT_VERSION_TTL = 1.0
+DEFAULT_CACHE_SIZE = 256
+
+SCHEMA = '''
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('bookings', 0);
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('customers', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_table_versions_touch AFTER UPDATE OF version ON table_versions
+BEGIN
+    UPDATE table_versions SET updated_at = (julianday('now') - 2440587.5) * 86400.0
+    WHERE table_name = NEW.table_name;
+END;
+'''
+
+VERSION_TRIGGER = '''
+CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event} AFTER {EVENT} ON {table}
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+END;
+'''
+
+ROOM_FIELDS = ('room_id', 'room_number', 'room_type', 'price_per_night')
+BOOKING_FIELDS = ('booking_id', 'user_id', 'room_id', 'check_in', 'check_out', 'total_amount')
+CUSTOMER_FIELDS = ('customer_id', 'name', 'email', 'phone', 'address')
+
+# Sort orders offered on /rooms (request value -> column)
+ROOM_SORTS = {
+    'room_number': 'room_number',
+    'price': 'price_per_night',
+    'type': 'room_type',
+}
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def ensure_schema(conn):
+    """Track versions and change times of the bookings and customers tables"""
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(table_versions)')]
+    if 'updated_at' not in columns:
+        conn.execute('ALTER TABLE table_versions ADD COLUMN updated_at REAL')
+    conn.executescript(SCHEMA + ''.join(
+        VERSION_TRIGGER.format(table=table, event=event.lower(), EVENT=event)
+        for table in ('bookings', 'customers') for event in ('INSERT', 'UPDATE', 'DELETE')))
+    conn.execute("UPDATE table_versions SET updated_at = (julianday('now') - 2440587.5) * 86400.0 "
+                 "WHERE updated_at IS NULL")
+    conn.commit()
+
+
+class ApiError(Exception):
+    """Answered as {"error": message} with the given status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiCache:
+    """Table versions, reused for a TTL, and serialized responses by ETag"""
+
+    def __init__(self, version_ttl=DEFAULT_VERSION_TTL, max_entries=DEFAULT_CACHE_SIZE):
+        self.version_ttl = version_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = None
+        self._read_at = 0.0
+        self._bodies = OrderedDict()
+        self.version_reads = 0
+        self.not_modified = 0
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self):
+        """({table: (version, updated_at)}, the time.time() they were read at), re-read after the TTL"""
+        with self._lock:
+            if self._versions is not None and time.monotonic() - self._read_at < self.version_ttl:
+                return self._versions
+        read_time = time.time()
+        rows = get_db().execute('SELECT table_name, version, updated_at FROM table_versions').fetchall()
+        versions = ({name: (version, updated_at or 0.0) for name, version, updated_at in rows}, read_time)
+        with self._lock:
+            self._versions = versions
+            self._read_at = time.monotonic()
+            self.version_reads += 1
+        return versions
+
+    def invalidate(self):
+        """Re-read the versions on the next request (after a write by this process)"""
+        with self._lock:
+            self._versions = None
+
+    def get(self, etag):
+        with self._lock:
+            body = self._bodies.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._bodies.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._bodies[etag] = body
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+
+    def stats(self):
+        """Version read, 304 and response cache counters"""
+        with self._lock:
+            return {
+                'version_reads': self.version_reads,
+                'not_modified': self.not_modified,
+                'hits': self.hits,
+                'misses': self.misses,
+                'cached': len(self._bodies),
+            }
+
+
+def get_api_cache(app=None):
+    """Return the app's API cache"""
+    app = app or current_app
+    return extension(app, 'api_cache', lambda: ApiCache(
+        version_ttl=app.config.get('API_VERSION_TTL', DEFAULT_VERSION_TTL),
+        max_entries=app.config.get('API_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+    ))
+
+
+def dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def json_response(value, status=200, headers=None):
+    return Response(dumps(value), status=status, headers=headers, mimetype='application/json')
+
+
+def table(rows, fields, next_cursor=None):
+    """A compact list: field names once, then one array per row"""
+    result = {'fields': fields, 'rows': [[row[field] for field in fields] for row in rows]}
+    if next_cursor:
+        result['next'] = next_cursor
+    return result
+
+
+def conditional(tables, build, scope=''):
+    """Answer a GET from build() with an ETag and Last-Modified derived from tables.
+
+    Answers 304 when the client already has this version, and serves the
+    serialized response from the cache when another client fetched it.
+    scope distinguishes responses that differ by user.
+    """
+    cache = get_api_cache()
+    versions, read_time = cache.versions()
+    state = ','.join(f'{name}:{versions.get(name, (0, 0.0))[0]}' for name in tables)
+    basis = f'{request.path}?{request.query_string.decode()}|{scope}|{state}'
+    etag = hashlib.blake2b(basis.encode(), digest_size=12).hexdigest()
+    updated = max(versions.get(name, (0, 0.0))[1] for name in tables)
+    # Last-Modified has whole seconds, so a change later in the same second
+    # would not move it: it is only sent (and If-Modified-Since honoured)
+    # once that second ended over a second before the versions were read
+    last_modified = None
+    if int(updated) + 2 <= read_time:
+        last_modified = datetime.fromtimestamp(int(updated), timezone.utc)
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = (last_modified is not None and request.if_modified_since is not None
+                 and last_modified <= request.if_modified_since)
+    if fresh:
+        with cache._lock:
+            cache.not_modified += 1
+        response = Response(status=304)
+    else:
+        body = cache.get(etag)
+        if body is None:
+            body = dumps(build())
+            cache.put(etag, body)
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def require_login():
+    if 'user_id' not in session:
+        raise ApiError(401, 'Please log in')
+
+
+def is_admin():
+    return session.get('user_role') == 'admin'
+
+
+def json_body(*names):
+    """The named fields of the request's JSON object"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Expected a JSON object')
+    missing = [name for name in names if data.get(name) in (None, '')]
+    if missing:
+        raise ApiError(400, f"Missing field(s): {', '.join(missing)}")
+    return [data[name] for name in names]
+
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ApiError(400, f'{name} must be a YYYY-MM-DD date')
+
+
+def parse_price(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ApiError(400, f'{name} must be a number')
+
+
+@api.errorhandler(ApiError)
+def api_error(error):
+    return json_response({'error': str(error)}, error.status)
+
+
+@api.after_app_request
+def track_writes(response):
+    # Whatever this process just wrote is visible to its next API request
+    if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        get_api_cache().invalidate()
+    return response
+
+
+@api.route('/rooms')
+def rooms():
+    require_login()
+    sort_column = ROOM_SORTS.get(request.args.get('sort'), 'room_number')
+    room_type = request.args.get('room_type') or None
+    min_price, max_price = parse_price('min_price'), parse_price('max_price')
+
+    def build():
+        selected, _ = get_catalog().view(get_db(), sort_column, room_type, min_price, max_price)
+        return table(selected, ROOM_FIELDS)
+    return conditional(('rooms',), build)
+
+
+@api.route('/rooms/<int:room_id>')
+def room(room_id):
+    require_login()
+
+    def build():
+        found = get_catalog().get(get_db(), room_id)
+        if found is None:
+            raise ApiError(404, 'Room not found')
+        return {field: found[field] for field in ROOM_FIELDS}
+    return conditional(('rooms',), build)
+
+
+@api.route('/availability')
+def availability():
+    require_login()
+    check_in = parse_date(request.args.get('check_in'), 'check_in')
+    check_out = parse_date(request.args.get('check_out'), 'check_out')
+    if check_out <= check_in:
+        raise ApiError(400, 'check_out must be after check_in')
+    room_type = request.args.get('room_type') or None
+
+    def build():
+        conn = get_db()
+        selected, _ = get_catalog().view(conn, 'room_number', room_type)
+        free = set(get_availability().free_rooms([room['room_id'] for room in selected],
+                                                 check_in, check_out))
+        rooms = [room for room in selected if room['room_id'] in free]
+        quotes = pricing.get_rates().quote(conn, rooms, check_in, check_out)
+        result = table([dict(room, total=quotes[room['room_id']]) for room in rooms], ROOM_FIELDS + ('total',))
+        result.update(check_in=check_in, check_out=check_out)
+        return result
+    return conditional(('rooms', 'bookings', 'room_rates'), build)
+
+
+@api.route('/bookings')
+def bookings():
+    require_login()
+    admin = is_admin()
+    page_size = page_size_from_request()
+
+    def build():
+        where, params = ([], []) if admin else (['user_id = ?'], [session['user_id']])
+        after = decode_cursor(request.args.get('after'))
+        page = fetch_page(get_db(), 'bookings', 'booking_id', 'booking_id', where, params,
+                          after=after, page_size=page_size)
+        return table(page, BOOKING_FIELDS, page.next_cursor)
+    return conditional(('bookings',), build, scope='' if admin else session['user_id'])
+
+
+@api.route('/bookings/<int:booking_id>')
+def booking(booking_id):
+    require_login()
+    admin = is_admin()
+
+    def build():
+        conn = get_db()
+        found = conn.execute(f'SELECT * FROM {across(conn, "bookings")} WHERE booking_id = ?',
+                             (booking_id,)).fetchone()
+        if found is None or (found['user_id'] != session['user_id'] and not admin):
+            raise ApiError(404, 'Booking not found')
+        return {field: found[field] for field in BOOKING_FIELDS}
+    return conditional(('bookings',), build, scope='' if admin else session['user_id'])
+
+
+@api.route('/bookings', methods=['POST'])
+def create_booking():
+    require_login()
+    check_in, check_out = json_body('check_in', 'check_out')
+    check_in, check_out = parse_date(check_in, 'check_in'), parse_date(check_out, 'check_out')
+    data = request.get_json()
+    room_id, room_type = data.get('room_id'), data.get('room_type')
+    if room_id is None and not room_type:
+        raise ApiError(400, 'Missing field(s): room_id or room_type')
+    conn = get_db()
+    rates = pricing.get_rates()
+    try:
+        if room_id is not None:
+            try:
+                room_id = int(room_id)
+            except (TypeError, ValueError):
+                raise ApiError(400, 'room_id must be a number')
+            room = get_catalog().get(conn, room_id)
+            rate_factor = rates.stay_factor(conn, room['room_type'], check_in, check_out) if room else None
+            receipt = get_writer().call('book_stay', session['user_id'], session['username'],
+                                        room_id, check_in, check_out, rate_factor)
+        else:
+            # the hotel chooses the room: best fit among the free rooms of the type
+            room_type = str(room_type)
+            receipt, room_id = get_writer().call(
+                'book_room_type', session['user_id'], session['username'], room_type,
+                check_in, check_out, assignment.choose_rooms(room_type, check_in, check_out),
+                rates.stay_factor(conn, room_type, check_in, check_out))
+    except BookingConflict as e:
+        raise ApiError(409, str(e))
+    except BookingError as e:
+        raise ApiError(400, str(e))
+    booking = {
+        'booking_id': receipt.booking_id,
+        'user_id': receipt.user_id,
+        'room_id': room_id,
+        'check_in': receipt.check_in,
+        'check_out': receipt.check_out,
+        'total_amount': receipt.total_amount,
+    }
+    return json_response(booking, 201, {'Location': url_for('api.booking', booking_id=receipt.booking_id)})
+
+
+@api.route('/group-bookings', methods=['POST'])
+def create_group_booking():
+    require_login()
+    name, rooms = json_body('name', 'rooms')
+    try:
+        bill = get_writer().call('book_group', session['user_id'], session['username'], str(name), rooms,
+                                 pricing.get_rates().rates(get_db()))
+    except groups.GroupUnavailable as e:
+        return json_response({'error': str(e), 'problems': e.problems}, 409)
+    except BookingConflict as e:
+        raise ApiError(409, str(e))
+    except BookingError as e:
+        raise ApiError(400, str(e))
+    return json_response(bill, 201, {'Location': url_for('api.group_booking', group_id=bill['group_id'])})
+
+
+@api.route('/group-bookings/<int:group_id>')
+def group_booking(group_id):
+    require_login()
+    admin = is_admin()
+
+    def build():
+        bill = groups.load_bill(get_db(), group_id)
+        if bill is None or (bill['user_id'] != session['user_id'] and not admin):
+            raise ApiError(404, 'Group booking not found')
+        return bill
+    return conditional(('bookings',), build, scope='' if admin else session['user_id'])
+
+
+@api.route('/customers')
+def customers():
+    require_login()
+    page_size = page_size_from_request()
+
+    def build():
+        conn = get_db()
+        query = request.args.get('q', '').strip()
+        if query:
+            return table(search.search(conn, query, limit=page_size), CUSTOMER_FIELDS)
+        where, params = [], []
+        name_prefix = request.args.get('name', '').strip()
+        if name_prefix:
+            where.append('name >= ? AND name < ?')
+            params.extend(prefix_range(name_prefix))
+        page = fetch_page(conn, 'customers', 'customer_id', 'name', where, params,
+                          after=decode_cursor(request.args.get('after')), page_size=page_size)
+        return table(page, CUSTOMER_FIELDS, page.next_cursor)
+    return conditional(('customers',), build)
+
+
+@api.route('/customers', methods=['POST'])
+def create_customer():
+    require_login()
+    name, email, phone, address = json_body('name', 'email', 'phone', 'address')
+    customer_id = get_writer().call('insert_customer', name, email, phone, address)
+    customer = dict(zip(CUSTOMER_FIELDS, (customer_id, name, email, phone, address)))
+    return json_response(customer, 201)
+
+
+def init_app(app):
+    """Serve the API"""
+    app.register_blueprint(api)
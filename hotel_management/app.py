@@ -1,376 +1,890 @@
-import os
-import sqlite3
-from datetime import datetime, timedelta, date
-from flask import Flask, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
-
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-here'
-
-# Database configuration
-DATABASE = os.path.join('database', 'hotel.db')
-
-def init_db():
-    """Initialize the database with required tables"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT NOT NULL
-        )
-    ''')
-    
-    # Create rooms table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS rooms (
-            room_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            room_number TEXT UNIQUE NOT NULL,
-            room_type TEXT NOT NULL,
-            price_per_night REAL NOT NULL,
-            status TEXT NOT NULL DEFAULT 'Available'
-        )
-    ''')
-    
-    # Create customers table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customers (
-            customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT NOT NULL,
-            phone TEXT NOT NULL,
-            address TEXT NOT NULL
-        )
-    ''')
-    
-    # Create bookings table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            room_id INTEGER NOT NULL,
-            check_in DATE NOT NULL,
-            check_out DATE NOT NULL,
-            total_amount REAL NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (user_id),
-            FOREIGN KEY (room_id) REFERENCES rooms (room_id)
-        )
-    ''')
-    
-    # Insert default admin user if not exists
-    cursor.execute("SELECT * FROM users WHERE username = 'admin'")
-    if not cursor.fetchone():
-        hashed_password = generate_password_hash('admin123', method='pbkdf2:sha256')
-        cursor.execute('''
-            INSERT INTO users (username, password, role) 
-            VALUES (?, ?, ?)
-        ''', ('admin', hashed_password, 'admin'))
-    
-    conn.commit()
-    conn.close()
-
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def is_admin():
-    """Check if current user is admin"""
-    return 'user_role' in session and session['user_role'] == 'admin'
-
-def is_logged_in():
-    """Check if user is logged in"""
-    return 'user_id' in session
-
-# Routes
-@app.route('/')
-def index():
-    return render_template('index.html')
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        role = request.form['role']
-        
-        if not username or not password:
-            flash('Username and password are required!')
-            return redirect(url_for('register'))
-        
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
-        
-        conn = get_db_connection()
-        try:
-            conn.execute('''
-                INSERT INTO users (username, password, role)
-                VALUES (?, ?, ?)
-            ''', (username, hashed_password, role))
-            conn.commit()
-            flash('Registration successful! Please log in.')
-            return redirect(url_for('login'))
-        except sqlite3.IntegrityError:
-            flash('Username already exists!')
-            return redirect(url_for('register'))
-        finally:
-            conn.close()
-    
-    return render_template('register.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-        
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        conn.close()
-        
-        if user and check_password_hash(user['password'], password):
-            session['user_id'] = user['user_id']
-            session['username'] = user['username']
-            session['user_role'] = user['role']
-            flash('Login successful!')
-            
-            if user['role'] == 'admin':
-                return redirect(url_for('dashboard'))
-            else:
-                return redirect(url_for('book_room'))
-        else:
-            flash('Invalid username or password!')
-    
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.clear()
-    flash('You have been logged out.')
-    return redirect(url_for('index'))
-
-@app.route('/dashboard')
-def dashboard():
-    if not is_logged_in() or not is_admin():
-        flash('Access denied!')
-        return redirect(url_for('login'))
-    
-    conn = get_db_connection()
-    
-    # Get statistics
-    total_rooms = conn.execute('SELECT COUNT(*) as count FROM rooms').fetchone()['count']
-    available_rooms = conn.execute('SELECT COUNT(*) as count FROM rooms WHERE status = "Available"').fetchone()['count']
-    booked_rooms = conn.execute('SELECT COUNT(*) as count FROM rooms WHERE status = "Booked"').fetchone()['count']
-    
-    # Get total revenue
-    total_revenue = conn.execute('SELECT SUM(total_amount) as sum FROM bookings').fetchone()['sum']
-    if total_revenue is None:
-        total_revenue = 0
-    
-    # Get all rooms
-    rooms = conn.execute('SELECT * FROM rooms').fetchall()
-    
-    conn.close()
-    
-    return render_template('dashboard.html', 
-                          total_rooms=total_rooms,
-                          available_rooms=available_rooms,
-                          booked_rooms=booked_rooms,
-                          total_revenue=total_revenue,
-                          rooms=rooms)
-
-@app.route('/rooms')
-def rooms():
-    if not is_logged_in() or not is_admin():
-        flash('Access denied!')
-        return redirect(url_for('login'))
-    
-    conn = get_db_connection()
-    rooms = conn.execute('SELECT * FROM rooms').fetchall()
-    conn.close()
-    
-    return render_template('rooms.html', rooms=rooms)
-
-@app.route('/add_room', methods=['POST'])
-def add_room():
-    if not is_logged_in() or not is_admin():
-        flash('Access denied!')
-        return redirect(url_for('login'))
-    
-    room_number = request.form['room_number']
-    room_type = request.form['room_type']
-    price_per_night = request.form['price_per_night']
-    
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            INSERT INTO rooms (room_number, room_type, price_per_night, status)
-            VALUES (?, ?, ?, ?)
-        ''', (room_number, room_type, price_per_night, 'Available'))
-        conn.commit()
-        flash('Room added successfully!')
-    except sqlite3.IntegrityError:
-        flash('Room number already exists!')
-    finally:
-        conn.close()
-    
-    return redirect(url_for('rooms'))
-
-@app.route('/edit_room/<int:room_id>', methods=['POST'])
-def edit_room(room_id):
-    if not is_logged_in() or not is_admin():
-        flash('Access denied!')
-        return redirect(url_for('login'))
-    
-    room_type = request.form['room_type']
-    price_per_night = request.form['price_per_night']
-    
-    conn = get_db_connection()
-    conn.execute('''
-        UPDATE rooms 
-        SET room_type = ?, price_per_night = ?
-        WHERE room_id = ?
-    ''', (room_type, price_per_night, room_id))
-    conn.commit()
-    conn.close()
-    
-    flash('Room updated successfully!')
-    return redirect(url_for('rooms'))
-
-@app.route('/delete_room/<int:room_id>')
-def delete_room(room_id):
-    if not is_logged_in() or not is_admin():
-        flash('Access denied!')
-        return redirect(url_for('login'))
-    
-    conn = get_db_connection()
-    conn.execute('DELETE FROM rooms WHERE room_id = ?', (room_id,))
-    conn.commit()
-    conn.close()
-    
-    flash('Room deleted successfully!')
-    return redirect(url_for('rooms'))
-
-@app.route('/book-room')
-def book_room():
-    if not is_logged_in():
-        flash('Please log in to book a room!')
-        return redirect(url_for('login'))
-    
-    conn = get_db_connection()
-    available_rooms = conn.execute('''
-        SELECT * FROM rooms 
-        WHERE status = "Available"
-    ''').fetchall()
-    conn.close()
-    
-    return render_template('booking.html', rooms=available_rooms)
-
-@app.route('/process-booking', methods=['POST'])
-def process_booking():
-    if not is_logged_in():
-        flash('Please log in to book a room!')
-        return redirect(url_for('login'))
-    
-    room_id = request.form['room_id']
-    check_in = request.form['check_in']
-    check_out = request.form['check_out']
-    
-    # Validate dates
-    try:
-        check_in_date = datetime.strptime(check_in, '%Y-%m-%d')
-        check_out_date = datetime.strptime(check_out, '%Y-%m-%d')
-        
-        if check_out_date <= check_in_date:
-            flash('Check-out date must be after check-in date!')
-            return redirect(url_for('book_room'))
-    except ValueError:
-        flash('Invalid date format!')
-        return redirect(url_for('book_room'))
-    
-    conn = get_db_connection()
-    
-    # Check if room is already booked for these dates
-    existing_booking = conn.execute('''
-        SELECT * FROM bookings 
-        WHERE room_id = ? AND (
-            (check_in <= ? AND check_out >= ?) OR
-            (check_in <= ? AND check_out >= ?) OR
-            (check_in >= ? AND check_out <= ?)
-        )
-    ''', (room_id, check_in, check_in, check_out, check_out, check_in, check_out)).fetchone()
-    
-    if existing_booking:
-        flash('This room is already booked for the selected dates!')
-        conn.close()
-        return redirect(url_for('book_room'))
-    
-    # Get room details
-    room = conn.execute('SELECT * FROM rooms WHERE room_id = ?', (room_id,)).fetchone()
-    
-    # Calculate total amount
-    days = (check_out_date - check_in_date).days
-    total_amount = days * room['price_per_night']
-    
-    # Insert booking
-    conn.execute('''
-        INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (session['user_id'], room_id, check_in, check_out, total_amount))
-    
-    # Update room status
-    conn.execute('UPDATE rooms SET status = "Booked" WHERE room_id = ?', (room_id,))
-    
-    conn.commit()
-    
-    # Get booking details for receipt
-    booking = conn.execute('''
-        SELECT b.*, r.room_number, r.room_type, u.username
-        FROM bookings b
-        JOIN rooms r ON b.room_id = r.room_id
-        JOIN users u ON b.user_id = u.user_id
-        WHERE b.booking_id = last_insert_rowid()
-    ''').fetchone()
-    
-    conn.close()
-    
-    flash('Room booked successfully!')
-    return render_template('bill.html', booking=booking, days=days)
-
-@app.route('/customer-details', methods=['GET', 'POST'])
-def customer_details():
-    if not is_logged_in():
-        flash('Please log in to view customer details!')
-        return redirect(url_for('login'))
-    
-    if request.method == 'POST':
-        name = request.form['name']
-        email = request.form['email']
-        phone = request.form['phone']
-        address = request.form['address']
-        
-        conn = get_db_connection()
-        try:
-            conn.execute('''
-                INSERT INTO customers (name, email, phone, address)
-                VALUES (?, ?, ?, ?)
-            ''', (name, email, phone, address))
-            conn.commit()
-            flash('Customer details saved successfully!')
-        except:
-            flash('Error saving customer details!')
-        finally:
-            conn.close()
-    
-    conn = get_db_connection()
-    customers = conn.execute('SELECT * FROM customers').fetchall()
-    conn.close()
-    
-    return render_template('customer.html', customers=customers)
-
-if __name__ == '__main__':
+import startup  # first, so the startup timings include importing Flask
+import hmac
+import io
+import os
+import secrets
+import sqlite3
+from datetime import datetime, timedelta, date
+from flask import (Flask, render_template, request, redirect, url_for, flash, session, jsonify,
+                   Response, abort, stream_with_context)
+from werkzeug.security import generate_password_hash
+
+import api
+import archive
+import assignment
+import catalog
+import db
+import events
+import groups
+import metrics
+import migrations
+import occupancy
+import pricing
+import receipts
+import rollups
+import search
+import sessions
+import stats
+import writer
+from db import get_db
+from availability import AvailabilityIndex, get_availability
+from catalog import get_catalog
+from booking import BookingError, insert_booking
+from passwords import get_hasher
+from sessions import get_session_store
+from pagination import (Page, decode_cursor, fetch_page, page_from_sorted,
+                        page_size_from_request, prefix_range)
+from startup import get_startup
+from streaming import render_page, wants_streaming
+from writer import get_writer
+
+app = Flask(__name__)
+# Signs the flash-only cookie of anonymous sessions; without HOTEL_SECRET_KEY
+# a random key is used, and messages flashed before a restart are dropped
+app.secret_key = os.environ.get('HOTEL_SECRET_KEY') or secrets.token_hex(32)
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+app.config['DATABASE'] = DATABASE
+app.config['DB_POOL_SIZE'] = 8
+app.config['PAGE_SIZE'] = 50
+app.config['STREAM_TEMPLATES'] = False
+app.config['STREAM_MAX_PAGE_SIZE'] = 10000
+app.config['ROOM_CATALOG_CACHE'] = True
+app.config['ROOM_CATALOG_TTL'] = 0
+app.config['ROOM_CATALOG_VIEWS'] = 64
+app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:600000'
+app.config['PASSWORD_HASH_WORKERS'] = 2
+app.config['BULK_CHUNK_SIZE'] = 5000
+app.config['REPORT_MAX_DAYS'] = 3660
+app.config['METRICS_ENABLED'] = True
+app.config['METRICS_TOKEN'] = None
+app.config['RECEIPT_CACHE_BYTES'] = 4 * 1024 * 1024
+app.config['RECEIPT_RENDER_WORKERS'] = 1
+app.config['STARTUP_WARMUP'] = True
+app.config['WRITER_MAX_BATCH'] = 64
+app.config['SESSION_LIFETIME'] = 12 * 3600
+app.config['SESSION_CACHE_SIZE'] = 10000
+app.config['SESSION_CACHE_TTL'] = 5
+app.config['API_VERSION_TTL'] = 1.0
+app.config['API_CACHE_SIZE'] = 256
+app.config['ASSIGNMENT_MIN_STAY'] = 2
+app.config['PRICING_OCCUPANCY_UPLIFT'] = ()
+app.config['EVENT_SNAPSHOT_INTERVAL'] = 100000
+app.config['EVENT_SNAPSHOT_CHECK'] = 60
+app.config['EVENT_REPLAY_ON_STARTUP'] = True
+app.config['ARCHIVE_AFTER_DAYS'] = 365
+app.config['ARCHIVE_BATCH'] = 2000
+db.init_app(app)
+metrics.init_app(app)
+sessions.init_app(app)
+api.init_app(app)
+events.init_app(app)
+
+def init_db():
+    """Initialize the database with required tables.
+    
+    Returns the schema migrations applied; a database that is already up to
+    date costs one PRAGMA read.
+    """
+    conn = sqlite3.connect(app.config['DATABASE'])
+    if migrations.schema_version(conn) == migrations.LATEST_VERSION:
+        conn.close()
+        return []
+    cursor = conn.cursor()
+    
+    # Create or upgrade the schema (see migrations.py)
+    applied = migrations.migrate(conn)
+    
+    # Insert default admin user if not exists
+    cursor.execute("SELECT * FROM users WHERE username = 'admin'")
+    if not cursor.fetchone():
+        hashed_password = generate_password_hash('admin123', method=app.config['PASSWORD_HASH_METHOD'])
+        cursor.execute('''
+            INSERT INTO users (username, password, role) 
+            VALUES (?, ?, ?)
+        ''', ('admin', hashed_password, 'admin'))
+    
+    conn.commit()
+    conn.close()
+    return applied
+
+startup.init_app(app, init_db)
+
+@get_startup(app).warmup
+def warm_caches(app):
+    """Load the room catalog and availability index and start the hashing processes"""
+    conn = get_db()
+    get_catalog(app).rooms(conn)
+    if app.config['EVENT_REPLAY_ON_STARTUP']:
+        # From the latest snapshot of the event log and the events after it
+        state = events.get_event_log(app).restore(conn)
+        index = app.extensions['availability'] = AvailabilityIndex()
+        index.load_bookings(conn, state.bookings)
+    get_availability(app)
+    get_hasher(app).start()
+
+# Writes, run on the single database writer (see writer.py)
+@writer.operation
+def insert_user(conn, username, password_hash, role):
+    conn.execute('''
+        INSERT INTO users (username, password, role)
+        VALUES (?, ?, ?)
+    ''', (username, password_hash, role))
+
+@writer.operation
+def update_password(conn, user_id, password_hash):
+    conn.execute('UPDATE users SET password = ? WHERE user_id = ?', (password_hash, user_id))
+
+@writer.operation
+def insert_room(conn, room_number, room_type, price_per_night):
+    conn.execute('''
+        INSERT INTO rooms (room_number, room_type, price_per_night)
+        VALUES (?, ?, ?)
+    ''', (room_number, room_type, price_per_night))
+
+@writer.operation
+def update_room(conn, room_id, room_type, price_per_night):
+    conn.execute('''
+        UPDATE rooms 
+        SET room_type = ?, price_per_night = ?
+        WHERE room_id = ?
+    ''', (room_type, price_per_night, room_id))
+
+@writer.operation
+def remove_room(conn, room_id):
+    """Delete a room that has never been booked"""
+    if conn.execute('SELECT 1 FROM bookings WHERE room_id = ? LIMIT 1', (room_id,)).fetchone():
+        raise ValueError('The room has bookings')
+    conn.execute('DELETE FROM rooms WHERE room_id = ?', (room_id,))
+
+@writer.operation
+def insert_customer(conn, name, email, phone, address):
+    return conn.execute('''
+        INSERT INTO customers (name, email, phone, address)
+        VALUES (?, ?, ?, ?)
+    ''', (name, email, phone, address)).lastrowid
+
+@writer.operation
+def book_stay(conn, user_id, username, room_id, check_in, check_out, rate_factor=None):
+    """Book a room and store its receipt snapshot with it; returns the receipt"""
+    snapshots = []
+    
+    def record_receipt(conn, booking):
+        snapshots.append(receipts.snapshot(booking, username))
+        receipts.record(conn, snapshots[-1])
+    
+    insert_booking(conn, user_id, room_id, check_in, check_out, record=record_receipt,
+                   rate_factor=rate_factor)
+    return snapshots[-1]
+
+@writer.operation
+def book_room_type(conn, user_id, username, room_type, check_in, check_out, candidates, rate_factor=None):
+    """Book the best-fit free room of a type, storing its receipt; returns (receipt, room_id)"""
+    snapshots = []
+    
+    def record_receipt(conn, booking):
+        snapshots.append(receipts.snapshot(booking, username))
+        receipts.record(conn, snapshots[-1])
+    
+    room_id = assignment.assign(conn, user_id, room_type, check_in, check_out, candidates,
+                                record=record_receipt, rate_factor=rate_factor)
+    return snapshots[-1], room_id
+
+@writer.operation
+def reassign_rooms(conn, today, min_stay):
+    """Re-optimize the rooms of future room-type bookings; returns the report"""
+    return assignment.optimize(conn, today, min_stay)
+
+@writer.operation
+def book_group(conn, user_id, username, name, requests, rates=None):
+    """Book a group of rooms all-or-nothing, with a receipt per room; returns the group's bill"""
+    return groups.book_group(conn, user_id, username, name, requests,
+                             record=lambda conn, booking: receipts.record(
+                                 conn, receipts.snapshot(booking, username)),
+                             rates=rates)
+
+@writer.operation
+def set_room_rates(conn, room_type, start, end, factor, weekdays):
+    """Set a room type's rate multiplier over a range of nights; returns the nights set"""
+    return pricing.set_rates(conn, room_type, start, end, factor, weekdays)
+
+def is_admin():
+    """Check if current user is admin"""
+    return 'user_role' in session and session['user_role'] == 'admin'
+
+def can_read_metrics():
+    """Admins, or a scraper presenting METRICS_TOKEN as a bearer token"""
+    token = app.config['METRICS_TOKEN']
+    if token:
+        header = request.headers.get('Authorization', '')
+        if hmac.compare_digest(header.encode(), f'Bearer {token}'.encode()):
+            return True
+    return is_logged_in() and is_admin()
+
+def is_logged_in():
+    """Check if user is logged in"""
+    return 'user_id' in session
+
+# Sort orders offered on the room listings (request value -> column)
+ROOM_SORTS = {
+    'room_number': 'room_number',
+    'price': 'price_per_night',
+    'type': 'room_type',
+}
+
+def listing_page_size(streaming):
+    """Page size for a listing; streamed pages may be much larger"""
+    if streaming:
+        return page_size_from_request(limit=app.config['STREAM_MAX_PAGE_SIZE'])
+    return page_size_from_request()
+
+def request_night():
+    """The night selected with ?night=YYYY-MM-DD, defaulting to tonight"""
+    night = request.args.get('night', '')
+    try:
+        return date.fromisoformat(night).isoformat()
+    except ValueError:
+        return occupancy.tonight()
+
+def room_page(conn, occupied, streaming=False):
+    """Fetch the page of rooms selected by the request's filter and sort arguments.
+
+    `occupied` is the set of room ids booked for the night being shown; the
+    status filter ('Available' / 'Booked') is applied against it.
+    """
+    filters = {}
+    if request.args.get('room_type'):
+        filters['room_type'] = request.args['room_type']
+    for name in ('min_price', 'max_price'):
+        try:
+            filters[name] = float(request.args[name])
+        except (KeyError, ValueError):
+            pass
+    status = request.args.get('status')
+    if status not in (occupancy.AVAILABLE, occupancy.BOOKED):
+        status = None
+    
+    sort_column = ROOM_SORTS.get(request.args.get('sort'), 'room_number')
+    after = decode_cursor(request.args.get('after'))
+    page_size = listing_page_size(streaming)
+    descending = request.args.get('order') == 'desc'
+    
+    if app.config['ROOM_CATALOG_CACHE']:
+        rows, keys = get_catalog().view(conn, sort_column, **filters)
+        if status:
+            want_booked = status == occupancy.BOOKED
+            selected = [i for i, room in enumerate(rows) if (room['room_id'] in occupied) == want_booked]
+            rows = [rows[i] for i in selected]
+            keys = [keys[i] for i in selected]
+        return page_from_sorted(rows, keys, after, page_size, descending)
+    
+    where, params = [], []
+    for name, condition in (('room_type', 'room_type = ?'),
+                            ('min_price', 'price_per_night >= ?'),
+                            ('max_price', 'price_per_night <= ?')):
+        if name in filters:
+            where.append(condition)
+            params.append(filters[name])
+    if status:
+        negate = '' if status == occupancy.BOOKED else 'NOT '
+        where.append(f'room_id {negate}IN (SELECT room_id FROM room_nights WHERE night = ?)')
+        params.append(request_night())
+    
+    return fetch_page(conn, 'rooms', 'room_id', sort_column, where, params,
+                      after=after, page_size=page_size, descending=descending,
+                      lazy=streaming)
+
+# Routes
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        role = request.form['role']
+        
+        if not username or not password:
+            flash('Username and password are required!')
+            return redirect(url_for('register'))
+        
+        hashed_password = get_hasher().hash(password)
+        
+        try:
+            get_writer().call('insert_user', username, hashed_password, role)
+            flash('Registration successful! Please log in.')
+            return redirect(url_for('login'))
+        except sqlite3.IntegrityError:
+            flash('Username already exists!')
+            return redirect(url_for('register'))
+    
+    return render_template('register.html')
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        
+        conn = get_db()
+        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        
+        hasher = get_hasher()
+        if user and hasher.verify(user['password'], password):
+            # Upgrade hashes made with an older method or cost
+            if hasher.needs_rehash(user['password']):
+                get_writer().call('update_password', user['user_id'], hasher.hash(password))
+            
+            session['user_id'] = user['user_id']
+            session['username'] = user['username']
+            session['user_role'] = user['role']
+            flash('Login successful!')
+            
+            if user['role'] == 'admin':
+                return redirect(url_for('dashboard'))
+            else:
+                return redirect(url_for('book_room'))
+        else:
+            flash('Invalid username or password!')
+    
+    return render_template('login.html')
+
+@app.route('/logout')
+def logout():
+    session.clear()
+    flash('You have been logged out.')
+    return redirect(url_for('index'))
+
+@app.route('/dashboard')
+def dashboard():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    conn = get_db()
+    
+    # Get statistics (stored totals plus the night's occupancy from the ledger)
+    night = request_night()
+    dashboard_stats = stats.read_stats(conn, night)
+    occupied = occupancy.occupied_rooms(conn, night)
+    
+    # Get one page of rooms (read lazily when the page is streamed)
+    streaming = wants_streaming()
+    rooms = room_page(conn, occupied, streaming)
+    
+    return render_page('dashboard.html', streaming,
+                       rooms=rooms,
+                       night=night,
+                       occupied=occupied,
+                       **dashboard_stats)
+
+@app.route('/admin/stats')
+def admin_stats():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    return jsonify({
+        'db_pool': db.get_pool().stats(),
+        'availability': get_availability().stats(),
+        'room_catalog': get_catalog().stats(),
+        'rollups': rollups.get_rollups().stats(),
+        'receipts': receipts.get_receipts().stats(),
+        'startup': get_startup().stats(),
+        'writer': get_writer().stats(),
+        'sessions': get_session_store().stats(),
+        'api': api.get_api_cache().stats(),
+        'rates': pricing.get_rates().stats(),
+        'events': events.get_event_log().stats(),
+        'archive': archive.get_archiver().stats(),
+    })
+
+@app.route('/admin/sessions/revoke', methods=['POST'])
+def revoke_sessions():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    user = get_db().execute('SELECT user_id, username FROM users WHERE username = ?',
+                            (request.form['username'],)).fetchone()
+    if user is None:
+        flash('User not found!')
+    else:
+        count = get_session_store().revoke_user(user['user_id'])
+        flash(f"Logged {user['username']} out of {count} session(s).")
+    return redirect(url_for('dashboard'))
+
+@app.route('/admin/rates', methods=['POST'])
+def set_rates():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    room_type = request.form['room_type']
+    weekdays = request.form.getlist('weekdays')
+    try:
+        factor = float(request.form['factor'])
+        count = get_writer().call('set_room_rates', room_type, request.form['start'], request.form['end'],
+                                  factor, tuple(int(day) for day in weekdays) if weekdays else None)
+    except ValueError as e:
+        flash(f'Invalid rate update: {e}')
+        return redirect(url_for('dashboard'))
+    pricing.get_rates().invalidate()
+    flash(f'Set the {room_type} rate to x{factor:g} for {count} night(s).')
+    return redirect(url_for('dashboard'))
+
+@app.route('/admin/rates.json')
+def rates_json():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    try:
+        start, end, _, room_type = report_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if room_type is None:
+        return jsonify({'error': 'room_type is required'}), 400
+    return jsonify({'room_type': room_type,
+                    'nights': pricing.get_rates().nightly(get_db(), room_type, start.isoformat(), end.isoformat())})
+
+@app.route('/admin/inventory.json')
+def inventory_json():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    try:
+        night = date.fromisoformat(request.args.get('as_of', date.today().isoformat()))
+        return jsonify(events.inventory_as_of(get_db(), night))
+    except ValueError:
+        return jsonify({'error': 'as_of must be a date (YYYY-MM-DD)'}), 400
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/admin/assignment/optimize', methods=['POST'])
+def optimize_assignment():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    report = get_writer().call('reassign_rooms', date.today().isoformat(), app.config['ASSIGNMENT_MIN_STAY'])
+    if report['moved']:
+        receipts.get_receipts().invalidate()
+    flash(f"Moved {report['moved']} of {report['bookings']} future room-type bookings: "
+          f"{report['nights_freed']} unsellable night(s) freed.")
+    return redirect(url_for('dashboard'))
+
+@app.route('/admin/archive', methods=['POST'])
+def archive_stays():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    before = archive.horizon(app.config['ARCHIVE_AFTER_DAYS'])
+    if archive.get_archiver().start(before, app.config['ARCHIVE_BATCH']):
+        flash(f"Archiving stays that ended before {before} in the background; see /admin/stats for progress.")
+    else:
+        flash('Archival is already running!')
+    return redirect(url_for('dashboard'))
+
+@app.route('/metrics')
+def metrics_report():
+    if not can_read_metrics():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    registry = metrics.get_metrics()
+    if registry is None:
+        abort(404)
+    
+    pool = db.get_pool().stats()
+    gauges = {f'db_pool_{name}': value for name, value in pool.items()}
+    gauges.update({f'room_catalog_{name}': value for name, value in get_catalog().stats().items()
+                   if isinstance(value, (int, float))})
+    gauges.update({f'receipt_cache_{name}': value for name, value in receipts.get_receipts().stats().items()})
+    gauges.update({f'startup_{name}': value for name, value in get_startup().stats().items()})
+    gauges.update({f'writer_{name}': value for name, value in get_writer().stats().items()})
+    gauges.update({f'session_store_{name}': value for name, value in get_session_store().stats().items()})
+    gauges.update({f'api_{name}': value for name, value in api.get_api_cache().stats().items()})
+    gauges.update({f'rates_{name}': value for name, value in pricing.get_rates().stats().items()
+                   if isinstance(value, (int, float))})
+    gauges.update({f'events_{name}': value for name, value in events.get_event_log().stats().items()})
+    gauges.update({f'archive_{name}': value for name, value in archive.get_archiver().stats().items()})
+    
+    if request.args.get('format') == 'json':
+        return jsonify(dict(registry.to_dict(), gauges=gauges))
+    return Response(registry.prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profile', methods=['GET', 'POST'])
+def metrics_profile():
+    if not can_read_metrics():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    registry = metrics.get_metrics()
+    if registry is None:
+        abort(404)
+    
+    if request.method == 'POST':
+        route = request.form.get('route', '')
+        if route not in app.view_functions:
+            return jsonify({'error': f'Unknown route: {route}'}), 400
+        samples = request.form.get('samples', 20, type=int)
+        registry.arm_profile(route, max(1, samples))
+        return jsonify({'route': route, 'samples': samples})
+    
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        sort = 'cumulative'
+    report = registry.profile_report(sort=sort, limit=request.args.get('limit', 40, type=int))
+    return Response(report, mimetype='text/plain')
+
+def report_request():
+    """Parse ?start=&end=&group=&room_type= for the reports (defaults: this month, by day)"""
+    today = date.today()
+    month_start = today.replace(day=1)
+    start = date.fromisoformat(request.args.get('start') or month_start.isoformat())
+    end = date.fromisoformat(request.args.get('end') or
+                             ((month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)).isoformat())
+    if end < start:
+        raise ValueError('End date must not be before start date!')
+    if (end - start).days >= app.config['REPORT_MAX_DAYS']:
+        raise ValueError(f"Reports are limited to {app.config['REPORT_MAX_DAYS']} days!")
+    group = request.args.get('group', 'day')
+    if group not in rollups.GROUPS:
+        raise ValueError(f"Group must be one of {', '.join(rollups.GROUPS)}!")
+    return start, end, group, request.args.get('room_type') or None
+
+@app.route('/admin/reports')
+def reports():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    try:
+        start, end, group, room_type = report_request()
+    except ValueError as e:
+        flash(str(e))
+        return redirect(url_for('reports'))
+    
+    report = rollups.get_rollups().report(get_db(), start, end, group, room_type)
+    return render_template('reports.html', report=report)
+
+@app.route('/admin/reports.json')
+def reports_json():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    try:
+        start, end, group, room_type = report_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(rollups.get_rollups().report(get_db(), start, end, group, room_type))
+
+@app.route('/rooms')
+def rooms():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    conn = get_db()
+    occupied = occupancy.occupied_rooms(conn, request_night())
+    streaming = wants_streaming()
+    rooms = room_page(conn, occupied, streaming)
+    
+    return render_page('rooms.html', streaming, rooms=rooms, occupied=occupied)
+
+@app.route('/add_room', methods=['POST'])
+def add_room():
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    room_number = request.form['room_number']
+    room_type = request.form['room_type']
+    price_per_night = request.form['price_per_night']
+    
+    try:
+        get_writer().call('insert_room', room_number, room_type, price_per_night)
+        get_catalog().invalidate()
+        flash('Room added successfully!')
+    except sqlite3.IntegrityError:
+        flash('Room number already exists!')
+    
+    return redirect(url_for('rooms'))
+
+@app.route('/edit_room/<int:room_id>', methods=['POST'])
+def edit_room(room_id):
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    room_type = request.form['room_type']
+    price_per_night = request.form['price_per_night']
+    
+    get_writer().call('update_room', room_id, room_type, price_per_night)
+    get_catalog().invalidate()
+    
+    flash('Room updated successfully!')
+    return redirect(url_for('rooms'))
+
+@app.route('/delete_room/<int:room_id>')
+def delete_room(room_id):
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    
+    conn = get_db()
+    # The writer only sees the hot bookings; stays moved to the archive count too
+    if archive.attach(conn) and conn.execute('SELECT 1 FROM archive.bookings WHERE room_id = ? LIMIT 1',
+                                             (room_id,)).fetchone():
+        flash('Room has bookings and cannot be deleted!')
+        return redirect(url_for('rooms'))
+    try:
+        get_writer().call('remove_room', room_id)
+    except ValueError:
+        flash('Room has bookings and cannot be deleted!')
+        return redirect(url_for('rooms'))
+    get_catalog().invalidate()
+    get_availability().remove_room(room_id)
+    
+    flash('Room deleted successfully!')
+    return redirect(url_for('rooms'))
+
+@app.route('/admin/import/<kind>', methods=['POST'])
+def bulk_import(kind):
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    import bulk  # only needed here, so kept off the startup path
+    if kind not in bulk.KINDS:
+        abort(404)
+    
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'No file uploaded'}), 400
+    
+    fmt = request.form.get('format') or bulk.detect_format(upload.filename)
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+    try:
+        report = bulk.import_rows(get_db(), kind, bulk.read_rows(stream, fmt),
+                                  chunk_size=app.config['BULK_CHUNK_SIZE'])
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if kind == 'rooms':
+        get_catalog().invalidate()
+    
+    return jsonify(report.to_dict())
+
+@app.route('/admin/export/<kind>')
+def bulk_export(kind):
+    if not is_logged_in() or not is_admin():
+        flash('Access denied!')
+        return redirect(url_for('login'))
+    import bulk  # only needed here, so kept off the startup path
+    if kind not in bulk.KINDS:
+        abort(404)
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        abort(400)
+    
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(bulk.export_rows(get_db(), kind, fmt)),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
+@app.route('/book-room')
+def book_room():
+    if not is_logged_in():
+        flash('Please log in to book a room!')
+        return redirect(url_for('login'))
+    
+    conn = get_db()
+    check_in = request.args.get('check_in', '')
+    check_out = request.args.get('check_out', '')
+    
+    if check_in and check_out:
+        # Date-range search: ask the availability index which rooms are free
+        try:
+            if datetime.strptime(check_out, '%Y-%m-%d') <= datetime.strptime(check_in, '%Y-%m-%d'):
+                flash('Check-out date must be after check-in date!')
+                return redirect(url_for('book_room'))
+        except ValueError:
+            flash('Invalid date format!')
+            return redirect(url_for('book_room'))
+        
+        all_rooms = get_catalog().rooms(conn)
+        free_ids = set(get_availability().free_rooms(
+            [room['room_id'] for room in all_rooms], check_in, check_out))
+        available_rooms = [room for room in all_rooms if room['room_id'] in free_ids]
+        # Price of the stay in every room, from the rate calendar
+        quotes = pricing.get_rates().quote(conn, available_rooms, check_in, check_out)
+    else:
+        # Rooms that are free tonight, at their nightly price
+        occupied = occupancy.occupied_rooms(conn)
+        available_rooms = [room for room in get_catalog().rooms(conn) if room['room_id'] not in occupied]
+        quotes = {}
+    
+    # Room types on offer, for letting the hotel choose the room: type -> (rooms free, lowest total)
+    room_types = {}
+    for room in available_rooms:
+        price = quotes.get(room['room_id'], room['price_per_night'])
+        count, lowest = room_types.get(room['room_type'], (0, price))
+        room_types[room['room_type']] = (count + 1, min(lowest, price))
+    
+    return render_template('booking.html', rooms=available_rooms, room_types=sorted(room_types.items()),
+                          quotes=quotes, check_in=check_in, check_out=check_out)
+
+@app.route('/process-booking', methods=['POST'])
+def process_booking():
+    if not is_logged_in():
+        flash('Please log in to book a room!')
+        return redirect(url_for('login'))
+    
+    room_id = request.form.get('room_id')
+    room_type = request.form.get('room_type')
+    check_in = request.form['check_in']
+    check_out = request.form['check_out']
+    if not room_id and not room_type:
+        flash('Please choose a room or a room type!')
+        return redirect(url_for('book_room'))
+    
+    # Validate dates
+    try:
+        check_in_date = datetime.strptime(check_in, '%Y-%m-%d')
+        check_out_date = datetime.strptime(check_out, '%Y-%m-%d')
+        
+        if check_out_date <= check_in_date:
+            flash('Check-out date must be after check-in date!')
+            return redirect(url_for('book_room'))
+    except ValueError:
+        flash('Invalid date format!')
+        return redirect(url_for('book_room'))
+    
+    availability = get_availability()
+    
+    if room_id:
+        # Check if room is already booked for these dates
+        if not availability.is_free(room_id, check_in, check_out):
+            flash('This room is already booked for the selected dates!')
+            return redirect(url_for('book_room'))
+    
+    # The stay is priced here from the rate calendar; the writer re-checks
+    # and inserts inside one write transaction, storing the receipt snapshot
+    # with the booking
+    conn = get_db()
+    rates = pricing.get_rates()
+    try:
+        if room_id:
+            room = get_catalog().get(conn, room_id)
+            rate_factor = rates.stay_factor(conn, room['room_type'], check_in, check_out) if room else None
+            receipt = get_writer().call('book_stay', session['user_id'], session['username'],
+                                        room_id, check_in, check_out, rate_factor)
+        else:
+            # Any room of the type: the hotel picks the best fit
+            receipt, room_id = get_writer().call(
+                'book_room_type', session['user_id'], session['username'], room_type,
+                check_in, check_out, assignment.choose_rooms(room_type, check_in, check_out),
+                rates.stay_factor(conn, room_type, check_in, check_out))
+    except BookingError as e:
+        flash(str(e))
+        return redirect(url_for('book_room'))
+    availability.add_booking(room_id, check_in, check_out)
+    
+    # Render the bill in the background while the browser follows the redirect
+    receipts.get_receipts().submit(receipt)
+    
+    flash('Room booked successfully!')
+    return redirect(url_for('bill', booking_id=receipt.booking_id))
+
+@app.route('/bill/<int:booking_id>')
+def bill(booking_id):
+    if not is_logged_in():
+        flash('Please log in to view your bill!')
+        return redirect(url_for('login'))
+    
+    found = receipts.get_receipts().get(get_db(), booking_id)
+    if found is None or (found[0] != session['user_id'] and not is_admin()):
+        abort(404)
+    return render_template('bill.html', receipt_html=found[1])
+
+@app.route('/group-bill/<int:group_id>')
+def group_bill(group_id):
+    if not is_logged_in():
+        flash('Please log in to view your bill!')
+        return redirect(url_for('login'))
+    
+    bill = groups.load_bill(get_db(), group_id)
+    if bill is None or (bill['user_id'] != session['user_id'] and not is_admin()):
+        abort(404)
+    return render_template('group_bill.html', bill=bill)
+
+@app.route('/customer-details', methods=['GET', 'POST'])
+def customer_details():
+    if not is_logged_in():
+        flash('Please log in to view customer details!')
+        return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        name = request.form['name']
+        email = request.form['email']
+        phone = request.form['phone']
+        address = request.form['address']
+        
+        try:
+            get_writer().call('insert_customer', name, email, phone, address)
+            flash('Customer details saved successfully!')
+        except:
+            flash('Error saving customer details!')
+    
+    conn = get_db()
+    query = request.args.get('q', '').strip()
+    if query:
+        # Ranked full-text results: one page of the best matches
+        page_size = page_size_from_request()
+        customers = Page(search.search(conn, query, limit=page_size), None, page_size, True)
+        return render_template('customer.html', customers=customers)
+    
+    where, params = [], []
+    name_prefix = request.args.get('name', '').strip()
+    if name_prefix:
+        where.append('name >= ? AND name < ?')
+        params.extend(prefix_range(name_prefix))
+    streaming = wants_streaming()
+    customers = fetch_page(conn, 'customers', 'customer_id', 'name', where, params,
+                           after=decode_cursor(request.args.get('after')),
+                           page_size=listing_page_size(streaming),
+                           lazy=streaming)
+    
+    return render_page('customer.html', streaming, customers=customers)
+
+@app.route('/customers/search')
+def customer_search():
+    if not is_logged_in():
+        return jsonify({'error': 'Please log in to search customers!'}), 401
+    
+    try:
+        limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    
+    results = search.search(get_db(), request.args.get('q', ''), limit=limit)
+    return jsonify([{
+        'customer_id': row['customer_id'],
+        'name': row['name'],
+        'email': row['email'],
+        'phone': row['phone'],
+    } for row in results])
+
+get_startup(app).imported()
+
+if __name__ == '__main__':
+    get_startup(app).run()
     app.run(debug=True)
\ No newline at end of file
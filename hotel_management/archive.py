@@ -0,0 +1,362 @@
+"""
+Archival of completed stays, and online backups.
+
+bookings and the occupancy ledger (room_nights) grow with every stay the
+hotel has ever sold.  Stays that checked out more than ARCHIVE_AFTER_DAYS
+days ago are moved into an archive database next to the main one
+(database/hotel_archive.db), ATTACHed as "archive", in batches of
+ARCHIVE_BATCH bookings.  Each batch is two writes through the writer
+(see writer.py), which attaches the archive to its connection before
+each batch: one copies the batch into the archive, the next deletes it
+from the hot tables.  A transaction over a WAL database and an attached
+one is not atomic across the two files, so the copy is committed first
+and the delete is only ever of stays already archived; a crash in
+between leaves the batch in both, and the next run finishes moving it.
+The admin page starts a run in the background (one at a time per
+process) and /admin/stats reports it.
+
+Moving a stay is not a change to it, so the triggers that would take the
+delete for a cancellation (the ledger, the dashboard revenue, the nightly
+rollups and the event log) skip it: they only fire WHEN the archiving
+table is empty, and each delete transaction holds a row in it until just
+before it commits, so no other connection ever sees the row.  The event
+log gets a 'booking archived' event per stay instead.  Reports, the dashboard
+revenue and the point-in-time inventory are unchanged by archival.
+Archived nights keep the room type the room had when they were archived:
+changing a room's type afterwards re-types only its nights still in the
+hot ledger, in the rollups as in their consistency check.
+
+The request path (overlap checks, tonight's occupancy, the availability
+index, a guest's booking list, event snapshots) reads only the hot
+tables, whose size now depends on the horizon rather than on the hotel's
+age.  Queries that must see all of history use across(conn, table), which
+attaches the archive once it exists and names a temporary view over the
+hot and archived rows: the consistency checks, looking a booking up by
+id and room deletion do.
+
+backup() copies both databases with SQLite's online backup API, each in
+one step from a single read transaction over both: a consistent pair of
+copies, which in WAL mode writers never wait for.
+
+Command line usage:
+
+    python archive.py                # archive stays older than the horizon
+    python archive.py --days N       # ... that checked out more than N days ago
+    python archive.py --backup DIR   # back up hotel.db and hotel_archive.db into DIR
+
+Configuration (app.config):
+    ARCHIVE_AFTER_DAYS  days after check-out a stay is moved to the archive (default 365)
+    ARCHIVE_BATCH       bookings moved per transaction (default 2000)
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from flask import current_app
+
+import events
+import writer
+from db import extension
+from writer import get_writer
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+
+DEFAULT_AFTER_DAYS = 365
+DEFAULT_BATCH = 2000
+
+ARCHIVE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archive.bookings (
+    booking_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    check_in DATE NOT NULL,
+    check_out DATE NOT NULL,
+    total_amount REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS archive.idx_archive_bookings_room_dates ON bookings (room_id, check_in, check_out);
+CREATE INDEX IF NOT EXISTS archive.idx_archive_bookings_user_id ON bookings (user_id);
+
+CREATE TABLE IF NOT EXISTS archive.room_nights (
+    room_id INTEGER NOT NULL,
+    night DATE NOT NULL,
+    booking_id INTEGER NOT NULL,
+    rate REAL NOT NULL DEFAULT 0,
+    room_type TEXT NOT NULL,
+    PRIMARY KEY (room_id, night)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS archive.idx_archive_room_nights_night ON room_nights (night, room_id);
+
+CREATE TEMP VIEW IF NOT EXISTS all_bookings AS
+    SELECT booking_id, user_id, room_id, check_in, check_out, total_amount FROM main.bookings
+    UNION ALL
+    SELECT booking_id, user_id, room_id, check_in, check_out, total_amount FROM archive.bookings;
+
+CREATE TEMP VIEW IF NOT EXISTS all_room_nights AS
+    SELECT room_id, night, booking_id, rate FROM main.room_nights
+    UNION ALL
+    SELECT room_id, night, booking_id, rate FROM archive.room_nights;
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS archiving (
+    started REAL NOT NULL
+);
+'''
+
+# Triggers that would record moving a stay as cancelling it; they check the archiving table
+GUARDED_TRIGGERS = (
+    'trg_nights_booking_delete',   # the ledger rows are moved with the booking
+    'trg_rollup_night_delete',     # the nights stay sold in the rollups
+    'trg_stats_booking_delete',    # and in the dashboard revenue
+    'trg_events_booking_delete',   # logged as archived instead
+)
+
+
+def ensure_schema(conn):
+    """Create the archiving flag table the delete triggers check"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def archive_file(database):
+    """The archive database that goes with a main database file"""
+    return os.path.splitext(database)[0] + '_archive.db'
+
+
+def attached(conn):
+    return any(row[1] == 'archive' for row in conn.execute('PRAGMA database_list'))
+
+
+def attach(conn, create=False):
+    """Attach the archive (creating it with create=True) and its all_* views; returns whether it is attached.
+
+    The archive is not attached to an in-memory database, nor inside a
+    transaction, where SQLite does not allow ATTACH.
+    """
+    if attached(conn):
+        return True
+    main = next((row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main'), '')
+    if not main or getattr(conn, 'in_transaction', True):
+        return False
+    path = archive_file(main)
+    if not create and not os.path.exists(path):
+        return False
+    conn.execute('ATTACH DATABASE ? AS archive', (path,))
+    if create:
+        conn.execute('PRAGMA archive.journal_mode = WAL')
+    conn.executescript(ARCHIVE_SCHEMA)
+    return True
+
+
+def across(conn, table):
+    """table ('bookings' or 'room_nights'), or its view over the hot and archived rows once there is an archive"""
+    return f'all_{table}' if attach(conn) else table
+
+
+@writer.before_batch
+def attach_archive(conn):
+    """Attach the archive to the write connection once it has been created"""
+    attach(conn)
+
+
+@writer.operation
+def copy_stays(conn, before, batch):
+    """Copy up to batch stays that checked out before `before` into the archive; returns them"""
+    if not attached(conn):
+        raise ValueError('The archive is not attached to the write connection')
+    stays = [tuple(stay) for stay in conn.execute('''
+        SELECT booking_id, user_id, room_id, check_in, check_out, total_amount FROM main.bookings
+        WHERE check_in < ? AND check_out < ? LIMIT ?
+    ''', (before, before, batch))]
+    conn.executemany('INSERT OR IGNORE INTO archive.bookings VALUES (?, ?, ?, ?, ?, ?)', stays)
+    conn.executemany('''
+        INSERT OR IGNORE INTO archive.room_nights (room_id, night, booking_id, rate, room_type)
+        SELECT n.room_id, n.night, n.booking_id, n.rate, r.room_type
+        FROM main.room_nights n JOIN main.rooms r ON r.room_id = n.room_id
+        WHERE n.room_id = ? AND n.night >= ? AND n.night < ? AND n.booking_id = ?
+    ''', _ledger(stays))
+    return stays
+
+
+def _ledger(stays):
+    return [(room_id, check_in, check_out, booking_id)
+            for booking_id, _, room_id, check_in, check_out, _ in stays]
+
+
+@writer.operation
+def remove_stays(conn, stays):
+    """Delete archived stays from the hot tables, logging them as archived; returns the nights removed"""
+    conn.execute('INSERT INTO main.archiving (started) VALUES (?)', (time.time(),))
+    ids = [(stay[0],) for stay in stays]
+    conn.executemany(f'''
+        INSERT INTO main.events (recorded_at, kind, entity_id, room_id)
+        SELECT {events.NOW}, {events.BOOKING_ARCHIVED}, booking_id, room_id FROM main.bookings
+        WHERE booking_id = ?
+    ''', ids)
+    nights = conn.executemany('''
+        DELETE FROM main.room_nights WHERE room_id = ? AND night >= ? AND night < ? AND booking_id = ?
+    ''', _ledger(stays)).rowcount
+    conn.executemany('DELETE FROM main.room_assignments WHERE booking_id = ?', ids)
+    conn.executemany('DELETE FROM main.bookings WHERE booking_id = ?', ids)
+    conn.execute('DELETE FROM main.archiving')
+    return nights
+
+
+def create(database):
+    """Create the archive database for a main database file, if it does not exist yet"""
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        attach(conn, create=True)
+    finally:
+        conn.close()
+
+
+def archive_stays(database, call, before, batch=DEFAULT_BATCH):
+    """Move every stay that checked out before `before` ('YYYY-MM-DD') into the archive.
+
+    call is a writer's call() (see writer.py).  Returns (bookings, nights, seconds).
+    """
+    start = time.perf_counter()
+    create(database)
+    bookings = nights = 0
+    while True:
+        stays = call('copy_stays', before, batch)
+        if stays:
+            nights += call('remove_stays', stays)
+            bookings += len(stays)
+        if len(stays) < batch:
+            break
+    return bookings, nights, time.perf_counter() - start
+
+
+class Archiver:
+    """Runs archival in the background, one run at a time"""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._thread = None
+        self.runs = 0
+        self.failures = 0
+        self.bookings = 0
+        self.nights = 0
+        self.last_seconds = 0.0
+
+    def start(self, before, batch=DEFAULT_BATCH):
+        """Start archiving stays that ended before `before`; False if a run is already going"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self._run, args=(before, batch), name='archive', daemon=True)
+            self._thread.start()
+        return True
+
+    def _run(self, before, batch):
+        try:
+            bookings, nights, seconds = archive_stays(self.app.config['DATABASE'], get_writer(self.app).call,
+                                                      before, batch)
+        except (sqlite3.Error, ValueError, writer.WriterError):
+            self.app.logger.exception('Archiving stays that ended before %s failed', before)
+            with self._lock:
+                self.failures += 1
+            return
+        with self._lock:
+            self.runs += 1
+            self.bookings += bookings
+            self.nights += nights
+            self.last_seconds = seconds
+
+    def wait(self, timeout=None):
+        """Wait for the current run, if any, to finish"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': int(self._thread is not None and self._thread.is_alive()),
+                'runs': self.runs,
+                'failures': self.failures,
+                'bookings': self.bookings,
+                'nights': self.nights,
+                'last_seconds': self.last_seconds,
+            }
+
+
+def get_archiver(app=None):
+    """Return the app's background archiver"""
+    app = app or current_app._get_current_object()
+    return extension(app, 'archive', lambda: Archiver(app))
+
+
+def horizon(days, today=None):
+    """The first check-out date that stays hot"""
+    return ((today or date.today()) - timedelta(days=days)).isoformat()
+
+
+def backup(database, directory):
+    """Copy the database and its archive into directory; returns {copy: bytes}.
+
+    Both are read in one read transaction, so the copies are consistent
+    with each other; each is copied in one step of the backup API (a
+    multi-step backup restarts whenever another connection writes).
+    """
+    os.makedirs(directory, exist_ok=True)
+    source = sqlite3.connect(database, isolation_level=None)
+    copies = {}
+    try:
+        names = ['main'] + (['archive'] if attach(source) else [])
+        source.execute('BEGIN')
+        for name in names:
+            source.execute(f'SELECT count(*) FROM {name}.sqlite_master').fetchone()
+        for name, path in zip(names, (database, archive_file(database))):
+            target = os.path.join(directory, os.path.basename(path))
+            partial = target + '.partial'
+            copy = sqlite3.connect(partial)
+            try:
+                source.backup(copy, name=name)
+            finally:
+                copy.close()
+            os.replace(partial, target)
+            copies[target] = os.path.getsize(target)
+        source.execute('COMMIT')
+    finally:
+        source.close()
+    return copies
+
+
+def main():
+    args = sys.argv[1:]
+    if '--backup' in args:
+        directory = args[args.index('--backup') + 1]
+        start = time.perf_counter()
+        copies = backup(DATABASE, directory)
+        for path, size in copies.items():
+            print(f"{path}: {size / 1e6:.1f}MB")
+        print(f"Backed up in {time.perf_counter() - start:.2f}s")
+        return 0
+
+    import app as app_module
+
+    app = app_module.app
+    days = int(args[args.index('--days') + 1]) if '--days' in args else DEFAULT_AFTER_DAYS
+    before = horizon(days)
+    with app.app_context():
+        app_module.init_db()
+        bookings, nights, seconds = archive_stays(app.config['DATABASE'], get_writer(app).call, before,
+                                                  app.config.get('ARCHIVE_BATCH', DEFAULT_BATCH))
+        get_writer(app).close()
+    print(f"Archived {bookings} stay(s) ({nights} nights) that ended before {before} in {seconds:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Automatic room assignment.
+
+A guest who books a room type (rather than a room) leaves the choice of
+room to the hotel.  Picking the first free room scatters stays across the
+calendar and leaves gaps too short to sell: a one-night hole between two
+stays is a night nobody books.  Rooms are instead chosen best fit: the
+free room whose gap around the stay is smallest, avoiding any gap shorter
+than the minimum stay (ASSIGNMENT_MIN_STAY, default 2 nights), so stays
+are packed back to back and long free runs stay whole for long stays.
+Gaps before today do not count.
+
+rank_rooms() scores the free rooms of a type on the in-memory availability
+calendars (see availability.py), and assign() books the best of them that
+is still free inside the writer's transaction, recording the booking in
+room_assignments as one the hotel may move.
+
+optimize() is the batch job: it takes every future booking in
+room_assignments (the guest has not arrived yet), keeps every other
+booking where it is, and places them again best fit in check-in order
+around the fixed ones, room type by room type.  A room type is only
+rearranged if its stays all fit and fewer nights are left unsellable;
+the bookings that change room are logged in booking_moves, which the
+availability index of every worker process picks up, and their receipts
+are updated to the new room (a worker process that has the old bill in its
+receipt cache shows it until it is evicted).  Guests keep the price they
+booked.
+
+Command line usage:
+
+    python assignment.py    # re-optimize the assignments of future bookings
+"""
+
+import json
+import sys
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+
+from flask import current_app
+
+import occupancy
+import receipts
+from availability import RoomCalendar, get_availability, to_ordinal
+from booking import BookingConflict, insert_booking
+from catalog import get_catalog
+from db import get_db
+
+DEFAULT_MIN_STAY = 2
+
+# Best-fit rooms handed to the writer, which books the first still free
+CANDIDATES = 8
+
+# Candidate rooms per stay the optimizer looks at before settling for a short gap
+SCAN_LIMIT = 64
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS room_assignments (
+    booking_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS booking_moves (
+    move_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_id INTEGER NOT NULL,
+    from_room INTEGER NOT NULL,
+    to_room INTEGER NOT NULL,
+    moved_at TEXT NOT NULL
+);
+'''
+
+
+def ensure_schema(conn):
+    """Create the room assignment and booking move tables"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def score(before, after, min_stay):
+    """(unsellable nights, leftover nights) of the gaps a stay leaves on either side.
+
+    after is None when nothing follows the stay.
+    """
+    orphans = sum(gap for gap in (before, after) if gap is not None and 0 < gap < min_stay)
+    return orphans, before + (after or 0)
+
+
+def rank_rooms(index, rooms, check_in, check_out, today, min_stay=DEFAULT_MIN_STAY):
+    """Ids of the rooms free for the stay, best fit first (room number breaks ties)"""
+    start, end, first = to_ordinal(check_in), to_ordinal(check_out), to_ordinal(today)
+    ranked = []
+    for position, room in enumerate(rooms):
+        neighbours = index.calendar(room['room_id']).neighbours(start, end)
+        if neighbours is None:
+            continue
+        before = max(0, start - max(first, neighbours[0] or first))
+        after = neighbours[1] - end if neighbours[1] is not None else None
+        ranked.append((score(before, after, min_stay), position, room['room_id']))
+    ranked.sort()
+    return [room_id for _, _, room_id in ranked]
+
+
+def choose_rooms(room_type, check_in, check_out, app=None):
+    """The best-fit free rooms of a type for a stay, from the app's room catalog and availability index"""
+    app = app or current_app
+    rooms = get_catalog(app).view(get_db(), room_type=room_type)[0]
+    return rank_rooms(get_availability(app), rooms, check_in, check_out, date.today(),
+                      app.config.get('ASSIGNMENT_MIN_STAY', DEFAULT_MIN_STAY))[:CANDIDATES]
+
+
+def assign(conn, user_id, room_type, check_in, check_out, candidates, record=None, rate_factor=None):
+    """Book the first of candidates still free, inside the caller's write transaction.
+
+    candidates come from choose_rooms(), possibly a moment out of date, so
+    each one is checked again here.  Returns the booked room's id; raises
+    BookingConflict if none of them is free.  record and rate_factor are
+    passed on to insert_booking().
+    """
+    if candidates:
+        of_type = {row[0] for row in conn.execute(
+            f"SELECT room_id FROM rooms WHERE room_type = ? AND room_id IN ({', '.join('?' * len(candidates))})",
+            [room_type] + list(candidates))}
+        for room_id in candidates:
+            if room_id not in of_type or not occupancy.is_free(conn, room_id, check_in, check_out):
+                continue
+            booking_id, _ = insert_booking(conn, user_id, room_id, check_in, check_out, record, rate_factor)
+            conn.execute('INSERT INTO room_assignments (booking_id) VALUES (?)', (booking_id,))
+            return room_id
+    raise BookingConflict(f'No {room_type} room is available for the selected dates!')
+
+
+def orphan_nights(blocks, first, min_stay):
+    """Free nights from day ordinal first on, in gaps shorter than min_stay, around sorted blocks"""
+    total = 0
+    free_from = first
+    for start, end in blocks:
+        if end <= free_from:
+            continue
+        gap = start - free_from
+        if 0 < gap < min_stay:
+            total += gap
+        free_from = end
+    return total
+
+
+def place(rooms, fixed, stays, first, min_stay):
+    """Best-fit placement of stays around fixed blocks, in check-in order.
+
+    rooms are room ids in room number order, fixed maps a room id to its
+    sorted (start, end) blocks and stays are (start, end, booking_id).
+    Returns {booking_id: room_id}, or None if some stay does not fit.
+    """
+    calendars = {room_id: RoomCalendar() for room_id in rooms}
+    events = []
+    for room_id in rooms:
+        for start, end in fixed[room_id]:
+            calendars[room_id].add(start, end)
+            events.append((start, 0, end, room_id))
+    events.extend((start, 1, end, booking_id) for start, end, booking_id in stays)
+    # fixed blocks before stays starting the same day
+    events.sort()
+
+    # (night each room is free from, -room position, room id); scanning down
+    # from a stay's start visits the closest fits first, lower numbers first
+    position = {room_id: i for i, room_id in enumerate(rooms)}
+    free_from = {room_id: first for room_id in rooms}
+    keys = sorted((first, -position[room_id], room_id) for room_id in rooms)
+
+    def occupy(room_id, end):
+        if end <= free_from[room_id]:
+            return
+        key = (free_from[room_id], -position[room_id], room_id)
+        del keys[bisect_left(keys, key)]
+        free_from[room_id] = end
+        insort(keys, (end, -position[room_id], room_id))
+
+    placement = {}
+    for start, kind, end, ident in events:
+        if kind == 0:
+            occupy(ident, end)
+            continue
+        best = None
+        scanned = 0
+        i = bisect_right(keys, (start, float('inf'))) - 1
+        while i >= 0 and scanned < SCAN_LIMIT:
+            room_free_from, _, room_id = keys[i]
+            i -= 1
+            before = start - room_free_from
+            if best is not None and best[0][0] == 0 and before > best[0][1]:
+                # a fit without unsellable nights that no farther room can beat
+                break
+            calendar = calendars[room_id]
+            j = bisect_right(calendar.starts, start)
+            after = calendar.starts[j] - end if j < len(calendar) else None
+            if after is not None and after < 0:
+                continue
+            scanned += 1
+            candidate = (score(before, after, min_stay), room_id)
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+        if best is None:
+            return None
+        placement[ident] = best[1]
+        occupy(best[1], end)
+    return placement
+
+
+def optimize(conn, today, min_stay=DEFAULT_MIN_STAY):
+    """Re-assign future hotel-assigned bookings, inside the caller's write transaction.
+
+    Returns a report: bookings considered, bookings moved, unsellable nights
+    before and after, and nights freed.
+    """
+    started = time.perf_counter()
+    first = to_ordinal(today)
+    rooms = conn.execute('SELECT room_id, room_number, room_type FROM rooms ORDER BY room_number, room_id').fetchall()
+    room_type = {room_id: kind for room_id, _, kind in rooms}
+    room_number = {room_id: number for room_id, number, _ in rooms}
+    by_type = {}
+    for room_id, _, kind in rooms:
+        by_type.setdefault(kind, []).append(room_id)
+
+    fixed = {room_id: [] for room_id in room_type}
+    movable = {kind: [] for kind in by_type}
+    current = {}
+    for booking_id, room_id, check_in, check_out, assigned in conn.execute('''
+        SELECT b.booking_id, b.room_id, b.check_in, b.check_out, a.booking_id IS NOT NULL
+        FROM bookings b LEFT JOIN room_assignments a ON a.booking_id = b.booking_id
+        WHERE b.check_out > ?
+    ''', (date.fromordinal(first).isoformat(),)):
+        if room_id not in room_type:
+            continue
+        start, end = to_ordinal(check_in), to_ordinal(check_out)
+        if assigned and start > first:
+            movable[room_type[room_id]].append((start, end, booking_id))
+            current[booking_id] = room_id
+        else:
+            fixed[room_id].append((start, end))
+    for blocks in fixed.values():
+        blocks.sort()
+
+    report = {'bookings': len(current), 'moved': 0, 'orphan_nights_before': 0, 'orphan_nights_after': 0}
+    moves = []
+    for kind, type_rooms in by_type.items():
+        stays = movable[kind]
+        blocks = {room_id: list(fixed[room_id]) for room_id in type_rooms}
+        for start, end, booking_id in stays:
+            blocks[current[booking_id]].append((start, end))
+        before = sum(orphan_nights(sorted(blocks[room_id]), first, min_stay) for room_id in type_rooms)
+        report['orphan_nights_before'] += before
+        stays.sort()
+        placement = place(type_rooms, fixed, stays, first, min_stay) if stays else None
+        if placement is not None:
+            blocks = {room_id: list(fixed[room_id]) for room_id in type_rooms}
+            for start, end, booking_id in stays:
+                blocks[placement[booking_id]].append((start, end))
+            after = sum(orphan_nights(sorted(blocks[room_id]), first, min_stay) for room_id in type_rooms)
+            if after < before:
+                report['orphan_nights_after'] += after
+                moves.extend((booking_id, current[booking_id], placement[booking_id])
+                             for booking_id in placement if placement[booking_id] != current[booking_id])
+                continue
+        report['orphan_nights_after'] += before
+
+    if moves:
+        _move(conn, moves, room_number)
+    report['moved'] = len(moves)
+    report['nights_freed'] = report['orphan_nights_before'] - report['orphan_nights_after']
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def _move(conn, moves, room_number):
+    """Move bookings to other rooms: [(booking_id, from_room, to_room)]"""
+    ids = [move[0] for move in moves]
+    stays = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        stays.update((row[0], row[1:]) for row in conn.execute(
+            f"SELECT booking_id, check_in, check_out FROM bookings WHERE booking_id IN ({', '.join('?' * len(chunk))})",
+            chunk))
+    # Clear every old night first: two bookings may be trading rooms
+    conn.executemany('''
+        DELETE FROM room_nights WHERE room_id = ? AND night >= ? AND night < ? AND booking_id = ?
+    ''', [(from_room, *stays[booking_id], booking_id) for booking_id, from_room, _ in moves])
+    conn.executemany('UPDATE bookings SET room_id = ? WHERE booking_id = ?',
+                     [(to_room, booking_id) for booking_id, _, to_room in moves])
+    moved_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+    conn.executemany('INSERT INTO booking_moves (booking_id, from_room, to_room, moved_at) VALUES (?, ?, ?, ?)',
+                     [(booking_id, from_room, to_room, moved_at) for booking_id, from_room, to_room in moves])
+    for booking_id, _, to_room in moves:
+        row = conn.execute('SELECT snapshot FROM receipts WHERE booking_id = ?', (booking_id,)).fetchone()
+        if row is not None:
+            receipt = receipts.Receipt(*json.loads(row[0]))
+            receipts.record(conn, receipt._replace(room_number=room_number[to_room]))
+
+
+def main():
+    import app as app_module
+    from writer import get_writer
+
+    app = app_module.app
+    with app.app_context():
+        app_module.init_db()
+        report = get_writer(app).call('reassign_rooms', date.today().isoformat(),
+                                      app.config.get('ASSIGNMENT_MIN_STAY', DEFAULT_MIN_STAY))
+        print(f"Moved {report['moved']} of {report['bookings']} bookings in {report['seconds']}s; "
+              f"unsellable nights {report['orphan_nights_before']} -> {report['orphan_nights_after']} "
+              f"({report['nights_freed']} freed)")
+        get_writer(app).close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
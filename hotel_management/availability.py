@@ -0,0 +1,252 @@
+"""
+In-memory room availability engine.
+
+Each room keeps its bookings as a sorted list of disjoint busy blocks
+(half-open [check_in, check_out) intervals of date ordinals), so "is room X
+free" is a binary search instead of a scan over the bookings table.  The
+index is built from SQLite on first use and kept current by pulling any
+bookings newer than the last one it has seen, which also picks up bookings
+written by other worker processes.  Bookings moved to another room (see
+assignment.py) are logged in booking_moves, and a refresh reloads the
+rooms named by any move it has not seen yet.
+
+The index is per room, not across rooms: "which rooms are free" asks
+every room given, one binary search each (see free_rooms).
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from functools import lru_cache
+
+from flask import current_app
+
+from db import extension, get_db
+
+
+@lru_cache(maxsize=8192)
+def _parse_ordinal(value):
+    return date.fromisoformat(value[:10]).toordinal()
+
+
+def to_ordinal(value):
+    """Convert a date, datetime or 'YYYY-MM-DD' string to a day ordinal"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        return _parse_ordinal(value)
+    return value.toordinal()
+
+
+class RoomCalendar:
+    """Sorted, merged busy blocks for a single room"""
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self):
+        self.starts = array('l')
+        self.ends = array('l')
+
+    def __len__(self):
+        return len(self.starts)
+
+    def is_free(self, start, end):
+        """True if no busy block intersects [start, end)"""
+        i = bisect_left(self.starts, end)
+        return i == 0 or self.ends[i - 1] <= start
+
+    def neighbours(self, start, end):
+        """(end of the block before, start of the block after) a free [start, end).
+
+        Either is None when there is no such block; returns None if
+        [start, end) is not free.
+        """
+        i = bisect_left(self.starts, end)
+        if i and self.ends[i - 1] > start:
+            return None
+        return (self.ends[i - 1] if i else None,
+                self.starts[i] if i < len(self.starts) else None)
+
+    def add(self, start, end):
+        """Mark [start, end) busy, merging with touching or overlapping blocks"""
+        starts, ends = self.starts, self.ends
+        if not starts or start > ends[-1]:
+            # Fast path: bookings loaded in check-in order land at the end
+            starts.append(start)
+            ends.append(end)
+            return
+        lo = bisect_left(ends, start)
+        hi = bisect_right(starts, end)
+        if lo < hi:
+            start = min(start, starts[lo])
+            end = max(end, ends[hi - 1])
+        starts[lo:hi] = array('l', (start,))
+        ends[lo:hi] = array('l', (end,))
+
+
+class AvailabilityIndex:
+    """Per-room interval index over the bookings table"""
+
+    # Refreshes seeing moves between more rooms than this reload the whole index
+    MAX_ROOM_RELOADS = 64
+
+    def __init__(self):
+        self._rooms = {}
+        self._last_booking_id = 0
+        self._last_move_id = 0
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, conn):
+        """Rebuild the whole index from SQLite"""
+        rooms = {}
+        last_id = 0
+        rows = conn.execute('''
+            SELECT room_id, check_in, check_out, booking_id
+            FROM bookings
+            ORDER BY room_id, check_in
+        ''')
+        for room_id, check_in, check_out, booking_id in rows:
+            calendar = rooms.get(room_id)
+            if calendar is None:
+                calendar = rooms[room_id] = RoomCalendar()
+            calendar.add(to_ordinal(check_in), to_ordinal(check_out))
+            if booking_id > last_id:
+                last_id = booking_id
+        last_move_id = conn.execute('SELECT max(move_id) FROM booking_moves').fetchone()[0]
+        with self._lock:
+            self._rooms = rooms
+            self._last_booking_id = last_id
+            self._last_move_id = last_move_id or 0
+            self.loaded = True
+
+    def load_bookings(self, conn, bookings):
+        """Rebuild the whole index from {booking_id: (room_id, check_in, check_out, ...)} already read.
+
+        check_in and check_out are day ordinals, as restored from the
+        event log (see events.py); bookings in room and check-in order
+        are the fast case.
+        """
+        rooms = {}
+        last_id = 0
+        for booking_id, stay in bookings.items():
+            calendar = rooms.get(stay[0])
+            if calendar is None:
+                calendar = rooms[stay[0]] = RoomCalendar()
+            calendar.add(stay[1], stay[2])
+            if booking_id > last_id:
+                last_id = booking_id
+        last_move_id = conn.execute('SELECT max(move_id) FROM booking_moves').fetchone()[0]
+        with self._lock:
+            self._rooms = rooms
+            self._last_booking_id = last_id
+            self._last_move_id = last_move_id or 0
+            self.loaded = True
+
+    def refresh(self, conn):
+        """Pull bookings inserted since the last load or refresh"""
+        rows = conn.execute('''
+            SELECT room_id, check_in, check_out, booking_id
+            FROM bookings
+            WHERE booking_id > ?
+        ''', (self._last_booking_id,)).fetchall()
+        if rows:
+            with self._lock:
+                for room_id, check_in, check_out, booking_id in rows:
+                    self._add(room_id, to_ordinal(check_in), to_ordinal(check_out))
+                    self._last_booking_id = max(self._last_booking_id, booking_id)
+
+        moves = conn.execute('''
+            SELECT from_room, to_room, move_id FROM booking_moves WHERE move_id > ?
+        ''', (self._last_move_id,)).fetchall()
+        if moves:
+            moved = {room_id for move in moves for room_id in move[:2]}
+            if len(moved) > self.MAX_ROOM_RELOADS:
+                self.load(conn)
+                return
+            for room_id in moved:
+                self.reload_room(conn, room_id)
+            with self._lock:
+                self._last_move_id = max(self._last_move_id, max(move[2] for move in moves))
+
+    def _add(self, room_id, start, end):
+        calendar = self._rooms.get(room_id)
+        if calendar is None:
+            calendar = self._rooms[room_id] = RoomCalendar()
+        calendar.add(start, end)
+
+    def add_booking(self, room_id, check_in, check_out):
+        """Record a booking written by this process.
+
+        The booking will be seen again by the next refresh(); adding an
+        interval that is already busy is a no-op, so that is harmless.
+        """
+        with self._lock:
+            self._add(int(room_id), to_ordinal(check_in), to_ordinal(check_out))
+
+    def remove_room(self, room_id):
+        """Forget every booking for a room"""
+        with self._lock:
+            self._rooms.pop(int(room_id), None)
+
+    def reload_room(self, conn, room_id):
+        """Rebuild a single room's calendar from SQLite"""
+        calendar = RoomCalendar()
+        for check_in, check_out in conn.execute('''
+            SELECT check_in, check_out FROM bookings
+            WHERE room_id = ?
+            ORDER BY check_in
+        ''', (room_id,)):
+            calendar.add(to_ordinal(check_in), to_ordinal(check_out))
+        with self._lock:
+            self._rooms[int(room_id)] = calendar
+
+    def calendar(self, room_id):
+        """The room's calendar (empty if it has no bookings)"""
+        return self._rooms.get(int(room_id)) or RoomCalendar()
+
+    def is_free(self, room_id, check_in, check_out):
+        """True if the room has no booking overlapping [check_in, check_out)"""
+        calendar = self._rooms.get(int(room_id))
+        if calendar is None:
+            return True
+        return calendar.is_free(to_ordinal(check_in), to_ordinal(check_out))
+
+    def free_rooms(self, room_ids, check_in, check_out):
+        """Filter room_ids down to the rooms free for [check_in, check_out).
+
+        O(len(room_ids) * log(blocks per room)): one binary search per room.
+        An index across rooms would not make the search sublinear: its
+        callers already walk and render the rooms they pass in, and the
+        answer itself is often most of them.  With 10,000 rooms and a
+        million bookings this takes about 3 ms (bench_availability.py).
+        """
+        start, end = to_ordinal(check_in), to_ordinal(check_out)
+        rooms = self._rooms
+        free = []
+        for room_id in room_ids:
+            calendar = rooms.get(room_id)
+            if calendar is None or calendar.is_free(start, end):
+                free.append(room_id)
+        return free
+
+    def stats(self):
+        """Index size metrics"""
+        return {
+            'rooms': len(self._rooms),
+            'blocks': sum(len(c) for c in self._rooms.values()),
+            'last_booking_id': self._last_booking_id,
+        }
+
+
+def get_availability(app=None):
+    """Return the app's availability index, loaded and refreshed"""
+    app = app or current_app
+    index = extension(app, 'availability', AvailabilityIndex)
+    conn = get_db()
+    if not index.loaded:
+        index.load(conn)
+    else:
+        index.refresh(conn)
+    return index
@@ -0,0 +1,115 @@
+"""
+Benchmark for polling the JSON API when nothing has changed.
+
+Seeds a throwaway database with rooms and bookings, then polls the room
+list and a week of availability the ways a channel manager could, and
+reports the mean latency, response size and SQL statements per poll:
+
+  html       scraping the /rooms and /book-room pages (what it did before)
+  full       the API with its response cache off: every poll builds the JSON
+  cached     the API without If-None-Match: serialized response from the cache
+  304 ttl=0  If-None-Match, reading the table versions on every poll
+  304        If-None-Match with the default API_VERSION_TTL: no query at all
+
+Usage: python benchmarks/bench_api.py [--rooms N] [--bookings N] [--polls N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+START = date(2030, 1, 1)
+WEEK = f'check_in={START + timedelta(days=30)}&check_out={START + timedelta(days=37)}'
+
+
+def seed(path, rooms, bookings):
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                     [(f'B{i:05d}', ('Single', 'Double', 'Suite')[i % 3], 100 + i % 200)
+                      for i in range(rooms)])
+    rng = random.Random(7)
+    rows = []
+    for i in range(bookings):
+        room_id = i % rooms + 1
+        day = START + timedelta(days=(i // rooms) * 10 + rng.randint(0, 3))
+        rows.append((1, room_id, day.isoformat(), (day + timedelta(days=rng.randint(1, 5))).isoformat(), 100.0))
+    conn.executemany('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def poll(app, client, urls, polls, conditional):
+    """Mean seconds, bytes and SQL statements per poll of each url"""
+    registry = app.extensions['metrics']
+    etags = {url: client.get(url).headers.get('ETag') for url in urls}
+    statements = sum(s['count'] for s in registry.to_dict()['sql'])
+    size = 0
+    start = time.perf_counter()
+    for i in range(polls):
+        url = urls[i % len(urls)]
+        headers = {'If-None-Match': etags[url]} if conditional else {}
+        response = client.get(url, headers=headers)
+        assert response.status_code == (304 if conditional else 200), response.status_code
+        size += len(response.data)
+    elapsed = time.perf_counter() - start
+    statements = sum(s['count'] for s in registry.to_dict()['sql']) - statements
+    return elapsed / polls, size / polls, statements / polls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--polls', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    app.config['STARTUP_WARMUP'] = False
+    app.config['PAGE_SIZE'] = args.rooms
+    app.config['MAX_PAGE_SIZE'] = args.rooms
+
+    html = ['/rooms', f'/book-room?{WEEK}']
+    json = ['/api/v1/rooms', f'/api/v1/availability?{WEEK}']
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        app.config['DATABASE'] = path
+        app_module.init_db()
+        seed(path, args.rooms, args.bookings)
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        client.get('/rooms')
+
+        results = [('html', poll(app, client, html, args.polls // 10, False))]
+        for label, cache_size, ttl, conditional in (('full', 0, 1.0, False),
+                                                     ('cached', 256, 1.0, False),
+                                                     ('304 ttl=0', 256, 0.0, True),
+                                                     ('304', 256, 1.0, True)):
+            app.extensions.pop('api_cache', None)
+            app.config['API_CACHE_SIZE'] = cache_size
+            app.config['API_VERSION_TTL'] = ttl
+            results.append((label, poll(app, client, json, args.polls, conditional)))
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+
+    print(f"{args.rooms} rooms, {args.bookings} bookings; polling the room list and a week of availability\n")
+    print(f"{'mode':<10} {'mean ms':>9} {'bytes':>9} {'SQL/poll':>9}")
+    for label, (seconds, size, statements) in results:
+        print(f"{label:<10} {seconds * 1000:>9.3f} {size:>9.0f} {statements:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Benchmark for archiving past stays.
+
+Builds a throwaway database with the full schema (every trigger on) and
+a year of future bookings for --rooms rooms, then grows the history
+behind it a few years at a time.  At each size it times the request
+path, which reads only the hot tables:
+
+    overlap    the booking overlap check for a room and a week
+    tonight    the rooms occupied on one night
+    guest      a guest's bookings (each guest books every few months)
+    index      loading the availability index
+    snapshot   building an event-log snapshot of the inventory
+
+Then it archives every stay older than --keep days and times the same
+queries again, and reports:
+
+1. The archival rate (stays moved per second).
+2. The revenue and nights sold across hot and archived rows against the
+   totals before archival (they must match).
+3. Booking write latency while an online backup of both databases runs,
+   against the latency with no backup running.
+
+Usage: python benchmarks/bench_archive.py [--rooms N] [--years 1,2,4,8] [--keep DAYS]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+import archive
+import events
+import migrations
+import writer
+from availability import AvailabilityIndex
+from db import PRAGMAS
+
+TODAY = date(2030, 1, 1)
+ROOM_TYPES = (('Single', 100.0), ('Double', 150.0), ('Suite', 250.0))
+GUESTS = 5000
+CHUNK = 20000
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def stays(rooms, first, last, rng):
+    """Back-to-back stays for every room between the two days: (user_id, room_id, check_in, check_out, total)"""
+    for room_id in range(1, rooms + 1):
+        day = first + rng.randint(0, 3)
+        price = ROOM_TYPES[room_id % 3][1]
+        while True:
+            length = rng.randint(1, 7)
+            if day + length > last:
+                break
+            yield (rng.randint(1, GUESTS), room_id, date.fromordinal(day).isoformat(),
+                   date.fromordinal(day + length).isoformat(), price * length)
+            day += length + rng.choice((0, 0, 1, 2))
+
+
+def add_stays(conn, source):
+    """Insert the stays through the triggers in chunks; returns how many"""
+    count = 0
+    batch = []
+    for stay in source:
+        batch.append(stay)
+        if len(batch) == CHUNK:
+            count += insert(conn, batch)
+            batch = []
+    return count + insert(conn, batch)
+
+
+def insert(conn, batch):
+    conn.executemany('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                     'VALUES (?, ?, ?, ?, ?)', batch)
+    conn.commit()
+    return len(batch)
+
+
+def timed(work, repeat):
+    """Mean milliseconds per call of work()"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        work()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def hot_path(conn, rooms, rng):
+    """Milliseconds per overlap check, tonight's occupancy, guest list, index load and snapshot"""
+    def overlap():
+        check_in = TODAY + timedelta(days=rng.randrange(300))
+        conn.execute('SELECT 1 FROM room_nights WHERE room_id = ? AND night >= ? AND night < ? LIMIT 1',
+                     (rng.randint(1, rooms), check_in.isoformat(), (check_in + timedelta(days=7)).isoformat())
+                     ).fetchone()
+
+    def guest():
+        conn.execute('SELECT * FROM bookings WHERE user_id = ?', (rng.randint(1, GUESTS),)).fetchall()
+
+    return (timed(overlap, 2000),
+            timed(lambda: conn.execute('SELECT room_id FROM room_nights WHERE night = ?',
+                                       (TODAY.isoformat(),)).fetchall(), 200),
+            timed(guest, 500),
+            timed(lambda: AvailabilityIndex().load(conn), 1),
+            timed(lambda: events.build_snapshot(conn), 1))
+
+
+def totals(conn):
+    bookings = archive.across(conn, 'bookings')
+    nights = archive.across(conn, 'room_nights')
+    return (conn.execute(f'SELECT count(*), round(sum(total_amount), 2) FROM {bookings}').fetchone()
+            + conn.execute(f'SELECT count(*) FROM {nights}').fetchone())
+
+
+def write_latency(path, rooms, running, first):
+    """Milliseconds per single-booking write transaction while running() is true, booking nights from first on"""
+    conn = connect(path)
+    latencies = []
+    day = first.toordinal()
+    while running() or not latencies:
+        start = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                     'VALUES (1, ?, ?, ?, 100)', (len(latencies) % rooms + 1, date.fromordinal(day).isoformat(),
+                                                  date.fromordinal(day + 1).isoformat()))
+        conn.commit()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if len(latencies) % rooms == 0:
+            day += 1
+    conn.close()
+    return statistics.median(latencies), max(latencies), len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=500)
+    parser.add_argument('--years', default='1,2,4,8', help='years of history to time the hot path at')
+    parser.add_argument('--keep', type=int, default=365, help='days after check-out a stay stays hot')
+    args = parser.parse_args()
+    sizes = [int(years) for years in args.years.split(',')]
+
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'hotel.db')
+        conn = connect(path)
+        migrations.migrate(conn)
+        conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                         [(f'R{i:05d}',) + ROOM_TYPES[(i + 1) % 3] for i in range(args.rooms)])
+        conn.commit()
+        today = TODAY.toordinal()
+        add_stays(conn, stays(args.rooms, today, today + 365, rng))
+
+        print(f"{'history':>12} {'bookings':>10} {'overlap':>9} {'tonight':>9} {'guest':>9} "
+              f"{'index':>9} {'snapshot':>9}")
+        covered = 0
+        for years in sizes:
+            start = time.perf_counter()
+            add_stays(conn, stays(args.rooms, today - years * 365, today - covered * 365, rng))
+            covered = years
+            conn.execute('ANALYZE')
+            conn.commit()
+            bookings = conn.execute('SELECT count(*) FROM bookings').fetchone()[0]
+            timings = hot_path(conn, args.rooms, rng)
+            print(f"{f'{years} years':>12} {bookings:>10,} " + ' '.join(f'{ms:>7.2f}ms' for ms in timings)
+                  + f"   (grown in {time.perf_counter() - start:.0f}s)")
+
+        before = totals(conn)
+        conn.close()
+        archiver = writer.Writer(path)
+        moved, nights, elapsed = archive.archive_stays(
+            path, archiver.call, (TODAY - timedelta(days=args.keep)).isoformat(), archive.DEFAULT_BATCH)
+        archiver.close()
+        conn = connect(path)
+        conn.execute('ANALYZE main')
+        conn.commit()
+        bookings = conn.execute('SELECT count(*) FROM main.bookings').fetchone()[0]
+        timings = hot_path(conn, args.rooms, rng)
+        print(f"{'archived':>12} {bookings:>10,} " + ' '.join(f'{ms:>7.2f}ms' for ms in timings))
+
+        print(f"\nArchived {moved:,} stays ({nights:,} nights) in {elapsed:.1f}s "
+              f"({moved / elapsed:,.0f} stays/s)")
+        start = time.perf_counter()
+        after = totals(conn)
+        assert after == before, (before, after)
+        print(f"Hot + archived: {after[0]:,} bookings, {after[1]:,.2f} revenue, {after[2]:,} nights "
+              f"(same as before archival), summed in {time.perf_counter() - start:.2f}s")
+        conn.close()
+
+        end = time.perf_counter() + 2
+        idle = write_latency(path, args.rooms, lambda: time.perf_counter() < end, TODAY + timedelta(days=1000))
+        done = {}
+
+        def copy():
+            start = time.perf_counter()
+            done['copies'] = archive.backup(path, os.path.join(tmpdir, 'backup'))
+            done['seconds'] = time.perf_counter() - start
+        copier = threading.Thread(target=copy)
+        copier.start()
+        during = write_latency(path, args.rooms, copier.is_alive, TODAY + timedelta(days=5000))
+        copier.join()
+        print(f"\nBackup of both databases: {sum(done['copies'].values()) / 1e6:.1f}MB in {done['seconds']:.1f}s")
+        print(f"Booking writes: median {idle[0]:.2f}ms, max {idle[1]:.1f}ms with no backup; "
+              f"median {during[0]:.2f}ms, max {during[1]:.1f}ms during it ({during[2]:,} writes)")
+
+
+if __name__ == '__main__':
+    main()
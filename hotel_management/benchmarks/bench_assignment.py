@@ -0,0 +1,154 @@
+"""
+Benchmark for automatic room assignment.
+
+1. Allocation: replays a stream of room-type requests (random arrival
+   dates over the next --days, stays of 1-7 nights, in booking order,
+   enough to fill the hotel) against the in-memory availability index
+   with three ways of choosing the room, and reports the requests turned
+   away, the nights left unsellable (free gaps shorter than the minimum
+   stay) and the mean time per request:
+
+     first fit  the free room with the lowest number
+     random     any free room
+     best fit   assignment.rank_rooms()
+
+2. Re-optimization: stores the random allocation as hotel-assigned
+   bookings of a --rooms property (with --fixed percent of them chosen by
+   the guest instead, so they stay put), runs assignment.optimize() and
+   reports its time, the bookings moved and the unsellable nights freed.
+
+Usage: python benchmarks/bench_assignment.py [--rooms N] [--days N] [--fixed PERCENT]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+import assignment
+from availability import AvailabilityIndex
+from booking import run_immediate
+from occupancy import check_consistency
+
+START = date(2030, 1, 1)
+TYPES = ('Single', 'Double', 'Suite')
+
+
+def make_rooms(count):
+    return [{'room_id': i + 1, 'room_number': f'{i // 100 + 1}{i % 100:02d}', 'room_type': TYPES[i % 3]}
+            for i in range(count)]
+
+
+def make_requests(rooms, days, rng):
+    """Room-type requests, in booking order, for about the hotel's capacity over days"""
+    requests = []
+    nights = 0
+    while nights < len(rooms) * days:
+        length = rng.randint(1, 7)
+        check_in = START + timedelta(days=rng.randrange(days - length + 1))
+        requests.append((rng.choice(TYPES), check_in, check_in + timedelta(days=length)))
+        nights += length
+    return requests
+
+
+def allocate(rooms, requests, choose, min_stay):
+    """Run the requests through choose(); returns (stays, rejected, unsellable nights, seconds)"""
+    index = AvailabilityIndex()
+    by_type = {}
+    for room in rooms:
+        by_type.setdefault(room['room_type'], []).append(room)
+    stays = []
+    start = time.perf_counter()
+    for room_type, check_in, check_out in requests:
+        chosen = choose(index, by_type[room_type], check_in, check_out)
+        if chosen is not None:
+            index.add_booking(chosen, check_in, check_out)
+            stays.append((chosen, check_in, check_out))
+    elapsed = time.perf_counter() - start
+    first = START.toordinal()
+    unsellable = 0
+    for room in rooms:
+        calendar = index.calendar(room['room_id'])
+        unsellable += assignment.orphan_nights(zip(calendar.starts, calendar.ends), first, min_stay)
+    return stays, len(requests) - len(stays), unsellable, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--fixed', type=int, default=20, help='percent of bookings chosen by the guest')
+    parser.add_argument('--min-stay', type=int, default=assignment.DEFAULT_MIN_STAY)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    rooms = make_rooms(args.rooms)
+    requests = make_requests(rooms, args.days, rng)
+
+    def first_fit(index, candidates, check_in, check_out):
+        for room in candidates:
+            if index.is_free(room['room_id'], check_in, check_out):
+                return room['room_id']
+
+    def random_fit(index, candidates, check_in, check_out):
+        free = index.free_rooms([room['room_id'] for room in candidates], check_in, check_out)
+        return rng.choice(free) if free else None
+
+    def best_fit(index, candidates, check_in, check_out):
+        ranked = assignment.rank_rooms(index, candidates, check_in, check_out, START, args.min_stay)
+        return ranked[0] if ranked else None
+
+    print(f"{args.rooms} rooms, {len(requests)} room-type requests over {args.days} days\n")
+    print(f"{'allocation':<10} {'rejected':>9} {'unsellable':>11} {'us/request':>11}")
+    results = {}
+    for label, choose in (('first fit', first_fit), ('random', random_fit), ('best fit', best_fit)):
+        results[label] = allocate(rooms, requests, choose, args.min_stay)
+        _, rejected, unsellable, elapsed = results[label]
+        print(f"{label:<10} {rejected:>9} {unsellable:>11} {elapsed / len(requests) * 1e6:>11.1f}")
+
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        app.config['DATABASE'] = path
+        app_module.init_db()
+        conn = sqlite3.connect(path)
+        conn.executemany('INSERT INTO rooms (room_id, room_number, room_type, price_per_night) VALUES (?, ?, ?, 100)',
+                         [(room['room_id'], room['room_number'], room['room_type']) for room in rooms])
+        stays = results['random'][0]
+        conn.executemany('INSERT INTO bookings (booking_id, user_id, room_id, check_in, check_out, total_amount) '
+                         'VALUES (?, 1, ?, ?, ?, 100)',
+                         [(i + 1, room_id, check_in.isoformat(), check_out.isoformat())
+                          for i, (room_id, check_in, check_out) in enumerate(stays)])
+        conn.executemany('INSERT INTO room_assignments (booking_id) VALUES (?)',
+                         [(i + 1,) for i in range(len(stays)) if rng.randrange(100) >= args.fixed])
+        conn.commit()
+
+        today = (START - timedelta(days=1)).isoformat()
+        start = time.perf_counter()
+        report = run_immediate(conn, lambda conn: assignment.optimize(conn, today, args.min_stay))
+        elapsed = time.perf_counter() - start
+        ledger = check_consistency(conn)
+        conn.close()
+        pool = app.extensions.pop('db_pool', None)
+        if pool:
+            pool.close_all()
+
+    print(f"\nRe-optimizing the random allocation ({len(stays)} bookings, {100 - args.fixed}% hotel-assigned)")
+    print(f"  moved {report['moved']} of {report['bookings']} bookings in {elapsed:.2f}s (one transaction)")
+    print(f"  unsellable nights {report['orphan_nights_before']} -> {report['orphan_nights_after']} "
+          f"({report['nights_freed']} freed); ledger missing/unexpected rows: {ledger}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark for the room availability engine.
+
+Seeds a throwaway SQLite database with 10k rooms and 1M bookings, then
+compares the in-memory interval index against the overlap query that
+process_booking used to run.
+
+Usage: python benchmarks/bench_availability.py [--rooms N] [--bookings N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import assignment
+from availability import AvailabilityIndex, to_ordinal
+
+START = date(2024, 1, 1)
+
+
+def seed(conn, rooms, bookings):
+    """Insert non-overlapping bookings spread evenly over the rooms"""
+    conn.execute('''
+        CREATE TABLE bookings (
+            booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            room_id INTEGER NOT NULL,
+            check_in DATE NOT NULL,
+            check_out DATE NOT NULL,
+            total_amount REAL NOT NULL
+        )
+    ''')
+    per_room = max(1, bookings // rooms)
+    rng = random.Random(42)
+    rows = []
+    for room_id in range(1, rooms + 1):
+        day = START + timedelta(days=rng.randint(0, 3))
+        for _ in range(per_room):
+            nights = rng.randint(1, 5)
+            check_out = day + timedelta(days=nights)
+            rows.append((1, room_id, day.isoformat(), check_out.isoformat(), nights * 100.0))
+            day = check_out + timedelta(days=rng.randint(0, 3))
+        if len(rows) >= 100000:
+            conn.executemany('''
+                INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            rows = []
+    conn.executemany('''
+        INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.execute('CREATE INDEX idx_bookings_room_dates ON bookings (room_id, check_in, check_out)')
+    conn.commit()
+    assignment.ensure_schema(conn)
+    return per_room * rooms
+
+
+def timed(label, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / repeat * 1e6:>12.1f} us/op")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=10000)
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn = sqlite3.connect(os.path.join(tmpdir, 'bench.db'))
+
+        start = time.perf_counter()
+        total = seed(conn, args.rooms, args.bookings)
+        print(f"Seeded {args.rooms} rooms / {total} bookings in {time.perf_counter() - start:.1f}s")
+
+        index = AvailabilityIndex()
+        start = time.perf_counter()
+        index.load(conn)
+        print(f"Index rebuilt from SQLite in {time.perf_counter() - start:.2f}s: {index.stats()}")
+
+        rng = random.Random(7)
+        span = (total // args.rooms) * 5
+        probes = []
+        for _ in range(args.queries):
+            check_in = START + timedelta(days=rng.randint(0, span))
+            check_out = check_in + timedelta(days=rng.randint(1, 7))
+            probes.append((rng.randint(1, args.rooms), check_in.isoformat(), check_out.isoformat()))
+
+        def index_is_free():
+            return sum(index.is_free(*probe) for probe in probes)
+
+        def sql_overlap():
+            hits = 0
+            for room_id, check_in, check_out in probes:
+                hits += conn.execute('''
+                    SELECT 1 FROM bookings
+                    WHERE room_id = ? AND (
+                        (check_in <= ? AND check_out >= ?) OR
+                        (check_in <= ? AND check_out >= ?) OR
+                        (check_in >= ? AND check_out <= ?)
+                    )
+                ''', (room_id, check_in, check_in, check_out, check_out, check_in, check_out)).fetchone() is None
+            return hits
+
+        print()
+        timed(f"index.is_free x{len(probes)} (per batch)", index_is_free, 5)
+        timed(f"legacy overlap query x{len(probes)} (per batch)", sql_overlap, 1)
+
+        room_ids = list(range(1, args.rooms + 1))
+        _, check_in, check_out = probes[0]
+        free = timed(f"index.free_rooms over {args.rooms} rooms", lambda: index.free_rooms(room_ids, check_in, check_out), 20)
+        print(f"  -> {len(free)} rooms free for {check_in} .. {check_out}")
+
+        start = time.perf_counter()
+        for room_id, check_in, check_out in probes:
+            index.add_booking(room_id, check_in, to_ordinal(check_out) + 1)
+        print(f"{'index.add_booking':<40} {(time.perf_counter() - start) / len(probes) * 1e6:>12.1f} us/op")
+
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
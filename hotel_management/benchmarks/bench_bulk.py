@@ -0,0 +1,104 @@
+"""
+Benchmark for bulk import and export.
+
+Generates CSV files of rooms and customers, imports them into a throwaway
+database once row by row (one execute and commit per row, like repeated
+/add_room posts) and once through bulk.import_rows, then exports them again,
+reporting rows per second for each step.
+
+Usage: python benchmarks/bench_bulk.py [--rows N] [--chunk-size N] [--naive-rows N]
+"""
+
+import argparse
+import csv
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+
+def make_csv(kind, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if kind == 'rooms':
+        writer.writerow(['room_number', 'room_type', 'price_per_night'])
+        for i in range(rows):
+            writer.writerow([f'R{i:07d}', ('Single', 'Double', 'Suite')[i % 3], 100 + i % 200])
+    else:
+        writer.writerow(['name', 'email', 'phone', 'address'])
+        for i in range(rows):
+            writer.writerow([f'Guest {i}', f'guest{i}@example.com', f'555-{i:07d}', f'{i} Main Street'])
+    buffer.seek(0)
+    return buffer
+
+
+def naive_import(conn, kind, stream):
+    """One INSERT and one commit per row"""
+    import bulk
+
+    spec = bulk.KINDS[kind]
+    columns = spec['columns']
+    sql = f'INSERT INTO {kind} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+    count = 0
+    for _, row in bulk.read_rows(stream, 'csv'):
+        conn.execute(sql, spec['validate'](row))
+        conn.commit()
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--naive-rows', type=int, default=5000,
+                        help='rows for the row-by-row baseline (it is slow)')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+    import bulk
+    from db import ConnectionPool
+
+    app = app_module.app
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"{'kind':<10} {'step':<18} {'rows':>8} {'seconds':>9} {'rows/s':>10}")
+        for kind in bulk.KINDS:
+            for label in ('row-by-row', 'bulk'):
+                path = os.path.join(tmpdir, f'{kind}-{label}.db')
+                app.config['DATABASE'] = path
+                app_module.init_db()
+                conn = ConnectionPool(path, max_size=1).acquire()
+                conn.execute(f'DELETE FROM {kind}')
+                conn.commit()
+
+                rows = args.naive_rows if label == 'row-by-row' else args.rows
+                stream = make_csv(kind, rows)
+                start = time.perf_counter()
+                if label == 'row-by-row':
+                    inserted = naive_import(conn, kind, stream)
+                else:
+                    report = bulk.import_rows(conn, kind, bulk.read_rows(stream, 'csv'), args.chunk_size)
+                    assert not report.rejected, report.errors[:5]
+                    inserted = report.inserted
+                elapsed = time.perf_counter() - start
+                print(f"{kind:<10} {'import ' + label:<18} {inserted:>8} {elapsed:>9.2f} {inserted / elapsed:>10.0f}")
+
+                if label == 'bulk':
+                    for fmt in ('csv', 'jsonl'):
+                        start = time.perf_counter()
+                        size = sum(len(chunk) for chunk in bulk.export_rows(conn, kind, fmt))
+                        elapsed = time.perf_counter() - start
+                        print(f"{kind:<10} {'export ' + fmt:<18} {inserted:>8} {elapsed:>9.2f} "
+                              f"{inserted / elapsed:>10.0f}  ({size / 1024 / 1024:.1f} MB)")
+                conn.close()
+        app.extensions.pop('db_pool', None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark for the event log and replay.
+
+Builds a throwaway database holding only the tables the log needs, then
+writes a few million events through the real triggers: rooms added, back
+to back bookings for every room, with some bookings changed or removed
+and some room prices changed along the way.  It reports:
+
+1. The cost of journaling: bookings inserted per second with and
+   without the event trigger, and the log's size per event.
+2. Taking a snapshot of the inventory (time and size).
+3. Replay: every event from an empty inventory, against restore() (the
+   latest snapshot plus the events logged after it).
+4. The availability index built from the restored state against loading
+   it from the bookings table, and the point-in-time state as of the
+   snapshot's time.
+
+Usage: python benchmarks/bench_events.py [--rooms N] [--events N] [--tail PERCENT]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+import archive
+import assignment
+import events
+import migrations
+from availability import AvailabilityIndex
+
+ROOM_TYPES = (('Single', 100.0), ('Double', 150.0), ('Suite', 250.0))
+
+CHUNK = 20000
+
+
+def create(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    migrations._base_tables(conn)
+    conn.execute('CREATE INDEX idx_bookings_room_dates ON bookings (room_id, check_in, check_out)')
+    assignment.ensure_schema(conn)
+    archive.ensure_schema(conn)
+    events.ensure_schema(conn)
+    return conn
+
+
+def stays(rooms, rng, first):
+    """Endless back-to-back stays, round-robin over the rooms: (room_id, check_in, check_out, total)"""
+    day = {room_id: first + rng.randint(0, 3) for room_id in range(1, rooms + 1)}
+    while True:
+        for room_id in range(1, rooms + 1):
+            length = rng.randint(1, 7)
+            check_in = day[room_id]
+            day[room_id] = check_in + length + rng.choice((0, 0, 1, 2))
+            yield (1, room_id, date.fromordinal(check_in).isoformat(),
+                   date.fromordinal(check_in + length).isoformat(), ROOM_TYPES[room_id % 3][1] * length)
+
+
+def write_events(conn, rooms, count, rng, source):
+    """Write about count events through the triggers: mostly bookings, some changed or removed"""
+    written = conn.execute('SELECT count(*) FROM events').fetchone()[0]
+    target = written + count
+    while written < target:
+        batch = [next(source) for _ in range(CHUNK)]
+        conn.execute('BEGIN')
+        conn.executemany('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                         'VALUES (?, ?, ?, ?, ?)', batch)
+        last = conn.execute('SELECT max(booking_id) FROM bookings').fetchone()[0]
+        recent = range(max(1, last - CHUNK * 4), last + 1)
+        conn.executemany('UPDATE bookings SET total_amount = total_amount * 0.9 WHERE booking_id = ?',
+                         [(booking_id,) for booking_id in rng.sample(recent, CHUNK // 20)])
+        conn.executemany('DELETE FROM bookings WHERE booking_id = ?',
+                         [(booking_id,) for booking_id in rng.sample(recent, CHUNK // 50)])
+        conn.executemany('UPDATE rooms SET price_per_night = price_per_night + 5 WHERE room_id = ?',
+                         [(rng.randint(1, rooms),) for _ in range(5)])
+        conn.execute('COMMIT')
+        written = conn.execute('SELECT max(event_id) FROM events').fetchone()[0]
+    return written
+
+
+def insert_rate(conn, source, count):
+    """Bookings inserted per second, in one transaction that is rolled back"""
+    batch = [next(source) for _ in range(count)]
+    conn.execute('BEGIN')
+    start = time.perf_counter()
+    conn.executemany('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                     'VALUES (?, ?, ?, ?, ?)', batch)
+    elapsed = time.perf_counter() - start
+    conn.execute('ROLLBACK')
+    return count / elapsed
+
+
+def table_bytes(conn, table):
+    try:
+        return conn.execute('SELECT sum(pgsize) FROM dbstat WHERE name = ?', (table,)).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=3000000)
+    parser.add_argument('--tail', type=int, default=10, help='percent of the events logged after the snapshot')
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn = create(os.path.join(tmpdir, 'bench.db'))
+        conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                         [(f'R{i:05d}',) + ROOM_TYPES[(i + 1) % 3] for i in range(args.rooms)])
+        source = stays(args.rooms, rng, date(2000, 1, 1).toordinal())
+
+        with_log = insert_rate(conn, source, 100000)
+        conn.execute('DROP TRIGGER trg_events_booking_insert')
+        without_log = insert_rate(conn, source, 100000)
+        conn.executescript(events.SCHEMA)
+        print(f"Booking inserts: {without_log:,.0f}/s without the event trigger, {with_log:,.0f}/s with it "
+              f"({1 - with_log / without_log:.0%} slower)")
+
+        head = args.events * (100 - args.tail) // 100
+        start = time.perf_counter()
+        written = write_events(conn, args.rooms, head, rng, source)
+        elapsed = time.perf_counter() - start
+        size = table_bytes(conn, 'events')
+        print(f"Wrote {written:,} events through the triggers in {elapsed:.1f}s"
+              + (f"; {size / written:.1f} bytes per event" if size else ''))
+
+        conn.execute('BEGIN')
+        start = time.perf_counter()
+        snapshot_at = events.take_snapshot(conn)
+        conn.execute('COMMIT')
+        elapsed = time.perf_counter() - start
+        bookings, blob = conn.execute('SELECT (SELECT count(*) FROM bookings), length(rooms) + length(bookings) '
+                                      'FROM event_snapshots ORDER BY snapshot_id DESC LIMIT 1').fetchone()
+        print(f"Snapshot at event {snapshot_at:,}: {bookings:,} bookings in {blob / 1e6:.1f}MB, "
+              f"taken in {elapsed:.2f}s")
+        middle = datetime.now()
+        time.sleep(1.1)
+        written = write_events(conn, args.rooms, args.events - written, rng, source)
+        print(f"{written - snapshot_at:,} more events after the snapshot ({written:,} in all)\n")
+
+        start = time.perf_counter()
+        initial = conn.execute('SELECT event_id, rooms, bookings FROM event_snapshots '
+                               'ORDER BY snapshot_id LIMIT 1').fetchone()
+        full = events.State.from_snapshot(*initial)
+        full.apply(conn.execute(f'SELECT {events.EVENT_COLUMNS} FROM events ORDER BY event_id'))
+        full_time = time.perf_counter() - start
+        start = time.perf_counter()
+        state = events.restore(conn)
+        restore_time = time.perf_counter() - start
+        assert state.bookings == full.bookings and state.rooms == full.rooms
+        print(f"Full replay: {full.replayed:,} events in {full_time:.2f}s "
+              f"({full.replayed / full_time:,.0f} events/s)")
+        print(f"Snapshot + replay: {state.replayed:,} events in {restore_time:.2f}s "
+              f"({len(state.bookings):,} bookings, {len(state.rooms):,} rooms)")
+
+        start = time.perf_counter()
+        loaded = AvailabilityIndex()
+        loaded.load(conn)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        replayed = AvailabilityIndex()
+        replayed.load_bookings(conn, events.restore(conn).bookings)
+        replay_time = time.perf_counter() - start
+        assert loaded.stats() == replayed.stats()
+        print(f"\nAvailability index: from bookings {load_time:.2f}s, from snapshot + replay {replay_time:.2f}s")
+
+        start = time.perf_counter()
+        past = events.state_at(conn, middle)
+        print(f"State as of the snapshot's time: event {past.event_id:,}, "
+              f"{len(past.bookings):,} bookings, in {time.perf_counter() - start:.2f}s")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
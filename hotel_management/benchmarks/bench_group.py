@@ -0,0 +1,114 @@
+"""
+Benchmark for group bookings against a loop of single bookings.
+
+Books groups of 50 and 200 rooms on a throwaway database with 2000 rooms
+and 20k existing bookings, three ways, each on fresh dates:
+
+  loop      one POST /api/v1/bookings per room (one commit per room)
+  by id     one POST /api/v1/group-bookings naming every room
+  by type   one POST /api/v1/group-bookings asking for N rooms of a type
+
+and reports the total time for the group and the time per room.
+
+Usage: python benchmarks/bench_group.py [--sizes 50,200] [--rooms N] [--rounds N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+START = date(2030, 1, 1)
+
+
+def seed(path, rooms, bookings):
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                     [(f'G{i:05d}', ('Single', 'Double')[i % 2], 100 + i % 100) for i in range(rooms)])
+    rng = random.Random(3)
+    rows = []
+    for i in range(bookings):
+        day = START + timedelta(days=(i // rooms) * 7 + rng.randint(0, 2))
+        rows.append((1, i % rooms + 1, day.isoformat(), (day + timedelta(days=2)).isoformat(), 200.0))
+    conn.executemany('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='50,200', help='comma-separated group sizes')
+    parser.add_argument('--rooms', type=int, default=2000)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    app.config['STARTUP_WARMUP'] = False
+    app.config['RECEIPT_RENDER_WORKERS'] = 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        app.config['DATABASE'] = path
+        app_module.init_db()
+        seed(path, args.rooms, args.bookings)
+        client = app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        client.get('/rooms')
+
+        # Every run books its own week, well after the seeded bookings
+        week = [START + timedelta(days=7 * (args.bookings // args.rooms + 2))]
+
+        def stay():
+            check_in = week[0]
+            week[0] += timedelta(days=7)
+            return {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=3)).isoformat()}
+
+        def loop(size):
+            dates = stay()
+            for room_id in range(2, 2 * size + 1, 2):
+                response = client.post('/api/v1/bookings', json=dict(dates, room_id=room_id))
+                assert response.status_code == 201, response.get_json()
+
+        def by_id(size):
+            dates = stay()
+            rooms = [dict(dates, room_id=room_id) for room_id in range(2, 2 * size + 1, 2)]
+            response = client.post('/api/v1/group-bookings', json={'name': 'bench', 'rooms': rooms})
+            assert response.status_code == 201, response.get_json()
+
+        def by_type(size):
+            response = client.post('/api/v1/group-bookings', json={'name': 'bench', 'rooms': [
+                dict(stay(), room_type='Single', count=size)]})
+            assert response.status_code == 201, response.get_json()
+
+        print(f"{args.rooms} rooms, {args.bookings} bookings (best of {args.rounds})\n")
+        print(f"{'rooms':>6} {'mode':<8} {'total ms':>10} {'ms/room':>9} {'speedup':>8}")
+        for size in (int(n) for n in args.sizes.split(',')):
+            baseline = None
+            for label, run in (('loop', loop), ('by id', by_id), ('by type', by_type)):
+                best = float('inf')
+                for _ in range(args.rounds):
+                    start = time.perf_counter()
+                    run(size)
+                    best = min(best, time.perf_counter() - start)
+                baseline = baseline or best
+                print(f"{size:>6} {label:<8} {best * 1000:>10.1f} {best / size * 1000:>9.3f} "
+                      f"{baseline / best:>7.1f}x")
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark for login latency under concurrent load.
+
+Drives /login from many threads while other threads keep requesting a cheap
+page, once with hashing inline on the request threads and once with the
+process pool, and reports p50/p99 latency for both kinds of request.
+
+Usage: python benchmarks/bench_login.py [--threads N] [--logins N] [--workers N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(app, threads, logins):
+    """Run concurrent logins plus background page views; return latencies"""
+    login_times = []
+    page_times = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def login_worker():
+        client = app.test_client()
+        for _ in range(logins):
+            start = time.perf_counter()
+            response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 302, response.status_code
+            with lock:
+                login_times.append(elapsed)
+
+    def page_worker():
+        client = app.test_client()
+        while not done.is_set():
+            start = time.perf_counter()
+            client.get('/')
+            elapsed = time.perf_counter() - start
+            with lock:
+                page_times.append(elapsed)
+
+    pages = [threading.Thread(target=page_worker) for _ in range(2)]
+    workers = [threading.Thread(target=login_worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pages + workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in pages:
+        thread.join()
+    return login_times, page_times, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=5, help='logins per thread')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                        help='hashing processes for the pooled run')
+    parser.add_argument('--method', default='pbkdf2:sha256:600000')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+    from passwords import PasswordHasher
+
+    app = app_module.app
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app.config['DATABASE'] = os.path.join(tmpdir, 'bench.db')
+        app.config['PASSWORD_HASH_METHOD'] = args.method
+        app.config['DB_POOL_SIZE'] = args.threads + 4
+        app_module.init_db()
+
+        print(f"{args.threads} threads x {args.logins} logins, method {args.method}\n")
+        print(f"{'hashing':<14} {'logins/s':>9} {'login p50':>10} {'login p99':>10} {'page p99':>10}")
+        for label, workers in (('inline', 0), (f'pool x{args.workers}', args.workers)):
+            hasher = PasswordHasher(args.method, workers=workers)
+            app.extensions['password_hasher'] = hasher
+            if workers:
+                hasher.verify(hasher.hash('warm-up'), 'warm-up')  # start the processes
+            login_times, page_times, elapsed = run(app, args.threads, args.logins)
+            hasher.shutdown()
+            print(f"{label:<14} {len(login_times) / elapsed:>9.1f} "
+                  f"{percentile(login_times, 50) * 1000:>8.0f}ms "
+                  f"{percentile(login_times, 99) * 1000:>8.0f}ms "
+                  f"{percentile(page_times, 99) * 1000:>8.1f}ms")
+        app.extensions.pop('db_pool').close_all()
+
+
+if __name__ == '__main__':
+    main()
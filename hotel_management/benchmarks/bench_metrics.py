@@ -0,0 +1,106 @@
+"""
+Benchmark for the overhead of request and SQL instrumentation.
+
+Serves the same mix of admin pages from a throwaway database with the
+metrics registry removed and then installed, and reports requests per
+second and mean latency for both, plus the relative overhead.  Also times
+a tight loop of trivial statements on a plain and a timed connection to
+show the fixed cost added to each SQL statement.
+
+Usage: python benchmarks/bench_metrics.py [--requests N] [--rooms N]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+PAGES = ('/', '/dashboard', '/rooms', '/book-room', '/customer-details')
+
+
+def run(app, requests):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    for url in PAGES:
+        client.get(url)  # warm up templates, caches and the pool
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(PAGES[i % len(PAGES)])
+        assert response.status_code == 200, response.status_code
+    return time.perf_counter() - start
+
+
+def statement_cost(factory, statements=100000):
+    """Mean seconds per 'SELECT 1' on a connection of the given class"""
+    conn = sqlite3.connect(':memory:', factory=factory)
+    start = time.perf_counter()
+    for _ in range(statements):
+        conn.execute('SELECT 1').fetchone()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed / statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    registry = app.extensions['metrics']
+    timed_factory = app.config['DB_CONNECTION_FACTORY']
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        app.config['DATABASE'] = path
+        app_module.init_db()
+        conn = sqlite3.connect(path)
+        conn.executemany('''
+            INSERT INTO rooms (room_number, room_type, price_per_night)
+            VALUES (?, ?, ?)
+        ''', [(f'B{i:05d}', ('Single', 'Double', 'Suite')[i % 3], 100 + i % 200) for i in range(args.rooms)])
+        conn.commit()
+        conn.close()
+
+        results = {'off': [], 'on': []}
+        for _ in range(args.rounds):
+            for label in ('off', 'on'):
+                pool = app.extensions.pop('db_pool', None)
+                if pool:
+                    pool.close_all()
+                if label == 'on':
+                    app.extensions['metrics'] = registry
+                    app.config['DB_CONNECTION_FACTORY'] = timed_factory
+                else:
+                    app.extensions.pop('metrics', None)
+                    app.config['DB_CONNECTION_FACTORY'] = None
+                results[label].append(run(app, args.requests))
+        app.extensions.pop('db_pool').close_all()
+
+    print(f"{args.requests} requests over {', '.join(PAGES)} (best of {args.rounds})\n")
+    print(f"{'metrics':<8} {'req/s':>9} {'mean ms':>9}")
+    best = {label: min(times) for label, times in results.items()}
+    for label in ('off', 'on'):
+        print(f"{label:<8} {args.requests / best[label]:>9.0f} {best[label] / args.requests * 1000:>9.3f}")
+    print(f"\noverhead: {(best['on'] / best['off'] - 1) * 100:+.1f}%")
+
+    plain = min(statement_cost(sqlite3.Connection) for _ in range(args.rounds))
+    timed = min(statement_cost(timed_factory) for _ in range(args.rounds))
+    print(f"per statement: {plain * 1e6:.2f}us plain, {timed * 1e6:.2f}us timed "
+          f"(+{(timed - plain) * 1e6:.2f}us)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark for the dynamic pricing rate calendar.
+
+Loads a few years of seasonal and weekend multipliers for each room type
+into a throwaway database with pricing.set_rates() (timing the bulk
+updates and the rebuild of the running totals they trigger), then times:
+
+1. Pricing one stay of 1 to 365 nights: summing the nights in SQL,
+   adding them up night by night in Python, and two reads of the
+   running totals (RateCalendar.stay_factor, which includes checking the
+   version counter, and the lookup on its own).
+2. Quoting every room on the booking page for a week's stay: one SQL sum
+   per room against RateCalendar.quote().
+
+Usage: python benchmarks/bench_pricing.py [--rooms N] [--years N]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+import pricing
+from booking import run_immediate
+
+ROOM_TYPES = (('Single', 100.0), ('Double', 150.0), ('Suite', 250.0))
+
+START = date(2030, 1, 1)
+
+# A stay's multiplier sum from the table: nights without a row are at 1.0
+STAY_SQL = '''
+SELECT COALESCE(SUM(factor), 0) + (julianday(:check_out) - julianday(:check_in)) - COUNT(*)
+FROM room_rates WHERE room_type = :room_type AND night >= :check_in AND night < :check_out
+'''
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def load_rates(conn, years):
+    """A high and a low season every year plus a weekend premium; returns (updates, nights, seconds)"""
+    updates = nights = 0
+    start = time.perf_counter()
+    for year in range(START.year, START.year + years):
+        for room_type, _ in ROOM_TYPES:
+            for first, last, factor, weekdays in (
+                    (f'{year}-06-15', f'{year}-09-15', 1.4, None),
+                    (f'{year}-12-20', f'{year + 1}-01-03', 1.8, None),
+                    (f'{year}-01-10', f'{year}-03-10', 0.8, None),
+                    (f'{year}-01-01', f'{year}-12-31', 1.15, (4, 5))):
+                nights += run_immediate(conn, lambda conn: pricing.set_rates(
+                    conn, room_type, first, last, factor, weekdays))
+                updates += 1
+    return updates, nights, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        app.config['DATABASE'] = path
+        app_module.init_db()
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                         [(f'R{i:05d}',) + ROOM_TYPES[i % 3] for i in range(args.rooms)])
+        conn.commit()
+
+        updates, nights, elapsed = load_rates(conn, args.years)
+        calendar = pricing.RateCalendar()
+        rebuild, series = timed(lambda: (calendar.invalidate(), calendar.series(conn))[1], args.repeat)
+        print(f"{updates} bulk rate updates ({nights} nights) in {elapsed * 1000:.0f}ms "
+              f"({elapsed / updates * 1000:.2f}ms each); running totals rebuilt in {rebuild * 1000:.1f}ms\n")
+
+        def nightly(room_type, check_in, check_out):
+            rates = dict(conn.execute('SELECT night, factor FROM room_rates WHERE room_type = ? '
+                                      'AND night >= ? AND night < ?', (room_type, check_in, check_out)))
+            first = date.fromisoformat(check_in)
+            return sum(rates.get((first + timedelta(days=n)).isoformat(), 1.0)
+                       for n in range((date.fromisoformat(check_out) - first).days))
+
+        print(f"{'stay':<10} {'SQL sum':>10} {'per night':>10} {'running totals':>15} {'lookup only':>12}")
+        for length in (1, 7, 30, 365):
+            check_in = START + timedelta(days=170)
+            params = {'room_type': 'Suite', 'check_in': check_in.isoformat(),
+                      'check_out': (check_in + timedelta(days=length)).isoformat()}
+            sql, expected = timed(lambda: conn.execute(STAY_SQL, params).fetchone()[0], args.repeat)
+            loop, looped = timed(lambda: nightly(*params.values()), args.repeat)
+            fast, factor = timed(lambda: calendar.stay_factor(conn, *params.values()), args.repeat)
+            lookup, _ = timed(lambda: pricing.stay_factor(series, *params.values()), args.repeat)
+            assert abs(factor - expected) < 1e-6 and abs(factor - looped) < 1e-6, (factor, expected, looped)
+            print(f"{length:>3} nights {sql * 1e6:>8.0f}us {loop * 1e6:>8.0f}us "
+                  f"{fast * 1e6:>13.1f}us {lookup * 1e6:>10.1f}us")
+
+        rooms = conn.execute('SELECT room_id, room_type, price_per_night FROM rooms').fetchall()
+        check_in = (START + timedelta(days=200)).isoformat()
+        check_out = (START + timedelta(days=207)).isoformat()
+
+        def per_room():
+            return {room['room_id']: pricing.price(room['price_per_night'], conn.execute(STAY_SQL, {
+                'room_type': room['room_type'], 'check_in': check_in, 'check_out': check_out}).fetchone()[0])
+                for room in rooms}
+        sql, expected = timed(per_room, args.repeat)
+        fast, quotes = timed(lambda: calendar.quote(conn, rooms, check_in, check_out), args.repeat)
+        assert quotes == expected
+        print(f"\nQuoting {len(rooms)} rooms for a 7-night stay: SQL per room {sql * 1000:.1f}ms, "
+              f"rate calendar {fast * 1000:.2f}ms")
+        conn.close()
+        pool = app.extensions.pop('db_pool', None)
+        if pool:
+            pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark for the occupancy and revenue rollups.
+
+Fills a throwaway database with years of back-to-back stays for thousands
+of rooms (through the normal triggers, so the ledger and rollups are
+maintained as they would be in production), then times the same reports
+three ways: expanding bookings into nights with SQL on every request,
+aggregating daily_rollups with SQL, and the in-process rollup cache.
+
+Usage: python benchmarks/bench_rollups.py [--rooms N] [--years N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+ROOM_TYPES = (('Single', 100.0), ('Double', 150.0), ('Suite', 250.0))
+
+# The report computed straight from bookings: expand every stay into nights
+NAIVE_SQL = '''
+WITH RECURSIVE stay(room_id, night, check_out, rate) AS (
+    SELECT room_id, MAX(check_in, :start), check_out,
+           total_amount / (julianday(check_out) - julianday(check_in))
+    FROM bookings WHERE check_in <= :end AND check_out > :start
+    UNION ALL
+    SELECT room_id, date(night, '+1 day'), check_out, rate FROM stay
+    WHERE date(night, '+1 day') < check_out AND date(night, '+1 day') <= :end
+)
+SELECT strftime(:format, night), COUNT(*), SUM(rate) FROM stay GROUP BY 1
+'''
+
+ROLLUP_SQL = '''
+SELECT strftime(:format, night), SUM(rooms_sold), SUM(revenue)
+FROM daily_rollups WHERE night BETWEEN :start AND :end GROUP BY 1
+'''
+
+FORMATS = {'day': '%Y-%m-%d', 'week': '%Y-%W', 'month': '%Y-%m'}
+
+
+def seed(app_module, path, rooms, years, seed_value=1):
+    """Create the rooms and fill them with stays; return counts, load time and date range"""
+    app_module.app.config['DATABASE'] = path
+    app_module.init_db()
+    rng = random.Random(seed_value)
+    first = date.today().replace(month=1, day=1) - timedelta(days=365 * years)
+    last = first + timedelta(days=365 * years)
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                     [(f'R{i:05d}',) + ROOM_TYPES[i % 3] for i in range(rooms)])
+    conn.commit()
+
+    start = time.perf_counter()
+    bookings = nights = 0
+    for room_id in range(1, rooms + 1):
+        price = ROOM_TYPES[(room_id - 1) % 3][1]
+        day = first + timedelta(days=rng.randint(0, 3))
+        stays = []
+        while True:
+            length = rng.randint(1, 7)
+            check_out = day + timedelta(days=length)
+            if check_out > last:
+                break
+            stays.append((1, room_id, day.isoformat(), check_out.isoformat(), price * length))
+            nights += length
+            day = check_out + timedelta(days=rng.choice((0, 0, 1, 2, 3)))
+        conn.executemany('''
+            INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+            VALUES (?, ?, ?, ?, ?)
+        ''', stays)
+        bookings += len(stays)
+        if room_id % 100 == 0:
+            conn.commit()
+    conn.commit()
+    conn.close()
+    return bookings, nights, time.perf_counter() - start, first, last - timedelta(days=1)
+
+
+def timed(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-naive', action='store_true',
+                        help='skip the (slow) report computed from bookings')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+    import rollups
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        bookings, nights, elapsed, first, last = seed(app_module, path, args.rooms, args.years)
+        print(f"{args.rooms} rooms, {args.years} years: {bookings} bookings, {nights} room-nights")
+        print(f"loaded through the triggers in {elapsed:.1f}s "
+              f"({bookings / elapsed:.0f} bookings/s, {nights / elapsed:.0f} nights/s)\n")
+
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA cache_size = -64000')
+        reports = [
+            ('monthly, all types', 'month', None, first, last),
+            ('weekly, Suite', 'week', 'Suite', first, last),
+            ('daily, all types', 'day', None, first, last),
+            ('daily, last 90 days', 'day', None, last - timedelta(days=89), last),
+        ]
+
+        print(f"{'report':<22} {'from bookings':>14} {'SQL rollups':>12} "
+              f"{'cache (cold)':>13} {'cache (warm)':>13}")
+        for label, group, room_type, start, end in reports:
+            params = {'format': FORMATS[group], 'start': start.isoformat(), 'end': end.isoformat()}
+            if room_type:
+                naive_sql = NAIVE_SQL.replace('FROM bookings WHERE',
+                                              'FROM bookings JOIN rooms USING (room_id) WHERE room_type = :room_type AND')
+                rollup_sql = ROLLUP_SQL.replace('WHERE night', 'WHERE room_type = :room_type AND night')
+                params['room_type'] = room_type
+            else:
+                naive_sql, rollup_sql = NAIVE_SQL, ROLLUP_SQL
+
+            if args.skip_naive:
+                naive = None
+            else:
+                naive, _ = timed(lambda: conn.execute(naive_sql, params).fetchall(), 1)
+            sql, _ = timed(lambda: conn.execute(rollup_sql, params).fetchall(), args.repeat)
+
+            def cold():
+                cache = rollups.RollupCache()
+                return cache.report(conn, start, end, group, room_type)
+            cache = rollups.RollupCache()
+            cache.report(conn, start, end, group, room_type)
+            cold_time, _ = timed(cold, args.repeat)
+            warm_time, report = timed(lambda: cache.report(conn, start, end, group, room_type), args.repeat)
+
+            naive_text = f"{naive * 1000:>12.1f}ms" if naive is not None else f"{'skipped':>14}"
+            print(f"{label:<22} {naive_text} {sql * 1000:>10.1f}ms "
+                  f"{cold_time * 1000:>11.1f}ms {warm_time * 1000:>11.2f}ms"
+                  f"   ({len(report['periods'])} rows, occupancy {report['total']['occupancy']:.1%})")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
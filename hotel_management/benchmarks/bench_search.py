@@ -0,0 +1,128 @@
+"""
+Benchmark for customer search.
+
+Loads a throwaway database with generated guests (through the normal
+triggers, so the full-text index is built as it would be in production),
+then times typeahead prefixes and full searches by name, email and phone
+against the FTS5 index and against a LIKE '%term%' scan of customers,
+reporting p50/p99 latency per query kind.
+
+Usage: python benchmarks/bench_search.py [--customers N] [--queries N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+FIRST_NAMES = ('James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+               'Thomas', 'Sarah', 'Charles', 'Karen', 'Amélie', 'José', 'Zoë', 'Priya', 'Wei')
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson',
+              'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson',
+              'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson', 'Nakamura',
+              'Okafor', 'Kowalski', 'Müller', 'Rossi', 'Dubois', 'Singh', 'Chen', 'Ivanova')
+STREETS = ('Main', 'Oak', 'Pine', 'Maple', 'Cedar', 'Elm', 'Lake', 'Hill', 'Park', 'River')
+
+
+def guest(rng, i):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return (f'{first} {last}',
+            f'{first.lower()}.{last.lower()}{i}@example.com',
+            f'({rng.randint(200, 999)}) {rng.randint(200, 999)}-{i % 10000:04d}',
+            f'{rng.randint(1, 9999)} {rng.choice(STREETS)} Street')
+
+
+def seed(app_module, path, customers, seed_value=1):
+    """Create the guests; return the rows inserted and the load time"""
+    app_module.app.config['DATABASE'] = path
+    app_module.init_db()
+    rng = random.Random(seed_value)
+    rows = [guest(rng, i) for i in range(customers)]
+
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    start = time.perf_counter()
+    conn.executemany('INSERT INTO customers (name, email, phone, address) VALUES (?, ?, ?, ?)', rows)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return rows, elapsed
+
+
+def queries(rng, rows, count):
+    """Sample search strings of each kind from the loaded guests"""
+    kinds = {'typeahead (1-2 chars)': [], 'typeahead (3-5 chars)': [], 'full name': [],
+             'email': [], 'phone (digits)': []}
+    for _ in range(count):
+        name, email, phone, _ = rng.choice(rows)
+        kinds['typeahead (1-2 chars)'].append(name[:rng.randint(1, 2)])
+        kinds['typeahead (3-5 chars)'].append(name[:rng.randint(3, 5)])
+        kinds['full name'].append(name)
+        kinds['email'].append(email.split('@')[0])
+        kinds['phone (digits)'].append(''.join(c for c in phone if c.isdigit())[:7])
+    return kinds
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=300000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--scan-queries', type=int, default=10,
+                        help='queries per kind for the (slow) LIKE scan baseline')
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    import app as app_module
+    import search
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        rows, elapsed = seed(app_module, path, args.customers)
+        size = os.path.getsize(path) + os.path.getsize(path + '-wal') if os.path.exists(path + '-wal') \
+            else os.path.getsize(path)
+        print(f"{args.customers} customers loaded through the triggers in {elapsed:.1f}s "
+              f"({args.customers / elapsed:.0f} rows/s), database {size / 1024 / 1024:.0f} MB\n")
+
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        rng = random.Random(2)
+        print(f"{'query':<24} {'FTS p50':>9} {'FTS p99':>9} {'scan p50':>10} {'scan p99':>10} {'hits':>6}")
+        for kind, texts in queries(rng, rows, args.queries).items():
+            fts, hits = [], 0
+            for text in texts:
+                start = time.perf_counter()
+                hits += bool(search.search(conn, text))
+                fts.append(time.perf_counter() - start)
+
+            scan = []
+            for text in texts[:args.scan_queries]:
+                start = time.perf_counter()
+                conn.execute('''
+                    SELECT * FROM customers
+                    WHERE name LIKE ?1 OR email LIKE ?1 OR phone LIKE ?1 OR address LIKE ?1
+                    LIMIT 10
+                ''', (f'%{text}%',)).fetchall()
+                scan.append(time.perf_counter() - start)
+
+            fts50, fts99 = percentiles(fts)
+            scan50, scan99 = percentiles(scan)
+            print(f"{kind:<24} {fts50 * 1000:>7.2f}ms {fts99 * 1000:>7.2f}ms "
+                  f"{scan50 * 1000:>8.2f}ms {scan99 * 1000:>8.2f}ms {hits / len(texts):>6.0%}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
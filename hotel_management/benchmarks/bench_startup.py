@@ -0,0 +1,82 @@
+"""
+Benchmark for cold start.
+
+Starts fresh Python processes that import the app, run the startup phase
+against an up-to-date copy of the database and serve one page and one
+login, and reports the median time of each startup phase plus the time to
+the first response, with and without the warm-up.
+
+Usage: python benchmarks/bench_startup.py [--runs N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(path, warmup):
+    """Runs in the fresh process: start the app and print its timings as JSON"""
+    started = time.perf_counter()
+    sys.path.append(HERE)
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['DATABASE'] = path
+    app.config['STARTUP_WARMUP'] = warmup
+    app_module.get_startup(app).run()
+    ready = time.perf_counter()
+
+    client = app.test_client()
+    client.get('/')
+    first_page = time.perf_counter() - ready
+    start = time.perf_counter()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    first_login = time.perf_counter() - start
+
+    timings = app_module.get_startup(app).stats()
+    timings.update(ready_seconds=ready - started, first_page_seconds=first_page,
+                   first_login_seconds=first_login)
+    app.extensions['password_hasher'].shutdown()
+    print(json.dumps(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], args.child[1] == 'warm')
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'startup.db')
+        sys.path.append(HERE)
+        os.chdir(HERE)
+        import app as app_module
+        app_module.app.config['DATABASE'] = path
+        app_module.init_db()
+
+        columns = ('import', 'init', 'warmup', 'ready', 'first_page', 'first_login')
+        print(f"median of {args.runs} cold starts (ms)\n")
+        print(f"{'warm-up':<8}" + ''.join(f'{name:>13}' for name in columns))
+        for mode in ('cold', 'warm'):
+            runs = []
+            for _ in range(args.runs):
+                output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', path, mode],
+                                        capture_output=True, text=True, check=True).stdout
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+            row = [statistics.median(run.get(f'{name}_seconds', 0.0) for run in runs) for name in columns]
+            print(f"{'on' if mode == 'warm' else 'off':<8}" + ''.join(f'{value * 1000:>13.1f}' for value in row))
+
+
+if __name__ == '__main__':
+    main()
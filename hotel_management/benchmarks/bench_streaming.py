@@ -0,0 +1,106 @@
+"""
+Benchmark for streamed admin page rendering.
+
+Seeds a throwaway database with many rooms, then renders /rooms with a large
+page size in two fresh processes: once buffered (render_template after
+fetchall) and once streamed (lazy cursor + stream_template).  Reports the
+time to first byte, total time and peak RSS growth of each.
+
+Usage: python benchmarks/bench_streaming.py [--rooms N] [--per-page N]
+"""
+
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+
+def seed(path, rooms):
+    import app as app_module
+
+    app_module.app.config['DATABASE'] = path
+    app_module.init_db()
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO rooms (room_number, room_type, price_per_night)
+        VALUES (?, ?, ?)
+    ''', [(f'{i:06d}', ('Single', 'Double', 'Suite')[i % 3], 100 + i % 200) for i in range(rooms)])
+    conn.commit()
+    conn.close()
+
+
+def run_child(mode, path, per_page):
+    """Render one page in this process and print the measurements as JSON"""
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    app.config['DATABASE'] = path
+    app.config['MAX_PAGE_SIZE'] = per_page
+    app.config['STREAM_MAX_PAGE_SIZE'] = per_page
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    client.get('/rooms?per_page=1')  # warm up templates and the pool
+
+    url = f'/rooms?per_page={per_page}&stream={1 if mode == "streamed" else 0}'
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    ttfb = None
+    size = 0
+    for chunk in response.response:
+        if chunk and ttfb is None:
+            ttfb = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    response.close()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'mode': mode,
+        'ttfb_ms': ttfb * 1000,
+        'total_ms': total * 1000,
+        'bytes': size,
+        'peak_rss_growth_kb': rss_after - rss_before,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=20000)
+    parser.add_argument('--per-page', type=int, default=10000)
+    parser.add_argument('--child', choices=['buffered', 'streamed'], help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.db, args.per_page)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'bench.db')
+        seed(path, args.rooms)
+
+        print(f"Rendering /rooms with {args.per_page} of {args.rooms} rooms per page\n")
+        print(f"{'mode':<10} {'TTFB ms':>10} {'total ms':>10} {'KB sent':>10} {'peak RSS +KB':>14}")
+        for mode in ('buffered', 'streamed'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', mode,
+                 '--db', path, '--per-page', str(args.per_page)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<10} {result['ttfb_ms']:>10.1f} {result['total_ms']:>10.1f} "
+                  f"{result['bytes'] / 1024:>10.0f} {result['peak_rss_growth_kb']:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark for booking write throughput under several worker processes.
+
+Forks 1, 4 and 16 worker processes, each with a few threads that book
+one-night stays back to back (every thread on its own room, so none of
+them conflict), and compares:
+
+  direct  every thread commits on its own connection, as each worker did
+          before server.py, queueing on SQLite's write lock
+  writer  every thread hands its booking to the single writer in this
+          process, which commits them in batches (server.py's setup)
+
+and reports commits/s, latency, the writes that failed (lock timeouts)
+and the writer's mean batch size.
+
+Usage: python benchmarks/bench_writes.py [--workers 1,4,16] [--threads N] [--duration S]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+START = date(2030, 1, 1)
+
+
+def connect(path):
+    from db import PRAGMAS
+
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def book_until(deadline, write, room_id):
+    """Book consecutive nights of one room until the deadline"""
+    latencies = []
+    errors = 0
+    day = 0
+    while time.perf_counter() < deadline:
+        check_in = (START + timedelta(days=day)).isoformat()
+        check_out = (START + timedelta(days=day + 1)).isoformat()
+        start = time.perf_counter()
+        try:
+            write(room_id, check_in, check_out)
+        except Exception:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+        day += 1
+    return latencies, errors
+
+
+def worker(mode, path, first_room, threads, duration, address, authkey, go, results):
+    """Worker process: run the booking threads and report their latencies"""
+    import app as app_module
+    from booking import run_immediate
+    from writer import WriterClient
+
+    if mode == 'writer':
+        client = WriterClient(address, authkey)
+
+        def write(room_id, check_in, check_out):
+            client.call('book_stay', 1, 'admin', room_id, check_in, check_out)
+    else:
+        local = threading.local()
+
+        def write(room_id, check_in, check_out):
+            if not hasattr(local, 'conn'):
+                local.conn = connect(path)
+            run_immediate(local.conn, lambda conn: app_module.book_stay(
+                conn, 1, 'admin', room_id, check_in, check_out))
+
+    outcomes = []
+    go.wait()
+    deadline = time.perf_counter() + duration
+    pool = [threading.Thread(target=lambda room_id: outcomes.append(book_until(deadline, write, room_id)),
+                             args=(first_room + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(([l for latencies, _ in outcomes for l in latencies], sum(e for _, e in outcomes)))
+
+
+def run(app_module, mode, workers, threads, duration, tmpdir):
+    """One run on a fresh database; returns its row of results"""
+    import writer
+
+    path = os.path.join(tmpdir, f'{mode}-{workers}.db')
+    app_module.app.config['DATABASE'] = path
+    app_module.init_db()
+    conn = connect(path)
+    first = conn.execute('SELECT COALESCE(MAX(room_id), 0) + 1 FROM rooms').fetchone()[0]
+    conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                     [(f'W{i}', 'Single', 100.0) for i in range(workers * threads)])
+    conn.close()
+
+    context = multiprocessing.get_context('fork')
+    go = context.Event()
+    results = context.Queue()
+    database_writer = server = address = authkey = None
+    if mode == 'writer':
+        authkey = os.urandom(32)
+        database_writer = writer.Writer(path)
+        server = writer.WriterServer(database_writer, authkey)
+        address = server.address
+
+    processes = [context.Process(target=worker, args=(mode, path, first + i * threads, threads, duration,
+                                                      address, authkey, go, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    # threads only after forking
+    if server is not None:
+        server.start()
+    go.set()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    mean_batch = 1.0
+    if server is not None:
+        mean_batch = database_writer.stats()['mean_batch']
+        server.close()
+        database_writer.close()
+
+    latencies = sorted(l for latency_list, _ in outcomes for l in latency_list)
+    errors = sum(e for _, e in outcomes)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    return (len(latencies) / duration, statistics.median(latencies) if latencies else 0.0, p99,
+            errors, mean_batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,4,16', help='comma-separated worker process counts')
+    parser.add_argument('--threads', type=int, default=2, help='booking threads per worker')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per run')
+    args = parser.parse_args()
+    if not hasattr(os, 'fork'):
+        sys.exit('This benchmark forks its workers and needs a platform with fork()')
+
+    os.chdir(HERE)
+    import app as app_module
+
+    print(f"{'workers':>7} {'mode':<7} {'commits/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'failed':>7} {'batch':>6}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for workers in (int(n) for n in args.workers.split(',')):
+            for mode in ('direct', 'writer'):
+                rate, p50, p99, errors, batch = run(app_module, mode, workers, args.threads,
+                                                    args.duration, tmpdir)
+                print(f"{workers:>7} {mode:<7} {rate:>10.0f} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f} "
+                      f"{errors:>7} {batch:>6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+"""
+Load test for the booking workflow.
+
+Seeds a throwaway database with synthetic rooms, guests and bookings at a
+chosen scale, then drives the app from concurrent virtual users for a
+fixed time.  Each guest logs in, searches for free rooms over a date
+range, books one and opens the bill; admin users keep reloading the
+dashboard.  Requests go through the Flask test client (in process) or,
+with --server, over HTTP to a local threaded WSGI server.
+
+Throughput and p50/p95/p99 latency are reported per route.  --output saves
+the results as JSON and --baseline compares them with an earlier run: the
+script exits non-zero if any route's p95 latency rose, or its throughput
+fell, by more than --threshold.  Baselines are only comparable on the
+same machine and scale; refresh the stored one with:
+
+    python benchmarks/load_test.py --output benchmarks/baseline.json
+
+Usage: python benchmarks/load_test.py [--scale small|medium|large] [--workers N]
+       [--duration S] [--server] [--output FILE] [--baseline FILE] [--threshold F]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(HERE)
+
+# rooms, guest users, existing bookings
+SCALES = {
+    'small': (100, 200, 2000),
+    'medium': (1000, 2000, 50000),
+    'large': (5000, 20000, 500000),
+}
+
+ROUTES = ('login', 'book_room', 'process_booking', 'bill', 'dashboard')
+
+ROOM_TYPES = (('Single', 100.0), ('Double', 150.0), ('Suite', 300.0))
+
+PASSWORD = 'guest123'
+
+# Requests a guest makes between logins
+BOOKINGS_PER_LOGIN = 5
+
+# Days ahead over which new bookings are spread
+BOOKING_WINDOW = 365
+
+DEFAULT_THRESHOLD = 0.25
+
+
+def seed(app_module, rooms, users, bookings, seed_value=1):
+    """Create the schema and load synthetic data into app.config['DATABASE']"""
+    app = app_module.app
+    app_module.init_db()
+    rng = random.Random(seed_value)
+    today = date.today()
+
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.executemany('INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)',
+                     [(f'L{i:05d}', *ROOM_TYPES[i % len(ROOM_TYPES)]) for i in range(rooms)])
+    room_rows = conn.execute('SELECT room_id, price_per_night FROM rooms').fetchall()
+
+    # Every guest shares one password, so only one hash has to be computed
+    from werkzeug.security import generate_password_hash
+    hashed = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+    conn.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, 'customer')",
+                     [(f'guest{i}', hashed) for i in range(users)])
+    user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users WHERE role = 'customer'")]
+
+    # Back-to-back stays per room, half in the past and half ahead of today
+    per_room = -(-bookings // max(1, len(room_rows)))
+    rows = []
+    for room_id, price in room_rows:
+        day = today - timedelta(days=per_room * 3 // 2)
+        for _ in range(per_room):
+            if len(rows) == bookings:
+                break
+            check_in = day + timedelta(days=rng.randint(0, 2))
+            nights = rng.randint(1, 4)
+            day = check_in + timedelta(days=nights)
+            rows.append((rng.choice(user_ids), room_id, check_in.isoformat(), day.isoformat(),
+                         nights * price))
+    conn.executemany('''
+        INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+        VALUES (?, ?, ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+    return len(room_rows), len(user_ids), len(rows)
+
+
+class ClientTransport:
+    """Requests through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code, response.headers.get('Location', '')
+
+
+class HTTPTransport:
+    """Requests over HTTP to a local server, keeping the session cookie"""
+
+    def __init__(self, address):
+        self.address = address
+        self.cookie = None
+
+    def request(self, method, path, data=None):
+        conn = http.client.HTTPConnection(*self.address)
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            cookie = response.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            return response.status, response.getheader('Location', '')
+        finally:
+            conn.close()
+
+
+def serve(app):
+    """Start a threaded WSGI server on a free port; returns (server, address)"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ('127.0.0.1', server.server_port)
+
+
+class Recorder:
+    """Latencies and failures per route, shared by the virtual users"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = dict.fromkeys(ROUTES, 0)
+        self.conflicts = 0
+
+    def call(self, transport, route, method, path, data=None, expect=(200, 302)):
+        start = time.perf_counter()
+        try:
+            status, location = transport.request(method, path, data)
+        except Exception:
+            status, location = None, ''
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if status not in expect:
+                self.errors[route] += 1
+        return status, location
+
+    def conflict(self):
+        with self._lock:
+            self.conflicts += 1
+
+
+def guest(transport, recorder, username, rng, deadline, room_ids):
+    """One guest: log in, then search, book and view the bill until the deadline"""
+    while time.perf_counter() < deadline:
+        status, location = recorder.call(transport, 'login', 'POST', '/login',
+                                         {'username': username, 'password': PASSWORD}, expect=(302,))
+        if status != 302 or 'login' in location:
+            continue
+        for _ in range(BOOKINGS_PER_LOGIN):
+            if time.perf_counter() >= deadline:
+                return
+            check_in = date.today() + timedelta(days=rng.randint(1, BOOKING_WINDOW))
+            check_out = check_in + timedelta(days=rng.randint(1, 4))
+            dates = {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}
+            recorder.call(transport, 'book_room', 'GET', f'/book-room?{urlencode(dates)}', expect=(200,))
+            status, location = recorder.call(transport, 'process_booking', 'POST', '/process-booking',
+                                             {'room_id': rng.choice(room_ids), **dates}, expect=(302,))
+            match = re.search(r'/bill/(\d+)', location)
+            if match is None:
+                recorder.conflict()
+                continue
+            recorder.call(transport, 'bill', 'GET', f'/bill/{match.group(1)}', expect=(200,))
+
+
+def admin(transport, recorder, deadline):
+    """The front desk: reload the dashboard until the deadline"""
+    recorder.call(transport, 'login', 'POST', '/login',
+                  {'username': 'admin', 'password': 'admin123'}, expect=(302,))
+    while time.perf_counter() < deadline:
+        recorder.call(transport, 'dashboard', 'GET', '/dashboard', expect=(200,))
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(app, workers=4, duration=10.0, admins=1, server=False, seed_value=2):
+    """Drive the app with concurrent guests and admins; return the results dict"""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    room_ids = [row[0] for row in conn.execute('SELECT room_id FROM rooms')]
+    usernames = [row[0] for row in conn.execute(
+        "SELECT username FROM users WHERE role = 'customer' ORDER BY user_id")]
+    conn.close()
+    if not room_ids or not usernames:
+        raise ValueError('The database needs rooms and guest users; run seed() first')
+
+    httpd = None
+    if server:
+        httpd, address = serve(app)
+        make_transport = lambda: HTTPTransport(address)
+    else:
+        make_transport = lambda: ClientTransport(app)
+
+    recorder = Recorder()
+    rng = random.Random(seed_value)
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=guest, args=(
+        make_transport(), recorder, usernames[i % len(usernames)],
+        random.Random(rng.random()), deadline, room_ids)) for i in range(workers)]
+    threads += [threading.Thread(target=admin, args=(make_transport(), recorder, deadline))
+                for _ in range(admins)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if httpd is not None:
+        httpd.shutdown()
+
+    routes = {}
+    for route, samples in recorder.latencies.items():
+        if not samples:
+            continue
+        ordered = sorted(samples)
+        routes[route] = {
+            'requests': len(ordered),
+            'errors': recorder.errors[route],
+            'rps': round(len(ordered) / elapsed, 2),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+            'max_ms': round(ordered[-1] * 1000, 3),
+        }
+    return {
+        'meta': {
+            'transport': 'http' if server else 'test-client',
+            'workers': workers,
+            'admins': admins,
+            'duration': round(elapsed, 2),
+            'conflicts': recorder.conflicts,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'routes': routes,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Regressions against a baseline, as human-readable strings (empty if none)"""
+    regressions = []
+    for route, base in baseline.get('routes', {}).items():
+        current = results['routes'].get(route)
+        if current is None:
+            regressions.append(f'{route}: no requests completed (baseline {base["requests"]})')
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f'{route}: p95 {current["p95_ms"]:.1f}ms vs {base["p95_ms"]:.1f}ms baseline '
+                               f'(+{(current["p95_ms"] / base["p95_ms"] - 1) * 100:.0f}%)')
+        if current['rps'] < base['rps'] / (1 + threshold):
+            regressions.append(f'{route}: {current["rps"]:.1f} req/s vs {base["rps"]:.1f} baseline '
+                               f'({(current["rps"] / base["rps"] - 1) * 100:.0f}%)')
+        if current['errors'] > base.get('errors', 0):
+            regressions.append(f'{route}: {current["errors"]} errors (baseline {base.get("errors", 0)})')
+    return regressions
+
+
+def print_report(results):
+    meta = results['meta']
+    print(f"{meta['workers']} guests + {meta['admins']} admin over {meta['transport']} "
+          f"for {meta['duration']}s ({meta['conflicts']} booking conflicts)\n")
+    print(f"{'route':<16} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'errors':>6}")
+    for route in ROUTES:
+        row = results['routes'].get(route)
+        if row:
+            print(f"{route:<16} {row['requests']:>8} {row['rps']:>8.1f} {row['p50_ms']:>8.2f} "
+                  f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f} {row['errors']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--rooms', type=int, help='override the scale\'s room count')
+    parser.add_argument('--users', type=int, help='override the scale\'s guest count')
+    parser.add_argument('--bookings', type=int, help='override the scale\'s booking count')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent guests')
+    parser.add_argument('--admins', type=int, default=1, help='concurrent dashboard users')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--server', action='store_true', help='go over HTTP to a local WSGI server')
+    parser.add_argument('--hash-method', help='password hash method (default: the app\'s)')
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--baseline', help='compare with the results saved in this file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed fractional regression per route (default 0.25)')
+    args = parser.parse_args()
+
+    rooms, users, bookings = SCALES[args.scale]
+    rooms = args.rooms if args.rooms is not None else rooms
+    users = args.users if args.users is not None else users
+    bookings = args.bookings if args.bookings is not None else bookings
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    os.chdir(HERE)
+    import app as app_module
+
+    app = app_module.app
+    if args.hash_method:
+        app.config['PASSWORD_HASH_METHOD'] = args.hash_method
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app.config['DATABASE'] = os.path.join(tmpdir, 'load.db')
+        start = time.perf_counter()
+        rooms, users, bookings = seed(app_module, rooms, users, bookings)
+        print(f"Seeded {rooms} rooms, {users} guests and {bookings} bookings "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        results = run(app, workers=args.workers, duration=args.duration,
+                      admins=args.admins, server=args.server)
+        results['meta'].update(scale=args.scale, rooms=rooms, users=users, bookings=bookings,
+                               hash_method=app.config['PASSWORD_HASH_METHOD'])
+        app.extensions.pop('db_pool').close_all()
+        for name in ('password_hasher', 'receipts'):
+            if name in app.extensions:
+                app.extensions.pop(name).shutdown()
+
+    print_report(results)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"\nResults saved to {output}")
+
+    if baseline is None:
+        return 0
+    differs = [f"{key} {baseline['meta'].get(key)} (now {results['meta'][key]})"
+               for key in ('scale', 'transport', 'workers', 'admins', 'cpus')
+               if baseline['meta'].get(key) != results['meta'][key]]
+    if differs:
+        print(f"\nWarning: the baseline was run with {', '.join(differs)}")
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.threshold:.0%} of the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\n✅ No route regressed beyond {args.threshold:.0%} of the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
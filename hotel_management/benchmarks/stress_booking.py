@@ -0,0 +1,124 @@
+"""
+Multi-process stress test for the booking commit path.
+
+Several worker processes hammer a small set of rooms with overlapping
+booking requests through booking.commit_booking().  Afterwards the bookings
+table is checked for overlapping stays; the script exits non-zero if it
+finds any.
+
+Usage: python benchmarks/stress_booking.py [--workers N] [--attempts N] [--rooms N]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from booking import BookingConflict, commit_booking
+from db import ConnectionPool
+
+START = date(2030, 1, 1)
+
+
+def create_database(path, rooms):
+    """Create the schema through the app's own init_db and add rooms"""
+    import app as app_module
+
+    app_module.app.config['DATABASE'] = path
+    app_module.init_db()
+    conn = sqlite3.connect(path)
+    conn.executemany('''
+        INSERT INTO rooms (room_number, room_type, price_per_night)
+        VALUES (?, ?, ?)
+    ''', [(str(100 + i), 'Single', 100.0) for i in range(rooms)])
+    conn.commit()
+    conn.close()
+
+
+def worker(args):
+    """Fire booking attempts and return (booked, conflicts, errors)"""
+    path, seed, attempts, rooms, window = args
+    rng = random.Random(seed)
+    conn = ConnectionPool(path).acquire()
+    booked = conflicts = errors = 0
+    for _ in range(attempts):
+        check_in = START + timedelta(days=rng.randint(0, window))
+        check_out = check_in + timedelta(days=rng.randint(1, 4))
+        try:
+            commit_booking(conn, 1, rng.randint(1, rooms),
+                           check_in.isoformat(), check_out.isoformat())
+            booked += 1
+        except BookingConflict:
+            conflicts += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    return booked, conflicts, errors
+
+
+def count_overlaps(path):
+    conn = sqlite3.connect(path)
+    overlaps = conn.execute('''
+        SELECT COUNT(*)
+        FROM bookings a
+        JOIN bookings b
+          ON a.room_id = b.room_id
+         AND a.booking_id < b.booking_id
+         AND a.check_in < b.check_out
+         AND b.check_in < a.check_out
+    ''').fetchone()[0]
+    conn.close()
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--attempts', type=int, default=500,
+                        help='booking attempts per worker')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--window', type=int, default=90,
+                        help='days over which check-in dates are spread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'stress.db')
+        create_database(path, args.rooms)
+
+        jobs = [(path, seed, args.attempts, args.rooms, args.window)
+                for seed in range(args.workers)]
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.workers) as pool:
+            results = pool.map(worker, jobs)
+        elapsed = time.perf_counter() - start
+
+        booked = sum(r[0] for r in results)
+        conflicts = sum(r[1] for r in results)
+        errors = sum(r[2] for r in results)
+        total = booked + conflicts + errors
+        overlaps = count_overlaps(path)
+
+    print(f"Workers:            {args.workers}")
+    print(f"Booking attempts:   {total}")
+    print(f"Committed:          {booked}")
+    print(f"Rejected conflicts: {conflicts}")
+    print(f"Lock errors:        {errors}")
+    print(f"Elapsed:            {elapsed:.2f}s ({total / elapsed:.0f} attempts/s, {booked / elapsed:.0f} commits/s)")
+    print(f"Overlapping stays:  {overlaps}")
+
+    if overlaps:
+        print("❌ Double bookings detected")
+        return 1
+    print("✅ No overlapping bookings")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Race-free booking commits.
+
+The overlap check and the INSERT run inside one BEGIN IMMEDIATE
+transaction, so two workers can never both see a room as free and book it.
+The check is a range lookup on the occupancy ledger, whose primary key
+rejects an overlapping night even if the check were ever bypassed.
+Only writers queue behind the reserved lock (readers keep going in WAL
+mode), and a writer that cannot get the lock retries with bounded,
+jittered exponential backoff instead of failing the request.
+
+The app books through insert_booking() on the single writer (writer.py),
+which supplies the transaction; commit_booking() is the standalone form
+that opens its own.
+"""
+
+import random
+import sqlite3
+import time
+from datetime import date
+
+import occupancy
+
+MAX_RETRIES = 5
+BASE_DELAY = 0.01
+MAX_DELAY = 0.25
+
+
+class BookingError(Exception):
+    """The booking could not be made"""
+
+
+class BookingConflict(BookingError):
+    """The room is already booked for some of the requested nights"""
+
+
+def is_busy_error(error):
+    """True for the SQLite errors raised when another writer holds the lock"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def run_immediate(conn, work, retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY):
+    """Run work(conn) inside BEGIN IMMEDIATE, retrying when the database is busy.
+
+    work() must not commit; the transaction is committed once it returns and
+    rolled back if it raises.
+    """
+    attempt = 0
+    while True:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(conn)
+                conn.commit()
+                return result
+            except BaseException:
+                conn.rollback()
+                raise
+        except sqlite3.OperationalError as e:
+            if not is_busy_error(e) or attempt >= retries:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
+
+
+def insert_booking(conn, user_id, room_id, check_in, check_out, record=None, rate_factor=None):
+    """Book a room for [check_in, check_out) inside the caller's write transaction.
+
+    Dates are 'YYYY-MM-DD' strings.  Returns (booking_id, total_amount).
+    Raises BookingConflict if any existing booking for the room overlaps
+    the requested stay.
+
+    The total is the room's price_per_night times rate_factor, the sum of
+    the stay's nightly multipliers from the rate calendar (see pricing.py),
+    or times the number of nights if it is not given.
+
+    If given, record(conn, booking) is called with a dict of the new
+    booking plus its room's number and type, so a caller can store data
+    derived from it (such as the receipt) in the same transaction.
+    """
+    nights = (date.fromisoformat(check_out) - date.fromisoformat(check_in)).days
+    if nights <= 0:
+        raise BookingError('Check-out date must be after check-in date!')
+    if not occupancy.is_free(conn, room_id, check_in, check_out):
+        raise BookingConflict('This room is already booked for the selected dates!')
+
+    room = conn.execute(
+        'SELECT room_number, room_type, price_per_night FROM rooms WHERE room_id = ?', (room_id,)
+    ).fetchone()
+    if room is None:
+        raise BookingError('Room not found!')
+
+    total_amount = round(room[2] * rate_factor, 2) if rate_factor is not None else nights * room[2]
+    try:
+        cursor = conn.execute('''
+            INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, room_id, check_in, check_out, total_amount))
+    except sqlite3.IntegrityError:
+        # the occupancy ledger's primary key rejected an overlapping night
+        raise BookingConflict('This room is already booked for the selected dates!')
+    if record is not None:
+        record(conn, {
+            'booking_id': cursor.lastrowid,
+            'user_id': user_id,
+            'room_id': room_id,
+            'room_number': room[0],
+            'room_type': room[1],
+            'check_in': check_in,
+            'check_out': check_out,
+            'nights': nights,
+            'total_amount': total_amount,
+        })
+    return cursor.lastrowid, total_amount
+
+
+def commit_booking(conn, user_id, room_id, check_in, check_out, record=None, rate_factor=None,
+                   **retry_options):
+    """Atomically book a room in its own BEGIN IMMEDIATE transaction.
+
+    See insert_booking() for the arguments and result.
+    """
+    return run_immediate(
+        conn, lambda conn: insert_booking(conn, user_id, room_id, check_in, check_out, record, rate_factor),
+        **retry_options)
@@ -0,0 +1,276 @@
+"""
+Bulk import and export of rooms and customers.
+
+Rows are streamed from CSV or JSON Lines, validated one at a time, and
+inserted in chunks, each chunk committed as one transaction.  A chunk is
+written to a temporary staging table with executemany() and copied into
+the real table with a single INSERT ... SELECT, so the triggers on the
+table (notably the customer search index, which flushes its pending
+writes at every statement) run inside one statement per chunk rather than
+one per row.  Invalid rows are reported with their line number and skipped;
+a chunk that hits a constraint violation (e.g. a duplicate room number) is
+retried row by row so only the offending rows are rejected.  Exports stream
+straight off the cursor.
+
+Command line usage:
+
+    python bulk.py import rooms rooms.csv
+    python bulk.py import customers guests.jsonl --chunk-size 10000
+    python bulk.py export rooms rooms.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    """A row that failed validation"""
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None or not str(value).strip():
+        raise RowError(f'{field} is required')
+    return str(value).strip()
+
+
+def validate_room(row):
+    price = row.get('price_per_night')
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise RowError('price_per_night must be a number')
+    if price < 0:
+        raise RowError('price_per_night must not be negative')
+    return (_text(row, 'room_number'), _text(row, 'room_type'), price)
+
+
+def validate_customer(row):
+    email = _text(row, 'email')
+    if '@' not in email:
+        raise RowError('email is not a valid address')
+    return (_text(row, 'name'), email, _text(row, 'phone'), _text(row, 'address'))
+
+
+# Import/export definitions for each supported table
+KINDS = {
+    'rooms': {
+        'columns': ('room_number', 'room_type', 'price_per_night'),
+        'export_columns': ('room_id', 'room_number', 'room_type', 'price_per_night'),
+        'key': 'room_id',
+        'validate': validate_room,
+    },
+    'customers': {
+        'columns': ('name', 'email', 'phone', 'address'),
+        'export_columns': ('customer_id', 'name', 'email', 'phone', 'address'),
+        'key': 'customer_id',
+        'validate': validate_customer,
+    },
+}
+
+
+class ImportReport:
+    """Outcome of a bulk import"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round((self.inserted + self.rejected) / self.elapsed) if self.elapsed else None,
+        }
+
+
+def detect_format(filename, default='csv'):
+    """Guess 'csv' or 'jsonl' from a file name"""
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, fmt):
+    """Yield (line_number, row dict or RowError) from a text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowError('each line must be a JSON object')
+                continue
+            yield line_number, row
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _insert_chunk(conn, sql, stage, chunk, report):
+    """Insert one chunk in its own transaction, isolating constraint failures"""
+    stage_sql, copy_sql, clear_sql = stage
+    try:
+        with conn:
+            conn.executemany(stage_sql, [values for _, values in chunk])
+            conn.execute(copy_sql)
+            conn.execute(clear_sql)
+        report.inserted += len(chunk)
+        return
+    except sqlite3.IntegrityError:
+        pass
+    # Something in the chunk violates a constraint: find it row by row
+    with conn:
+        conn.execute('BEGIN')
+        for line, values in chunk:
+            try:
+                conn.execute('SAVEPOINT bulk_row')
+                conn.execute(sql, values)
+                conn.execute('RELEASE bulk_row')
+                report.inserted += 1
+            except sqlite3.IntegrityError as e:
+                conn.execute('ROLLBACK TO bulk_row')
+                conn.execute('RELEASE bulk_row')
+                report.reject(line, str(e))
+
+
+def import_rows(conn, kind, rows, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Validate and insert rows from read_rows(); returns an ImportReport"""
+    spec = KINDS[kind]
+    columns = spec['columns']
+    names = ", ".join(columns)
+    sql = f'INSERT INTO {kind} ({names}) VALUES ({", ".join("?" * len(columns))})'
+    conn.execute(f'CREATE TEMP TABLE IF NOT EXISTS bulk_{kind} AS SELECT {names} FROM {kind} WHERE 0')
+    stage = (
+        f'INSERT INTO temp.bulk_{kind} ({names}) VALUES ({", ".join("?" * len(columns))})',
+        f'INSERT INTO {kind} ({names}) SELECT {names} FROM temp.bulk_{kind} ORDER BY rowid',
+        f'DELETE FROM temp.bulk_{kind}',
+    )
+    validate = spec['validate']
+    report = ImportReport(kind)
+    start = time.perf_counter()
+
+    chunk = []
+    for line, row in rows:
+        if isinstance(row, RowError):
+            report.reject(line, str(row))
+            continue
+        try:
+            chunk.append((line, validate(row)))
+        except RowError as e:
+            report.reject(line, str(e))
+            continue
+        if len(chunk) >= chunk_size:
+            _insert_chunk(conn, sql, stage, chunk, report)
+            chunk = []
+    if chunk:
+        _insert_chunk(conn, sql, stage, chunk, report)
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def export_rows(conn, kind, fmt, batch_size=1000):
+    """Yield the table as CSV or JSON Lines text, a batch of rows at a time"""
+    spec = KINDS[kind]
+    columns = spec['export_columns']
+    cursor = conn.execute(f'SELECT {", ".join(columns)} FROM {kind} ORDER BY {spec["key"]}')
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            writer.writerows(tuple(row) for row in batch)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif fmt == 'jsonl':
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield ''.join(
+                json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n'
+                for row in batch
+            )
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import/export of rooms and customers')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('path', help="file to read or write ('-' for stdin/stdout)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'])
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--database', default=DATABASE)
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    conn = sqlite3.connect(args.database)
+    conn.execute('PRAGMA busy_timeout = 5000')
+
+    if args.action == 'import':
+        if args.path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            stream = open(args.path, encoding='utf-8-sig', newline='')
+        with stream:
+            report = import_rows(conn, args.kind, read_rows(stream, fmt), args.chunk_size)
+        conn.close()
+        result = report.to_dict()
+        print(f"Imported {result['inserted']} {args.kind}, rejected {result['rejected']} "
+              f"in {result['elapsed_seconds']}s ({result['rows_per_second']} rows/s)")
+        for error in report.errors[:20]:
+            print(f"  line {error['line']}: {error['error']}")
+        return 1 if report.rejected else 0
+
+    out = sys.stdout if args.path == '-' else open(args.path, 'w', encoding='utf-8', newline='')
+    with out:
+        for chunk in export_rows(conn, args.kind, fmt):
+            out.write(chunk)
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
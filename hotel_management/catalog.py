@@ -0,0 +1,174 @@
+"""
+Read-through cache of the room catalog.
+
+Rooms change rarely compared to how often they are listed, so every worker
+keeps a versioned snapshot of the rooms table in memory.  Triggers bump a
+shared version counter in SQLite on every insert, update or delete of a
+room (additions, edits and deletions alike), so a worker only
+has to read one integer to know whether its snapshot is still current, and
+writes made by other processes are seen on the next read.  An optional TTL
+skips even that check; writes made by this process invalidate the snapshot
+immediately.
+
+Filtered and sorted views of the snapshot are kept in a small LRU and
+dropped together with the snapshot.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+from db import extension
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('rooms', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_rooms_insert AFTER INSERT ON rooms
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'rooms';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_rooms_update AFTER UPDATE ON rooms
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'rooms';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_rooms_delete AFTER DELETE ON rooms
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'rooms';
+END;
+'''
+
+
+def ensure_schema(conn):
+    """Create the shared version counter and the rooms triggers"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def read_version(conn, table_name):
+    """Current shared version of a table"""
+    row = conn.execute(
+        'SELECT version FROM table_versions WHERE table_name = ?', (table_name,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+class RoomCatalog:
+    """Versioned in-process snapshot of the rooms table"""
+
+    def __init__(self, ttl=0.0, max_views=64):
+        self.ttl = ttl
+        self.max_views = max_views
+        self._lock = threading.Lock()
+        self._version = None
+        self._rooms = ()
+        self._by_id = {}
+        self._views = OrderedDict()
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.view_hits = 0
+        self.view_misses = 0
+
+    def _current(self, conn):
+        """Make sure the snapshot is current; return (version, rooms, by_id)"""
+        now = time.monotonic()
+        if self._version is not None and self.ttl and now - self._checked_at < self.ttl:
+            self.hits += 1
+            return self._version, self._rooms, self._by_id
+
+        version = read_version(conn, 'rooms')
+        with self._lock:
+            if version == self._version:
+                self._checked_at = now
+                self.hits += 1
+                return self._version, self._rooms, self._by_id
+
+        rooms = tuple(conn.execute('SELECT * FROM rooms ORDER BY room_number, room_id'))
+        with self._lock:
+            if self._version is not None:
+                self.invalidations += 1
+            self.misses += 1
+            self._version = version
+            self._rooms = rooms
+            self._by_id = {room['room_id']: room for room in rooms}
+            self._views.clear()
+            self._checked_at = now
+            return version, rooms, self._by_id
+
+    def invalidate(self):
+        """Drop the snapshot after a write made by this process"""
+        with self._lock:
+            if self._version is not None:
+                self.invalidations += 1
+            self._version = None
+            self._views.clear()
+
+    def rooms(self, conn):
+        """Every room, ordered by room number"""
+        return self._current(conn)[1]
+
+    def get(self, conn, room_id):
+        """A single room by id, or None"""
+        return self._current(conn)[2].get(int(room_id))
+
+    def view(self, conn, sort_column='room_number', room_type=None,
+             min_price=None, max_price=None):
+        """Rooms matching the filters, in ascending (sort_column, room_id) order"""
+        version, rooms, _ = self._current(conn)
+        key = (version, sort_column, room_type, min_price, max_price)
+        with self._lock:
+            cached = self._views.get(key)
+            if cached is not None:
+                self._views.move_to_end(key)
+                self.view_hits += 1
+                return cached
+            self.view_misses += 1
+
+        selected = [
+            room for room in rooms
+            if (room_type is None or room['room_type'] == room_type)
+            and (min_price is None or room['price_per_night'] >= min_price)
+            and (max_price is None or room['price_per_night'] <= max_price)
+        ]
+        selected.sort(key=lambda room: (room[sort_column], room['room_id']))
+        keys = [(room[sort_column], room['room_id']) for room in selected]
+        result = (selected, keys)
+
+        with self._lock:
+            if version == self._version:
+                self._views[key] = result
+                while len(self._views) > self.max_views:
+                    self._views.popitem(last=False)
+        return result
+
+    def stats(self):
+        """Hit, miss and invalidation counters"""
+        return {
+            'version': self._version,
+            'rooms': len(self._rooms),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'views': len(self._views),
+            'view_hits': self.view_hits,
+            'view_misses': self.view_misses,
+        }
+
+
+def get_catalog(app=None):
+    """Return the app's room catalog cache"""
+    app = app or current_app
+    return extension(app, 'room_catalog', lambda: RoomCatalog(
+        ttl=app.config.get('ROOM_CATALOG_TTL', 0.0),
+        max_views=app.config.get('ROOM_CATALOG_VIEWS', 64),
+    ))
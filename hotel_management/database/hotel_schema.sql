@@ -1,74 +1,414 @@
--- Hotel Management System Database Schema
-
--- Drop tables if they exist (for fresh setup)
-DROP TABLE IF EXISTS bookings;
-DROP TABLE IF EXISTS customers;
-DROP TABLE IF EXISTS rooms;
-DROP TABLE IF EXISTS users;
-
--- Create users table
-CREATE TABLE users (
-    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    username TEXT UNIQUE NOT NULL,
-    password TEXT NOT NULL,
-    role TEXT NOT NULL
-);
-
--- Create rooms table
-CREATE TABLE rooms (
-    room_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    room_number TEXT UNIQUE NOT NULL,
-    room_type TEXT NOT NULL,
-    price_per_night REAL NOT NULL,
-    status TEXT NOT NULL DEFAULT 'Available'
-);
-
--- Create customers table
-CREATE TABLE customers (
-    customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL,
-    email TEXT NOT NULL,
-    phone TEXT NOT NULL,
-    address TEXT NOT NULL
-);
-
--- Create bookings table
-CREATE TABLE bookings (
-    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
-    user_id INTEGER NOT NULL,
-    room_id INTEGER NOT NULL,
-    check_in DATE NOT NULL,
-    check_out DATE NOT NULL,
-    total_amount REAL NOT NULL,
-    FOREIGN KEY (user_id) REFERENCES users (user_id),
-    FOREIGN KEY (room_id) REFERENCES rooms (room_id)
-);
-
--- Insert default admin user
-INSERT INTO users (username, password, role) 
-VALUES ('admin', 'pbkdf2:sha256:260000$xyz123$abcdef456789hashvalue', 'admin');
-
--- Insert sample rooms
-INSERT INTO rooms (room_number, room_type, price_per_night, status) VALUES
-('101', 'Single', 100.00, 'Available'),
-('102', 'Single', 100.00, 'Available'),
-('201', 'Double', 150.00, 'Available'),
-('202', 'Double', 150.00, 'Available'),
-('301', 'Suite', 250.00, 'Available');
-
--- Sample customer data
-INSERT INTO customers (name, email, phone, address) VALUES
-('John Doe', 'john.doe@email.com', '123-456-7890', '123 Main St, City, State'),
-('Jane Smith', 'jane.smith@email.com', '098-765-4321', '456 Oak Ave, Town, State');
-
--- Sample booking data
-INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) VALUES
-(2, 1, '2025-11-01', '2025-11-05', 400.00),
-(2, 3, '2025-11-10', '2025-11-12', 300.00);
-
--- Indexes for better performance
-CREATE INDEX idx_users_username ON users(username);
-CREATE INDEX idx_rooms_status ON rooms(status);
-CREATE INDEX idx_bookings_user_id ON bookings(user_id);
-CREATE INDEX idx_bookings_room_id ON bookings(room_id);
-CREATE INDEX idx_bookings_dates ON bookings(check_in, check_out);
\ No newline at end of file
+-- Hotel Management System Database Schema
+--
+-- Generated from migrations.py (schema version 15); do not edit by hand.
+-- Regenerate with: python migrations.py --dump-schema > database/hotel_schema.sql
+--
+-- To create a database by hand: sqlite3 database/hotel.db < database/hotel_schema.sql
+-- then run python init_db.py, which seeds the bookkeeping rows, records the
+-- schema version and adds the admin user and sample rooms.
+
+CREATE TABLE users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+
+CREATE TABLE rooms (
+    room_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_number TEXT UNIQUE NOT NULL,
+    room_type TEXT NOT NULL,
+    price_per_night REAL NOT NULL
+);
+
+CREATE TABLE customers (
+    customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    address TEXT NOT NULL
+);
+
+CREATE TABLE bookings (
+    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    check_in DATE NOT NULL,
+    check_out DATE NOT NULL,
+    total_amount REAL NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (user_id),
+    FOREIGN KEY (room_id) REFERENCES rooms (room_id)
+);
+
+CREATE TABLE hotel_stats (
+    stat_id INTEGER PRIMARY KEY CHECK (stat_id = 1),
+    total_rooms INTEGER NOT NULL DEFAULT 0,
+    total_revenue REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE room_nights (
+    room_id INTEGER NOT NULL,
+    night DATE NOT NULL,
+    booking_id INTEGER NOT NULL,
+    rate REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (room_id, night)
+) WITHOUT ROWID;
+
+CREATE TABLE table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+, updated_at REAL);
+
+CREATE TABLE daily_rollups (
+    night DATE NOT NULL,
+    room_type TEXT NOT NULL,
+    rooms_sold INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (night, room_type)
+) WITHOUT ROWID;
+
+CREATE TABLE receipts (
+    booking_id INTEGER PRIMARY KEY,
+    snapshot TEXT NOT NULL
+);
+
+CREATE VIRTUAL TABLE customers_fts USING fts5(
+    name, email, phone, address,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '1 2 3 4 5 6'
+);
+
+CREATE TABLE sessions (
+    session_key TEXT PRIMARY KEY,
+    user_id INTEGER,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE booking_groups (
+    group_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    bill TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE booking_group_members (
+    booking_id INTEGER PRIMARY KEY,
+    group_id INTEGER NOT NULL
+);
+
+CREATE TABLE room_assignments (
+    booking_id INTEGER PRIMARY KEY
+);
+
+CREATE TABLE booking_moves (
+    move_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking_id INTEGER NOT NULL,
+    from_room INTEGER NOT NULL,
+    to_room INTEGER NOT NULL,
+    moved_at TEXT NOT NULL
+);
+
+CREATE TABLE room_rates (
+    room_type TEXT NOT NULL,
+    night DATE NOT NULL,
+    factor REAL NOT NULL,
+    PRIMARY KEY (room_type, night)
+) WITHOUT ROWID;
+
+CREATE TABLE events (
+    event_id INTEGER PRIMARY KEY,
+    recorded_at INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    entity_id INTEGER NOT NULL,
+    room_id INTEGER,
+    check_in INTEGER,
+    check_out INTEGER,
+    amount INTEGER,
+    detail TEXT
+);
+
+CREATE TABLE event_snapshots (
+    snapshot_id INTEGER PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    taken_at INTEGER NOT NULL,
+    rooms BLOB NOT NULL,
+    bookings BLOB NOT NULL
+);
+
+CREATE TABLE archiving (
+    started REAL NOT NULL
+);
+
+CREATE INDEX idx_bookings_room_dates ON bookings (room_id, check_in, check_out);
+
+CREATE INDEX idx_bookings_dates ON bookings (check_in, check_out);
+
+CREATE INDEX idx_bookings_user_id ON bookings (user_id);
+
+CREATE INDEX idx_rooms_type_price ON rooms (room_type, price_per_night);
+
+CREATE INDEX idx_rooms_price ON rooms (price_per_night);
+
+CREATE INDEX idx_customers_name ON customers (name);
+
+CREATE INDEX idx_room_nights_night ON room_nights (night, room_id);
+
+CREATE INDEX idx_sessions_user_id ON sessions (user_id);
+
+CREATE INDEX idx_sessions_expires_at ON sessions (expires_at);
+
+CREATE INDEX idx_booking_group_members_group ON booking_group_members (group_id);
+
+CREATE TRIGGER trg_stats_room_count_insert AFTER INSERT ON rooms
+BEGIN
+    UPDATE hotel_stats SET total_rooms = total_rooms + 1 WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER trg_stats_room_count_delete AFTER DELETE ON rooms
+BEGIN
+    UPDATE hotel_stats SET total_rooms = total_rooms - 1 WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER trg_stats_booking_insert AFTER INSERT ON bookings
+BEGIN
+    UPDATE hotel_stats SET total_revenue = total_revenue + NEW.total_amount
+    WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER trg_stats_booking_amount AFTER UPDATE OF total_amount ON bookings
+BEGIN
+    UPDATE hotel_stats SET total_revenue = total_revenue - OLD.total_amount + NEW.total_amount
+    WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER trg_nights_booking_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO room_nights (room_id, night, booking_id, rate)
+    WITH RECURSIVE stay(night) AS (
+        SELECT NEW.check_in
+        UNION ALL
+        SELECT date(night, '+1 day') FROM stay WHERE date(night, '+1 day') < NEW.check_out
+    )
+    SELECT NEW.room_id, night, NEW.booking_id,
+           NEW.total_amount / (julianday(NEW.check_out) - julianday(NEW.check_in))
+    FROM stay WHERE night < NEW.check_out;
+END;
+
+CREATE TRIGGER trg_nights_booking_update
+AFTER UPDATE OF room_id, check_in, check_out, total_amount ON bookings
+BEGIN
+    DELETE FROM room_nights
+    WHERE room_id = OLD.room_id AND night >= OLD.check_in AND night < OLD.check_out
+      AND booking_id = OLD.booking_id;
+    INSERT INTO room_nights (room_id, night, booking_id, rate)
+    WITH RECURSIVE stay(night) AS (
+        SELECT NEW.check_in
+        UNION ALL
+        SELECT date(night, '+1 day') FROM stay WHERE date(night, '+1 day') < NEW.check_out
+    )
+    SELECT NEW.room_id, night, NEW.booking_id,
+           NEW.total_amount / (julianday(NEW.check_out) - julianday(NEW.check_in))
+    FROM stay WHERE night < NEW.check_out;
+END;
+
+CREATE TRIGGER trg_version_rooms_insert AFTER INSERT ON rooms
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'rooms';
+END;
+
+CREATE TRIGGER trg_version_rooms_update AFTER UPDATE ON rooms
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'rooms';
+END;
+
+CREATE TRIGGER trg_version_rooms_delete AFTER DELETE ON rooms
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'rooms';
+END;
+
+CREATE TRIGGER trg_rollup_night_insert AFTER INSERT ON room_nights
+BEGIN
+    INSERT INTO daily_rollups (night, room_type, rooms_sold, revenue)
+    SELECT NEW.night, room_type, 1, NEW.rate FROM rooms WHERE room_id = NEW.room_id
+    ON CONFLICT (night, room_type) DO UPDATE SET
+        rooms_sold = rooms_sold + 1,
+        revenue = revenue + excluded.revenue;
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER trg_rollup_room_delete AFTER DELETE ON rooms
+BEGIN
+    UPDATE daily_rollups SET
+        rooms_sold = rooms_sold - 1,
+        revenue = revenue - (SELECT rate FROM room_nights
+                             WHERE room_id = OLD.room_id AND night = daily_rollups.night)
+    WHERE room_type = OLD.room_type
+      AND night IN (SELECT night FROM room_nights WHERE room_id = OLD.room_id);
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER trg_rollup_room_type AFTER UPDATE OF room_type ON rooms
+WHEN OLD.room_type IS NOT NEW.room_type
+BEGIN
+    UPDATE daily_rollups SET
+        rooms_sold = rooms_sold - 1,
+        revenue = revenue - (SELECT rate FROM room_nights
+                             WHERE room_id = OLD.room_id AND night = daily_rollups.night)
+    WHERE room_type = OLD.room_type
+      AND night IN (SELECT night FROM room_nights WHERE room_id = OLD.room_id);
+    INSERT INTO daily_rollups (night, room_type, rooms_sold, revenue)
+    SELECT night, NEW.room_type, 1, rate FROM room_nights WHERE room_id = NEW.room_id
+    ON CONFLICT (night, room_type) DO UPDATE SET
+        rooms_sold = rooms_sold + 1,
+        revenue = revenue + excluded.revenue;
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER trg_customers_fts_insert AFTER INSERT ON customers
+BEGIN
+    INSERT INTO customers_fts (rowid, name, email, phone, address)
+    VALUES (NEW.customer_id, NEW.name, NEW.email, replace(replace(replace(replace(replace(replace(NEW.phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), NEW.address);
+END;
+
+CREATE TRIGGER trg_customers_fts_delete AFTER DELETE ON customers
+BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name, email, phone, address)
+    VALUES ('delete', OLD.customer_id, OLD.name, OLD.email, replace(replace(replace(replace(replace(replace(OLD.phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), OLD.address);
+END;
+
+CREATE TRIGGER trg_customers_fts_update
+AFTER UPDATE OF name, email, phone, address ON customers
+BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name, email, phone, address)
+    VALUES ('delete', OLD.customer_id, OLD.name, OLD.email, replace(replace(replace(replace(replace(replace(OLD.phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), OLD.address);
+    INSERT INTO customers_fts (rowid, name, email, phone, address)
+    VALUES (NEW.customer_id, NEW.name, NEW.email, replace(replace(replace(replace(replace(replace(NEW.phone, ' ', ''), '-', ''), '(', ''), ')', ''), '.', ''), '+', ''), NEW.address);
+END;
+
+CREATE TRIGGER trg_table_versions_touch AFTER UPDATE OF version ON table_versions
+BEGIN
+    UPDATE table_versions SET updated_at = (julianday('now') - 2440587.5) * 86400.0
+    WHERE table_name = NEW.table_name;
+END;
+
+CREATE TRIGGER trg_version_bookings_insert AFTER INSERT ON bookings
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'bookings';
+END;
+
+CREATE TRIGGER trg_version_bookings_update AFTER UPDATE ON bookings
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'bookings';
+END;
+
+CREATE TRIGGER trg_version_bookings_delete AFTER DELETE ON bookings
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'bookings';
+END;
+
+CREATE TRIGGER trg_version_customers_insert AFTER INSERT ON customers
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'customers';
+END;
+
+CREATE TRIGGER trg_version_customers_update AFTER UPDATE ON customers
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'customers';
+END;
+
+CREATE TRIGGER trg_version_customers_delete AFTER DELETE ON customers
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'customers';
+END;
+
+CREATE TRIGGER trg_version_room_rates_insert AFTER INSERT ON room_rates
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'room_rates';
+END;
+
+CREATE TRIGGER trg_version_room_rates_update AFTER UPDATE ON room_rates
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'room_rates';
+END;
+
+CREATE TRIGGER trg_version_room_rates_delete AFTER DELETE ON room_rates
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'room_rates';
+END;
+
+CREATE TRIGGER trg_events_room_insert AFTER INSERT ON rooms
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, amount, detail)
+    VALUES (CAST(strftime('%s', 'now') AS INTEGER), 1, NEW.room_id, NEW.room_id, CAST(round(NEW.price_per_night * 100) AS INTEGER),
+            json_array(NEW.room_number, NEW.room_type));
+END;
+
+CREATE TRIGGER trg_events_room_update
+AFTER UPDATE OF room_number, room_type, price_per_night ON rooms
+WHEN OLD.room_number IS NOT NEW.room_number OR OLD.room_type IS NOT NEW.room_type
+  OR OLD.price_per_night IS NOT NEW.price_per_night
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, amount, detail)
+    VALUES (CAST(strftime('%s', 'now') AS INTEGER), 2, NEW.room_id, NEW.room_id, CAST(round(NEW.price_per_night * 100) AS INTEGER),
+            json_array(NEW.room_number, NEW.room_type));
+END;
+
+CREATE TRIGGER trg_events_room_delete AFTER DELETE ON rooms
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id)
+    VALUES (CAST(strftime('%s', 'now') AS INTEGER), 3, OLD.room_id, OLD.room_id);
+END;
+
+CREATE TRIGGER trg_events_booking_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, check_in, check_out, amount)
+    VALUES (CAST(strftime('%s', 'now') AS INTEGER), 4, NEW.booking_id, NEW.room_id, CAST(julianday(NEW.check_in) - 1721424.5 AS INTEGER),
+            CAST(julianday(NEW.check_out) - 1721424.5 AS INTEGER), CAST(round(NEW.total_amount * 100) AS INTEGER));
+END;
+
+CREATE TRIGGER trg_events_booking_update
+AFTER UPDATE OF room_id, check_in, check_out, total_amount ON bookings
+WHEN OLD.room_id IS NOT NEW.room_id OR OLD.check_in IS NOT NEW.check_in
+  OR OLD.check_out IS NOT NEW.check_out OR OLD.total_amount IS NOT NEW.total_amount
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, check_in, check_out, amount)
+    VALUES (CAST(strftime('%s', 'now') AS INTEGER), 5, NEW.booking_id, NEW.room_id, CAST(julianday(NEW.check_in) - 1721424.5 AS INTEGER),
+            CAST(julianday(NEW.check_out) - 1721424.5 AS INTEGER), CAST(round(NEW.total_amount * 100) AS INTEGER));
+END;
+
+CREATE TRIGGER trg_stats_booking_delete AFTER DELETE ON bookings
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    UPDATE hotel_stats SET total_revenue = total_revenue - OLD.total_amount
+    WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER trg_nights_booking_delete AFTER DELETE ON bookings
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    DELETE FROM room_nights
+    WHERE room_id = OLD.room_id AND night >= OLD.check_in AND night < OLD.check_out
+      AND booking_id = OLD.booking_id;
+END;
+
+CREATE TRIGGER trg_rollup_night_delete AFTER DELETE ON room_nights
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    UPDATE daily_rollups SET
+        rooms_sold = rooms_sold - 1,
+        revenue = revenue - OLD.rate
+    WHERE night = OLD.night
+      AND room_type = (SELECT room_type FROM rooms WHERE room_id = OLD.room_id);
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER trg_events_booking_delete AFTER DELETE ON bookings
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id)
+    VALUES (CAST(strftime('%s', 'now') AS INTEGER), 6, OLD.booking_id, OLD.room_id);
+END;
@@ -0,0 +1,183 @@
+"""
+Pooled SQLite connections for the Hotel Management System.
+
+Every app context checks out one connection from a shared pool and hands it
+back on teardown, so routes no longer pay for opening a connection (and
+re-preparing their statements) on every request.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+# Pragmas applied to every pooled connection
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),        # 16 MB page cache per connection
+    ('mmap_size', 268435456),      # 256 MB memory-mapped I/O
+    ('busy_timeout', 5000),        # wait up to 5s for a competing writer
+    ('temp_store', 'MEMORY'),
+)
+
+
+# Guards creating an app's pool, writer and caches, which the first requests
+# may race to do; re-entrant, as some are made while making another
+_create_lock = threading.RLock()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout"""
+
+
+class ConnectionPool:
+    """A bounded pool of long-lived SQLite connections"""
+
+    def __init__(self, database, max_size=8, timeout=30.0, cached_statements=256,
+                 factory=sqlite3.Connection):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._acquired = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        """Open a new connection with the tuned pragmas applied"""
+        conn = sqlite3.connect(
+            self.database,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=self.factory,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self):
+        """Check out a connection, opening one if the pool is not yet full"""
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._size < self.max_size
+                if grow:
+                    self._size += 1
+            if grow:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(
+                        f'No database connection available after {self.timeout}s'
+                    )
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._acquired += 1
+            if waited > 0.001:
+                self._waited += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in tests)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._size -= 1
+
+    def stats(self):
+        """Pool size and wait-time metrics"""
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': self._size - self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'acquired': self._acquired,
+                'waited': self._waited,
+                'wait_seconds_total': self._wait_total,
+                'wait_seconds_max': self._wait_max,
+            }
+
+
+def extension(app, name, create):
+    """Return app.extensions[name], calling create() to make it on first use.
+
+    Only one thread creates it: the others wait and get the same one.
+    """
+    value = app.extensions.get(name)
+    if value is None:
+        with _create_lock:
+            value = app.extensions.get(name)
+            if value is None:
+                value = app.extensions[name] = create()
+    return value
+
+
+def get_pool(app=None):
+    """Return the connection pool for the app, creating it on first use"""
+    app = app or current_app
+    return extension(app, 'db_pool', lambda: ConnectionPool(
+        app.config['DATABASE'],
+        max_size=app.config.get('DB_POOL_SIZE', 8),
+        timeout=app.config.get('DB_POOL_TIMEOUT', 30.0),
+        factory=app.config.get('DB_CONNECTION_FACTORY') or sqlite3.Connection,
+    ))
+
+
+def get_db():
+    """Get the connection bound to the current app context"""
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def release_db(exception=None):
+    """Hand the app context's connection back to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+def init_app(app):
+    """Register the pool teardown with the Flask app"""
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_POOL_TIMEOUT', 30.0)
+    app.teardown_appcontext(release_db)
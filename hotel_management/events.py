@@ -0,0 +1,459 @@
+"""
+Append-only event log of the inventory.
+
+Rooms and bookings are changed in place (UPDATE / DELETE), so the tables
+only ever hold the present.  Every change to them is also appended to the
+events table by triggers, in the same transaction as the change itself,
+whatever made it (the writer, bulk imports, the re-optimization job).
+Archival (see archive.py) logs the stays it moves out of the hot tables
+itself:
+
+    kind               entity_id   room_id   check_in / check_out   amount   detail
+    room added         room        room                             price    [number, type]
+    room changed       room        room                             price    [number, type]
+    room removed       room        room
+    booking made       booking     room      day ordinals           total
+    booking changed    booking     room      day ordinals           total
+    booking removed    booking     room
+    booking archived   booking     room
+
+Events are stored compactly: integer columns only (dates as day ordinals,
+money in cents, the time as whole Unix seconds), with JSON for the rare
+room detail, and are never updated or deleted.
+
+Snapshots store the whole inventory as of one event: the rooms as JSON
+and the bookings as a packed array of integers, both zlib-compressed.
+One is taken when the log is created and then whenever
+EVENT_SNAPSHOT_INTERVAL events have been logged since the last one
+(checked in the background, at most every EVENT_SNAPSHOT_CHECK seconds,
+after a request that writes).  The inventory is read outside the writer,
+which only stores the finished snapshot.  restore() loads the latest snapshot and
+replays the events after it; the startup warm-up builds the availability
+index that way instead of reading every booking.  state_at() does the
+same up to any past moment, which is what the point-in-time tool shows.
+
+Command line usage:
+
+    python events.py                    # log size and snapshots
+    python events.py --snapshot         # take a snapshot now
+    python events.py --as-of YYYY-MM-DD # the inventory at the end of a day
+    python events.py --replay           # time a full restore
+
+Configuration (app.config):
+    EVENT_SNAPSHOT_INTERVAL  events logged between snapshots (default 100000)
+    EVENT_SNAPSHOT_CHECK     seconds between checks for a due snapshot (default 60)
+    EVENT_REPLAY_ON_STARTUP  build the availability index from the log at startup (default True)
+"""
+
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from array import array
+from datetime import date, datetime, timedelta
+
+from flask import current_app, request
+
+import writer
+from db import extension, get_db
+from writer import get_writer
+
+DEFAULT_SNAPSHOT_INTERVAL = 100000
+DEFAULT_SNAPSHOT_CHECK = 60.0
+
+ROOM_ADDED, ROOM_CHANGED, ROOM_REMOVED, BOOKING_MADE, BOOKING_CHANGED, BOOKING_REMOVED = range(1, 7)
+BOOKING_ARCHIVED = 7
+
+KINDS = {
+    ROOM_ADDED: 'room added',
+    ROOM_CHANGED: 'room changed',
+    ROOM_REMOVED: 'room removed',
+    BOOKING_MADE: 'booking made',
+    BOOKING_CHANGED: 'booking changed',
+    BOOKING_REMOVED: 'booking removed',
+    BOOKING_ARCHIVED: 'booking archived',
+}
+
+# SQL for a 'YYYY-MM-DD' column as a Python day ordinal, money in cents and the time now
+ORDINAL = "CAST(julianday({0}) - 1721424.5 AS INTEGER)"
+CENTS = "CAST(round({0} * 100) AS INTEGER)"
+NOW = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# Each snapshot booking is (booking_id, room_id, check_in, check_out, amount)
+BOOKING_WIDTH = 5
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS events (
+    event_id INTEGER PRIMARY KEY,
+    recorded_at INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    entity_id INTEGER NOT NULL,
+    room_id INTEGER,
+    check_in INTEGER,
+    check_out INTEGER,
+    amount INTEGER,
+    detail TEXT
+);
+
+CREATE TABLE IF NOT EXISTS event_snapshots (
+    snapshot_id INTEGER PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    taken_at INTEGER NOT NULL,
+    rooms BLOB NOT NULL,
+    bookings BLOB NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_events_room_insert AFTER INSERT ON rooms
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, amount, detail)
+    VALUES ({NOW}, {ROOM_ADDED}, NEW.room_id, NEW.room_id, {CENTS.format('NEW.price_per_night')},
+            json_array(NEW.room_number, NEW.room_type));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_events_room_update
+AFTER UPDATE OF room_number, room_type, price_per_night ON rooms
+WHEN OLD.room_number IS NOT NEW.room_number OR OLD.room_type IS NOT NEW.room_type
+  OR OLD.price_per_night IS NOT NEW.price_per_night
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, amount, detail)
+    VALUES ({NOW}, {ROOM_CHANGED}, NEW.room_id, NEW.room_id, {CENTS.format('NEW.price_per_night')},
+            json_array(NEW.room_number, NEW.room_type));
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_events_room_delete AFTER DELETE ON rooms
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id)
+    VALUES ({NOW}, {ROOM_REMOVED}, OLD.room_id, OLD.room_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_events_booking_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, check_in, check_out, amount)
+    VALUES ({NOW}, {BOOKING_MADE}, NEW.booking_id, NEW.room_id, {ORDINAL.format('NEW.check_in')},
+            {ORDINAL.format('NEW.check_out')}, {CENTS.format('NEW.total_amount')});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_events_booking_update
+AFTER UPDATE OF room_id, check_in, check_out, total_amount ON bookings
+WHEN OLD.room_id IS NOT NEW.room_id OR OLD.check_in IS NOT NEW.check_in
+  OR OLD.check_out IS NOT NEW.check_out OR OLD.total_amount IS NOT NEW.total_amount
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id, check_in, check_out, amount)
+    VALUES ({NOW}, {BOOKING_CHANGED}, NEW.booking_id, NEW.room_id, {ORDINAL.format('NEW.check_in')},
+            {ORDINAL.format('NEW.check_out')}, {CENTS.format('NEW.total_amount')});
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_events_booking_delete AFTER DELETE ON bookings
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    INSERT INTO events (recorded_at, kind, entity_id, room_id)
+    VALUES ({NOW}, {BOOKING_REMOVED}, OLD.booking_id, OLD.room_id);
+END;
+'''
+
+
+def ensure_schema(conn):
+    """Create the event log and its triggers, and snapshot the inventory it starts from"""
+    conn.executescript(SCHEMA)
+    if conn.execute('SELECT 1 FROM event_snapshots LIMIT 1').fetchone() is None:
+        take_snapshot(conn)
+    conn.commit()
+
+
+def _pack(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return zlib.compress(values.tobytes(), 1)
+
+
+def _unpack(blob):
+    values = array('q')
+    values.frombytes(zlib.decompress(blob))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def build_snapshot(conn):
+    """(event_id, rooms, bookings) of the current inventory; run inside one read transaction"""
+    event_id = conn.execute('SELECT COALESCE(max(event_id), 0) FROM events').fetchone()[0]
+    rooms = [list(row) for row in conn.execute(
+        f"SELECT room_id, room_number, room_type, {CENTS.format('price_per_night')} FROM rooms ORDER BY room_id")]
+    bookings = array('q')
+    # In room and check-in order, so the availability calendars are built by appending
+    for row in conn.execute(f'''
+        SELECT booking_id, room_id, {ORDINAL.format('check_in')}, {ORDINAL.format('check_out')},
+               {CENTS.format('total_amount')}
+        FROM bookings ORDER BY room_id, check_in
+    '''):
+        bookings.extend(row)
+    return event_id, zlib.compress(json.dumps(rooms, separators=(',', ':')).encode(), 1), _pack(bookings)
+
+
+def events_since_snapshot(conn):
+    """Events logged after the latest snapshot"""
+    return conn.execute('SELECT (SELECT COALESCE(max(event_id), 0) FROM events) - '
+                        '(SELECT COALESCE(max(event_id), 0) FROM event_snapshots)').fetchone()[0]
+
+
+# Writes, run on the single database writer
+@writer.operation
+def store_snapshot(conn, event_id, rooms, bookings):
+    """Store a snapshot unless one as recent exists; returns whether it was stored"""
+    if conn.execute('SELECT 1 FROM event_snapshots WHERE event_id >= ? LIMIT 1', (event_id,)).fetchone():
+        return False
+    conn.execute(f'INSERT INTO event_snapshots (event_id, taken_at, rooms, bookings) VALUES (?, {NOW}, ?, ?)',
+                 (event_id, rooms, bookings))
+    return True
+
+
+def take_snapshot(conn):
+    """Snapshot the inventory inside the caller's (write) transaction; returns its event_id"""
+    event_id, rooms, bookings = build_snapshot(conn)
+    store_snapshot(conn, event_id, rooms, bookings)
+    return event_id
+
+
+class State:
+    """Rooms and bookings as of one event of the log"""
+
+    __slots__ = ('rooms', 'bookings', 'event_id', 'snapshot_event_id', 'replayed')
+
+    def __init__(self, rooms, bookings, event_id):
+        # room_id -> (room_number, room_type, price in cents)
+        self.rooms = rooms
+        # booking_id -> (room_id, check_in, check_out, total in cents), check_in/out as day ordinals
+        self.bookings = bookings
+        self.event_id = event_id
+        self.snapshot_event_id = event_id
+        self.replayed = 0
+
+    @classmethod
+    def from_snapshot(cls, event_id, rooms, bookings):
+        values = _unpack(bookings)
+        items = iter(values)
+        return cls({room_id: (number, room_type, price)
+                    for room_id, number, room_type, price in json.loads(zlib.decompress(rooms))},
+                   {booking_id: (room_id, check_in, check_out, amount)
+                    for booking_id, room_id, check_in, check_out, amount in zip(*[items] * BOOKING_WIDTH)},
+                   event_id)
+
+    def apply(self, rows):
+        """Apply (event_id, kind, entity_id, room_id, check_in, check_out, amount, detail) rows in order"""
+        rooms, bookings = self.rooms, self.bookings
+        count = 0
+        event_id = self.event_id
+        for event_id, kind, entity_id, room_id, check_in, check_out, amount, detail in rows:
+            if kind == BOOKING_MADE or kind == BOOKING_CHANGED:
+                bookings[entity_id] = (room_id, check_in, check_out, amount)
+            elif kind == BOOKING_REMOVED or kind == BOOKING_ARCHIVED:
+                bookings.pop(entity_id, None)
+            elif kind == ROOM_REMOVED:
+                rooms.pop(entity_id, None)
+            else:
+                number, room_type = json.loads(detail)
+                rooms[entity_id] = (number, room_type, amount)
+            count += 1
+        self.event_id = event_id
+        self.replayed += count
+        return count
+
+    def inventory(self, night):
+        """Every room with the booking occupying it on night (a date), and totals by room type"""
+        ordinal = night.toordinal()
+        occupied = {}
+        for booking_id, (room_id, check_in, check_out, amount) in self.bookings.items():
+            if check_in <= ordinal < check_out and room_id in self.rooms:
+                occupied[room_id] = (booking_id, amount / 100 / (check_out - check_in))
+        rooms = []
+        by_type = {}
+        for room_id, (number, room_type, price) in sorted(self.rooms.items(), key=lambda item: item[1][0]):
+            booking_id, rate = occupied.get(room_id, (None, 0.0))
+            rooms.append({'room_id': room_id, 'room_number': number, 'room_type': room_type,
+                          'price_per_night': price / 100, 'booking_id': booking_id})
+            totals = by_type.setdefault(room_type, {'rooms': 0, 'sold': 0, 'revenue': 0.0})
+            totals['rooms'] += 1
+            totals['sold'] += booking_id is not None
+            totals['revenue'] = round(totals['revenue'] + rate, 2)
+        return {'night': night.isoformat(), 'event_id': self.event_id, 'rooms': rooms, 'room_types': by_type}
+
+
+EVENT_COLUMNS = 'event_id, kind, entity_id, room_id, check_in, check_out, amount, detail'
+
+
+def restore(conn):
+    """The current state: the latest snapshot plus the events logged after it"""
+    row = conn.execute('SELECT event_id, rooms, bookings FROM event_snapshots '
+                       'ORDER BY snapshot_id DESC LIMIT 1').fetchone()
+    if row is None:
+        raise LookupError('The event log has no snapshot')
+    state = State.from_snapshot(*row)
+    state.apply(conn.execute(f'SELECT {EVENT_COLUMNS} FROM events WHERE event_id > ? ORDER BY event_id',
+                             (state.event_id,)))
+    return state
+
+
+def state_at(conn, moment):
+    """The state as of moment (a datetime): the last snapshot before it plus the events up to it"""
+    timestamp = int(moment.timestamp())
+    row = conn.execute('SELECT event_id, rooms, bookings FROM event_snapshots WHERE taken_at <= ? '
+                       'ORDER BY snapshot_id DESC LIMIT 1', (timestamp,)).fetchone()
+    if row is None:
+        raise LookupError('The event log starts after that')
+    state = State.from_snapshot(*row)
+    rows = conn.execute(f'SELECT {EVENT_COLUMNS}, recorded_at FROM events WHERE event_id > ? ORDER BY event_id',
+                        (state.event_id,))
+
+    def until(rows):
+        for row in rows:
+            if row[-1] > timestamp:
+                return
+            yield row[:-1]
+    state.apply(until(rows))
+    return state
+
+
+def inventory_as_of(conn, day):
+    """The inventory at the end of day (a date, local time), with who occupied each room that night"""
+    return state_at(conn, datetime.combine(day + timedelta(days=1), datetime.min.time())).inventory(day)
+
+
+class EventLog:
+    """Periodic snapshots of the log, and the last restore's timings"""
+
+    def __init__(self, app, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, check_interval=DEFAULT_SNAPSHOT_CHECK):
+        self.app = app
+        self.snapshot_interval = snapshot_interval
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._last_check = time.time()
+        self._checking = False
+        self.snapshots = 0
+        self.snapshot_failures = 0
+        self.restores = 0
+        self.replayed = 0
+        self.restore_seconds = 0.0
+
+    def restore(self, conn):
+        """restore(), counted"""
+        start = time.perf_counter()
+        state = restore(conn)
+        with self._lock:
+            self.restores += 1
+            self.replayed += state.replayed
+            self.restore_seconds = time.perf_counter() - start
+        return state
+
+    def snapshot(self, min_events=0):
+        """Take a snapshot if min_events have been logged since the last one; returns its event_id or None.
+
+        The inventory is read in a read transaction of its own, which (in
+        WAL mode) sees one consistent state without holding up writes;
+        the writer only stores the result.
+        """
+        conn = sqlite3.connect(self.app.config['DATABASE'], isolation_level=None)
+        try:
+            conn.execute('BEGIN')
+            if events_since_snapshot(conn) < max(min_events, 1):
+                return None
+            event_id, rooms, bookings = build_snapshot(conn)
+        finally:
+            conn.close()
+        if not get_writer(self.app).call('store_snapshot', event_id, rooms, bookings):
+            return None
+        with self._lock:
+            self.snapshots += 1
+        return event_id
+
+    def maybe_snapshot(self):
+        with self._lock:
+            if self._checking or time.time() - self._last_check < self.check_interval:
+                return
+            self._checking = True
+        threading.Thread(target=self._snapshot_in_background, name='event-snapshot', daemon=True).start()
+
+    def _snapshot_in_background(self):
+        try:
+            with self.app.app_context():
+                self.snapshot(self.snapshot_interval)
+        except (sqlite3.Error, writer.WriterError):
+            self.app.logger.exception('Taking an event log snapshot failed')
+            with self._lock:
+                self.snapshot_failures += 1
+        finally:
+            with self._lock:
+                self._checking = False
+                self._last_check = time.time()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'snapshots': self.snapshots,
+                'snapshot_failures': self.snapshot_failures,
+                'restores': self.restores,
+                'replayed': self.replayed,
+                'restore_seconds': self.restore_seconds,
+            }
+
+
+def get_event_log(app=None):
+    """Return the app's event log"""
+    app = app or current_app._get_current_object()
+    return extension(app, 'events', lambda: EventLog(
+        app,
+        snapshot_interval=app.config.get('EVENT_SNAPSHOT_INTERVAL', DEFAULT_SNAPSHOT_INTERVAL),
+        check_interval=app.config.get('EVENT_SNAPSHOT_CHECK', DEFAULT_SNAPSHOT_CHECK),
+    ))
+
+
+def init_app(app):
+    """Check for a due snapshot after requests that write"""
+    @app.after_request
+    def check_snapshot(response):
+        if request.method != 'GET' and response.status_code < 400:
+            get_event_log(app).maybe_snapshot()
+        return response
+
+
+def main():
+    import app as app_module
+
+    app = app_module.app
+    with app.app_context():
+        app_module.init_db()
+        conn = get_db()
+        log = get_event_log(app)
+        if '--snapshot' in sys.argv:
+            event_id = log.snapshot()
+            print(f"Snapshot taken at event {event_id}" if event_id is not None
+                  else "No events since the latest snapshot")
+        elif '--as-of' in sys.argv:
+            day = date.fromisoformat(sys.argv[sys.argv.index('--as-of') + 1])
+            inventory = inventory_as_of(conn, day)
+            print(f"Inventory on the night of {inventory['night']} (as of event {inventory['event_id']})")
+            for room in inventory['rooms']:
+                status = f"booking {room['booking_id']}" if room['booking_id'] else 'available'
+                print(f"  {room['room_number']:<8} {room['room_type']:<10} "
+                      f"{room['price_per_night']:>9.2f}  {status}")
+            for room_type, totals in sorted(inventory['room_types'].items()):
+                print(f"  {room_type}: {totals['sold']} of {totals['rooms']} sold, revenue {totals['revenue']:.2f}")
+        elif '--replay' in sys.argv:
+            state = log.restore(conn)
+            print(f"Restored {len(state.rooms)} rooms and {len(state.bookings)} bookings from the snapshot at "
+                  f"event {state.snapshot_event_id} plus {state.replayed} events "
+                  f"in {log.stats()['restore_seconds']:.3f}s")
+        else:
+            events, snapshots = conn.execute(
+                'SELECT (SELECT count(*) FROM events), (SELECT count(*) FROM event_snapshots)').fetchone()
+            latest = conn.execute('SELECT event_id, taken_at FROM event_snapshots '
+                                  'ORDER BY snapshot_id DESC LIMIT 1').fetchone()
+            print(f"{events} events, {snapshots} snapshot(s); latest at event {latest[0]}, "
+                  f"{datetime.fromtimestamp(latest[1]):%Y-%m-%d %H:%M:%S}")
+        get_writer(app).close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Group bookings.
+
+Tour groups and conferences book tens or hundreds of rooms at once.
+Booking them one by one costs a round trip, an overlap check, an INSERT
+and a commit per room, and can leave the group half booked.  book_group()
+takes the whole list of requests (specific rooms, or a number of rooms of
+a type, each for its own dates) and, inside the caller's write
+transaction:
+
+  1. reads the candidate rooms and every night already booked in the
+     group's date window: two queries, whatever the size of the group
+  2. places every request in memory, so that the group either fits
+     completely or fails with a list of the requests that do not fit
+  3. inserts the bookings in one go, taking each one's id from the
+     insert; the occupancy ledger's primary key still rejects any
+     overlap at the storage level
+  4. stores one consolidated bill for the group
+
+A room-type request takes the free rooms of that type in room number
+order.  Each room is priced from the rate calendar the caller passes in
+(see pricing.py).  Every booking also gets its own receipt (see receipts.py), so
+/bill/<booking_id> keeps working for each room of the group.
+"""
+
+import json
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pricing
+from booking import BookingConflict, BookingError
+
+MAX_ROOMS = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS booking_groups (
+    group_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    total_amount REAL NOT NULL,
+    bill TEXT NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS booking_group_members (
+    booking_id INTEGER PRIMARY KEY,
+    group_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_booking_group_members_group ON booking_group_members (group_id);
+'''
+
+
+class GroupUnavailable(BookingConflict):
+    """Some requests of the group cannot be placed; nothing was booked"""
+
+    def __init__(self, problems):
+        # problems is the only argument, so the error pickles back from the writer
+        super().__init__(problems)
+        self.problems = problems
+
+    def __str__(self):
+        return 'Not enough free rooms for this group: ' + '; '.join(self.problems)
+
+
+def ensure_schema(conn):
+    """Create the group and group member tables"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def parse_requests(requests):
+    """Validate a list of request dicts; returns (room_id, room_type, count, check_in, check_out) tuples"""
+    if not isinstance(requests, list) or not requests:
+        raise BookingError('A group booking needs a list of rooms')
+    parsed = []
+    for i, item in enumerate(requests, 1):
+        if not isinstance(item, dict):
+            raise BookingError(f'Request {i}: expected an object')
+        try:
+            check_in = date.fromisoformat(item['check_in'])
+            check_out = date.fromisoformat(item['check_out'])
+        except (KeyError, TypeError, ValueError):
+            raise BookingError(f'Request {i}: check_in and check_out must be YYYY-MM-DD dates')
+        if check_out <= check_in:
+            raise BookingError(f'Request {i}: check-out date must be after check-in date')
+        try:
+            count = int(item.get('count', 1))
+            room_id = int(item['room_id']) if item.get('room_id') is not None else None
+        except (TypeError, ValueError):
+            raise BookingError(f'Request {i}: room_id and count must be numbers')
+        room_type = item.get('room_type') or None
+        if (room_id is None) == (room_type is None):
+            raise BookingError(f'Request {i}: give either room_id or room_type')
+        if count < 1 or (room_id is not None and count != 1):
+            raise BookingError(f'Request {i}: count must be at least 1 (and 1 for a room_id)')
+        parsed.append((room_id, room_type, count, check_in, check_out))
+    if sum(request[2] for request in parsed) > MAX_ROOMS:
+        raise BookingError(f'A group booking is limited to {MAX_ROOMS} rooms')
+    return parsed
+
+
+def _nights(check_in, check_out):
+    return [(check_in + timedelta(days=n)).isoformat() for n in range((check_out - check_in).days)]
+
+
+def allocate(conn, requests):
+    """Place parsed requests on rooms; returns [(room, check_in, check_out)] or raises GroupUnavailable"""
+    room_ids = sorted({request[0] for request in requests if request[0] is not None})
+    room_types = sorted({request[1] for request in requests if request[1] is not None})
+    conditions = []
+    if room_ids:
+        conditions.append(f"room_id IN ({', '.join('?' * len(room_ids))})")
+    if room_types:
+        conditions.append(f"room_type IN ({', '.join('?' * len(room_types))})")
+    rooms = conn.execute(f'''
+        SELECT room_id, room_number, room_type, price_per_night FROM rooms
+        WHERE {' OR '.join(conditions)}
+        ORDER BY room_number, room_id
+    ''', room_ids + room_types).fetchall()
+    by_id = {room[0]: room for room in rooms}
+    by_type = {}
+    for room in rooms:
+        by_type.setdefault(room[2], []).append(room)
+
+    start = min(request[3] for request in requests).isoformat()
+    end = max(request[4] for request in requests).isoformat()
+    busy = {}
+    for room_id, night in conn.execute(
+            'SELECT room_id, night FROM room_nights WHERE night >= ? AND night < ?', (start, end)):
+        if room_id in by_id:
+            busy.setdefault(room_id, set()).add(night)
+
+    placed = []
+    problems = []
+
+    def take(room, nights, check_in, check_out):
+        busy.setdefault(room[0], set()).update(nights)
+        placed.append((room, check_in, check_out))
+
+    # Specific rooms first, so a room-type request never takes a room asked for by number
+    for i, (room_id, room_type, count, check_in, check_out) in enumerate(requests, 1):
+        if room_id is None:
+            continue
+        nights = _nights(check_in, check_out)
+        room = by_id.get(room_id)
+        if room is None:
+            problems.append(f'request {i}: room {room_id} does not exist')
+        elif busy.get(room_id, set()).intersection(nights):
+            problems.append(f'request {i}: room {room[1]} is booked for some of those nights')
+        else:
+            take(room, nights, check_in, check_out)
+
+    for i, (room_id, room_type, count, check_in, check_out) in enumerate(requests, 1):
+        if room_id is not None:
+            continue
+        nights = _nights(check_in, check_out)
+        free = [room for room in by_type.get(room_type, ())
+                if not busy.get(room[0], set()).intersection(nights)]
+        if len(free) < count:
+            problems.append(f'request {i}: {len(free)} of {count} {room_type} rooms free')
+            continue
+        for room in free[:count]:
+            take(room, nights, check_in, check_out)
+
+    if problems:
+        raise GroupUnavailable(problems)
+    return placed
+
+
+def book_group(conn, user_id, username, name, requests, record=None, rates=None):
+    """Book a whole group inside the caller's write transaction; returns its bill.
+
+    requests is a list of dicts with check_in, check_out and either room_id
+    or room_type (plus count, default 1).  Raises BookingError for an
+    invalid request and GroupUnavailable if the group does not fit; either
+    way nothing is booked.  record(conn, booking) is called for every
+    booking, as by insert_booking().  rates is a pricing.Rates snapshot of
+    the rate calendar; without it every night is at the base rate.
+    """
+    placed = allocate(conn, parse_requests(requests))
+    rows = []
+    for room, check_in, check_out in placed:
+        nights = (check_out - check_in).days
+        total = (pricing.price(room[3], rates.stay_factor(conn, room[2], check_in.isoformat(),
+                                                          check_out.isoformat()))
+                 if rates is not None else nights * room[3])
+        rows.append((user_id, room[0], check_in.isoformat(), check_out.isoformat(), total))
+
+    booking_ids = []
+    try:
+        for row in rows:
+            booking_ids.append(conn.execute('''
+                INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+                VALUES (?, ?, ?, ?, ?)
+            ''', row).lastrowid)
+    except sqlite3.IntegrityError:
+        raise BookingConflict('Some of these rooms were booked in the meantime')
+
+    booked_at = datetime.now().isoformat(sep=' ', timespec='seconds')
+    lines = []
+    for booking_id, (room, check_in, check_out), row in zip(booking_ids, placed, rows):
+        booking = {
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'room_id': room[0],
+            'room_number': room[1],
+            'room_type': room[2],
+            'check_in': row[2],
+            'check_out': row[3],
+            'nights': (check_out - check_in).days,
+            'total_amount': row[4],
+        }
+        if record is not None:
+            record(conn, booking)
+        lines.append({key: booking[key] for key in (
+            'booking_id', 'room_id', 'room_number', 'room_type', 'check_in', 'check_out', 'nights',
+            'total_amount')})
+
+    bill = {
+        'name': name,
+        'user_id': user_id,
+        'username': username,
+        'booked_at': booked_at,
+        'rooms': lines,
+        'nights': sum(line['nights'] for line in lines),
+        'total_amount': sum(line['total_amount'] for line in lines),
+    }
+    group_id = conn.execute('''
+        INSERT INTO booking_groups (user_id, name, total_amount, bill) VALUES (?, ?, ?, ?)
+    ''', (user_id, name, bill['total_amount'], json.dumps(bill, separators=(',', ':')))).lastrowid
+    conn.executemany('INSERT INTO booking_group_members (booking_id, group_id) VALUES (?, ?)',
+                     [(line['booking_id'], group_id) for line in lines])
+    return dict(bill, group_id=group_id)
+
+
+def load_bill(conn, group_id):
+    """The consolidated bill of a group, or None"""
+    row = conn.execute('SELECT bill FROM booking_groups WHERE group_id = ?', (group_id,)).fetchone()
+    if row is None:
+        return None
+    return dict(json.loads(row[0]), group_id=group_id)
@@ -1,11 +1,11 @@
-@echo off
-echo Hotel Management System - Dependency Installer
-echo =============================================
-echo.
-echo Installing required Python packages...
-echo.
-pip install -r requirements.txt
-echo.
-echo Installation complete!
-echo.
+@echo off
+echo Hotel Management System - Dependency Installer
+echo =============================================
+echo.
+echo Installing required Python packages...
+echo.
+pip install -r requirements.txt
+echo.
+echo Installation complete!
+echo.
 pause
\ No newline at end of file
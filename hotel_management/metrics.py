@@ -0,0 +1,404 @@
+"""
+Request and SQL timing instrumentation.
+
+Every request is timed per route into a fixed-bucket latency histogram, and
+every SQLite statement run through a pooled connection is timed per
+statement.  Time spent in SQL, template rendering and password hashing is
+also added up per route, so it is easy to see where a slow page spends its
+time.  Recording an observation is a bisect and a few additions under a
+lock, cheap enough to leave on in production.
+
+A cProfile of a chosen route can be sampled on demand: arm the profiler
+for the next N requests to that route and read the aggregated profile back
+from /metrics/profile.
+
+Results are served to admins from /metrics in Prometheus text format, or
+as JSON with /metrics?format=json.
+
+Configuration (app.config):
+    METRICS_ENABLED         instrument requests at all (default True)
+    METRICS_SQL_TIMING      time SQL statements on pooled connections (default True)
+    METRICS_MAX_STATEMENTS  distinct statements tracked before the rest are
+                            lumped together as 'other' (default 200)
+    METRICS_TOKEN           bearer token that may read /metrics without logging in
+    PROFILE_ROUTE           endpoint to profile from startup, e.g. 'book_room'
+    PROFILE_SAMPLES         number of requests to profile from startup
+"""
+
+import io
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import current_app, g, request, template_rendered, before_render_template
+
+# Latency bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OTHER_STATEMENT = 'other'
+
+# Per-thread accumulator of phase times for the request being handled
+_local = threading.local()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, pct):
+        """Estimate a percentile by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            largest = self.max
+        if not total:
+            return 0.0
+        rank = pct / 100 * total
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else largest
+                estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                return min(estimate, largest)
+            seen += bucket_count
+        return largest
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 6),
+            'p50': round(self.percentile(50), 6),
+            'p95': round(self.percentile(95), 6),
+            'p99': round(self.percentile(99), 6),
+            'max': round(self.max, 6),
+        }
+
+    def prometheus(self, name, labels):
+        """Prometheus text lines for this histogram"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            seconds = self.sum
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {seconds}')
+        lines.append(f'{name}_count{{{labels}}} {total}')
+        return lines
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's phase totals"""
+    phases = getattr(_local, 'phases', None)
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+class Metrics:
+    """Per-route and per-statement timings for one app"""
+
+    def __init__(self, max_statements=200, buckets=DEFAULT_BUCKETS):
+        self.max_statements = max_statements
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._responses = {}
+        self._phases = {}
+        self._statements = {}
+        self._statement_names = {}
+        self._profile_route = None
+        self._profile_remaining = 0
+        self._profile_taken = 0
+        self._profile_stats = None
+        self.connection_class = self._make_connection_class()
+
+    # -- requests ---------------------------------------------------------
+
+    def observe_request(self, route, status, seconds, phases):
+        histogram = self._routes.get(route)
+        if histogram is None:
+            with self._lock:
+                histogram = self._routes.setdefault(route, Histogram(self.buckets))
+        histogram.observe(seconds)
+        with self._lock:
+            key = (route, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+            for name, spent in phases.items():
+                key = (route, name)
+                self._phases[key] = self._phases.get(key, 0.0) + spent
+
+    # -- SQL --------------------------------------------------------------
+
+    def _statement_name(self, sql):
+        name = self._statement_names.get(sql)
+        if name is None:
+            with self._lock:
+                if len(self._statement_names) < self.max_statements:
+                    name = self._statement_names[sql] = ' '.join(sql.split())
+                else:
+                    name = OTHER_STATEMENT
+                self._statements.setdefault(name, Histogram(self.buckets))
+        return name
+
+    def observe_sql(self, sql, seconds):
+        self._statements[self._statement_name(sql)].observe(seconds)
+        phases = getattr(_local, 'phases', None)
+        if phases is not None:
+            phases['sql'] = phases.get('sql', 0.0) + seconds
+
+    def _make_connection_class(self):
+        """sqlite3.Connection subclass that times every statement into self"""
+        metrics = self
+
+        class TimedCursor(sqlite3.Cursor):
+            def execute(self, sql, parameters=()):
+                start = time.perf_counter()
+                try:
+                    return super().execute(sql, parameters)
+                finally:
+                    metrics.observe_sql(sql, time.perf_counter() - start)
+
+            def executemany(self, sql, seq_of_parameters):
+                start = time.perf_counter()
+                try:
+                    return super().executemany(sql, seq_of_parameters)
+                finally:
+                    metrics.observe_sql(sql, time.perf_counter() - start)
+
+            def executescript(self, sql_script):
+                start = time.perf_counter()
+                try:
+                    return super().executescript(sql_script)
+                finally:
+                    metrics.observe_sql(sql_script, time.perf_counter() - start)
+
+        class TimedConnection(sqlite3.Connection):
+            def cursor(self, factory=TimedCursor):
+                return super().cursor(factory)
+
+            def execute(self, sql, parameters=()):
+                return self.cursor().execute(sql, parameters)
+
+            def executemany(self, sql, seq_of_parameters):
+                return self.cursor().executemany(sql, seq_of_parameters)
+
+            def executescript(self, sql_script):
+                return self.cursor().executescript(sql_script)
+
+        return TimedConnection
+
+    # -- profiling --------------------------------------------------------
+
+    def arm_profile(self, route, samples):
+        """Profile the next `samples` requests to `route`, discarding older results"""
+        with self._lock:
+            self._profile_route = route
+            self._profile_remaining = samples
+            self._profile_taken = 0
+            self._profile_stats = None
+
+    def claim_profile(self, route):
+        """True if this request to `route` should be profiled"""
+        if route != self._profile_route or self._profile_remaining <= 0:
+            return False
+        with self._lock:
+            if self._profile_remaining <= 0:
+                return False
+            self._profile_remaining -= 1
+            return True
+
+    def add_profile(self, profiler):
+        with self._lock:
+            if self._profile_stats is None:
+                import pstats
+                self._profile_stats = pstats.Stats(profiler)
+            else:
+                self._profile_stats.add(profiler)
+            self._profile_taken += 1
+
+    def profile_report(self, sort='cumulative', limit=40):
+        """Aggregated profile of the sampled requests as pstats text"""
+        with self._lock:
+            stats = self._profile_stats
+            header = (f'route: {self._profile_route}  sampled: {self._profile_taken}  '
+                      f'remaining: {self._profile_remaining}\n')
+            if stats is None:
+                return header + 'no samples collected yet\n'
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(limit)
+        return header + out.getvalue()
+
+    # -- output -----------------------------------------------------------
+
+    def to_dict(self):
+        with self._lock:
+            routes = dict(self._routes)
+            responses = dict(self._responses)
+            phases = dict(self._phases)
+            statements = dict(self._statements)
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'routes': {
+                route: dict(
+                    histogram.summary(),
+                    status={str(status): count for (name, status), count in responses.items() if name == route},
+                    phases={name: round(spent, 6) for (key, name), spent in phases.items() if key == route},
+                )
+                for route, histogram in sorted(routes.items())
+            },
+            'sql': [
+                dict(histogram.summary(), statement=sql)
+                for sql, histogram in sorted(statements.items(), key=lambda item: -item[1].sum)
+            ],
+        }
+
+    def prometheus(self, gauges=None):
+        """Everything in Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            responses = sorted(self._responses.items())
+            phases = sorted(self._phases.items())
+            statements = sorted(self._statements.items())
+
+        lines = ['# HELP hotel_request_duration_seconds Request latency by route.',
+                 '# TYPE hotel_request_duration_seconds histogram']
+        for route, histogram in routes:
+            lines.extend(histogram.prometheus('hotel_request_duration_seconds', f'route="{_label(route)}"'))
+
+        lines += ['# HELP hotel_requests_total Responses by route and status code.',
+                  '# TYPE hotel_requests_total counter']
+        lines += [f'hotel_requests_total{{route="{_label(route)}",status="{status}"}} {count}'
+                  for (route, status), count in responses]
+
+        lines += ['# HELP hotel_request_phase_seconds_total Time spent in SQL, templates and hashing by route.',
+                  '# TYPE hotel_request_phase_seconds_total counter']
+        lines += [f'hotel_request_phase_seconds_total{{route="{_label(route)}",phase="{name}"}} {spent}'
+                  for (route, name), spent in phases]
+
+        lines += ['# HELP hotel_sql_duration_seconds SQLite statement latency.',
+                  '# TYPE hotel_sql_duration_seconds histogram']
+        for sql, histogram in statements:
+            lines.extend(histogram.prometheus('hotel_sql_duration_seconds', f'statement="{_label(sql[:200])}"'))
+
+        for name, value in sorted((gauges or {}).items()):
+            lines += [f'# TYPE hotel_{name} gauge', f'hotel_{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def get_metrics(app=None):
+    """Return the app's metrics registry, or None if instrumentation is off"""
+    app = app or current_app
+    return app.extensions.get('metrics')
+
+
+def _start_request():
+    metrics = get_metrics()
+    if metrics is None:
+        return
+    _local.phases = {}
+    g.metrics_start = time.perf_counter()
+    if request.endpoint and metrics.claim_profile(request.endpoint):
+        # Imported here: profiling is rare and cProfile/pstats add to every cold start
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active on this thread
+            return
+        g.metrics_profiler = profiler
+
+
+def _response_status(response):
+    if 'metrics_start' in g:
+        g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(exc):
+    # Teardown, not after_request: a streamed page (stream_with_context)
+    # is only torn down once its body has been sent, and an exception
+    # propagated past the handlers skips after_request but not this
+    start = g.pop('metrics_start', None)
+    status = g.pop('metrics_status', 500)
+    phases = getattr(_local, 'phases', None) or {}
+    _local.phases = None
+    metrics = get_metrics()
+    profiler = g.pop('metrics_profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    if metrics is None or start is None:
+        return
+    if profiler is not None:
+        metrics.add_profile(profiler)
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(route, status, time.perf_counter() - start, phases)
+
+
+def _template_started(sender, template, context, **extra):
+    if getattr(_local, 'phases', None) is not None:
+        _local.template_start = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    start = getattr(_local, 'template_start', None)
+    phases = getattr(_local, 'phases', None)
+    if start is not None and phases is not None:
+        phases['template'] = phases.get('template', 0.0) + time.perf_counter() - start
+        _local.template_start = None
+
+
+def init_app(app):
+    """Install the request hooks and the timed connection factory"""
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_SQL_TIMING', True)
+    app.config.setdefault('METRICS_MAX_STATEMENTS', 200)
+    app.config.setdefault('METRICS_TOKEN', None)
+    if not app.config['METRICS_ENABLED']:
+        return
+
+    metrics = app.extensions['metrics'] = Metrics(app.config['METRICS_MAX_STATEMENTS'])
+    if app.config.get('PROFILE_ROUTE') and app.config.get('PROFILE_SAMPLES'):
+        metrics.arm_profile(app.config['PROFILE_ROUTE'], app.config['PROFILE_SAMPLES'])
+    if app.config['METRICS_SQL_TIMING']:
+        app.config['DB_CONNECTION_FACTORY'] = metrics.connection_class
+
+    app.before_request(_start_request)
+    app.after_request(_response_status)
+    app.teardown_request(_finish_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
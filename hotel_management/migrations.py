@@ -0,0 +1,384 @@
+"""
+Versioned schema migrations.
+
+The schema is built by one ordered list of migrations, shared by the app,
+init_db.py and the generated database/hotel_schema.sql.  The version a
+database has reached is kept in PRAGMA user_version; migrate() applies
+every newer migration in order, each in its own BEGIN IMMEDIATE
+transaction together with the version bump, so a failed migration leaves
+the database at the previous version and two processes starting at once
+cannot apply the same migration twice.
+
+Migrations are written to be idempotent (CREATE ... IF NOT EXISTS and
+column checks), so a database created before versioning (user_version 0)
+is brought up to date by running them all.
+
+The indexes the hot queries rely on are declared in INDEXES.
+verify_indexes() reports any that are missing, and check_query_plans()
+runs EXPLAIN QUERY PLAN over HOT_QUERIES and reports every query that
+would scan a whole table.
+
+Command line usage:
+
+    python migrations.py               # migrate database/hotel.db
+    python migrations.py --check       # also verify indexes and query plans
+    python migrations.py --repair      # recreate missing indexes
+    python migrations.py --dump-schema # print the schema as SQL
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+import api
+import archive
+import assignment
+import catalog
+import events
+import groups
+import occupancy
+import pricing
+import receipts
+import rollups
+import search
+import sessions
+import stats
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+
+
+class MigrationError(Exception):
+    """The database cannot be migrated"""
+
+
+BASE_TABLES = '''
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rooms (
+    room_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_number TEXT UNIQUE NOT NULL,
+    room_type TEXT NOT NULL,
+    price_per_night REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS customers (
+    customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    address TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    check_in DATE NOT NULL,
+    check_out DATE NOT NULL,
+    total_amount REAL NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users (user_id),
+    FOREIGN KEY (room_id) REFERENCES rooms (room_id)
+);
+'''
+
+# Secondary indexes: name -> (table, columns)
+INDEXES = {
+    # a room's bookings (room deletion, reports from bookings)
+    'idx_bookings_room_dates': ('bookings', 'room_id, check_in, check_out'),
+    # bookings by date range
+    'idx_bookings_dates': ('bookings', 'check_in, check_out'),
+    # a guest's bookings
+    'idx_bookings_user_id': ('bookings', 'user_id'),
+    # filtered, keyset-paginated room and customer listings
+    'idx_rooms_type_price': ('rooms', 'room_type, price_per_night'),
+    'idx_rooms_price': ('rooms', 'price_per_night'),
+    'idx_customers_name': ('customers', 'name'),
+    # rooms occupied on a night
+    'idx_room_nights_night': ('room_nights', 'night, room_id'),
+}
+
+# Indexes made obsolete by schema changes or covered by another index
+OBSOLETE_INDEXES = (
+    'idx_rooms_status',      # rooms.status was replaced by the occupancy ledger
+    'idx_users_username',    # duplicates the UNIQUE constraint's index
+    'idx_bookings_room_id',  # a prefix of idx_bookings_room_dates
+)
+
+# Queries on the request path, with sample parameters, that must never scan a whole table
+HOT_QUERIES = {
+    'login': ('SELECT * FROM users WHERE username = ?', ('admin',)),
+    'booking: room price': (
+        'SELECT room_number, room_type, price_per_night FROM rooms WHERE room_id = ?', (1,)),
+    'booking: overlap check': (
+        'SELECT 1 FROM room_nights WHERE room_id = ? AND night >= ? AND night < ? LIMIT 1',
+        (1, '2030-01-01', '2030-01-05')),
+    'rooms occupied on a night': ('SELECT room_id FROM room_nights WHERE night = ?', ('2030-01-01',)),
+    'rooms page by number': (
+        'SELECT * FROM rooms WHERE (room_number, room_id) > (?, ?) '
+        'ORDER BY room_number ASC, room_id ASC LIMIT ?', ('101', 1, 51)),
+    'rooms page by type and price': (
+        'SELECT * FROM rooms WHERE room_type = ? AND (price_per_night, room_id) > (?, ?) '
+        'ORDER BY price_per_night ASC, room_id ASC LIMIT ?', ('Suite', 100.0, 1, 51)),
+    'rooms page by price': (
+        'SELECT * FROM rooms WHERE price_per_night >= ? AND price_per_night <= ? '
+        'ORDER BY price_per_night ASC, room_id ASC LIMIT ?', (100.0, 200.0, 51)),
+    'customers page by name': (
+        'SELECT * FROM customers WHERE name >= ? AND name < ? '
+        'ORDER BY name ASC, customer_id ASC LIMIT ?', ('Jo', 'Jp', 51)),
+    'customer search': (
+        'SELECT c.* FROM customers_fts f JOIN customers c ON c.customer_id = f.rowid '
+        'WHERE customers_fts MATCH ? ORDER BY f.rowid DESC LIMIT ?', ('"jo"*', 10)),
+    'ranked customer search': (
+        'SELECT c.* FROM (SELECT rowid, rank FROM customers_fts '
+        'WHERE customers_fts MATCH ? AND rank MATCH ? ORDER BY rank LIMIT ?) f '
+        'JOIN customers c ON c.customer_id = f.rowid ORDER BY f.rank, f.rowid DESC',
+        ('"joh"*', 'bm25(10.0, 5.0, 5.0, 1.0)', 10)),
+    'a guest\'s bookings': ('SELECT * FROM bookings WHERE user_id = ?', (1,)),
+    'group bill': ('SELECT bill FROM booking_groups WHERE group_id = ?', (1,)),
+    'receipt': ('SELECT snapshot FROM receipts WHERE booking_id = ?', (1,)),
+    'dashboard statistics': ('SELECT total_rooms, total_revenue FROM hotel_stats WHERE stat_id = 1', ()),
+    'session': ('SELECT user_id, data, expires_at FROM sessions WHERE session_key = ?', ('0' * 64,)),
+    'expired sessions': ('SELECT session_key FROM sessions WHERE expires_at < ? LIMIT ?', (0.0, 1000)),
+    'bookings moved since': (
+        'SELECT from_room, to_room, move_id FROM booking_moves WHERE move_id > ?', (0,)),
+    'cache version': ('SELECT version FROM table_versions WHERE table_name = ?', ('rooms',)),
+    'report rollups': (
+        'SELECT night, room_type, rooms_sold, revenue FROM daily_rollups '
+        'WHERE night BETWEEN ? AND ?', ('2030-01-01', '2030-01-31')),
+    'occupancy uplift: rooms of a type': ('SELECT COUNT(*) FROM rooms WHERE room_type = ?', ('Suite',)),
+    'occupancy uplift: nights sold': (
+        'SELECT night, rooms_sold FROM daily_rollups WHERE night >= ? AND night < ? AND room_type = ? '
+        'AND rooms_sold > 0', ('2030-01-01', '2030-01-05', 'Suite')),
+    'stays to archive': (
+        'SELECT * FROM bookings WHERE check_in < ? AND check_out < ? LIMIT ?', ('2029-01-01', '2029-01-01', 2000)),
+}
+
+
+def _base_tables(conn):
+    conn.executescript(BASE_TABLES)
+
+
+def _guard_delete_triggers(conn):
+    """Recreate the booking and ledger delete triggers so that archival can skip them"""
+    archive.ensure_schema(conn)
+    for trigger in archive.GUARDED_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    for module in (stats, occupancy, rollups, events):
+        module.ensure_schema(conn)
+
+
+def ensure_indexes(conn):
+    """Create the declared indexes and drop obsolete ones"""
+    for name in OBSOLETE_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    for name, (table, columns) in INDEXES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+
+
+# (version, description, apply(conn)), in order.  Append new migrations;
+# never edit or renumber one that has shipped.
+MIGRATIONS = (
+    (1, 'users, rooms, customers and bookings', _base_tables),
+    (2, 'trigger-maintained dashboard statistics', stats.ensure_schema),
+    (3, 'per-night occupancy ledger', occupancy.ensure_schema),
+    (4, 'table version counters for the caches', catalog.ensure_schema),
+    (5, 'nightly occupancy and revenue rollups', rollups.ensure_schema),
+    (6, 'receipt snapshots', receipts.ensure_schema),
+    (7, 'customer search index', search.ensure_schema),
+    (8, 'hot-path indexes', ensure_indexes),
+    (9, 'server-side sessions', sessions.ensure_schema),
+    (10, 'change tracking for the JSON API', api.ensure_schema),
+    (11, 'group bookings', groups.ensure_schema),
+    (12, 'automatic room assignment', assignment.ensure_schema),
+    (13, 'rate calendar', pricing.ensure_schema),
+    (14, 'event log of rooms and bookings', events.ensure_schema),
+    (15, 'archival flag for the delete triggers', _guard_delete_triggers),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+SCHEMA_HEADER = '''-- Hotel Management System Database Schema
+--
+-- Generated from migrations.py (schema version {version}); do not edit by hand.
+-- Regenerate with: python migrations.py --dump-schema > database/hotel_schema.sql
+--
+-- To create a database by hand: sqlite3 database/hotel.db < database/hotel_schema.sql
+-- then run python init_db.py, which seeds the bookkeeping rows, records the
+-- schema version and adds the admin user and sample rooms.
+'''
+
+
+class _Transactional:
+    """Connection wrapper that keeps a migration inside the caller's transaction.
+
+    The schema modules' ensure_schema() functions commit, and
+    sqlite3.executescript() always commits first; here commit() is deferred
+    to migrate() and scripts are run one statement at a time.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def execute(self, sql, params=()):
+        return self._conn.execute(sql, params)
+
+    def executemany(self, sql, params):
+        return self._conn.executemany(sql, params)
+
+    def executescript(self, script):
+        statement = ''
+        for part in script.split(';'):
+            statement += part + ';'
+            if sqlite3.complete_statement(statement):
+                if statement.strip(' \t\n;'):
+                    self._conn.execute(statement)
+                statement = ''
+        if statement.strip(' \t\n;'):
+            raise MigrationError(f'Incomplete SQL statement: {statement.strip()[:80]}')
+
+    def commit(self):
+        pass
+
+
+def schema_version(conn):
+    """The migration version the database has reached"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply every migration newer than the database's version.
+
+    Returns the versions applied.  Raises MigrationError if the database
+    was migrated by newer code than this.
+    """
+    latest = migrations[-1][0]
+    current = schema_version(conn)
+    if current > latest:
+        raise MigrationError(f'Database schema version {current} is newer than this code ({latest})')
+    if current == latest:
+        return []
+
+    applied = []
+    conn.commit()
+    isolation_level, conn.isolation_level = conn.isolation_level, None
+    try:
+        for version, description, apply in migrations:
+            if version <= current:
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have got here first
+                if schema_version(conn) >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                apply(_Transactional(conn))
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(version)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
+
+
+def verify_indexes(conn):
+    """Names of declared indexes that are missing, plus obsolete ones still present"""
+    present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    missing = [name for name in INDEXES if name not in present]
+    obsolete = [name for name in OBSOLETE_INDEXES if name in present]
+    return missing + obsolete
+
+
+def full_scans(conn, sql, params=()):
+    """EXPLAIN QUERY PLAN steps of a query that scan a whole table"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    # A cached EXPLAIN is not re-prepared when the schema changes, so make
+    # the statement text depend on the schema version
+    schema = conn.execute('PRAGMA schema_version').fetchone()[0]
+    scans = []
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql} -- schema {schema}', params):
+        detail = row[-1]
+        words = detail.split()
+        # "SCAN rooms" reads every row; "SCAN rooms USING INDEX ..." walks an
+        # index in order (bounded by LIMIT) and virtual-table scans use their own index
+        if words[:1] == ['SCAN'] and len(words) >= 2 and words[1] in tables and 'USING' not in words \
+                and 'VIRTUAL' not in words:
+            scans.append(detail)
+    return scans
+
+
+def check_query_plans(conn, queries=None):
+    """{query name: [full-scan steps]} for every hot query that scans a table"""
+    problems = {}
+    for name, (sql, params) in (queries or HOT_QUERIES).items():
+        scans = full_scans(conn, sql, params)
+        if scans:
+            problems[name] = scans
+    return problems
+
+
+def dump_schema(conn):
+    """The database's schema as a SQL script (tables, indexes, triggers)"""
+    rows = conn.execute('''
+        SELECT type, name, tbl_name, sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END, rowid
+    ''').fetchall()
+    virtual = [name for kind, name, _, sql in rows if sql.upper().startswith('CREATE VIRTUAL TABLE')]
+    lines = []
+    for kind, name, table, sql in rows:
+        # FTS5 creates its shadow tables itself
+        if any(name.startswith(f'{v}_') for v in virtual):
+            continue
+        lines.append(sql + ';\n')
+    return '\n'.join(lines)
+
+
+def main():
+    args = sys.argv[1:]
+    if '--dump-schema' in args:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            conn = sqlite3.connect(os.path.join(tmpdir, 'schema.db'))
+            migrate(conn)
+            print(SCHEMA_HEADER.format(version=LATEST_VERSION))
+            print(dump_schema(conn), end='')
+            conn.close()
+        return 0
+
+    conn = sqlite3.connect(DATABASE)
+    before = schema_version(conn)
+    applied = migrate(conn)
+    print(f"Schema version {before} -> {schema_version(conn)}" if applied
+          else f"Schema is up to date (version {before})")
+
+    status = 0
+    if '--check' in args or '--repair' in args:
+        missing = verify_indexes(conn)
+        if missing and '--repair' in args:
+            with conn:
+                ensure_indexes(conn)
+            print(f"Recreated/dropped indexes: {', '.join(missing)}")
+            missing = verify_indexes(conn)
+        if missing:
+            print(f"Indexes missing or obsolete: {', '.join(missing)}")
+            status = 1
+        for name, scans in check_query_plans(conn).items():
+            print(f"Full table scan in '{name}': {'; '.join(scans)}")
+            status = 1
+        if not status:
+            print(f"All {len(INDEXES)} indexes present; no full table scans in {len(HOT_QUERIES)} hot queries")
+    conn.close()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
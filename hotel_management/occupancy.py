@@ -0,0 +1,222 @@
+"""
+Per-night occupancy ledger.
+
+Rooms used to carry a static status flag that was set to 'Booked' by the
+first booking and never cleared.  Occupancy is now derived from the
+bookings themselves: room_nights holds one row per room per booked night,
+written by triggers on bookings in the same transaction as the booking.
+"Is room R occupied on night D" is a primary-key lookup, and "which rooms
+are occupied on night D" is a range scan of the night index, whatever the
+date.  The primary key also makes a double booking impossible at the
+storage level.  Each row also carries the night's share of the booking's
+total (its rate), so revenue can be rolled up by night as well.
+
+A night is identified by its check-in date: a stay from 2024-05-01 to
+2024-05-03 occupies the nights of 2024-05-01 and 2024-05-02.
+
+Run this file directly to check the ledger against the bookings:
+
+    python occupancy.py [--repair]
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import date
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+
+BOOKED = 'Booked'
+AVAILABLE = 'Available'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS room_nights (
+    room_id INTEGER NOT NULL,
+    night DATE NOT NULL,
+    booking_id INTEGER NOT NULL,
+    rate REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (room_id, night)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_nights_booking_insert AFTER INSERT ON bookings
+BEGIN
+    INSERT INTO room_nights (room_id, night, booking_id, rate)
+    WITH RECURSIVE stay(night) AS (
+        SELECT NEW.check_in
+        UNION ALL
+        SELECT date(night, '+1 day') FROM stay WHERE date(night, '+1 day') < NEW.check_out
+    )
+    SELECT NEW.room_id, night, NEW.booking_id,
+           NEW.total_amount / (julianday(NEW.check_out) - julianday(NEW.check_in))
+    FROM stay WHERE night < NEW.check_out;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_nights_booking_delete AFTER DELETE ON bookings
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    DELETE FROM room_nights
+    WHERE room_id = OLD.room_id AND night >= OLD.check_in AND night < OLD.check_out
+      AND booking_id = OLD.booking_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_nights_booking_update
+AFTER UPDATE OF room_id, check_in, check_out, total_amount ON bookings
+BEGIN
+    DELETE FROM room_nights
+    WHERE room_id = OLD.room_id AND night >= OLD.check_in AND night < OLD.check_out
+      AND booking_id = OLD.booking_id;
+    INSERT INTO room_nights (room_id, night, booking_id, rate)
+    WITH RECURSIVE stay(night) AS (
+        SELECT NEW.check_in
+        UNION ALL
+        SELECT date(night, '+1 day') FROM stay WHERE date(night, '+1 day') < NEW.check_out
+    )
+    SELECT NEW.room_id, night, NEW.booking_id,
+           NEW.total_amount / (julianday(NEW.check_out) - julianday(NEW.check_in))
+    FROM stay WHERE night < NEW.check_out;
+END;
+'''
+
+LEDGER_TRIGGERS = ('trg_nights_booking_insert', 'trg_nights_booking_delete', 'trg_nights_booking_update')
+
+# Every night of every booking, as stay(room_id, night, booking_id, check_out, rate)
+BOOKED_NIGHTS = '''
+WITH RECURSIVE stay(room_id, night, booking_id, check_out, rate) AS (
+    SELECT room_id, check_in, booking_id, check_out,
+           total_amount / (julianday(check_out) - julianday(check_in))
+    FROM bookings WHERE check_in < check_out
+    UNION ALL
+    SELECT room_id, date(night, '+1 day'), booking_id, check_out, rate FROM stay
+    WHERE date(night, '+1 day') < check_out
+)
+'''
+
+
+def tonight():
+    """The night that starts today"""
+    return date.today().isoformat()
+
+
+def ensure_schema(conn):
+    """Create the ledger and its triggers, migrating older databases.
+
+    On a database that predates the ledger, the nights of existing bookings
+    are backfilled (if two legacy bookings overlap, the earlier one keeps
+    the night) and the obsolete rooms.status column is dropped.  A ledger
+    from before nightly rates were recorded gets the rate column and new
+    triggers, and its rates are filled in from the bookings.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'room_nights'"
+    ).fetchone()
+    add_rates = exists and 'rate' not in [row[1] for row in conn.execute('PRAGMA table_info(room_nights)')]
+    if add_rates:
+        for trigger in LEDGER_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        conn.execute('ALTER TABLE room_nights ADD COLUMN rate REAL NOT NULL DEFAULT 0')
+    conn.executescript(SCHEMA)
+    if not exists:
+        rebuild(conn)
+    elif add_rates:
+        conn.execute('''
+            UPDATE room_nights SET rate = COALESCE((
+                SELECT total_amount / (julianday(check_out) - julianday(check_in))
+                FROM bookings WHERE bookings.booking_id = room_nights.booking_id
+            ), 0)
+        ''')
+
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(rooms)')]
+    if 'status' in columns:
+        conn.execute('DROP INDEX IF EXISTS idx_rooms_status')
+        try:
+            conn.execute('ALTER TABLE rooms DROP COLUMN status')
+        except sqlite3.OperationalError:
+            # SQLite older than 3.35: the column stays but is no longer used
+            pass
+    conn.commit()
+
+
+def rebuild(conn):
+    """Repopulate the ledger from the bookings table"""
+    conn.execute('DELETE FROM room_nights')
+    conn.execute(BOOKED_NIGHTS + '''
+        INSERT OR IGNORE INTO room_nights (room_id, night, booking_id, rate)
+        SELECT room_id, night, booking_id, rate FROM stay ORDER BY booking_id
+    ''')
+    conn.commit()
+
+
+def check_consistency(conn, repair=False):
+    """Compare the ledger with the bookings.
+
+    Returns (missing, unexpected): nights a booking covers that the ledger
+    lacks, and ledger rows no booking accounts for.  With repair=True the
+    ledger is rebuilt when they differ.
+    """
+    missing = conn.execute(BOOKED_NIGHTS + '''
+        SELECT COUNT(*) FROM (
+            SELECT room_id, night, booking_id FROM stay
+            EXCEPT SELECT room_id, night, booking_id FROM room_nights
+        )
+    ''').fetchone()[0]
+    unexpected = conn.execute(BOOKED_NIGHTS + '''
+        SELECT COUNT(*) FROM (
+            SELECT room_id, night, booking_id FROM room_nights
+            EXCEPT SELECT room_id, night, booking_id FROM stay
+        )
+    ''').fetchone()[0]
+    if (missing or unexpected) and repair:
+        rebuild(conn)
+    return missing, unexpected
+
+
+def occupied_rooms(conn, night=None):
+    """Set of room ids occupied on a night (default: tonight)"""
+    rows = conn.execute(
+        'SELECT room_id FROM room_nights WHERE night = ?', (night or tonight(),)
+    )
+    return {row[0] for row in rows}
+
+
+def occupied_count(conn, night=None):
+    """Number of rooms occupied on a night (default: tonight)"""
+    return conn.execute(
+        'SELECT COUNT(*) FROM room_nights WHERE night = ?', (night or tonight(),)
+    ).fetchone()[0]
+
+
+def is_occupied(conn, room_id, night=None):
+    """True if the room is booked for the night"""
+    return conn.execute(
+        'SELECT 1 FROM room_nights WHERE room_id = ? AND night = ?',
+        (room_id, night or tonight()),
+    ).fetchone() is not None
+
+
+def is_free(conn, room_id, check_in, check_out):
+    """True if no night of [check_in, check_out) is booked for the room"""
+    return conn.execute('''
+        SELECT 1 FROM room_nights
+        WHERE room_id = ? AND night >= ? AND night < ?
+        LIMIT 1
+    ''', (room_id, check_in, check_out)).fetchone() is None
+
+
+def main():
+    repair = '--repair' in sys.argv[1:]
+    conn = sqlite3.connect(DATABASE)
+    ensure_schema(conn)
+    missing, unexpected = check_consistency(conn, repair=repair)
+    conn.close()
+
+    if not missing and not unexpected:
+        print("Occupancy ledger is consistent with the bookings")
+        return 0
+    print(f"{missing} booked nights missing from the ledger, {unexpected} unexpected")
+    print("Ledger rebuilt" if repair else "Run with --repair to rebuild the ledger")
+    return 0 if repair else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+Keyset (cursor-based) pagination for the admin listings.
+
+A page is fetched with "WHERE (sort_column, key) > (last_sort_value, last_key)
+ORDER BY sort_column, key LIMIT n", so every page is an index range scan no
+matter how deep the user pages, unlike OFFSET which re-reads every skipped
+row.  The cursor handed to the client is the sort value and key of the last
+row shown, encoded as URL-safe base64 JSON.
+"""
+
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from flask import current_app, request, url_for
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class Page:
+    """One page of rows plus the cursor for the page after it"""
+
+    def __init__(self, items, next_cursor, page_size, is_first):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+        self.is_first = is_first
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def url_for_next(self):
+        """URL of the next page, keeping the current sort and filter arguments"""
+        args = request.args.to_dict()
+        args['after'] = self.next_cursor
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+    def url_for_first(self):
+        """URL of the first page, keeping the current sort and filter arguments"""
+        args = request.args.to_dict()
+        args.pop('after', None)
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+class LazyPage(Page):
+    """A page that yields rows straight off the SQLite cursor.
+
+    Used for streamed responses: nothing is materialized, and the row count
+    and next-page cursor become known once the rows have been iterated.
+    """
+
+    def __init__(self, cursor, sort_column, key, page_size, is_first):
+        super().__init__([], None, page_size, is_first)
+        self._cursor = cursor
+        self._sort_column = sort_column
+        self._key = key
+        self._first = None
+        self._count = 0
+
+    def __bool__(self):
+        if self._first is None:
+            self._first = self._cursor.fetchone()
+        return self._first is not None
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        last = None
+        rows = self._cursor
+        if self._first is not None:
+            rows = _chain_first(self._first, rows)
+        for row in rows:
+            if self._count == self.page_size:
+                self.next_cursor = encode_cursor([last[self._sort_column], last[self._key]])
+                break
+            self._count += 1
+            last = row
+            yield row
+        self._cursor.close()
+
+
+def _chain_first(first, rows):
+    yield first
+    yield from rows
+
+
+def encode_cursor(values):
+    data = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor; malformed cursors yield None (start from the top)"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list) or len(values) != 2:
+        return None
+    return values
+
+
+def page_size_from_request(limit=None):
+    """The page size requested via ?per_page=, clamped to the configured limits"""
+    default = current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    limit = limit or current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    try:
+        size = int(request.args.get('per_page', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, limit))
+
+
+def fetch_page(conn, table, key, sort_column, where=(), params=(),
+               after=None, page_size=DEFAULT_PAGE_SIZE, descending=False, lazy=False):
+    """Fetch one page of rows from table ordered by (sort_column, key).
+
+    where is a sequence of SQL conditions ANDed together, with their
+    parameters in params.  after is a decoded cursor.  sort_column and key
+    must come from a whitelist, never from user input.  With lazy=True the
+    rows are read from the cursor only as the page is iterated.
+    """
+    conditions = list(where)
+    params = list(params)
+    if after is not None:
+        op = '<' if descending else '>'
+        conditions.append(f'({sort_column}, {key}) {op} (?, ?)')
+        params.extend(after)
+    direction = 'DESC' if descending else 'ASC'
+    sql = f'SELECT * FROM {table}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {sort_column} {direction}, {key} {direction} LIMIT ?'
+    params.append(page_size + 1)
+
+    if lazy:
+        return LazyPage(conn.execute(sql, params), sort_column, key, page_size,
+                        is_first=after is None)
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[sort_column], last[key]])
+    return Page(rows, next_cursor, page_size, is_first=after is None)
+
+
+def page_from_sorted(rows, keys, after=None, page_size=DEFAULT_PAGE_SIZE, descending=False):
+    """Keyset page over an in-memory list already sorted by keys (ascending).
+
+    keys[i] is the (sort value, key) pair of rows[i]; the cursor works the
+    same way as for fetch_page(), so pages can come from a cache or SQLite.
+    """
+    try:
+        if descending:
+            end = bisect_left(keys, tuple(after)) if after is not None else len(rows)
+            start = max(0, end - page_size)
+            items = rows[start:end][::-1]
+            last_key = keys[start] if items else None
+            more = start > 0
+        else:
+            start = bisect_right(keys, tuple(after)) if after is not None else 0
+            end = min(len(rows), start + page_size)
+            items = rows[start:end]
+            last_key = keys[end - 1] if items else None
+            more = end < len(rows)
+    except TypeError:
+        # Cursor values of the wrong type for this sort order
+        return page_from_sorted(rows, keys, None, page_size, descending)
+    next_cursor = encode_cursor(list(last_key)) if more and items else None
+    return Page(items, next_cursor, page_size, is_first=after is None)
+
+
+def prefix_range(prefix):
+    """Bounds [low, high) matching every string that starts with prefix"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -0,0 +1,107 @@
+"""
+Password hashing with a configurable cost, offloaded to a process pool.
+
+Hashing and verifying run on a bounded pool of worker processes, so a burst
+of logins at check-in time is spread over separate cores instead of pinning
+the request-handling workers.  When the configured hashing method changes,
+a user's hash is transparently upgraded the next time they log in.
+
+Configuration (app.config):
+    PASSWORD_HASH_METHOD       werkzeug method string, e.g. 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS      size of the process pool; 0 hashes inline
+    PASSWORD_HASH_MAX_PENDING  hashing jobs allowed in flight before callers wait
+"""
+
+import os
+import threading
+
+from flask import current_app
+from werkzeug.security import (DEFAULT_PBKDF2_ITERATIONS, check_password_hash,
+                               generate_password_hash)
+
+from db import extension
+from metrics import phase
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+
+
+def normalize_method(method):
+    """Spell out the defaults werkzeug fills in, e.g. 'pbkdf2' -> 'pbkdf2:sha256:600000'"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        if len(parts) == 1:
+            parts.append('sha256')
+        if len(parts) == 2:
+            parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    elif parts[0] == 'scrypt' and len(parts) == 1:
+        parts.extend(['32768', '8', '1'])
+    return ':'.join(parts)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded process pool"""
+
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_pending=None):
+        self.method = normalize_method(method)
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending or max(1, workers) * 4)
+
+    def _run(self, func, *args):
+        with phase('password_hash'):
+            if not self.workers:
+                return func(*args)
+            with self._slots:
+                return self._get_executor().submit(func, *args).result()
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # Imported here: multiprocessing is only needed once someone logs in
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn rather than fork: the server process is multi-threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the stored hash was made with a different method or cost"""
+        method = password_hash.split('$', 1)[0]
+        return normalize_method(method) != self.method
+
+    def start(self):
+        """Start the worker processes now rather than on the first login"""
+        if not self.workers:
+            return
+        executor = self._get_executor()
+        # A malformed hash is rejected without hashing, so this only waits for the spawn
+        for future in [executor.submit(check_password_hash, '', '') for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+def get_hasher(app=None):
+    """Return the app's password hasher"""
+    app = app or current_app
+    return extension(app, 'password_hasher', lambda: PasswordHasher(
+        app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING'),
+    ))
@@ -0,0 +1,267 @@
+"""
+Dynamic pricing.
+
+A room's price_per_night is its base rate.  The rate calendar scales it
+per night and room type: room_rates holds a multiplier for every
+(room_type, night) that is not 1.0, set by bulk updates over a date range
+(a season, or only some weekdays of it, such as weekends).  Optionally an
+occupancy uplift is added on top: with PRICING_OCCUPANCY_UPLIFT set to
+((0.7, 0.10), (0.9, 0.25)), a night on which 70% of a type's rooms are
+already sold costs 10% more, 90% sold 25% more.
+
+Each worker keeps the calendar as one array per room type of the running
+total of the nightly multipliers (in integer basis points, so sums are
+exact), which makes the price of any stay two array reads whatever its
+length: base rate x (total[check_out] - total[check_in]).  Nights outside
+the calendar cost the base rate.  The arrays are rebuilt when the shared
+'room_rates' version counter moves.  The occupancy uplift changes with
+every booking, so it is not part of them: it is added when a stay is
+priced, from the nightly rollups of that stay's nights and room type
+(one indexed range read), on top of those nights' calendar multipliers.
+
+The price is worked out in the web process from its calendar and handed
+to the writer with the booking, as the stay's multiplier sum.  Group
+bookings hand the writer a Rates snapshot instead, which prices each
+stay on the writer's connection.
+
+Configuration (app.config):
+    PRICING_OCCUPANCY_UPLIFT  ((occupancy, uplift), ...) tiers; empty turns the uplift off
+"""
+
+import threading
+from array import array
+from datetime import date, timedelta
+from itertools import accumulate
+
+from flask import current_app
+
+from catalog import read_version
+from db import extension
+
+# Multipliers are stored to 4 decimal places
+SCALE = 10000
+
+MAX_RANGE_DAYS = 3660
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS room_rates (
+    room_type TEXT NOT NULL,
+    night DATE NOT NULL,
+    factor REAL NOT NULL,
+    PRIMARY KEY (room_type, night)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('room_rates', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_room_rates_insert AFTER INSERT ON room_rates
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'room_rates';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_room_rates_update AFTER UPDATE ON room_rates
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'room_rates';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_room_rates_delete AFTER DELETE ON room_rates
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'room_rates';
+END;
+'''
+
+
+def ensure_schema(conn):
+    """Create the rate calendar and its version counter"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def set_rates(conn, room_type, start, end, factor, weekdays=None):
+    """Set the multiplier for the nights start..end (inclusive) inside the caller's transaction.
+
+    weekdays limits the update to those days (0 = Monday); a multiplier
+    of 1 clears the nights back to the base rate.  Returns the number of
+    nights set.
+    """
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    if last < first or (last - first).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'The range must be 1 to {MAX_RANGE_DAYS} nights')
+    if not 0 < factor <= 100:
+        raise ValueError('The multiplier must be above 0 and at most 100')
+    nights = [(first + timedelta(days=n)).isoformat() for n in range((last - first).days + 1)
+              if weekdays is None or (first + timedelta(days=n)).weekday() in weekdays]
+    if round(factor * SCALE) == SCALE:
+        conn.executemany('DELETE FROM room_rates WHERE room_type = ? AND night = ?',
+                         [(room_type, night) for night in nights])
+    else:
+        conn.executemany('INSERT OR REPLACE INTO room_rates (room_type, night, factor) VALUES (?, ?, ?)',
+                         [(room_type, night, round(factor, 4)) for night in nights])
+    return len(nights)
+
+
+def uplift_for(occupancy, tiers):
+    """The uplift of the highest tier an occupancy reaches"""
+    uplift = 0.0
+    for threshold, value in tiers:
+        if occupancy >= threshold:
+            uplift = max(uplift, value)
+    return uplift
+
+
+class RateSeries:
+    """Running totals of the nightly multipliers of one room type, in basis points"""
+
+    __slots__ = ('first', 'totals')
+
+    def __init__(self, first, factors):
+        self.first = first
+        self.totals = array('q', accumulate(factors, initial=0))
+
+    def stay(self, start, end):
+        """Sum of the multipliers of the nights [start, end) (day ordinals)"""
+        last = len(self.totals) - 1
+        lo = min(max(start - self.first, 0), last)
+        hi = min(max(end - self.first, 0), last)
+        # nights outside the calendar are at the base rate
+        return (self.totals[hi] - self.totals[lo]) / SCALE + (end - start) - (hi - lo)
+
+    def night(self, ordinal):
+        return self.stay(ordinal, ordinal + 1)
+
+
+def nightly_uplift(conn, tiers, room_type, start, end):
+    """{night ordinal: uplift} of the nights [start, end) (day ordinals) on which a type's occupancy earns one"""
+    capacity = conn.execute('SELECT COUNT(*) FROM rooms WHERE room_type = ?', (room_type,)).fetchone()[0]
+    if not capacity:
+        return {}
+    uplifts = {}
+    for night, sold in conn.execute('''
+        SELECT night, rooms_sold FROM daily_rollups
+        WHERE night >= ? AND night < ? AND room_type = ? AND rooms_sold > 0
+    ''', (date.fromordinal(start).isoformat(), date.fromordinal(end).isoformat(), room_type)):
+        uplift = uplift_for(sold / capacity, tiers)
+        if uplift:
+            uplifts[date.fromisoformat(night).toordinal()] = uplift
+    return uplifts
+
+
+def stay_factor(series, room_type, check_in, check_out):
+    """Multiplier sum of a stay ('YYYY-MM-DD' dates) from {room_type: RateSeries}"""
+    start, end = date.fromisoformat(check_in).toordinal(), date.fromisoformat(check_out).toordinal()
+    found = series.get(room_type)
+    return found.stay(start, end) if found is not None else float(end - start)
+
+
+def price(price_per_night, factor_sum):
+    """A stay's total from its room's base rate and its multiplier sum"""
+    return round(price_per_night * factor_sum, 2)
+
+
+class Rates:
+    """The rate calendar's running totals with the occupancy uplift tiers, priced against a connection"""
+
+    __slots__ = ('series', 'uplift')
+
+    def __init__(self, series, uplift=()):
+        self.series = series
+        self.uplift = tuple(uplift)
+
+    def stay_factor(self, conn, room_type, check_in, check_out):
+        """Multiplier sum of a stay ('YYYY-MM-DD' dates): the total is price_per_night times this"""
+        total = stay_factor(self.series, room_type, check_in, check_out)
+        if not self.uplift:
+            return total
+        start, end = date.fromisoformat(check_in).toordinal(), date.fromisoformat(check_out).toordinal()
+        found = self.series.get(room_type)
+        for night, uplift in nightly_uplift(conn, self.uplift, room_type, start, end).items():
+            total += (found.night(night) if found is not None else 1.0) * uplift
+        return total
+
+    def nightly(self, conn, room_type, start, end):
+        """[(night, multiplier)] for the nights start..end (inclusive)"""
+        found = self.series.get(room_type)
+        first = date.fromisoformat(start).toordinal()
+        last = date.fromisoformat(end).toordinal()
+        uplifts = nightly_uplift(conn, self.uplift, room_type, first, last + 1) if self.uplift else {}
+        return [(date.fromordinal(n).isoformat(),
+                 round((found.night(n) if found else 1.0) * (1 + uplifts.get(n, 0.0)), 4))
+                for n in range(first, last + 1)]
+
+
+class RateCalendar:
+    """In-process, versioned copy of the rate calendar as running totals"""
+
+    def __init__(self, uplift=()):
+        self.uplift = tuple(uplift)
+        self._lock = threading.Lock()
+        self._version = None
+        self._series = {}
+        self.loads = 0
+
+    def series(self, conn):
+        """{room_type: RateSeries} of the calendar multipliers, current as of the shared version counter"""
+        version = read_version(conn, 'room_rates')
+        with self._lock:
+            if version == self._version:
+                return self._series
+
+        nights = {}
+        for room_type, night, factor in conn.execute(
+                'SELECT room_type, night, factor FROM room_rates ORDER BY room_type, night'):
+            nights.setdefault(room_type, {})[date.fromisoformat(night).toordinal()] = factor
+
+        series = {}
+        for room_type, rates in nights.items():
+            first = min(rates)
+            factors = array('q', bytes(array('q').itemsize * (max(rates) - first + 1)))
+            for n in range(len(factors)):
+                factors[n] = round(rates.get(first + n, 1.0) * SCALE)
+            series[room_type] = RateSeries(first, factors)
+
+        with self._lock:
+            self._version = version
+            self._series = series
+            self.loads += 1
+            return series
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def rates(self, conn):
+        """A Rates snapshot of the calendar with this app's uplift tiers"""
+        return Rates(self.series(conn), self.uplift)
+
+    def stay_factor(self, conn, room_type, check_in, check_out):
+        """Multiplier sum of a stay: the total is price_per_night times this"""
+        return self.rates(conn).stay_factor(conn, room_type, check_in, check_out)
+
+    def quote(self, conn, rooms, check_in, check_out):
+        """{room_id: total} for a stay in each of rooms"""
+        rates = self.rates(conn)
+        factors = {}
+        quotes = {}
+        for room in rooms:
+            room_type = room['room_type']
+            if room_type not in factors:
+                factors[room_type] = rates.stay_factor(conn, room_type, check_in, check_out)
+            quotes[room['room_id']] = price(room['price_per_night'], factors[room_type])
+        return quotes
+
+    def nightly(self, conn, room_type, start, end):
+        """[(night, multiplier)] for the nights start..end (inclusive)"""
+        return self.rates(conn).nightly(conn, room_type, start, end)
+
+    def stats(self):
+        return {
+            'version': self._version,
+            'room_types': len(self._series),
+            'nights': sum(len(s.totals) - 1 for s in self._series.values()),
+            'loads': self.loads,
+        }
+
+
+def get_rates(app=None):
+    """Return the app's rate calendar"""
+    app = app or current_app
+    return extension(app, 'rates', lambda: RateCalendar(app.config.get('PRICING_OCCUPANCY_UPLIFT', ())))
@@ -0,0 +1,230 @@
+"""
+Booking receipts.
+
+A receipt is an immutable snapshot of everything the bill shows, taken at
+booking time from the values the booking commit already has in hand (no
+query after the commit), and written in the same transaction as the
+booking.  Snapshots are stored compactly as a JSON array keyed by
+booking_id, so a bill can be viewed again later and always shows the
+booking as it was made, even if the room or its price changes afterwards.
+
+The bill body is rendered by a small pool of background threads while the
+browser follows the redirect to /bill/<booking_id>, and rendered bills are
+kept in an LRU cache bounded by their total size.
+
+Configuration (app.config):
+    RECEIPT_CACHE_BYTES     total size of the rendered bills kept in memory
+    RECEIPT_RENDER_WORKERS  threads rendering bills; 0 renders inline
+    RECEIPT_MAX_PENDING     renders allowed in flight before rendering inline
+"""
+
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app, render_template
+from markupsafe import Markup
+
+import writer
+from db import extension
+from writer import get_writer
+
+FIELDS = ('booking_id', 'user_id', 'username', 'room_number', 'room_type',
+          'check_in', 'check_out', 'nights', 'total_amount', 'booked_at')
+
+Receipt = namedtuple('Receipt', FIELDS)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS receipts (
+    booking_id INTEGER PRIMARY KEY,
+    snapshot TEXT NOT NULL
+);
+'''
+
+# How long a bill request waits for a render already in progress
+RENDER_WAIT = 5.0
+
+
+def ensure_schema(conn):
+    """Create the receipts table"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def snapshot(booking, username):
+    """Receipt for a booking dict as passed to insert_booking's record hook"""
+    return Receipt(
+        booking_id=booking['booking_id'],
+        user_id=booking['user_id'],
+        username=username,
+        room_number=booking['room_number'],
+        room_type=booking['room_type'],
+        check_in=booking['check_in'],
+        check_out=booking['check_out'],
+        nights=booking['nights'],
+        total_amount=booking['total_amount'],
+        booked_at=datetime.now().isoformat(sep=' ', timespec='seconds'),
+    )
+
+
+def record(conn, receipt):
+    """Store a receipt snapshot (inside the caller's transaction)"""
+    conn.execute('INSERT OR REPLACE INTO receipts (booking_id, snapshot) VALUES (?, ?)',
+                 (receipt.booking_id, json.dumps(list(receipt), separators=(',', ':'))))
+
+
+def load(conn, booking_id):
+    """The stored receipt for a booking, or None if there is no such booking.
+
+    Bookings made before receipts were stored get one built from the
+    current tables on first view, which the writer then keeps.
+    """
+    row = conn.execute('SELECT snapshot FROM receipts WHERE booking_id = ?', (booking_id,)).fetchone()
+    if row is not None:
+        return Receipt(*json.loads(row[0]))
+
+    row = conn.execute('''
+        SELECT b.booking_id, b.user_id, u.username, r.room_number, r.room_type,
+               b.check_in, b.check_out,
+               CAST(julianday(b.check_out) - julianday(b.check_in) AS INTEGER),
+               b.total_amount, NULL
+        FROM bookings b
+        JOIN rooms r ON b.room_id = r.room_id
+        JOIN users u ON b.user_id = u.user_id
+        WHERE b.booking_id = ?
+    ''', (booking_id,)).fetchone()
+    if row is None:
+        return None
+    receipt = Receipt(*row)
+    get_writer().call('store_receipt', receipt)
+    return receipt
+
+
+@writer.operation
+def store_receipt(conn, receipt):
+    """Keep a receipt built on first view of a booking made before receipts were stored"""
+    record(conn, receipt)
+
+
+def render(receipt):
+    """Render the bill body for a receipt (needs an app context)"""
+    return Markup(render_template('receipt.html', receipt=receipt))
+
+
+class ReceiptRenderer:
+    """Renders bills in the background and caches them by booking_id"""
+
+    def __init__(self, app, cache_bytes=4 * 1024 * 1024, workers=1, max_pending=None):
+        self.app = app
+        self.cache_bytes = cache_bytes
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._size = 0
+        self._pending = {}
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_pending or max(1, workers) * 32)
+        self.hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def submit(self, receipt):
+        """Queue a receipt for rendering; renders inline when the queue is full"""
+        if not self.workers or not self._slots.acquire(blocking=False):
+            self._store(receipt, render(receipt))
+            return
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='receipts')
+            future = self._pending[receipt.booking_id] = self._executor.submit(self._render_job, receipt)
+        future.add_done_callback(lambda _: self._finish(receipt.booking_id, future))
+
+    def _render_job(self, receipt):
+        with self.app.app_context():
+            html = render(receipt)
+        self._store(receipt, html)
+        return receipt.user_id, html
+
+    def _finish(self, booking_id, future):
+        self._slots.release()
+        with self._lock:
+            if self._pending.get(booking_id) is future:
+                del self._pending[booking_id]
+
+    def _store(self, receipt, html):
+        with self._lock:
+            self.renders += 1
+            old = self._cache.pop(receipt.booking_id, None)
+            if old is not None:
+                self._size -= len(old[1])
+            if len(html) > self.cache_bytes:
+                return
+            self._cache[receipt.booking_id] = (receipt.user_id, html)
+            self._size += len(html)
+            while self._size > self.cache_bytes:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def get(self, conn, booking_id):
+        """(owner user_id, rendered bill) for a booking, or None if it does not exist"""
+        with self._lock:
+            cached = self._cache.get(booking_id)
+            if cached is not None:
+                self._cache.move_to_end(booking_id)
+                self.hits += 1
+                return cached
+            self.misses += 1
+            future = self._pending.get(booking_id)
+        if future is not None:
+            try:
+                return future.result(timeout=RENDER_WAIT)
+            except Exception:
+                # still rendering, or the background render failed: render here
+                pass
+
+        receipt = load(conn, booking_id)
+        if receipt is None:
+            return None
+        html = render(receipt)
+        self._store(receipt, html)
+        return receipt.user_id, html
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+    def stats(self):
+        """Cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._size,
+                'pending': len(self._pending),
+                'hits': self.hits,
+                'misses': self.misses,
+                'renders': self.renders,
+                'evictions': self.evictions,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+def get_receipts(app=None):
+    """Return the app's receipt renderer"""
+    app = app or current_app._get_current_object()
+    return extension(app, 'receipts', lambda: ReceiptRenderer(
+        app,
+        cache_bytes=app.config.get('RECEIPT_CACHE_BYTES', 4 * 1024 * 1024),
+        workers=app.config.get('RECEIPT_RENDER_WORKERS', 1),
+        max_pending=app.config.get('RECEIPT_MAX_PENDING'),
+    ))
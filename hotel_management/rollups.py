@@ -0,0 +1,338 @@
+"""
+Occupancy and revenue rollups.
+
+daily_rollups holds one row per night and room type with the number of
+rooms sold and the revenue earned that night.  Triggers on the occupancy
+ledger (room_nights) and on rooms keep it current in the same transaction
+as every booking, cancellation or room change, so a report never has to
+expand bookings into nights again.
+
+Reports are served from an in-process copy of the rollups held as
+day-indexed arrays of running totals per room type: the sum over any
+range of nights is two lookups, so a daily report over five years costs
+the same handful of array reads per row as a monthly one.  The copy is
+reloaded when the shared 'daily_rollups' version counter moves.
+
+Occupancy is measured against the current room inventory of each type;
+rooms that have since been deleted drop out of the history with them.
+Changing a room's type moves its nights in the ledger to the new type;
+nights already archived (see archive.py) keep the type they were
+archived with.
+
+Run this file directly to check the rollups against the ledger:
+
+    python rollups.py [--repair]
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from array import array
+from datetime import date, timedelta
+from itertools import accumulate
+from operator import add, sub
+
+from flask import current_app
+
+from archive import attach
+from catalog import read_version
+from db import extension
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+
+GROUPS = ('day', 'week', 'month')
+
+# Revenue is a running REAL sum, so allow for floating point noise
+REVENUE_TOLERANCE = 0.005
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    night DATE NOT NULL,
+    room_type TEXT NOT NULL,
+    rooms_sold INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (night, room_type)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('daily_rollups', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_night_insert AFTER INSERT ON room_nights
+BEGIN
+    INSERT INTO daily_rollups (night, room_type, rooms_sold, revenue)
+    SELECT NEW.night, room_type, 1, NEW.rate FROM rooms WHERE room_id = NEW.room_id
+    ON CONFLICT (night, room_type) DO UPDATE SET
+        rooms_sold = rooms_sold + 1,
+        revenue = revenue + excluded.revenue;
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_night_delete AFTER DELETE ON room_nights
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    UPDATE daily_rollups SET
+        rooms_sold = rooms_sold - 1,
+        revenue = revenue - OLD.rate
+    WHERE night = OLD.night
+      AND room_type = (SELECT room_type FROM rooms WHERE room_id = OLD.room_id);
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_room_delete AFTER DELETE ON rooms
+BEGIN
+    UPDATE daily_rollups SET
+        rooms_sold = rooms_sold - 1,
+        revenue = revenue - (SELECT rate FROM room_nights
+                             WHERE room_id = OLD.room_id AND night = daily_rollups.night)
+    WHERE room_type = OLD.room_type
+      AND night IN (SELECT night FROM room_nights WHERE room_id = OLD.room_id);
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_room_type AFTER UPDATE OF room_type ON rooms
+WHEN OLD.room_type IS NOT NEW.room_type
+BEGIN
+    UPDATE daily_rollups SET
+        rooms_sold = rooms_sold - 1,
+        revenue = revenue - (SELECT rate FROM room_nights
+                             WHERE room_id = OLD.room_id AND night = daily_rollups.night)
+    WHERE room_type = OLD.room_type
+      AND night IN (SELECT night FROM room_nights WHERE room_id = OLD.room_id);
+    INSERT INTO daily_rollups (night, room_type, rooms_sold, revenue)
+    SELECT night, NEW.room_type, 1, rate FROM room_nights WHERE room_id = NEW.room_id
+    ON CONFLICT (night, room_type) DO UPDATE SET
+        rooms_sold = rooms_sold + 1,
+        revenue = revenue + excluded.revenue;
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups';
+END;
+'''
+
+# The rollups recomputed from the ledger
+EXPECTED_ROLLUPS = '''
+SELECT n.night, r.room_type, COUNT(*) AS rooms_sold, SUM(n.rate) AS revenue
+FROM room_nights n JOIN rooms r ON r.room_id = n.room_id
+GROUP BY n.night, r.room_type
+'''
+
+# ... with the archived nights, under the room type stored with them
+ARCHIVED_ROLLUPS = f'''
+SELECT night, room_type, SUM(rooms_sold), SUM(revenue) FROM (
+    {EXPECTED_ROLLUPS}
+    UNION ALL
+    SELECT night, room_type, COUNT(*), SUM(rate) FROM archive.room_nights GROUP BY night, room_type
+)
+GROUP BY night, room_type
+'''
+
+
+def expected_rollups(conn):
+    """The query recomputing the rollups, including archived nights once there is an archive"""
+    return ARCHIVED_ROLLUPS if attach(conn) else EXPECTED_ROLLUPS
+
+
+def ensure_schema(conn):
+    """Create the rollup table and triggers, backfilling it from the ledger"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'daily_rollups'"
+    ).fetchone()
+    conn.executescript(SCHEMA)
+    if not exists:
+        rebuild(conn)
+    conn.commit()
+
+
+def rebuild(conn):
+    """Recompute every rollup row from the occupancy ledger"""
+    query = expected_rollups(conn)
+    conn.execute('DELETE FROM daily_rollups')
+    conn.execute('INSERT INTO daily_rollups (night, room_type, rooms_sold, revenue) ' + query)
+    conn.execute("UPDATE table_versions SET version = version + 1 WHERE table_name = 'daily_rollups'")
+    conn.commit()
+
+
+def check_consistency(conn, repair=False):
+    """Number of (night, room_type) rollups that differ from the ledger"""
+    expected = {(night, room_type): (sold, revenue)
+                for night, room_type, sold, revenue in conn.execute(expected_rollups(conn))}
+    stored = {(night, room_type): (sold, revenue)
+              for night, room_type, sold, revenue in conn.execute(
+                  'SELECT night, room_type, rooms_sold, revenue FROM daily_rollups WHERE rooms_sold != 0')}
+    drifted = 0
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key, (0, 0.0))
+        have = stored.get(key, (0, 0.0))
+        if want[0] != have[0] or abs(want[1] - have[1]) > REVENUE_TOLERANCE:
+            drifted += 1
+    if drifted and repair:
+        rebuild(conn)
+    return drifted
+
+
+def _period_start(day, group):
+    if group == 'week':
+        return day - timedelta(days=day.weekday())
+    if group == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(start, group):
+    if group == 'week':
+        return start + timedelta(days=7)
+    if group == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+class RollupSeries:
+    """Running totals of rooms sold and revenue for one room type, by day"""
+
+    def __init__(self, first_day, sold, revenue):
+        self.first = first_day.toordinal()
+        self.sold = array('l', accumulate(sold, initial=0))
+        self.revenue = array('d', accumulate(revenue, initial=0.0))
+
+    def between(self, bounds):
+        """Rooms sold and revenue between consecutive day ordinals in `bounds`.
+
+        Returns two lists, one entry per [bounds[i], bounds[i + 1]) range.
+        """
+        first, last = self.first, len(self.sold) - 1
+        index = [min(max(bound - first, 0), last) for bound in bounds]
+        sold = [self.sold[i] for i in index]
+        revenue = [self.revenue[i] for i in index]
+        return (list(map(sub, sold[1:], sold[:-1])),
+                list(map(sub, revenue[1:], revenue[:-1])))
+
+
+class RollupCache:
+    """In-process, versioned copy of daily_rollups for range reports"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._series = {}
+        self._capacity = {}
+        self.loads = 0
+
+    def _current(self, conn):
+        version = (read_version(conn, 'daily_rollups'), read_version(conn, 'rooms'))
+        with self._lock:
+            if version == self._version:
+                return self._series, self._capacity
+
+        capacity = dict(conn.execute('SELECT room_type, COUNT(*) FROM rooms GROUP BY room_type'))
+        by_type = {}
+        for night, room_type, sold, revenue in conn.execute(
+                'SELECT night, room_type, rooms_sold, revenue FROM daily_rollups ORDER BY room_type, night'):
+            by_type.setdefault(room_type, []).append((date.fromisoformat(night).toordinal(), sold, revenue))
+
+        series = {}
+        for room_type, rows in by_type.items():
+            first = rows[0][0]
+            span = rows[-1][0] - first + 1
+            sold = array('l', bytes(array('l').itemsize * span))
+            revenue = array('d', bytes(array('d').itemsize * span))
+            for ordinal, rooms_sold, amount in rows:
+                sold[ordinal - first] = rooms_sold
+                revenue[ordinal - first] = amount
+            series[room_type] = RollupSeries(date.fromordinal(first), sold, revenue)
+
+        with self._lock:
+            self._version = version
+            self._series = series
+            self._capacity = capacity
+            self.loads += 1
+            return series, capacity
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+    def report(self, conn, start, end, group='day', room_type=None):
+        """Occupancy, ADR and RevPAR per period for the nights start..end (inclusive).
+
+        Returns a dict with one row per period plus a totals row.
+        """
+        if group not in GROUPS:
+            raise ValueError(f'group must be one of {", ".join(GROUPS)}')
+        series, capacity = self._current(conn)
+        types = [room_type] if room_type else sorted(capacity.keys() | series.keys())
+        rooms = sum(capacity.get(name, 0) for name in types)
+        parts = [series[name] for name in types if name in series]
+
+        # Period boundaries as day ordinals, clipped to the requested range
+        stop = end + timedelta(days=1)
+        labels = []
+        bounds = [start.toordinal()]
+        period = _period_start(start, group)
+        while period < stop:
+            labels.append(period.isoformat())
+            period = _next_period(period, group)
+            bounds.append(min(period, stop).toordinal())
+
+        sold = [0] * len(labels)
+        revenue = [0.0] * len(labels)
+        for part in parts:
+            part_sold, part_revenue = part.between(bounds)
+            sold = list(map(add, sold, part_sold))
+            revenue = list(map(add, revenue, part_revenue))
+
+        rows = [_metrics(label, rooms, bounds[i + 1] - bounds[i], sold[i], revenue[i])
+                for i, label in enumerate(labels)]
+        total = _metrics('total', rooms, bounds[-1] - bounds[0], sum(sold), sum(revenue))
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'group': group,
+            'room_type': room_type,
+            'rooms': rooms,
+            'periods': rows,
+            'total': total,
+        }
+
+    def stats(self):
+        return {
+            'version': self._version,
+            'room_types': len(self._series),
+            'loads': self.loads,
+        }
+
+
+def _metrics(label, rooms, nights, sold, revenue):
+    available = rooms * nights
+    return {
+        'period': label,
+        'rooms_available': available,
+        'rooms_sold': sold,
+        'revenue': round(revenue, 2),
+        'occupancy': round(sold / available, 4) if available else 0.0,
+        'adr': round(revenue / sold, 2) if sold else 0.0,
+        'revpar': round(revenue / available, 2) if available else 0.0,
+    }
+
+
+def get_rollups(app=None):
+    """Return the app's rollup cache"""
+    app = app or current_app
+    return extension(app, 'rollups', RollupCache)
+
+
+def main():
+    repair = '--repair' in sys.argv[1:]
+    conn = sqlite3.connect(DATABASE)
+    ensure_schema(conn)
+    drifted = check_consistency(conn, repair=repair)
+    conn.close()
+
+    if not drifted:
+        print("Rollups are consistent with the occupancy ledger")
+        return 0
+    print(f"{drifted} nightly rollups differ from the ledger")
+    print("Rollups rebuilt" if repair else "Run with --repair to rebuild the rollups")
+    return 0 if repair else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
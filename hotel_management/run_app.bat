@@ -1,12 +1,12 @@
-@echo off
-echo Hotel Management System
-echo ======================
-echo.
-echo Starting the application...
-echo Make sure you have Python and Flask installed.
-echo.
-echo Open your browser and go to http://localhost:5000 after the server starts.
-echo Press Ctrl+C to stop the server.
-echo.
-pause
+@echo off
+echo Hotel Management System
+echo ======================
+echo.
+echo Starting the application...
+echo Make sure you have Python and Flask installed.
+echo.
+echo Open your browser and go to http://localhost:5000 after the server starts.
+echo Press Ctrl+C to stop the server.
+echo.
+pause
 python app.py
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+Production server for the Hotel Management System.
+
+Runs several worker processes that accept connections from one shared
+listening socket and serve each request on a bounded pool of threads, so
+page reads run in parallel across cores.  Every database write goes to
+the single writer (see writer.py) running in this parent process, which
+commits them in batches; workers never contend for the SQLite write lock.
+
+The schema is checked once, here, before the workers start; each worker
+then runs its own warm-up.  Workers are forked from a fork server, a
+fresh single-threaded process that has imported the app, never from this
+one, whose writer threads would be copied into them mid-flight; one that
+dies is replaced the same way.  On platforms without fork (Windows) the
+server runs a single process with workers x threads request threads
+instead.
+
+Usage: python server.py [--workers N] [--threads N] [--host HOST] [--port PORT]
+                        [--database PATH]
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import wait
+
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+
+import writer
+
+DEFAULT_WORKERS = 4
+DEFAULT_THREADS = 8
+
+
+class RequestHandler(WSGIRequestHandler):
+    # One request per connection: an idle keep-alive connection would
+    # otherwise hold one of the pooled threads
+    protocol_version = 'HTTP/1.0'
+
+
+class PooledWSGIServer(ThreadedWSGIServer):
+    """werkzeug's threaded server, with a fixed pool of request threads"""
+
+    def __init__(self, host, port, app, threads, fd=None):
+        self.pool = None
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        # werkzeug also calls this while setting up, before the pool exists
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+
+
+def listen(host, port, backlog=1024):
+    """Open the listening socket shared by the workers"""
+    sock = socket.create_server((host, port), backlog=backlog)
+    # Workers race to accept(): the ones that lose should get EAGAIN, not block
+    sock.setblocking(False)
+    return sock
+
+
+def serve_worker(sock, host, threads, database, secret_key, writer_address, authkey):
+    """Worker process: serve requests from the shared socket until terminated"""
+    # Ctrl+C reaches the whole process group; the parent stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    import app as app_module
+
+    app = app_module.app
+    app.config['DATABASE'] = database
+    app.secret_key = secret_key
+    app.config['WRITER_ADDRESS'] = writer_address
+    app.config['WRITER_AUTHKEY'] = authkey
+    app_module.get_startup(app).run()
+    server = PooledWSGIServer(host, sock.getsockname()[1], app, threads, fd=sock.fileno())
+    server.serve_forever()
+
+
+def serve_single(host, port, threads):
+    """No fork: one process, many threads, with the writer in-process"""
+    import app as app_module
+
+    app_module.app.config.pop('WRITER_ADDRESS', None)
+    app_module.get_startup(app_module.app).run()
+    server = PooledWSGIServer(host, port, app_module.app, threads)
+    print(f"Serving on http://{host}:{server.port} with {threads} threads in one process")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        writer.get_writer(app_module.app).close()
+
+
+def serve(host, port, workers, threads, database=None):
+    """Fork the workers, run the writer and supervise until interrupted"""
+    import app as app_module
+
+    app = app_module.app
+    if database:
+        app.config['DATABASE'] = database
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return serve_single(host, port, workers * threads)
+
+    applied = app_module.init_db()
+    if applied:
+        print(f"Schema migrated to version {applied[-1]}")
+
+    authkey = os.urandom(32)
+    database_writer = writer.Writer(app.config['DATABASE'],
+                                    max_batch=app.config.get('WRITER_MAX_BATCH', writer.DEFAULT_MAX_BATCH))
+    writer_server = writer.WriterServer(database_writer, authkey)
+    sock = listen(host, port)
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['app'])
+
+    def start_worker():
+        process = context.Process(target=serve_worker, name='worker',
+                                  args=(sock, host, threads, app.config['DATABASE'], app.secret_key,
+                                        writer_server.address, authkey))
+        process.start()
+        return process
+
+    processes = [start_worker() for _ in range(workers)]
+    writer_server.start()
+    print(f"Serving on http://{host}:{sock.getsockname()[1]} with {workers} workers "
+          f"x {threads} threads (writer pid {os.getpid()})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        while not stopping:
+            ended = wait([process.sentinel for process in processes], timeout=1.0)
+            for i, process in enumerate(processes):
+                if process.sentinel in ended and not stopping:
+                    process.join()
+                    print(f"Worker {process.pid} exited with {process.exitcode}; restarting",
+                          file=sys.stderr)
+                    processes[i] = start_worker()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        writer_server.close()
+        database_writer.close()
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='worker processes')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='request threads per worker')
+    parser.add_argument('--database', help='SQLite database (default: the app\'s)')
+    args = parser.parse_args()
+    serve(args.host, args.port, max(1, args.workers), max(1, args.threads), args.database)
+
+
+if __name__ == '__main__':
+    main()
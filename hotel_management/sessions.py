@@ -0,0 +1,388 @@
+"""
+Server-side sessions.
+
+Flask's default session is the whole session, signed, in a cookie: a
+logout or a revoked account cannot be enforced, since any copy of an old
+cookie stays valid, and every request verifies the signature of a cookie
+that grows with whatever is put in the session.  Here the cookie carries
+only a random session id, and the session itself lives in the sessions
+table, keyed by a SHA-256 of the id (a copy of the table holds no usable
+cookies).
+
+Each process keeps the sessions it has seen in an LRU keyed by id, so the
+usual request is one dict lookup; an entry is trusted for
+SESSION_CACHE_TTL seconds and then re-read, which bounds how long a
+session revoked by another process keeps working in this one (revocations
+made by this process apply at once).  Sessions expire SESSION_LIFETIME
+seconds after their last write; a session in use is extended (one write)
+once half its lifetime has passed.
+
+Only a logged-in session is stored.  Before login a session holds no
+more than flashed messages (a failed login, 'Access denied!'), and those
+stay in Flask's usual signed cookie, which costs no write; a session id
+is handed out at login, and changes whenever the logged-in user does.
+Writes go through the database writer (see writer.py).  Expired sessions are deleted
+in batches by a background sweep, started at most every
+SESSION_SWEEP_INTERVAL seconds by a request that saves a session.
+
+SessionStore is the storage behind the session interface; another backend
+only needs the same load / save / delete / revoke_user / sweep methods.
+
+Command line usage:
+
+    python sessions.py                    # delete expired sessions
+    python sessions.py --revoke-user ID   # log a user out everywhere
+
+Configuration (app.config):
+    SESSION_LIFETIME        seconds a session lasts without being used (default 12 hours)
+    SESSION_CACHE_SIZE      sessions kept in memory per process (default 10000)
+    SESSION_CACHE_TTL       seconds a cached session is used without re-reading it (default 5)
+    SESSION_SWEEP_INTERVAL  seconds between sweeps of expired sessions (default 300)
+    SESSION_SWEEP_BATCH     expired sessions deleted per write (default 1000)
+"""
+
+import hashlib
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature
+from werkzeug.datastructures import CallbackDict
+
+import writer
+from db import extension, get_db
+from writer import get_writer
+
+DEFAULT_LIFETIME = 12 * 3600
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 5.0
+DEFAULT_SWEEP_INTERVAL = 300.0
+DEFAULT_SWEEP_BATCH = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    session_key TEXT PRIMARY KEY,
+    user_id INTEGER,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_sessions_user_id ON sessions (user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
+'''
+
+
+def ensure_schema(conn):
+    """Create the sessions table"""
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def session_key(session_id):
+    """What the table stores for a session id"""
+    return hashlib.sha256(session_id.encode()).hexdigest()
+
+
+# Writes, run on the single database writer
+@writer.operation
+def save_session(conn, key, user_id, data, expires_at):
+    conn.execute('INSERT OR REPLACE INTO sessions (session_key, user_id, data, expires_at) '
+                 'VALUES (?, ?, ?, ?)', (key, user_id, data, expires_at))
+
+
+@writer.operation
+def delete_session(conn, key):
+    conn.execute('DELETE FROM sessions WHERE session_key = ?', (key,))
+
+
+@writer.operation
+def revoke_sessions(conn, user_id):
+    return conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount
+
+
+@writer.operation
+def delete_expired_sessions(conn, now, limit):
+    return conn.execute('''
+        DELETE FROM sessions WHERE session_key IN (
+            SELECT session_key FROM sessions WHERE expires_at < ? LIMIT ?)
+    ''', (now, limit)).rowcount
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """A session stored server-side under a random id"""
+
+    def __init__(self, initial=None, session_id=None, expires_at=0.0, signed=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.session_id = session_id
+        self.expires_at = expires_at
+        # an anonymous session read from a signed cookie rather than the store
+        self.signed = signed
+        # the user the session was loaded for; a change rotates the id
+        self.loaded_user_id = (initial or {}).get('user_id')
+        self.modified = False
+
+
+class SessionStore:
+    """SQLite-backed sessions behind a per-process LRU with a TTL"""
+
+    def __init__(self, app, lifetime=DEFAULT_LIFETIME, cache_size=DEFAULT_CACHE_SIZE,
+                 cache_ttl=DEFAULT_CACHE_TTL, sweep_interval=DEFAULT_SWEEP_INTERVAL,
+                 sweep_batch=DEFAULT_SWEEP_BATCH):
+        self.app = app
+        self.lifetime = lifetime
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        self._lock = threading.Lock()
+        # session id -> (user_id, serialized data, expires_at, cached_at); kept
+        # serialized so that no two requests share (and mutate) the same dict
+        self._cache = OrderedDict()
+        self._last_sweep = time.time()
+        self._sweeping = False
+        self.hits = 0
+        self.misses = 0
+        self.not_found = 0
+        self.evictions = 0
+        self.saves = 0
+        self.deletes = 0
+        self.revoked = 0
+        self.swept = 0
+        self.sweeps = 0
+        self.sweep_failures = 0
+
+    def _remember(self, session_id, user_id, data, expires_at):
+        with self._lock:
+            self._cache[session_id] = (user_id, data, expires_at, time.monotonic())
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def load(self, session_id):
+        """(data, expires_at) of a live session, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(session_id)
+            if entry is not None:
+                if entry[2] > now and time.monotonic() - entry[3] < self.cache_ttl:
+                    self._cache.move_to_end(session_id)
+                    self.hits += 1
+                    return session_json_serializer.loads(entry[1]), entry[2]
+                del self._cache[session_id]
+
+        row = get_db().execute('SELECT user_id, data, expires_at FROM sessions WHERE session_key = ?',
+                               (session_key(session_id),)).fetchone()
+        if row is None or row[2] <= now:
+            with self._lock:
+                self.not_found += 1
+            return None
+        self._remember(session_id, row[0], row[1], row[2])
+        with self._lock:
+            self.misses += 1
+        return session_json_serializer.loads(row[1]), row[2]
+
+    def save(self, session_id, data):
+        """Store a session's data, extending its lifetime; returns the new expiry"""
+        expires_at = time.time() + self.lifetime
+        user_id = data.get('user_id')
+        serialized = session_json_serializer.dumps(data)
+        get_writer(self.app).call('save_session', session_key(session_id), user_id, serialized, expires_at)
+        self._remember(session_id, user_id, serialized, expires_at)
+        with self._lock:
+            self.saves += 1
+        self._maybe_sweep()
+        return expires_at
+
+    def delete(self, session_id):
+        """End one session"""
+        with self._lock:
+            self._cache.pop(session_id, None)
+            self.deletes += 1
+        get_writer(self.app).call('delete_session', session_key(session_id))
+
+    def revoke_user(self, user_id):
+        """End every session of a user; returns how many there were"""
+        with self._lock:
+            for session_id in [sid for sid, entry in self._cache.items() if entry[0] == user_id]:
+                del self._cache[session_id]
+        count = get_writer(self.app).call('revoke_sessions', user_id)
+        with self._lock:
+            self.revoked += count
+        return count
+
+    def sweep(self):
+        """Delete expired sessions, one batch per write; returns how many"""
+        now = time.time()
+        total = 0
+        while True:
+            deleted = get_writer(self.app).call('delete_expired_sessions', now, self.sweep_batch)
+            total += deleted
+            if deleted < self.sweep_batch:
+                break
+        with self._lock:
+            for session_id in [sid for sid, entry in self._cache.items() if entry[2] <= now]:
+                del self._cache[session_id]
+            self.swept += total
+            self.sweeps += 1
+            self._last_sweep = now
+        return total
+
+    def _maybe_sweep(self):
+        with self._lock:
+            if self._sweeping or time.time() - self._last_sweep < self.sweep_interval:
+                return
+            self._sweeping = True
+        threading.Thread(target=self._sweep_in_background, name='session-sweep', daemon=True).start()
+
+    def _sweep_in_background(self):
+        try:
+            with self.app.app_context():
+                self.sweep()
+        except (sqlite3.Error, writer.WriterError):
+            self.app.logger.exception('Sweeping expired sessions failed')
+            with self._lock:
+                self.sweep_failures += 1
+        finally:
+            with self._lock:
+                self._sweeping = False
+                self._last_sweep = time.time()
+
+    def stats(self):
+        """Cache hit rate and session counters"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.not_found
+            return {
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_found': self.not_found,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'saves': self.saves,
+                'deletes': self.deletes,
+                'revoked': self.revoked,
+                'swept': self.swept,
+                'sweeps': self.sweeps,
+                'sweep_failures': self.sweep_failures,
+            }
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface keeping only a session id in the cookie once logged in"""
+
+    # Signs anonymous sessions the way Flask's default session does
+    signed_cookies = SecureCookieSessionInterface()
+    # The only keys read from or written to a signed cookie; who is logged
+    # in is only ever taken from the store
+    cookie_keys = ('_flashes',)
+
+    def open_session(self, app, request):
+        value = request.cookies.get(self.get_cookie_name(app))
+        if value and '.' in value:
+            # session ids are URL-safe base64, signed cookies are dot-separated
+            serializer = self.signed_cookies.get_signing_serializer(app)
+            if serializer is None:
+                return ServerSession()
+            try:
+                data = serializer.loads(value, max_age=get_session_store(app).lifetime)
+            except BadSignature:
+                return ServerSession()
+            return ServerSession({key: data[key] for key in self.cookie_keys if key in data}, signed=True)
+        if value:
+            loaded = get_session_store(app).load(value)
+            if loaded is not None:
+                return ServerSession(loaded[0], value, loaded[1])
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        store = get_session_store(app)
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.session_id is not None:
+                store.delete(session.session_id)
+            if session.session_id is not None or session.signed:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        if session.get('user_id') is None:
+            # Not logged in (or just logged out): keep it in a signed cookie
+            if session.session_id is not None:
+                store.delete(session.session_id)
+            elif not session.modified:
+                return
+            serializer = self.signed_cookies.get_signing_serializer(app)
+            if serializer is None:
+                return
+            data = {key: session[key] for key in self.cookie_keys if key in session}
+            response.set_cookie(name, serializer.dumps(data),
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+            return
+
+        rotate = session.session_id is None or session.get('user_id') != session.loaded_user_id
+        if rotate and session.session_id is not None:
+            store.delete(session.session_id)
+        if rotate:
+            session.session_id = secrets.token_urlsafe(32)
+        stale = session.expires_at - time.time() < store.lifetime / 2
+        if rotate or session.modified or stale:
+            session.expires_at = store.save(session.session_id, dict(session))
+        if rotate:
+            response.set_cookie(name, session.session_id, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+def get_session_store(app=None):
+    """Return the app's session store"""
+    app = app or current_app._get_current_object()
+    return extension(app, 'session_store', lambda: SessionStore(
+        app,
+        lifetime=app.config.get('SESSION_LIFETIME', DEFAULT_LIFETIME),
+        cache_size=app.config.get('SESSION_CACHE_SIZE', DEFAULT_CACHE_SIZE),
+        cache_ttl=app.config.get('SESSION_CACHE_TTL', DEFAULT_CACHE_TTL),
+        sweep_interval=app.config.get('SESSION_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL),
+        sweep_batch=app.config.get('SESSION_SWEEP_BATCH', DEFAULT_SWEEP_BATCH),
+    ))
+
+
+def init_app(app):
+    """Keep the app's sessions server-side"""
+    app.session_interface = ServerSessionInterface()
+
+
+def main():
+    import app as app_module
+
+    app = app_module.app
+    with app.app_context():
+        app_module.init_db()
+        store = get_session_store(app)
+        if '--revoke-user' in sys.argv:
+            user_id = int(sys.argv[sys.argv.index('--revoke-user') + 1])
+            print(f"Ended {store.revoke_user(user_id)} session(s) of user {user_id}")
+        else:
+            print(f"Deleted {store.sweep()} expired session(s)")
+        get_writer(app).close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
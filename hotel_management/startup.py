@@ -0,0 +1,111 @@
+"""
+Application startup.
+
+Startup is an explicit phase that runs once per process: the schema check
+(init_db), then an optional warm-up, before the first request is handled.
+Entry points run it up front; a WSGI server that only imports the app gets
+it on the first request instead.  The schema check is a single PRAGMA read
+when the database is already at the latest migration.
+
+The warm-up loads the room catalog and availability index, compiles every
+template and starts the password hashing processes, so the first guests
+are not the ones paying for it.  More warm-up work can be registered with
+get_startup(app).warmup.
+
+How long each phase took (importing the app, init, warm-up and the first
+request) is kept for /metrics and /admin/stats.
+
+Configuration (app.config):
+    STARTUP_WARMUP  preload caches and compile templates at startup (default True)
+"""
+
+import time
+
+# app.py imports this module first, so this is (nearly) when the app import began
+IMPORT_STARTED = time.perf_counter()
+
+import threading
+
+from flask import current_app
+
+PHASES = ('import', 'init', 'warmup', 'first_request')
+
+
+class Startup:
+    """Runs the startup phase once and keeps its timings"""
+
+    def __init__(self, app, init=None):
+        self.app = app
+        self.init = init
+        self.done = False
+        self.migrated = []
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._hooks = []
+        self._first_request = None
+
+    def warmup(self, func):
+        """Register func(app) to run during the warm-up (usable as a decorator)"""
+        self._hooks.append(func)
+        return func
+
+    def imported(self):
+        """Record that the app module has finished importing"""
+        self.timings.setdefault('import', time.perf_counter() - IMPORT_STARTED)
+
+    def run(self):
+        """Check the schema and warm up, unless this process already has"""
+        if self.done:
+            return
+        with self._lock:
+            if self.done:
+                return
+            start = time.perf_counter()
+            if self.init is not None:
+                self.migrated = self.init() or []
+            self.timings['init'] = time.perf_counter() - start
+
+            if self.app.config.get('STARTUP_WARMUP', True):
+                start = time.perf_counter()
+                with self.app.app_context():
+                    for hook in self._hooks:
+                        hook(self.app)
+                self.timings['warmup'] = time.perf_counter() - start
+            self.done = True
+
+    def _before_request(self):
+        if self._first_request is None:
+            self._first_request = time.perf_counter()
+        self.run()
+
+    def _after_request(self, response):
+        if 'first_request' not in self.timings and self._first_request is not None:
+            self.timings['first_request'] = time.perf_counter() - self._first_request
+        return response
+
+    def stats(self):
+        """Seconds spent in each startup phase so far"""
+        return {f'{phase}_seconds': round(self.timings[phase], 6)
+                for phase in PHASES if phase in self.timings}
+
+
+def compile_templates(app):
+    """Load and compile every template into Jinja's cache"""
+    env = app.jinja_env
+    for name in env.list_templates():
+        env.get_template(name)
+
+
+def get_startup(app=None):
+    """Return the app's startup phase"""
+    app = app or current_app
+    return app.extensions['startup']
+
+
+def init_app(app, init=None):
+    """Install the startup phase; init() checks the schema and returns the migrations applied"""
+    startup = app.extensions['startup'] = Startup(app, init)
+    startup.warmup(compile_templates)
+    app.before_request(startup._before_request)
+    app.after_request(startup._after_request)
+    return startup
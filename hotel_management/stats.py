@@ -0,0 +1,157 @@
+"""
+Materialized dashboard statistics.
+
+The hotel_stats table holds a single row with the room count and total
+revenue shown on the admin dashboard.  Triggers on rooms and bookings keep
+it up to date inside the same transaction as every write, so the dashboard
+reads it with one primary-key lookup instead of scanning both tables.  The
+booked/available split depends on the date, so it is read from the
+occupancy ledger's night index instead of being stored.
+
+Run this file directly to recompute the statistics from scratch and report
+any drift:
+
+    python stats.py [--repair]
+"""
+
+import os
+import sqlite3
+import sys
+
+import occupancy
+from archive import across
+
+# Database configuration
+DATABASE = os.path.join('database', 'hotel.db')
+
+# Revenue is a running REAL sum, so allow for floating point noise
+REVENUE_TOLERANCE = 0.005
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS hotel_stats (
+    stat_id INTEGER PRIMARY KEY CHECK (stat_id = 1),
+    total_rooms INTEGER NOT NULL DEFAULT 0,
+    total_revenue REAL NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_room_count_insert AFTER INSERT ON rooms
+BEGIN
+    UPDATE hotel_stats SET total_rooms = total_rooms + 1 WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_room_count_delete AFTER DELETE ON rooms
+BEGIN
+    UPDATE hotel_stats SET total_rooms = total_rooms - 1 WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_booking_insert AFTER INSERT ON bookings
+BEGIN
+    UPDATE hotel_stats SET total_revenue = total_revenue + NEW.total_amount
+    WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_booking_delete AFTER DELETE ON bookings
+WHEN NOT EXISTS (SELECT 1 FROM archiving)
+BEGIN
+    UPDATE hotel_stats SET total_revenue = total_revenue - OLD.total_amount
+    WHERE stat_id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_stats_booking_amount AFTER UPDATE OF total_amount ON bookings
+BEGIN
+    UPDATE hotel_stats SET total_revenue = total_revenue - OLD.total_amount + NEW.total_amount
+    WHERE stat_id = 1;
+END;
+'''
+
+# Triggers and columns from before room status was derived from bookings
+LEGACY_TRIGGERS = ('trg_stats_room_insert', 'trg_stats_room_delete', 'trg_stats_room_status')
+LEGACY_COLUMNS = ('available_rooms', 'booked_rooms')
+
+FIELDS = ('total_rooms', 'total_revenue')
+
+
+def ensure_schema(conn):
+    """Create the stats table and triggers, seeding the row from existing data"""
+    for trigger in LEGACY_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(hotel_stats)')]
+    for column in LEGACY_COLUMNS:
+        if column in columns:
+            try:
+                conn.execute(f'ALTER TABLE hotel_stats DROP COLUMN {column}')
+            except sqlite3.OperationalError:
+                # SQLite older than 3.35: the column stays but is no longer used
+                pass
+    conn.executescript(SCHEMA)
+    if conn.execute('SELECT 1 FROM hotel_stats WHERE stat_id = 1').fetchone() is None:
+        conn.execute('''
+            INSERT INTO hotel_stats (stat_id, total_rooms, total_revenue)
+            VALUES (1, ?, ?)
+        ''', recompute(conn))
+    conn.commit()
+
+
+def read_stats(conn, night=None):
+    """Return the dashboard statistics for a night (default: tonight) as a dict"""
+    row = conn.execute('''
+        SELECT total_rooms, total_revenue
+        FROM hotel_stats WHERE stat_id = 1
+    ''').fetchone()
+    result = dict(zip(FIELDS, tuple(row) if row else (0, 0.0)))
+    result['booked_rooms'] = occupancy.occupied_count(conn, night)
+    result['available_rooms'] = result['total_rooms'] - result['booked_rooms']
+    return result
+
+
+def recompute(conn):
+    """Recompute the stored statistics from the base tables (full scans, archived stays included)"""
+    total_rooms = conn.execute('SELECT COUNT(*) FROM rooms').fetchone()[0]
+    revenue = conn.execute(f'SELECT COALESCE(SUM(total_amount), 0) FROM {across(conn, "bookings")}').fetchone()[0]
+    return (total_rooms, revenue)
+
+
+def check_consistency(conn, repair=False):
+    """Compare the materialized row with a full recompute.
+
+    Returns a dict of {field: (stored, actual)} for every field that has
+    drifted; with repair=True the stored row is overwritten.
+    """
+    stored = read_stats(conn)
+    actual = dict(zip(FIELDS, recompute(conn)))
+    drift = {}
+    for field in FIELDS:
+        if field == 'total_revenue':
+            drifted = abs(stored[field] - actual[field]) > REVENUE_TOLERANCE
+        else:
+            drifted = stored[field] != actual[field]
+        if drifted:
+            drift[field] = (stored[field], actual[field])
+    if drift and repair:
+        conn.execute('''
+            INSERT OR REPLACE INTO hotel_stats (stat_id, total_rooms, total_revenue)
+            VALUES (1, ?, ?)
+        ''', tuple(actual[field] for field in FIELDS))
+        conn.commit()
+    return drift
+
+
+def main():
+    repair = '--repair' in sys.argv[1:]
+    conn = sqlite3.connect(DATABASE)
+    ensure_schema(conn)
+    occupancy.ensure_schema(conn)
+    drift = check_consistency(conn, repair=repair)
+    conn.close()
+
+    if not drift:
+        print("Dashboard statistics are consistent")
+        return 0
+    for field, (stored, actual) in drift.items():
+        print(f"{field}: stored {stored}, actual {actual}")
+    print("Statistics repaired" if repair else "Run with --repair to fix the stored statistics")
+    return 0 if repair else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,228 +1,1905 @@
-"""
-Test script for Hotel Management System
-This script verifies that all components of the application are working correctly.
-"""
-
-import os
-import sys
-import sqlite3
-
-# Add the current directory to Python path
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-# Change to the project directory
-dir_path = os.path.dirname(os.path.abspath(__file__))
-os.chdir(dir_path)
-
-def test_database_creation():
-    """Test if database and tables are created correctly"""
-    print("Testing database creation...")
-    
-    db_path = os.path.join('database', 'hotel.db')
-    if not os.path.exists(db_path):
-        print("❌ Database file not found")
-        return False
-    
-    conn = None
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Check if all tables exist
-        tables = ['users', 'rooms', 'customers', 'bookings']
-        for table in tables:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
-            if not cursor.fetchone():
-                print(f"❌ Table '{table}' not found")
-                return False
-        
-        print("✅ Database and all tables exist")
-        return True
-    except Exception as e:
-        print(f"❌ Error accessing database: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def test_default_admin():
-    """Test if default admin user exists"""
-    print("Testing default admin user...")
-    
-    conn = None
-    try:
-        conn = sqlite3.connect(os.path.join('database', 'hotel.db'))
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM users WHERE username = 'admin'")
-        admin = cursor.fetchone()
-        
-        if not admin:
-            print("❌ Default admin user not found")
-            return False
-            
-        # Check if password is hashed
-        if len(admin[2]) < 20:  # Password hash should be long
-            print("❌ Admin password not properly hashed")
-            return False
-            
-        if admin[3] != 'admin':  # Role should be 'admin'
-            print("❌ Admin user has incorrect role")
-            return False
-            
-        print("✅ Default admin user exists with proper credentials")
-        return True
-    except Exception as e:
-        print(f"❌ Error checking admin user: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def test_sample_rooms():
-    """Test if sample rooms were added"""
-    print("Testing sample rooms...")
-    
-    conn = None
-    try:
-        conn = sqlite3.connect(os.path.join('database', 'hotel.db'))
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM rooms")
-        count = cursor.fetchone()[0]
-        
-        if count == 0:
-            print("❌ No rooms found in database")
-            return False
-            
-        print(f"✅ {count} rooms found in database")
-        return True
-    except Exception as e:
-        print(f"❌ Error checking rooms: {e}")
-        return False
-    finally:
-        if conn:
-            conn.close()
-
-def test_template_files():
-    """Test if all required template files exist"""
-    print("Testing template files...")
-    
-    required_templates = [
-        'base.html',
-        'index.html',
-        'login.html',
-        'register.html',
-        'dashboard.html',
-        'rooms.html',
-        'booking.html',
-        'bill.html',
-        'customer.html'
-    ]
-    
-    template_dir = 'templates'
-    missing_files = []
-    
-    for template in required_templates:
-        file_path = os.path.join(template_dir, template)
-        if not os.path.exists(file_path):
-            missing_files.append(template)
-    
-    if missing_files:
-        print(f"❌ Missing template files: {missing_files}")
-        return False
-        
-    print(f"✅ All {len(required_templates)} template files exist")
-    return True
-
-def test_static_files():
-    """Test if required static files exist"""
-    print("Testing static files...")
-    
-    required_files = [
-        os.path.join('static', 'style.css')
-    ]
-    
-    missing_files = []
-    
-    for file_path in required_files:
-        if not os.path.exists(file_path):
-            missing_files.append(file_path)
-    
-    if missing_files:
-        print(f"❌ Missing static files: {missing_files}")
-        return False
-        
-    print("✅ All required static files exist")
-    return True
-
-def test_requirements_file():
-    """Test if requirements.txt exists and has required packages"""
-    print("Testing requirements file...")
-    
-    if not os.path.exists('requirements.txt'):
-        print("❌ requirements.txt file not found")
-        return False
-    
-    try:
-        with open('requirements.txt', 'r') as f:
-            content = f.read()
-            
-        required_packages = ['flask', 'werkzeug']
-        missing_packages = []
-        
-        for package in required_packages:
-            if package not in content.lower():
-                missing_packages.append(package)
-                
-        if missing_packages:
-            print(f"❌ Missing packages in requirements.txt: {missing_packages}")
-            return False
-            
-        print("✅ requirements.txt file exists with required packages")
-        return True
-    except Exception as e:
-        print(f"❌ Error reading requirements.txt: {e}")
-        return False
-
-def main():
-    """Run all tests"""
-    print("Hotel Management System - Test Suite")
-    print("=" * 40)
-    
-    tests = [
-        test_database_creation,
-        test_default_admin,
-        test_sample_rooms,
-        test_template_files,
-        test_static_files,
-        test_requirements_file
-    ]
-    
-    passed = 0
-    failed = 0
-    
-    for test in tests:
-        try:
-            if test():
-                passed += 1
-            else:
-                failed += 1
-        except Exception as e:
-            print(f"❌ Test {test.__name__} failed with exception: {e}")
-            failed += 1
-        print()
-    
-    print("=" * 40)
-    print(f"Test Results: {passed} passed, {failed} failed")
-    
-    if failed == 0:
-        print("🎉 All tests passed! The application is ready to use.")
-        return True
-    else:
-        print("⚠️  Some tests failed. Please check the issues above.")
-        return False
-
-if __name__ == '__main__':
-    success = main()
+"""
+Test script for Hotel Management System
+This script verifies that all components of the application are working correctly.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import tempfile
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Change to the project directory
+dir_path = os.path.dirname(os.path.abspath(__file__))
+os.chdir(dir_path)
+
+def test_database_creation():
+    """Test if database and tables are created correctly"""
+    print("Testing database creation...")
+    
+    db_path = os.path.join('database', 'hotel.db')
+    if not os.path.exists(db_path):
+        print("❌ Database file not found")
+        return False
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        # Check if all tables exist
+        tables = ['users', 'rooms', 'customers', 'bookings']
+        for table in tables:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
+            if not cursor.fetchone():
+                print(f"❌ Table '{table}' not found")
+                return False
+        
+        print("✅ Database and all tables exist")
+        return True
+    except Exception as e:
+        print(f"❌ Error accessing database: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def test_default_admin():
+    """Test if default admin user exists"""
+    print("Testing default admin user...")
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(os.path.join('database', 'hotel.db'))
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM users WHERE username = 'admin'")
+        admin = cursor.fetchone()
+        
+        if not admin:
+            print("❌ Default admin user not found")
+            return False
+            
+        # Check if password is hashed
+        if len(admin[2]) < 20:  # Password hash should be long
+            print("❌ Admin password not properly hashed")
+            return False
+            
+        if admin[3] != 'admin':  # Role should be 'admin'
+            print("❌ Admin user has incorrect role")
+            return False
+            
+        print("✅ Default admin user exists with proper credentials")
+        return True
+    except Exception as e:
+        print(f"❌ Error checking admin user: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def test_sample_rooms():
+    """Test if sample rooms were added"""
+    print("Testing sample rooms...")
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(os.path.join('database', 'hotel.db'))
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM rooms")
+        count = cursor.fetchone()[0]
+        
+        if count == 0:
+            print("❌ No rooms found in database")
+            return False
+            
+        print(f"✅ {count} rooms found in database")
+        return True
+    except Exception as e:
+        print(f"❌ Error checking rooms: {e}")
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+def test_template_files():
+    """Test if all required template files exist"""
+    print("Testing template files...")
+    
+    required_templates = [
+        'base.html',
+        'index.html',
+        'login.html',
+        'register.html',
+        'dashboard.html',
+        'rooms.html',
+        'booking.html',
+        'bill.html',
+        'receipt.html',
+        'customer.html'
+    ]
+    
+    template_dir = 'templates'
+    missing_files = []
+    
+    for template in required_templates:
+        file_path = os.path.join(template_dir, template)
+        if not os.path.exists(file_path):
+            missing_files.append(template)
+    
+    if missing_files:
+        print(f"❌ Missing template files: {missing_files}")
+        return False
+        
+    print(f"✅ All {len(required_templates)} template files exist")
+    return True
+
+def test_static_files():
+    """Test if required static files exist"""
+    print("Testing static files...")
+    
+    required_files = [
+        os.path.join('static', 'style.css')
+    ]
+    
+    missing_files = []
+    
+    for file_path in required_files:
+        if not os.path.exists(file_path):
+            missing_files.append(file_path)
+    
+    if missing_files:
+        print(f"❌ Missing static files: {missing_files}")
+        return False
+        
+    print("✅ All required static files exist")
+    return True
+
+def test_requirements_file():
+    """Test if requirements.txt exists and has required packages"""
+    print("Testing requirements file...")
+    
+    if not os.path.exists('requirements.txt'):
+        print("❌ requirements.txt file not found")
+        return False
+    
+    try:
+        with open('requirements.txt', 'r') as f:
+            content = f.read()
+            
+        required_packages = ['flask', 'werkzeug']
+        missing_packages = []
+        
+        for package in required_packages:
+            if package not in content.lower():
+                missing_packages.append(package)
+                
+        if missing_packages:
+            print(f"❌ Missing packages in requirements.txt: {missing_packages}")
+            return False
+            
+        print("✅ requirements.txt file exists with required packages")
+        return True
+    except Exception as e:
+        print(f"❌ Error reading requirements.txt: {e}")
+        return False
+
+def use_temp_database(tmpdir):
+    """Point the Flask app at a throwaway database and return the app module"""
+    import app as app_module
+    
+    pool = app_module.app.extensions.pop('db_pool', None)
+    if pool:
+        pool.close_all()
+    database_writer = app_module.app.extensions.pop('writer', None)
+    if database_writer:
+        database_writer.close()
+    app_module.app.config['DATABASE'] = os.path.join(tmpdir, 'hotel.db')
+    app_module.app.config['TESTING'] = True
+    app_module.init_db()
+    return app_module
+
+def test_connection_pool():
+    """Test that requests reuse pooled connections"""
+    print("Testing connection pool...")
+    
+    import threading
+    from db import get_db, get_pool
+    from writer import get_writer
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        
+        for _ in range(3):
+            with app.app_context():
+                get_db().execute('SELECT COUNT(*) FROM rooms').fetchone()
+        
+        pool = get_pool(app)
+        stats = pool.stats()
+        with app.app_context():
+            journal_mode = get_db().execute('PRAGMA journal_mode').fetchone()[0]
+        pool.close_all()
+        app.extensions.pop('db_pool', None)
+        
+        # Threads racing to create the pool and the writer all get the same ones
+        previous_writer = app.extensions.pop('writer', None)
+        if previous_writer:
+            previous_writer.close()
+        start = threading.Barrier(8)
+        pools = []
+        writers = []
+        
+        def first_request():
+            start.wait()
+            pools.append(get_pool(app))
+            writers.append(get_writer(app))
+        racers = [threading.Thread(target=first_request) for _ in range(8)]
+        for racer in racers:
+            racer.start()
+        for racer in racers:
+            racer.join()
+        app.extensions.pop('db_pool').close_all()
+        for racer_writer in {id(racer_writer): racer_writer for racer_writer in writers}.values():
+            racer_writer.close()
+        app.extensions.pop('writer')
+        
+        if len({id(racer_pool) for racer_pool in pools}) != 1 or len({id(w) for w in writers}) != 1:
+            print("❌ Concurrent first requests created more than one pool or writer")
+            return False
+        if stats['size'] != 1 or stats['acquired'] != 3 or stats['in_use'] != 0:
+            print(f"❌ Connections were not reused: {stats}")
+            return False
+        
+        if journal_mode.lower() != 'wal':
+            print(f"❌ Expected WAL journal mode, got {journal_mode}")
+            return False
+    
+    print("✅ Connection pool reuses connections in WAL mode")
+    return True
+
+def test_availability_index():
+    """Test the interval index used for room availability"""
+    print("Testing availability index...")
+    
+    from availability import AvailabilityIndex
+    
+    index = AvailabilityIndex()
+    index.add_booking(1, '2030-01-10', '2030-01-15')
+    index.add_booking(1, '2030-01-01', '2030-01-05')
+    index.add_booking(1, '2030-01-05', '2030-01-08')
+    
+    checks = [
+        (index.is_free(1, '2030-01-08', '2030-01-10'), True),   # gap between stays
+        (index.is_free(1, '2030-01-15', '2030-01-16'), True),   # back-to-back checkout
+        (index.is_free(1, '2029-12-30', '2030-01-01'), True),
+        (index.is_free(1, '2030-01-04', '2030-01-06'), False),
+        (index.is_free(1, '2030-01-07', '2030-01-11'), False),
+        (index.is_free(1, '2029-12-01', '2030-02-01'), False),  # spans every stay
+        (index.is_free(2, '2030-01-01', '2030-01-05'), True),   # room without bookings
+    ]
+    for result, expected in checks:
+        if result != expected:
+            print(f"❌ Availability check returned {result}, expected {expected}")
+            return False
+    
+    if index.free_rooms([1, 2, 3], '2030-01-02', '2030-01-03') != [2, 3]:
+        print("❌ free_rooms returned the wrong rooms")
+        return False
+    
+    print("✅ Availability index answers overlap queries correctly")
+    return True
+
+def test_concurrent_booking():
+    """Test that concurrent bookings of the same room cannot overlap"""
+    print("Testing concurrent booking commits...")
+    
+    import threading
+    from booking import BookingConflict, commit_booking
+    from db import ConnectionPool
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        use_temp_database(tmpdir)
+        path = os.path.join(tmpdir, 'hotel.db')
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES ('101', 'Single', 100)")
+        conn.commit()
+        conn.close()
+        
+        pool = ConnectionPool(path, max_size=8)
+        outcomes = []
+        
+        def attempt(check_in, check_out):
+            conn = pool.acquire()
+            try:
+                commit_booking(conn, 1, 1, check_in, check_out)
+                outcomes.append('booked')
+            except BookingConflict:
+                outcomes.append('conflict')
+            finally:
+                pool.release(conn)
+        
+        threads = [threading.Thread(target=attempt, args=('2030-01-01', '2030-01-03'))
+                   for _ in range(8)]
+        threads.append(threading.Thread(target=attempt, args=('2030-01-03', '2030-01-05')))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.close_all()
+        
+        if outcomes.count('booked') != 2 or outcomes.count('conflict') != 7:
+            print(f"❌ Unexpected booking outcomes: {outcomes}")
+            return False
+    
+    print("✅ Exactly one of the competing bookings was committed")
+    return True
+
+def test_dashboard_stats():
+    """Test that the materialized dashboard statistics track every write"""
+    print("Testing dashboard statistics...")
+    
+    import stats
+    from datetime import date, timedelta
+    
+    today = date.today()
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany('''
+            INSERT INTO rooms (room_number, room_type, price_per_night)
+            VALUES (?, ?, ?)
+        ''', [('101', 'Single', 100), ('102', 'Double', 150), ('103', 'Suite', 250)])
+        conn.execute('''
+            INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+            VALUES (1, 1, ?, ?, 200)
+        ''', (today.isoformat(), (today + timedelta(days=2)).isoformat()))
+        conn.execute("DELETE FROM rooms WHERE room_id = 3")
+        conn.commit()
+        
+        current = stats.read_stats(conn)
+        expected = {'total_rooms': 2, 'available_rooms': 1, 'booked_rooms': 1, 'total_revenue': 200}
+        drift = stats.check_consistency(conn)
+        
+        conn.execute("UPDATE hotel_stats SET total_rooms = 99")
+        conn.commit()
+        detected = stats.check_consistency(conn, repair=True)
+        repaired = stats.check_consistency(conn)
+        conn.close()
+        
+        if current != expected:
+            print(f"❌ Statistics {current} do not match {expected}")
+            return False
+        if drift or 'total_rooms' not in detected or repaired:
+            print("❌ Consistency check did not detect or repair drift")
+            return False
+    
+    print("✅ Dashboard statistics stay consistent with the base tables")
+    return True
+
+def login_as_admin(client):
+    """Log the test client in with the default admin account"""
+    return client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+def test_room_pagination():
+    """Test that keyset pagination visits every room exactly once"""
+    print("Testing room pagination...")
+    
+    import re
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany('''
+            INSERT INTO rooms (room_number, room_type, price_per_night)
+            VALUES (?, ?, ?)
+        ''', [(str(100 + i), 'Single' if i % 2 else 'Double', 100 + (i // 3) * 50) for i in range(8)])
+        conn.commit()
+        conn.close()
+        
+        client = app_module.app.test_client()
+        login_as_admin(client)
+        
+        seen = []
+        url = '/rooms?sort=price&per_page=3'
+        while url:
+            html = client.get(url).get_data(as_text=True)
+            seen.extend(re.findall(r'<td>(1\d\d)</td>', html))
+            match = re.search(r'href="([^"]*after=[^"]*)"[^>]*>Next page', html)
+            url = match.group(1).replace('&amp;', '&') if match else None
+        
+        filtered = client.get('/rooms?room_type=Double&max_price=150').get_data(as_text=True)
+        doubles = re.findall(r'<td>(1\d\d)</td>', filtered)
+        app_module.app.extensions.pop('db_pool').close_all()
+        
+        if sorted(seen) != [str(100 + i) for i in range(8)]:
+            print(f"❌ Pages did not cover every room exactly once: {seen}")
+            return False
+        if doubles != ['100', '102', '104']:
+            print(f"❌ Filtered listing returned {doubles}")
+            return False
+    
+    print("✅ Room listing pages through every room exactly once")
+    return True
+
+def test_streamed_pages():
+    """Test that streamed admin pages match the buffered rendering"""
+    print("Testing streamed page rendering...")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany('''
+            INSERT INTO rooms (room_number, room_type, price_per_night)
+            VALUES (?, 'Single', 100)
+        ''', [(str(100 + i),) for i in range(5)])
+        conn.commit()
+        conn.close()
+        
+        client = app_module.app.test_client()
+        login_as_admin(client)
+        
+        client.get('/')  # consume the login flash message
+        
+        def page_text(response):
+            return response.get_data(as_text=True).replace('&amp;stream=1', '').replace('?stream=1', '')
+        
+        results = []
+        for url in ('/rooms?per_page=3', '/dashboard?per_page=3', '/customer-details?name=J'):
+            buffered = client.get(url)
+            streamed = client.get(url + '&stream=1')
+            # A streamed response cannot know its Content-Length up front
+            results.append((url, 'Content-Length' not in streamed.headers
+                            and 'Content-Length' in buffered.headers,
+                            page_text(streamed) == page_text(buffered)))
+        app_module.app.extensions.pop('db_pool').close_all()
+        
+        for url, was_streamed, same_output in results:
+            if not was_streamed or not same_output:
+                print(f"❌ Streamed rendering of {url} differs from the buffered page")
+                return False
+    
+    print("✅ Streamed pages match the buffered rendering")
+    return True
+
+def test_room_catalog_cache():
+    """Test that the room catalog cache is invalidated by every room write"""
+    print("Testing room catalog cache...")
+    
+    from catalog import RoomCatalog
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.row_factory = sqlite3.Row
+        cache = RoomCatalog()
+        
+        conn.execute("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES ('101', 'Single', 100)")
+        conn.commit()
+        first = [room['room_number'] for room in cache.rooms(conn)]
+        cache.rooms(conn)
+        after_read = cache.stats()
+        
+        # Writes through another connection stand in for another worker
+        other = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        other.execute("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES ('102', 'Suite', 250)")
+        other.commit()
+        second = [room['room_number'] for room in cache.rooms(conn)]
+        other.execute("UPDATE rooms SET price_per_night = 120 WHERE room_number = '101'")
+        other.commit()
+        expensive = [room['room_number'] for room in cache.view(conn, min_price=200)[0]]
+        other.execute("DELETE FROM rooms WHERE room_number = '102'")
+        other.commit()
+        third = [room['room_number'] for room in cache.rooms(conn)]
+        other.close()
+        conn.close()
+        final = cache.stats()
+        
+        if (first, second, expensive, third) != (['101'], ['101', '102'], ['102'], ['101']):
+            print(f"❌ Cache served stale rooms: {first} {second} {expensive} {third}")
+            return False
+        if after_read['hits'] != 1 or after_read['misses'] != 1 or final['invalidations'] != 3:
+            print(f"❌ Unexpected cache counters: {final}")
+            return False
+    
+    print("✅ Room catalog cache is invalidated by room writes")
+    return True
+
+def test_password_rehash_on_login():
+    """Test offloaded password verification and rehash when the cost changes"""
+    print("Testing password hashing pool...")
+    
+    from passwords import PasswordHasher
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        old_hasher = app.extensions.get('password_hasher')
+        app.extensions['password_hasher'] = PasswordHasher('pbkdf2:sha256:1000', workers=1)
+        
+        try:
+            client = app.test_client()
+            bad = client.post('/login', data={'username': 'admin', 'password': 'wrong'})
+            good = login_as_admin(client)
+            conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+            stored = conn.execute("SELECT password FROM users WHERE username = 'admin'").fetchone()[0]
+            conn.close()
+            again = login_as_admin(app.test_client())
+        finally:
+            app.extensions['password_hasher'].shutdown()
+            if old_hasher is None:
+                app.extensions.pop('password_hasher')
+            else:
+                app.extensions['password_hasher'] = old_hasher
+            app.extensions.pop('db_pool').close_all()
+        
+        if bad.status_code != 200 or good.status_code != 302 or again.status_code != 302:
+            print("❌ Login did not accept only the correct password")
+            return False
+        if not stored.startswith('pbkdf2:sha256:1000$'):
+            print(f"❌ Password was not rehashed with the new cost: {stored[:30]}")
+            return False
+    
+    print("✅ Passwords are verified off-thread and rehashed on login")
+    return True
+
+def test_bulk_import_export():
+    """Test bulk CSV import with per-row errors and the streaming export"""
+    print("Testing bulk import/export...")
+    
+    import io
+    import json
+    
+    csv_text = (
+        "room_number,room_type,price_per_night\n"
+        "B1,Single,90\n"
+        "B2,Double,not-a-price\n"
+        "B3,Suite,300\n"
+        "B1,Double,120\n"
+    )
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.config['BULK_CHUNK_SIZE'] = 2
+        client = app.test_client()
+        
+        try:
+            denied = client.get('/admin/export/rooms')
+            login_as_admin(client)
+            response = client.post('/admin/import/rooms', data={
+                'file': (io.BytesIO(csv_text.encode('utf-8')), 'rooms.csv'),
+            }, content_type='multipart/form-data')
+            report = response.get_json()
+            exported = client.get('/admin/export/rooms?format=jsonl')
+            rows = [json.loads(line) for line in exported.get_data(as_text=True).splitlines()]
+            unknown = client.get('/admin/export/bookings')
+        finally:
+            app.config['BULK_CHUNK_SIZE'] = 5000
+            app.extensions.pop('db_pool').close_all()
+        
+        if denied.status_code != 302 or unknown.status_code != 404:
+            print("❌ Bulk endpoints are not restricted to known tables and admins")
+            return False
+        if report['inserted'] != 2 or report['rejected'] != 2:
+            print(f"❌ Unexpected import counts: {report}")
+            return False
+        if [error['line'] for error in report['errors']] != [3, 5]:
+            print(f"❌ Errors reported on the wrong lines: {report['errors']}")
+            return False
+        imported = {row['room_number']: row for row in rows if row['room_number'].startswith('B')}
+        if sorted(imported) != ['B1', 'B3'] or imported['B1']['price_per_night'] != 90:
+            print(f"❌ Export does not match the imported rooms: {imported}")
+            return False
+    
+    print("✅ Bulk import reports bad rows and the export round-trips")
+    return True
+
+def test_metrics_endpoint():
+    """Test request/SQL timing, the Prometheus and JSON output and route profiling"""
+    print("Testing metrics endpoint...")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.config['METRICS_TOKEN'] = 'scrape-me'
+        client = app.test_client()
+        
+        try:
+            denied = client.get('/metrics')
+            login_as_admin(client)
+            client.post('/metrics/profile', data={'route': 'dashboard', 'samples': 1})
+            client.get('/rooms')
+            client.get('/dashboard')
+            client.get('/dashboard')
+            text = client.get('/metrics').get_data(as_text=True)
+            report = client.get('/metrics?format=json').get_json()
+            profile = client.get('/metrics/profile').get_data(as_text=True)
+            # A streamed page is timed and profiled until its body has been generated
+            client.post('/metrics/profile', data={'route': 'rooms', 'samples': 1})
+            client.get('/rooms?stream=1').get_data()
+            streamed = client.get('/metrics/profile').get_data(as_text=True)
+            scraped = app.test_client().get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+        finally:
+            app.config['METRICS_TOKEN'] = None
+            app.extensions.pop('db_pool').close_all()
+        
+        if denied.status_code != 302 or scraped.status_code != 200:
+            print("❌ /metrics is not limited to admins and the scrape token")
+            return False
+        if 'hotel_request_duration_seconds_bucket{route="/rooms",le="+Inf"}' not in text:
+            print("❌ Route latency histogram missing from the Prometheus output")
+            return False
+        if 'hotel_sql_duration_seconds_count{statement="SELECT' not in text:
+            print("❌ SQL statement timings missing from the Prometheus output")
+            return False
+        rooms = report['routes'].get('/rooms', {})
+        if rooms.get('count', 0) < 1 or 'p99' not in rooms or rooms.get('phases', {}).get('sql', 0) <= 0:
+            print(f"❌ JSON report is missing route timings: {rooms}")
+            return False
+        if 'sampled: 1' not in profile or 'dashboard' not in profile:
+            print("❌ The armed route was not profiled exactly once")
+            return False
+        if 'sampled: 1' not in streamed or '_buffered_generator' not in streamed:
+            print("❌ The streamed page was not profiled while its body was generated")
+            return False
+    
+    print("✅ Requests and SQL are timed and exposed at /metrics")
+    return True
+
+def test_occupancy_ledger():
+    """Test date-aware room status and the migration from the old status flag"""
+    print("Testing occupancy ledger...")
+    
+    import occupancy
+    from datetime import date, timedelta
+    from booking import BookingConflict, commit_booking
+    
+    today = date.today()
+    night = lambda days: (today + timedelta(days=days)).isoformat()
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, 'Single', 100)",
+                         [('101',), ('102',)])
+        conn.commit()
+        booking_id, _ = commit_booking(conn, 1, 1, night(0), night(3))
+        try:
+            commit_booking(conn, 1, 1, night(2), night(4))
+            overlap_rejected = False
+        except BookingConflict:
+            overlap_rejected = True
+        
+        nights = conn.execute('SELECT COUNT(*) FROM room_nights WHERE booking_id = ?', (booking_id,)).fetchone()[0]
+        tonight = occupancy.occupied_rooms(conn)
+        after_checkout = occupancy.occupied_rooms(conn, night(3))
+        
+        client = app_module.app.test_client()
+        login_as_admin(client)
+        booked_now = client.get('/rooms?status=Booked').get_data(as_text=True)
+        booked_later = client.get(f'/rooms?status=Booked&night={night(5)}').get_data(as_text=True)
+        app_module.app.extensions.pop('db_pool').close_all()
+        
+        conn.execute('DELETE FROM bookings WHERE booking_id = ?', (booking_id,))
+        conn.commit()
+        emptied = occupancy.occupied_count(conn)
+        conn.close()
+        
+        if nights != 3 or not overlap_rejected:
+            print(f"❌ Ledger holds {nights} nights; overlap rejected: {overlap_rejected}")
+            return False
+        if tonight != {1} or after_checkout or emptied:
+            print(f"❌ Occupancy by night is wrong: {tonight} {after_checkout} {emptied}")
+            return False
+        if '<td>101</td>' not in booked_now or '<td>101</td>' in booked_later:
+            print("❌ Room listing status does not follow the selected night")
+            return False
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # A database from before the ledger: static status flag, no room_nights
+        path = os.path.join(tmpdir, 'hotel.db')
+        conn = sqlite3.connect(path)
+        conn.executescript(f'''
+            CREATE TABLE rooms (room_id INTEGER PRIMARY KEY AUTOINCREMENT, room_number TEXT UNIQUE NOT NULL,
+                                room_type TEXT NOT NULL, price_per_night REAL NOT NULL,
+                                status TEXT NOT NULL DEFAULT 'Available');
+            CREATE INDEX idx_rooms_status ON rooms (status, room_number);
+            CREATE TABLE bookings (booking_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+                                   room_id INTEGER NOT NULL, check_in DATE NOT NULL, check_out DATE NOT NULL,
+                                   total_amount REAL NOT NULL);
+            CREATE TABLE hotel_stats (stat_id INTEGER PRIMARY KEY, total_rooms INTEGER NOT NULL DEFAULT 0,
+                                      available_rooms INTEGER NOT NULL DEFAULT 0,
+                                      booked_rooms INTEGER NOT NULL DEFAULT 0,
+                                      total_revenue REAL NOT NULL DEFAULT 0);
+            CREATE TRIGGER trg_stats_room_status AFTER UPDATE OF status ON rooms
+            BEGIN UPDATE hotel_stats SET booked_rooms = booked_rooms + (NEW.status = 'Booked'); END;
+            INSERT INTO rooms (room_number, room_type, price_per_night, status)
+            VALUES ('101', 'Single', 100, 'Booked'), ('102', 'Single', 100, 'Booked');
+            INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+            VALUES (1, 1, '{night(-1)}', '{night(1)}', 200), (1, 2, '2020-01-01', '2020-01-02', 100);
+        ''')
+        conn.close()
+        
+        app_module = use_temp_database(tmpdir)
+        app_module.app.extensions.pop('db_pool', None)
+        conn = sqlite3.connect(path)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(rooms)')]
+        migrated = occupancy.occupied_rooms(conn)
+        consistency = occupancy.check_consistency(conn)
+        conn.close()
+        
+        if 'status' in columns or migrated != {1} or consistency != (0, 0):
+            print(f"❌ Migration left {columns}, occupied {migrated}, drift {consistency}")
+            return False
+    
+    print("✅ Room status is derived per night from the occupancy ledger")
+    return True
+
+def test_revenue_rollups():
+    """Test the nightly rollups behind the occupancy, ADR and RevPAR reports"""
+    print("Testing revenue rollups...")
+    
+    import rollups
+    from datetime import date
+    from booking import commit_booking
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                         [('101', 'Single', 100), ('102', 'Single', 100), ('301', 'Suite', 250)])
+        conn.commit()
+        commit_booking(conn, 1, 1, '2030-01-01', '2030-01-03')
+        suite_id, _ = commit_booking(conn, 1, 3, '2030-01-02', '2030-01-04')
+        
+        cache = rollups.RollupCache()
+        jan1, jan3 = date(2030, 1, 1), date(2030, 1, 3)
+        daily = cache.report(conn, jan1, jan3, 'day')
+        singles = cache.report(conn, jan1, jan3, 'month', 'Single')
+        
+        conn.execute("UPDATE rooms SET room_type = 'Double' WHERE room_id = 1")
+        conn.execute('DELETE FROM bookings WHERE booking_id = ?', (suite_id,))
+        conn.commit()
+        changed = cache.report(conn, jan1, jan3, 'month')
+        drift = rollups.check_consistency(conn)
+        conn.close()
+        
+        client = app_module.app.test_client()
+        login_as_admin(client)
+        api = client.get('/admin/reports.json?start=2030-01-01&end=2030-01-03&group=week').get_json()
+        bad = client.get('/admin/reports.json?start=2030-01-05&end=2030-01-01')
+        page = client.get('/admin/reports?start=2030-01-01&end=2030-01-03')
+        app_module.app.extensions.pop('db_pool').close_all()
+        
+        sold = [row['rooms_sold'] for row in daily['periods']]
+        total = daily['total']
+        if sold != [1, 2, 1] or total['rooms_available'] != 9 or total['revenue'] != 700:
+            print(f"❌ Daily rollups are wrong: {sold} {total}")
+            return False
+        if total['adr'] != 175 or total['revpar'] != 77.78 or total['occupancy'] != 0.4444:
+            print(f"❌ ADR/RevPAR/occupancy are wrong: {total}")
+            return False
+        if singles['total']['rooms_sold'] != 2 or singles['rooms'] != 2:
+            print(f"❌ Room type filter is wrong: {singles['total']}")
+            return False
+        if changed['total']['rooms_sold'] != 2 or changed['total']['revenue'] != 200 or drift:
+            print(f"❌ Rollups did not follow the room change and cancellation: {changed['total']}")
+            return False
+        if api['total']['rooms_sold'] != 2 or bad.status_code != 400 or page.status_code != 200:
+            print("❌ Report endpoints did not answer as expected")
+            return False
+    
+    print("✅ Rollups answer occupancy, ADR and RevPAR by period")
+    return True
+
+def test_booking_receipts():
+    """Test that receipts are snapshotted at booking time and served from the cache"""
+    print("Testing booking receipts...")
+    
+    import receipts
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('receipts', None)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                         [('101', 'Single', 100), ('102', 'Double', 150)])
+        conn.commit()
+        conn.close()
+        client = app.test_client()
+        login_as_admin(client)
+        
+        booked = client.post('/process-booking', data={
+            'room_id': 1, 'check_in': '2030-03-01', 'check_out': '2030-03-04'})
+        location = booked.headers.get('Location', '')
+        first = client.get(location)
+        
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        booking_id, total = conn.execute('SELECT booking_id, total_amount FROM bookings').fetchone()
+        stored = conn.execute('SELECT COUNT(*) FROM receipts').fetchone()[0]
+        conn.execute('UPDATE rooms SET price_per_night = price_per_night * 2 WHERE room_id = 1')
+        conn.execute('''INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+                        VALUES (1, 2, '2030-04-01', '2030-04-03', 300)''')
+        legacy_id = conn.execute('SELECT MAX(booking_id) FROM bookings').fetchone()[0]
+        conn.execute('DELETE FROM receipts WHERE booking_id = ?', (legacy_id,))
+        conn.commit()
+        conn.close()
+        
+        app.extensions['receipts'].invalidate()
+        again = client.get(f'/bill/{booking_id}')
+        cached = client.get(f'/bill/{booking_id}')
+        legacy = client.get(f'/bill/{legacy_id}')
+        missing = client.get('/bill/999999')
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        kept = conn.execute('SELECT COUNT(*) FROM receipts WHERE booking_id = ?', (legacy_id,)).fetchone()[0]
+        conn.close()
+        stats = app.extensions['receipts'].stats()
+        
+        client.post('/register', data={'username': 'guest', 'password': 'guest123', 'role': 'customer'})
+        client.post('/login', data={'username': 'guest', 'password': 'guest123'})
+        other = client.get(f'/bill/{booking_id}')
+        app.extensions.pop('receipts').shutdown()
+        app.extensions.pop('db_pool').close_all()
+        
+        if booked.status_code != 302 or not location.endswith(f'/bill/{booking_id}') or stored != 1:
+            print(f"❌ Booking did not store a receipt and redirect to it: {location}")
+            return False
+        amount = f'${total:.2f}'.encode()
+        if amount not in first.data or amount not in again.data:
+            print("❌ Bill does not show the amount charged at booking time")
+            return False
+        if cached.data != again.data or stats['hits'] < 1:
+            print(f"❌ Bill was not served from the cache: {stats}")
+            return False
+        if b'$300.00' not in legacy.data or kept != 1 or missing.status_code != 404 or other.status_code != 404:
+            print("❌ Legacy, missing or foreign bills were not handled")
+            return False
+        
+        renderer = receipts.ReceiptRenderer(app, cache_bytes=10, workers=0)
+        renderer._store(receipts.Receipt(1, 1, 'a', '1', 'Single', '', '', 1, 1.0, None), 'x' * 6)
+        renderer._store(receipts.Receipt(2, 1, 'a', '1', 'Single', '', '', 1, 1.0, None), 'y' * 6)
+        if list(renderer._cache) != [2] or renderer.stats()['evictions'] != 1:
+            print("❌ Receipt cache is not bounded by size")
+            return False
+    
+    print("✅ Receipts are snapshotted, cached and access-checked")
+    return True
+
+def test_customer_search():
+    """Test the full-text customer search and its typeahead endpoint"""
+    print("Testing customer search...")
+    
+    import search
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.row_factory = sqlite3.Row
+        conn.executemany('INSERT INTO customers (name, email, phone, address) VALUES (?, ?, ?, ?)', [
+            ('Harold Main', 'harold@example.net', '555 123 4567', '5 Oak Lane'),
+            ('Amélie Dubois', 'amelie@example.com', '(555) 010-2030', '1 Rue de la Paix'),
+            ('James Smith', 'jsmith@example.com', '555-444-1212', '12 Main Street'),
+            ('Jane Smithers', 'jane@example.org', '555 777 8888', '9 Smith Road'),
+        ])
+        conn.commit()
+        
+        def names(text):
+            return [row['name'] for row in search.search(conn, text)]
+        
+        by_prefix = names('ame')
+        by_email = names('jsmith@example')
+        by_phone = names('555-010')
+        ranked = names('main')
+        operators = sorted(names('smith" (*'))
+        # however many newer guests merely live on a street of that name
+        conn.executemany('INSERT INTO customers (name, email, phone, address) VALUES (?, ?, ?, ?)',
+                         [(f'Guest {i}', f'guest{i}@example.com', f'555 300 {i:04d}', f'{i} Harold Street')
+                          for i in range(1000)])
+        conn.commit()
+        best = names('harold')[0]
+        conn.execute("UPDATE customers SET name = 'James Smythe' WHERE email = 'jsmith@example.com'")
+        conn.execute("DELETE FROM customers WHERE email = 'jane@example.org'")
+        conn.commit()
+        after_edit = names('smyth') + names('jane')
+        
+        # A database from before the index is migrated on startup
+        conn.execute('DROP TABLE customers_fts')
+        conn.commit()
+        search.ensure_schema(conn)
+        migrated = names('dubois')
+        drift = search.check_consistency(conn)
+        conn.close()
+        
+        client = app_module.app.test_client()
+        login_as_admin(client)
+        api = client.get('/customers/search?q=amel&limit=5').get_json()
+        page = client.get('/customer-details?q=dubois')
+        app_module.app.extensions.pop('db_pool').close_all()
+        
+        if by_prefix != ['Amélie Dubois'] or by_email != ['James Smith'] or by_phone != ['Amélie Dubois']:
+            print(f"❌ Prefix, email or phone search failed: {by_prefix} {by_email} {by_phone}")
+            return False
+        if ranked != ['Harold Main', 'James Smith'] or operators != ['James Smith', 'Jane Smithers']:
+            print(f"❌ Results are not ranked by name or operators were not escaped: {ranked} {operators}")
+            return False
+        if best != 'Harold Main':
+            print(f"❌ The best name match was crowded out by newer matches: {best}")
+            return False
+        if after_edit != ['James Smythe'] or migrated != ['Amélie Dubois'] or drift:
+            print(f"❌ Index did not follow edits or the migration: {after_edit} {migrated}")
+            return False
+        if [row['name'] for row in api] != ['Amélie Dubois'] or b'Rue de la Paix' not in page.data:
+            print("❌ Search endpoint or customer page did not return the guest")
+            return False
+    
+    print("✅ Customer search finds guests by name, email and phone")
+    return True
+
+def test_schema_migrations():
+    """Test the versioned schema migrations and index checks"""
+    print("Testing schema migrations...")
+    
+    import migrations
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        conn = sqlite3.connect(os.path.join(tmpdir, 'fresh.db'))
+        applied = migrations.migrate(conn)
+        again = migrations.migrate(conn)
+        version = migrations.schema_version(conn)
+        problems = migrations.verify_indexes(conn) or migrations.check_query_plans(conn)
+        dumped = migrations.dump_schema(conn)
+        
+        # A migration that fails part way leaves the database as it was
+        def broken(db):
+            db.execute('CREATE TABLE half_done (id INTEGER)')
+            raise sqlite3.OperationalError('simulated failure')
+        try:
+            migrations.migrate(conn, migrations.MIGRATIONS + ((version + 1, 'broken', broken),))
+            rolled_back = False
+        except sqlite3.OperationalError:
+            rolled_back = migrations.schema_version(conn) == version and not conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone()
+        
+        # A missing index shows up as a full scan in a hot query
+        conn.execute('DROP INDEX idx_customers_name')
+        missing = migrations.verify_indexes(conn)
+        scans = migrations.check_query_plans(conn)
+        conn.close()
+    
+    with open(os.path.join('database', 'hotel_schema.sql')) as f:
+        shipped = f.read()
+    
+    if applied != [v for v, _, _ in migrations.MIGRATIONS] or again or version != migrations.LATEST_VERSION:
+        print(f"❌ Fresh database was not migrated once to the latest version: {applied} {again} {version}")
+        return False
+    if problems:
+        print(f"❌ Migrated database has index problems: {problems}")
+        return False
+    if not rolled_back:
+        print("❌ Failed migration was not rolled back")
+        return False
+    if missing != ['idx_customers_name'] or not scans:
+        print(f"❌ Dropped index was not reported: {missing} {scans}")
+        return False
+    if not shipped.endswith(dumped):
+        print("❌ database/hotel_schema.sql is out of date; regenerate it with migrations.py --dump-schema")
+        return False
+    
+    print("✅ Schema migrations are versioned, atomic and keep the hot queries indexed")
+    return True
+
+def test_load_test():
+    """Test the load test driver and its baseline comparison"""
+    print("Testing load test...")
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+    import load_test
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        seeded = load_test.seed(app_module, rooms=10, users=5, bookings=40)
+        results = load_test.run(app_module.app, workers=2, duration=3.0)
+        app_module.app.extensions.pop('db_pool').close_all()
+    
+    routes = results['routes']
+    slower = json.loads(json.dumps(results))
+    for row in slower['routes'].values():
+        row['p95_ms'] *= 2
+    faster = json.loads(json.dumps(results))
+    faster['routes']['login']['p95_ms'] /= 2
+    
+    if seeded != (10, 5, 40):
+        print(f"❌ Synthetic data was not seeded: {seeded}")
+        return False
+    if not {'login', 'book_room', 'process_booking', 'dashboard'} <= routes.keys() \
+            or any(row['errors'] for row in routes.values()):
+        print(f"❌ Load test did not drive every route cleanly: {routes}")
+        return False
+    if load_test.compare(results, results) or load_test.compare(results, slower):
+        print("❌ Equal or better results were reported as regressions")
+        return False
+    if not load_test.compare(results, faster, threshold=0.25):
+        print("❌ Login p95 regression was not reported")
+        return False
+    
+    print("✅ Load test drives the booking workflow and flags regressions")
+    return True
+
+
+def test_lazy_startup():
+    """Test the startup phase: cheap schema check, run-once warm-up and timings"""
+    print("Testing startup phase...")
+    
+    import startup
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app_module.init_db()
+        again = app_module.init_db()
+        
+        calls = []
+        phase = startup.Startup(app, init=lambda: calls.append('init') or [1])
+        phase.warmup(lambda app: calls.append('warmup'))
+        phase.run()
+        phase.run()
+        app.config['STARTUP_WARMUP'] = False
+        cold = startup.Startup(app, init=lambda: calls.append('cold init'))
+        cold.warmup(lambda app: calls.append('cold warmup'))
+        cold.run()
+        app.config['STARTUP_WARMUP'] = True
+        
+        client = app.test_client()
+        login_as_admin(client)
+        report = client.get('/metrics?format=json').get_json()
+        app.extensions.pop('db_pool').close_all()
+    
+    timings = app_module.get_startup(app).stats()
+    if again != []:
+        print(f"❌ init_db re-ran migrations on an up-to-date database: {again}")
+        return False
+    if calls != ['init', 'warmup', 'cold init'] or phase.migrated != [1]:
+        print(f"❌ Startup did not run exactly once or ignored STARTUP_WARMUP: {calls}")
+        return False
+    if not {'import_seconds', 'first_request_seconds'} <= timings.keys() \
+            or 'startup_import_seconds' not in report['gauges']:
+        print(f"❌ Startup timings are not recorded or exported: {timings}")
+        return False
+    
+    print("✅ Startup runs once, skips current schemas and reports its timings")
+    return True
+
+
+def test_writer_group_commit():
+    """Test that writes are batched on the single writer, locally and across processes"""
+    print("Testing the database writer...")
+    
+    import groups
+    import writer
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        path = os.path.join(tmpdir, 'hotel.db')
+        database_writer = writer.Writer(path)
+        
+        # Hold the write lock so the writes queue up behind the first one
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute('PRAGMA journal_mode = WAL')
+        blocker.execute('BEGIN IMMEDIATE')
+        futures = [database_writer.submit('insert_room', 'G0', 'Single', 100.0)]
+        time.sleep(0.2)
+        futures += [database_writer.submit('insert_room', f'G{i}', 'Single', 100.0) for i in range(1, 10)]
+        futures.append(database_writer.submit('insert_room', 'G1', 'Double', 200.0))
+        blocker.execute('COMMIT')
+        blocker.close()
+        outcomes = [future.exception(timeout=10) for future in futures]
+        stats = database_writer.stats()
+        
+        authkey = os.urandom(16)
+        server = writer.WriterServer(database_writer, authkey)
+        server.start()
+        client = writer.WriterClient(server.address, authkey, timeout=10)
+        client.call('insert_room', 'R1', 'Suite', 300.0)
+        try:
+            client.call('insert_room', 'R1', 'Suite', 300.0)
+            remote_error = None
+        except sqlite3.IntegrityError as e:
+            remote_error = e
+        # errors carrying more than a message must come back whole too
+        try:
+            client.call('book_group', 1, 'admin', 'Too big', [
+                {'room_type': 'Suite', 'count': 2, 'check_in': '2030-05-01', 'check_out': '2030-05-03'}])
+            group_error = None
+        except groups.GroupUnavailable as e:
+            group_error = e
+        
+        app.config['WRITER_ADDRESS'] = server.address
+        app.config['WRITER_AUTHKEY'] = authkey
+        app.extensions.pop('writer', None)
+        try:
+            web = app.test_client()
+            login_as_admin(web)
+            booked = web.post('/process-booking', data={
+                'room_id': 1, 'check_in': '2030-05-01', 'check_out': '2030-05-03'})
+            remote = app.extensions['writer'].stats()
+        finally:
+            del app.config['WRITER_ADDRESS'], app.config['WRITER_AUTHKEY']
+            remote_writer = app.extensions.pop('writer', None)
+            if remote_writer:
+                remote_writer.close()
+            client.close()
+            server.close()
+            database_writer.close()
+            app.extensions.pop('db_pool').close_all()
+            receipt_renderer = app.extensions.pop('receipts', None)
+            if receipt_renderer:
+                receipt_renderer.shutdown()
+        
+        conn = sqlite3.connect(path)
+        rooms = dict(conn.execute("SELECT room_number, room_type FROM rooms WHERE room_number LIKE 'G%'"))
+        bookings = conn.execute('SELECT COUNT(*) FROM bookings').fetchone()[0]
+        conn.close()
+    
+    if any(outcomes[:10]) or not isinstance(outcomes[10], sqlite3.IntegrityError):
+        print(f"❌ Only the duplicate room should have failed: {outcomes}")
+        return False
+    if len(rooms) != 10 or rooms['G1'] != 'Single' or stats['largest_batch'] < 10:
+        print(f"❌ Queued writes were not committed together: {stats}")
+        return False
+    if remote_error is None:
+        print("❌ A failed write was not reported back to the worker process")
+        return False
+    if group_error is None or group_error.problems != ['request 1: 1 of 2 Suite rooms free'] \
+            or str(group_error) != 'Not enough free rooms for this group: request 1: 1 of 2 Suite rooms free':
+        print(f"❌ A group conflict did not survive the trip back from the writer: {group_error}")
+        return False
+    if booked.status_code != 302 or bookings != 1 or remote['calls'] < 1:
+        print(f"❌ Booking did not go through the server's writer: {remote}")
+        return False
+    
+    print("✅ Writes are group-committed and reach the writer across processes")
+    return True
+
+
+def test_session_store():
+    """Test server-side sessions: cached lookups, logout, revocation and expiry sweeps"""
+    print("Testing the session store...")
+    
+    import logging
+    from flask.logging import default_handler
+    import sessions
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('session_store', None)
+        store = sessions.get_session_store(app)
+        
+        admin = app.test_client()
+        admin.get('/dashboard')
+        anonymous_id = admin.get_cookie('session').value
+        login_as_admin(admin)
+        session_id = admin.get_cookie('session').value
+        admin.get('/rooms')  # shows (and so removes) the login flash
+        saves = store.stats()['saves']
+        for _ in range(5):
+            admin.get('/rooms')
+        after_reads = store.stats()
+        
+        guest = app.test_client()
+        guest.post('/register', data={'username': 'guest', 'password': 'guest123', 'role': 'customer'})
+        guest.post('/login', data={'username': 'guest', 'password': 'guest123'})
+        guest_id = guest.get_cookie('session').value
+        logged_in = guest.get('/book-room').status_code
+        admin.post('/admin/sessions/revoke', data={'username': 'guest'})
+        revoked = guest.get('/book-room')
+        
+        stolen = app.test_client()
+        stolen.set_cookie('session', session_id)
+        before_logout = stolen.get('/dashboard').status_code
+        admin.get('/logout')
+        after_logout = stolen.get('/dashboard')
+        
+        visitor = app.test_client()
+        failed = visitor.post('/login', data={'username': 'admin', 'password': 'wrong'})
+        denied = visitor.get('/dashboard', follow_redirects=True)
+        
+        # a signed cookie claiming to be the admin must not log anyone in
+        forger = app.test_client()
+        serializer = sessions.ServerSessionInterface.signed_cookies.get_signing_serializer(app)
+        forger.set_cookie('session', serializer.dumps({'user_id': 1, 'username': 'admin',
+                                                       'user_role': 'admin'}))
+        forged = [forger.get(path).status_code for path in ('/dashboard', '/admin/stats')]
+        forged_cookie = forger.get_cookie('session')
+        
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        stored = {key for key, in conn.execute('SELECT session_key FROM sessions')}
+        anonymous_rows = conn.execute('SELECT COUNT(*) FROM sessions WHERE user_id IS NULL').fetchone()[0]
+        conn.executemany('INSERT INTO sessions (session_key, user_id, data, expires_at) VALUES (?, NULL, ?, ?)',
+                         [(f'expired{i}', '{}', time.time() - 60) for i in range(5)])
+        conn.commit()
+        store.sweep_batch = 2
+        with app.app_context():
+            swept = store.sweep()
+        left = conn.execute('SELECT COUNT(*) FROM sessions WHERE user_id IS NOT NULL OR expires_at < ?',
+                            (time.time(),)).fetchone()[0]
+        conn.close()
+        
+        store.cache_size = 2
+        for i in range(3):
+            store._remember(f'id{i}', None, '{}', time.time() + 60)
+        evicted = 'id0' not in store._cache
+        
+        # A background sweep that fails is logged and counted
+        logged = []
+        capture = logging.Handler()
+        capture.emit = logged.append
+        app.logger.addHandler(capture)
+        default_handler.setLevel(logging.CRITICAL + 1)
+        app.extensions['writer'].close()
+        try:
+            store._sweep_in_background()
+        finally:
+            app.logger.removeHandler(capture)
+            default_handler.setLevel(logging.NOTSET)
+        stats = store.stats()
+        app.extensions.pop('session_store')
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+    
+    if '.' in session_id or session_id == anonymous_id:
+        print("❌ Login did not get a new, opaque session id")
+        return False
+    if sessions.session_key(session_id) in stored or sessions.session_key(guest_id) in stored:
+        print("❌ Logged out or revoked sessions are still stored")
+        return False
+    if anonymous_rows != 0 or b'Invalid username or password!' not in failed.data \
+            or b'Access denied!' not in denied.data:
+        print(f"❌ Anonymous sessions were stored ({anonymous_rows}) or lost their flashed messages")
+        return False
+    if forged != [302, 302] or (forged_cookie and sessions.session_key(forged_cookie.value) in stored):
+        print(f"❌ A forged signed cookie was trusted as a login: {forged}")
+        return False
+    if after_reads['saves'] != saves or after_reads['hits'] < 5:
+        print(f"❌ Plain page views were not served from the session cache: {after_reads}")
+        return False
+    if logged_in != 200 or revoked.status_code != 302 or stats['revoked'] != 1:
+        print(f"❌ Revoking a user did not end their session: {stats}")
+        return False
+    if before_logout != 200 or after_logout.status_code != 302:
+        print("❌ A copied session cookie still works after logout")
+        return False
+    if swept != 5 or left != 0 or not evicted:
+        print(f"❌ Expired sessions were not swept or the cache is unbounded: {swept}, {left}")
+        return False
+    
+    if stats['sweep_failures'] != 1 or [record.exc_info is not None for record in logged] != [True]:
+        print(f"❌ A failed background sweep was not logged and counted: {stats}")
+        return False
+    
+    print("✅ Sessions are server-side, cached, revocable and swept")
+    return True
+
+
+def test_json_api():
+    """Test the JSON API: compact lists, conditional GETs and writes"""
+    print("Testing the JSON API...")
+    
+    import metrics
+    from werkzeug.http import http_date
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('api_cache', None)
+        app.extensions.pop('availability', None)
+        app.config['API_VERSION_TTL'] = 60
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                         [('101', 'Single', 100), ('102', 'Double', 150)])
+        # as if the data had last changed a minute ago
+        conn.execute('UPDATE table_versions SET updated_at = updated_at - 60')
+        conn.commit()
+        conn.close()
+        client = app.test_client()
+        anonymous = client.get('/api/v1/rooms').status_code
+        login_as_admin(client)
+        client.get('/rooms')
+        
+        listed = client.get('/api/v1/rooms')
+        etag = listed.headers['ETag']
+        registry = metrics.get_metrics(app)
+        queries = sum(s['count'] for s in registry.to_dict()['sql'])
+        polled = client.get('/api/v1/rooms', headers={'If-None-Match': etag})
+        since = client.get('/api/v1/rooms', headers={'If-Modified-Since': listed.headers['Last-Modified']})
+        polling_queries = sum(s['count'] for s in registry.to_dict()['sql']) - queries
+        
+        window = '?check_in=2030-06-01&check_out=2030-06-03'
+        free = client.get('/api/v1/availability' + window)
+        booked = client.post('/api/v1/bookings', json={'room_id': 1, 'check_in': '2030-06-01',
+                                                       'check_out': '2030-06-03'})
+        clash = client.post('/api/v1/bookings', json={'room_id': 1, 'check_in': '2030-06-02',
+                                                      'check_out': '2030-06-04'})
+        changed = client.get('/api/v1/availability' + window,
+                             headers={'If-None-Match': free.headers['ETag']})
+        # a copy fetched earlier in the second of the booking must not be confirmed
+        same_second = client.get('/api/v1/availability' + window,
+                                 headers={'If-Modified-Since': http_date(time.time())})
+        invalid = client.get('/api/v1/availability?check_in=2030-06-03&check_out=2030-06-01')
+        added = client.post('/api/v1/customers', json={'name': 'Jo Bloggs', 'email': 'jo@example.com',
+                                                       'phone': '555 0100', 'address': '1 High St'})
+        customers = client.get('/api/v1/customers?name=Jo').get_json()
+        admin_bookings = client.get('/api/v1/bookings').get_json()
+        
+        guest = app.test_client()
+        guest.post('/register', data={'username': 'guest', 'password': 'guest123', 'role': 'customer'})
+        guest.post('/login', data={'username': 'guest', 'password': 'guest123'})
+        guest_bookings = guest.get('/api/v1/bookings').get_json()
+        hidden = guest.get(booked.headers['Location']).status_code
+        stats = app.extensions['api_cache'].stats()
+        app.config['API_VERSION_TTL'] = 1.0
+        app.extensions.pop('api_cache')
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+    
+    body = listed.get_json()
+    if anonymous != 401 or body['fields'][:2] != ['room_id', 'room_number'] or len(body['rows']) != 2 \
+            or b', ' in listed.data:
+        print(f"❌ Room list is not compact JSON behind the login: {listed.data[:80]}")
+        return False
+    if polled.status_code != 304 or since.status_code != 304 or polling_queries != 0:
+        print(f"❌ Unchanged data was not answered with a query-free 304 ({polling_queries} queries)")
+        return False
+    if booked.status_code != 201 or clash.status_code != 409 or invalid.status_code != 400:
+        print(f"❌ Booking through the API failed: {booked.status_code} {clash.status_code}")
+        return False
+    if changed.status_code != 200 or [row[0] for row in changed.get_json()['rows']] != [2]:
+        print("❌ Availability was not refreshed after a booking")
+        return False
+    if same_second.status_code != 200 or 'Last-Modified' in changed.headers:
+        print("❌ A change within the Last-Modified second was answered with a 304")
+        return False
+    if added.status_code != 201 or customers['rows'][0][1] != 'Jo Bloggs':
+        print("❌ Customer created through the API is not listed")
+        return False
+    if len(admin_bookings['rows']) != 1 or guest_bookings['rows'] != [] or hidden != 404:
+        print("❌ Guests can see other users' bookings")
+        return False
+    if stats['not_modified'] < 2:
+        print(f"❌ API cache counters are wrong: {stats}")
+        return False
+    
+    print("✅ JSON API serves compact lists, 304s without queries and bookings")
+    return True
+
+
+def test_group_booking():
+    """Test all-or-nothing group bookings with one consolidated bill"""
+    print("Testing group bookings...")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                         [('101', 'Single', 100), ('102', 'Double', 150), ('103', 'Double', 150),
+                          ('104', 'Double', 150), ('105', 'Suite', 300)])
+        conn.execute('''INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount)
+                        VALUES (1, 2, '2030-07-01', '2030-07-02', 150)''')
+        # Ids come from the inserts, not from the sequence table (an imported booking can be ahead of it)
+        conn.execute('''INSERT INTO bookings (booking_id, user_id, room_id, check_in, check_out, total_amount)
+                        VALUES (41, 1, 2, '2030-08-01', '2030-08-02', 150)''')
+        conn.execute("UPDATE sqlite_sequence SET seq = 1 WHERE name = 'bookings'")
+        conn.commit()
+        conn.close()
+        client = app.test_client()
+        login_as_admin(client)
+        
+        stay = {'check_in': '2030-07-01', 'check_out': '2030-07-03'}
+        too_big = client.post('/api/v1/group-bookings', json={'name': 'Choir', 'rooms': [
+            dict(stay, room_id=5), dict(stay, room_type='Double', count=3)]})
+        invalid = client.post('/api/v1/group-bookings', json={'name': 'Choir', 'rooms': [
+            dict(stay, room_id=5, room_type='Suite')]})
+        booked = client.post('/api/v1/group-bookings', json={'name': 'Choir', 'rooms': [
+            dict(stay, room_type='Double', count=2), dict(stay, room_id=5),
+            {'room_id': 1, 'check_in': '2030-07-02', 'check_out': '2030-07-05'}]})
+        bill = booked.get_json()
+        page = client.get(f"/group-bill/{bill['group_id']}")
+        fetched = client.get(booked.headers['Location']).get_json()
+        room_bill = client.get(f"/bill/{bill['rooms'][0]['booking_id']}")
+        
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        bookings = conn.execute('SELECT booking_id, room_id FROM bookings ORDER BY booking_id').fetchall()
+        members = conn.execute('SELECT COUNT(*) FROM booking_group_members').fetchone()[0]
+        conn.close()
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+        receipt_renderer = app.extensions.pop('receipts', None)
+        if receipt_renderer:
+            receipt_renderer.shutdown()
+    
+    if too_big.status_code != 409 or len(too_big.get_json()['problems']) != 1 or invalid.status_code != 400:
+        print(f"❌ A group that does not fit was not refused: {too_big.get_json()}")
+        return False
+    if booked.status_code != 201 or sorted(line['room_id'] for line in bill['rooms']) != [1, 3, 4, 5]:
+        print(f"❌ Group was not placed on the free rooms: {bill}")
+        return False
+    if len(bookings) != 6 or members != 4 \
+            or sorted(bookings[2:]) != sorted((line['booking_id'], line['room_id']) for line in bill['rooms']):
+        print(f"❌ A refused group left bookings behind, or the bill does not match: {bookings}")
+        return False
+    if bill['total_amount'] != 150 * 2 * 2 + 300 * 2 + 100 * 3 or fetched['total_amount'] != bill['total_amount']:
+        print(f"❌ Consolidated bill total is wrong: {bill['total_amount']}")
+        return False
+    if page.status_code != 200 or b'$1500.00' not in page.data or room_bill.status_code != 200:
+        print("❌ Group bill page or per-room receipts are missing")
+        return False
+    
+    print("✅ Group bookings are all-or-nothing with one consolidated bill")
+    return True
+
+def test_room_assignment():
+    """Test best-fit room assignment for room-type bookings and the re-optimization job"""
+    print("Testing automatic room assignment...")
+
+    import occupancy
+    from availability import get_availability
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('availability', None)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                         [('101', 'Single', 100), ('102', 'Double', 150), ('103', 'Double', 150),
+                          ('104', 'Double', 150), ('F1', 'Family', 200), ('F2', 'Family', 200)])
+        # Guest-chosen bookings: 102 would leave a one-night gap, 103 has an exact gap, 104 is empty
+        conn.executemany('INSERT INTO bookings (user_id, room_id, check_in, check_out, total_amount) '
+                         'VALUES (1, ?, ?, ?, 0)',
+                         [(2, '2030-06-28', '2030-07-03'), (3, '2030-07-01', '2030-07-04'),
+                          (3, '2030-07-08', '2030-07-10'), (6, '2030-07-10', '2030-07-12')])
+        # Hotel-assigned Family stays, scattered so that F1 has an unsellable night on 07-03
+        conn.executemany('INSERT INTO bookings (booking_id, user_id, room_id, check_in, check_out, total_amount) '
+                         'VALUES (?, 1, ?, ?, ?, 200)',
+                         [(11, 5, '2030-07-01', '2030-07-03'), (12, 6, '2030-07-03', '2030-07-04'),
+                          (13, 5, '2030-07-04', '2030-07-06')])
+        conn.executemany('INSERT INTO room_assignments (booking_id) VALUES (?)', [(11,), (12,), (13,)])
+        conn.commit()
+        conn.close()
+        client = app.test_client()
+        login_as_admin(client)
+
+        booked = client.post('/process-booking', data={'room_type': 'Double', 'check_in': '2030-07-04',
+                                                       'check_out': '2030-07-08'})
+        api_booked = client.post('/api/v1/bookings', json={'room_type': 'Double', 'check_in': '2030-07-04',
+                                                          'check_out': '2030-07-08'}).get_json()
+        last = client.post('/api/v1/bookings', json={'room_type': 'Double', 'check_in': '2030-07-04',
+                                                    'check_out': '2030-07-08'}).get_json()
+        full = client.post('/api/v1/bookings', json={'room_type': 'Double', 'check_in': '2030-07-04',
+                                                    'check_out': '2030-07-08'})
+        before_bill = client.get('/bill/12')
+        optimized = client.post('/admin/assignment/optimize', follow_redirects=True)
+        after_bill = client.get('/bill/12')
+        again = client.post('/admin/assignment/optimize', follow_redirects=True)
+        with app.test_request_context():
+            index = get_availability()
+            index_sees_move = (not index.is_free(5, '2030-07-03', '2030-07-04')
+                               and index.is_free(6, '2030-07-03', '2030-07-04'))
+
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        rooms = dict(conn.execute('SELECT booking_id, room_id FROM bookings'))
+        assigned = {row[0] for row in conn.execute('SELECT booking_id FROM room_assignments')}
+        moves = conn.execute('SELECT booking_id, from_room, to_room FROM booking_moves').fetchall()
+        ledger = occupancy.check_consistency(conn)
+        conn.close()
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+        app.extensions.pop('availability', None)
+        receipt_renderer = app.extensions.pop('receipts', None)
+        if receipt_renderer:
+            receipt_renderer.shutdown()
+
+    first_id = int(booked.headers['Location'].rsplit('/', 1)[1])
+    if rooms.get(first_id) != 3 or api_booked.get('room_id') != 4 or last.get('room_id') != 2 \
+            or full.status_code != 409:
+        print(f"❌ Room-type bookings did not take the best-fit room: {rooms}, {api_booked}")
+        return False
+    if not {first_id, api_booked['booking_id'], 11, 12, 13} <= assigned:
+        print(f"❌ Room-type bookings were not recorded as assigned by the hotel: {assigned}")
+        return False
+    if moves != [(12, 6, 5)] or rooms[12] != 5 or rooms[11] != 5 or rooms[13] != 5 or ledger != (0, 0):
+        print(f"❌ Re-optimization did not close the gap: moves {moves}, rooms {rooms}, ledger {ledger}")
+        return False
+    if b'1 unsellable night(s) freed' not in optimized.data or b'Moved 0 of' not in again.data:
+        print("❌ Re-optimization report is missing or it moved bookings twice")
+        return False
+    if b'F2' not in before_bill.data or b'F1' not in after_bill.data or not index_sees_move:
+        print("❌ Receipt or availability index still shows the old room")
+        return False
+
+    print("✅ Room-type bookings are best fit and re-optimization frees unsellable nights")
+    return True
+
+def test_dynamic_pricing():
+    """Test the rate calendar: bulk updates, O(1) stay totals, quotes and occupancy uplift"""
+    print("Testing dynamic pricing...")
+
+    from datetime import date, timedelta
+    from pricing import RateSeries
+
+    series = RateSeries(100, [10000, 15000, 20000])
+    if series.stay(99, 105) != 7.5 or series.stay(101, 102) != 1.5 or series.stay(200, 202) != 2:
+        print("❌ Rate series sums the wrong nights")
+        return False
+
+    def weekend_factor(check_in, check_out, factor):
+        start = date.fromisoformat(check_in)
+        return sum(factor if (start + timedelta(days=n)).weekday() in (4, 5) else 1.0
+                   for n in range((date.fromisoformat(check_out) - start).days))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('availability', None)
+        app.extensions.pop('rates', None)
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        conn.executemany("INSERT INTO rooms (room_number, room_type, price_per_night) VALUES (?, ?, ?)",
+                         [('101', 'Single', 100), ('102', 'Single', 120), ('201', 'Suite', 300)])
+        conn.commit()
+        conn.close()
+        client = app.test_client()
+        login_as_admin(client)
+
+        client.post('/admin/rates', data={'room_type': 'Suite', 'start': '2030-12-20', 'end': '2030-12-31',
+                                          'factor': '1.5'})
+        weekends = client.post('/admin/rates', data={'room_type': 'Single', 'start': '2030-12-01',
+                                                     'end': '2030-12-31', 'factor': '1.2',
+                                                     'weekdays': ['4', '5']}, follow_redirects=True)
+        invalid = client.post('/admin/rates', data={'room_type': 'Suite', 'start': '2030-12-31',
+                                                    'end': '2030-12-01', 'factor': '2'}, follow_redirects=True)
+        nightly = client.get('/admin/rates.json?room_type=Suite&start=2030-12-19&end=2030-12-20').get_json()
+        page = client.get('/book-room?check_in=2030-12-18&check_out=2030-12-22')
+        # half a date range, or a malformed one, falls back to tonight's rooms
+        partial = client.get('/book-room?check_in=2030-12-18')
+        malformed = client.get('/book-room?check_in=bad')
+        client.post('/process-booking', data={'room_id': '3', 'check_in': '2030-12-18', 'check_out': '2030-12-22'})
+        single = client.post('/api/v1/bookings', json={'room_type': 'Single', 'check_in': '2030-12-18',
+                                                       'check_out': '2030-12-22'}).get_json()
+
+        app.config['PRICING_OCCUPANCY_UPLIFT'] = ((0.5, 0.2),)
+        app.extensions.pop('rates', None)
+        uplifted = client.get('/api/v1/availability?check_in=2030-12-18&check_out=2030-12-22'
+                              '&room_type=Single').get_json()
+        # Bookings move the uplift without rebuilding the calendar; groups are priced with it too
+        loads = app.extensions['rates'].stats()['loads']
+        group = client.post('/api/v1/group-bookings', json={'name': 'Uplifted', 'rooms': [
+            {'room_type': 'Single', 'check_in': '2030-12-18', 'check_out': '2030-12-22'}]}).get_json()
+        client.get('/api/v1/availability?check_in=2030-12-18&check_out=2030-12-22')
+        reloads = app.extensions['rates'].stats()['loads'] - loads
+        app.config['PRICING_OCCUPANCY_UPLIFT'] = ()
+        app.extensions.pop('rates', None)
+        client.post('/admin/rates', data={'room_type': 'Suite', 'start': '2030-12-01', 'end': '2030-12-31',
+                                          'factor': '1'})
+        cleared = client.get('/api/v1/availability?check_in=2030-12-26&check_out=2030-12-28'
+                             '&room_type=Suite').get_json()
+
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        totals = dict(conn.execute('SELECT room_id, total_amount FROM bookings'))
+        suite_rows = conn.execute("SELECT COUNT(*) FROM room_rates WHERE room_type = 'Suite'").fetchone()[0]
+        conn.close()
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+        app.extensions.pop('availability', None)
+        app.extensions.pop('rates', None)
+        receipt_renderer = app.extensions.pop('receipts', None)
+        if receipt_renderer:
+            receipt_renderer.shutdown()
+
+    single_factor = weekend_factor('2030-12-18', '2030-12-22', 1.2)
+    if b'for 8 night(s)' not in weekends.data or b'Invalid rate update' not in invalid.data \
+            or nightly['nights'] != [['2030-12-19', 1.0], ['2030-12-20', 1.5]]:
+        print(f"❌ Bulk rate updates were not applied as asked: {nightly}")
+        return False
+    if b'$1500.00' not in page.data or f'${100 * single_factor:.2f}'.encode() not in page.data:
+        print("❌ Booking page does not quote the stay from the rate calendar")
+        return False
+    if partial.status_code != 200 or malformed.status_code != 200:
+        print(f"❌ Booking page failed without a full date range: {partial.status_code}, {malformed.status_code}")
+        return False
+    if totals.get(3) != 1500 or single.get('total_amount') != round(100 * single_factor, 2):
+        print(f"❌ Bookings were not charged the calendar rate: {totals}, {single}")
+        return False
+    if uplifted['rows'] != [[2, '102', 'Single', 120, round(120 * single_factor * 1.2, 2)]]:
+        print(f"❌ Occupancy uplift not applied: {uplifted['rows']}")
+        return False
+    if reloads != 0 or group.get('total_amount') != round(120 * single_factor * 1.2, 2):
+        print(f"❌ A booking rebuilt the calendar ({reloads}) or a group missed the uplift: {group}")
+        return False
+    if suite_rows != 0 or cleared['rows'][0][-1] != 600:
+        print(f"❌ Resetting a range to the base rate left rates behind: {suite_rows}, {cleared['rows']}")
+        return False
+
+    print("✅ Stays are priced from the rate calendar, with bulk updates and occupancy uplift")
+    return True
+
+def test_event_log():
+    """Test the event log: same-transaction events, snapshots, replay and point-in-time inventory"""
+    print("Testing event log...")
+
+    import logging
+    from datetime import date, datetime
+    from flask.logging import default_handler
+    import events
+    from availability import AvailabilityIndex
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('availability', None)
+        app.extensions.pop('events', None)
+        client = app.test_client()
+        login_as_admin(client)
+
+        client.post('/add_room', data={'room_number': '101', 'room_type': 'Single', 'price_per_night': '100'})
+        client.post('/add_room', data={'room_number': '102', 'room_type': 'Double', 'price_per_night': '150'})
+        client.post('/process-booking', data={'room_id': '1', 'check_in': '2030-01-01', 'check_out': '2030-01-04'})
+        client.post('/edit_room/2', data={'room_type': 'Double', 'price_per_night': '175'})
+        client.post('/add_room', data={'room_number': '103', 'room_type': 'Suite', 'price_per_night': '300'})
+        refused = client.get('/delete_room/1', follow_redirects=True)
+        client.get('/delete_room/3')
+
+        with app.app_context():
+            snapshot_at = events.get_event_log(app).snapshot()
+        client.post('/api/v1/bookings', json={'room_id': 2, 'check_in': '2030-01-02', 'check_out': '2030-01-05'})
+
+        conn = sqlite3.connect(os.path.join(tmpdir, 'hotel.db'))
+        kinds = [row[0] for row in conn.execute('SELECT kind FROM events ORDER BY event_id')]
+        state = events.restore(conn)
+        rooms = {room_id: (number, room_type, round(price * 100))
+                 for room_id, number, room_type, price in conn.execute('SELECT * FROM rooms')}
+        bookings = {booking_id: (room_id, date.fromisoformat(check_in).toordinal(),
+                                 date.fromisoformat(check_out).toordinal(), round(total * 100))
+                    for booking_id, room_id, check_in, check_out, total in conn.execute(
+                        'SELECT booking_id, room_id, check_in, check_out, total_amount FROM bookings')}
+        replayed, loaded = AvailabilityIndex(), AvailabilityIndex()
+        replayed.load_bookings(conn, state.bookings)
+        loaded.load(conn)
+        calendars = [(list(replayed.calendar(room).starts), list(replayed.calendar(room).ends))
+                     == (list(loaded.calendar(room).starts), list(loaded.calendar(room).ends))
+                     for room in (1, 2)]
+        night = state.inventory(date(2030, 1, 3))
+
+        # Date the first three events (two rooms added, one booking) and the log's start in the past
+        past = int(datetime(2020, 1, 1, 12).timestamp())
+        conn.execute('UPDATE events SET recorded_at = ? WHERE event_id <= 3', (past,))
+        conn.execute('UPDATE event_snapshots SET taken_at = ? WHERE event_id = 0', (past - 86400 * 30,))
+        conn.commit()
+        conn.close()
+        then = client.get('/admin/inventory.json?as_of=2020-01-01').get_json()
+        before_log = client.get('/admin/inventory.json?as_of=2019-06-01')
+
+        # A background snapshot that fails is logged and counted
+        failing = events.EventLog(app)
+        logged = []
+        capture = logging.Handler()
+        capture.emit = logged.append
+        app.logger.addHandler(capture)
+        default_handler.setLevel(logging.CRITICAL + 1)
+        database = app.config['DATABASE']
+        app.config['DATABASE'] = os.path.join(tmpdir, 'missing', 'hotel.db')
+        try:
+            failing._snapshot_in_background()
+        finally:
+            app.config['DATABASE'] = database
+            app.logger.removeHandler(capture)
+            default_handler.setLevel(logging.NOTSET)
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+        app.extensions.pop('availability', None)
+        app.extensions.pop('events', None)
+        receipt_renderer = app.extensions.pop('receipts', None)
+        if receipt_renderer:
+            receipt_renderer.shutdown()
+
+    if kinds != [events.ROOM_ADDED, events.ROOM_ADDED, events.BOOKING_MADE, events.ROOM_CHANGED,
+                 events.ROOM_ADDED, events.ROOM_REMOVED, events.BOOKING_MADE]:
+        print(f"❌ Events were not logged with the changes: {kinds}")
+        return False
+    if b'Room has bookings and cannot be deleted!' not in refused.data or 1 not in rooms:
+        print("❌ A booked room was deleted, orphaning its bookings")
+        return False
+    if state.rooms != rooms or state.bookings != bookings or state.snapshot_event_id != snapshot_at \
+            or state.replayed != 1 or not all(calendars):
+        print(f"❌ Snapshot + replay does not match the tables: {state.rooms}, {state.bookings}")
+        return False
+    if night['room_types'] != {'Single': {'rooms': 1, 'sold': 1, 'revenue': 100.0},
+                               'Double': {'rooms': 1, 'sold': 1, 'revenue': 175.0}}:
+        print(f"❌ Wrong inventory for a night: {night['room_types']}")
+        return False
+    if [(room['room_number'], room['price_per_night']) for room in then['rooms']] != [('101', 100.0), ('102', 150.0)] \
+            or then['event_id'] != 3 or before_log.status_code != 404:
+        print(f"❌ Point-in-time inventory is wrong: {then}")
+        return False
+    if failing.stats()['snapshot_failures'] != 1 or [record.exc_info is not None for record in logged] != [True]:
+        print(f"❌ A failed background snapshot was not logged and counted: {failing.stats()}")
+        return False
+
+    print("✅ Changes are journaled with them, and replay rebuilds current and past inventory")
+    return True
+
+
+def test_archival():
+    """Test archiving past stays: hot tables shrink, totals and history stay whole, backups copy both"""
+    print("Testing archival...")
+
+    import archive
+    import events
+    import rollups
+    import stats
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app_module = use_temp_database(tmpdir)
+        app = app_module.app
+        app.extensions.pop('availability', None)
+        app.extensions.pop('events', None)
+        client = app.test_client()
+        login_as_admin(client)
+
+        client.post('/add_room', data={'room_number': '101', 'room_type': 'Single', 'price_per_night': '100'})
+        client.post('/add_room', data={'room_number': '102', 'room_type': 'Double', 'price_per_night': '150'})
+        # Past stays in 2020 (only one for room 102), and one future booking for room 101
+        for check_in, check_out in (('2020-03-01', '2020-03-04'), ('2020-03-10', '2020-03-12')):
+            client.post('/api/v1/bookings', json={'room_id': 1, 'check_in': check_in, 'check_out': check_out})
+        client.post('/api/v1/bookings', json={'room_id': 2, 'check_in': '2020-03-02', 'check_out': '2020-03-03'})
+        client.post('/api/v1/bookings', json={'room_id': 1, 'check_in': '2030-06-01', 'check_out': '2030-06-03'})
+        path = os.path.join(tmpdir, 'hotel.db')
+        conn = sqlite3.connect(path)
+        triggers = conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0]
+        schema = conn.execute('PRAGMA schema_version').fetchone()[0]
+        before = (stats.read_stats(conn)['total_revenue'],
+                  client.get('/admin/reports.json?start=2020-03-01&end=2020-03-31').get_json())
+        conn.close()
+
+        started = client.post('/admin/archive', follow_redirects=True)
+        archive.get_archiver(app).wait()
+        archived = archive.get_archiver(app).stats()
+        after = client.get('/admin/reports.json?start=2020-03-01&end=2020-03-31').get_json()
+        found = client.get('/api/v1/bookings/1')
+        refused = client.get('/delete_room/2', follow_redirects=True)
+        client.post('/api/v1/bookings', json={'room_id': 2, 'check_in': '2030-07-01', 'check_out': '2030-07-04'})
+        # Re-typing a room moves its live nights to the new type; archived nights keep the old one
+        client.post('/edit_room/1', data={'room_type': 'Suite', 'price_per_night': '100'})
+
+        conn = sqlite3.connect(path)
+        retyped = conn.execute("SELECT night, room_type FROM daily_rollups WHERE night IN ('2020-03-01', '2030-06-01') "
+                               "AND rooms_sold != 0 ORDER BY night").fetchall()
+        hot = [row[0] for row in conn.execute('SELECT booking_id FROM bookings ORDER BY booking_id')]
+        everything = conn.execute(f'SELECT count(*), sum(total_amount) FROM {archive.across(conn, "bookings")}').fetchone()
+        nights = (conn.execute('SELECT count(*) FROM room_nights').fetchone()[0],
+                  conn.execute('SELECT count(*) FROM archive.room_nights').fetchone()[0])
+        drift = (stats.check_consistency(conn), rollups.check_consistency(conn))
+        revenue = stats.read_stats(conn)['total_revenue']
+        state = events.restore(conn)
+        archived_events = conn.execute('SELECT count(*) FROM events WHERE kind = ?',
+                                       (events.BOOKING_ARCHIVED,)).fetchone()[0]
+        triggers_after = conn.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0] \
+            + conn.execute('SELECT count(*) FROM archiving').fetchone()[0]
+        schema_after = conn.execute('PRAGMA main.schema_version').fetchone()[0]
+        conn.close()
+        copies = archive.backup(path, os.path.join(tmpdir, 'backup'))
+        copied = []
+        for copy in sorted(copies):
+            backup_conn = sqlite3.connect(copy)
+            copied.append(backup_conn.execute('SELECT count(*) FROM bookings').fetchone()[0])
+            backup_conn.close()
+        app.extensions.pop('writer').close()
+        app.extensions.pop('db_pool').close_all()
+        app.extensions.pop('availability', None)
+        app.extensions.pop('events', None)
+        app.extensions.pop('rates', None)
+        app.extensions.pop('archive', None)
+        receipt_renderer = app.extensions.pop('receipts', None)
+        if receipt_renderer:
+            receipt_renderer.shutdown()
+
+    if b'in the background' not in started.data or (archived['runs'], archived['failures']) != (1, 0) \
+            or (archived['bookings'], archived['nights']) != (3, 6) or hot != [4, 5] \
+            or everything != (5, before[0] + 450.0) or nights != (5, 6):
+        print(f"❌ Past stays were not moved to the archive: {archived}, {hot}, {everything}, {nights}")
+        return False
+    if drift != ({}, 0) or revenue != before[0] + 450.0 or after != before[1]:
+        print(f"❌ Archival changed the totals or reports: {drift}, {revenue}, {after}")
+        return False
+    if retyped != [('2020-03-01', 'Single'), ('2030-06-01', 'Suite')]:
+        print(f"❌ Re-typing a room after archival mixed up the rollups: {retyped}")
+        return False
+    if set(state.bookings) != {4, 5} or archived_events != 3 or triggers_after != triggers \
+            or schema_after != schema:
+        print(f"❌ The event log or triggers are wrong after archival: {state.bookings}, {triggers_after}, "
+              f"schema version {schema} -> {schema_after}")
+        return False
+    if found.status_code != 200 or b'Room has bookings and cannot be deleted!' not in refused.data:
+        print("❌ Archived bookings are not found, or their room was deleted")
+        return False
+    if copied != [2, 3]:
+        print(f"❌ Backup did not copy both databases: {copies}, {copied}")
+        return False
+
+    print("✅ Past stays move to the archive with totals, reports and history intact, and both back up")
+    return True
+
+def main():
+    """Run all tests"""
+    print("Hotel Management System - Test Suite")
+    print("=" * 40)
+    
+    tests = [
+        test_database_creation,
+        test_default_admin,
+        test_sample_rooms,
+        test_template_files,
+        test_static_files,
+        test_requirements_file,
+        test_connection_pool,
+        test_availability_index,
+        test_concurrent_booking,
+        test_dashboard_stats,
+        test_room_pagination,
+        test_streamed_pages,
+        test_room_catalog_cache,
+        test_password_rehash_on_login,
+        test_bulk_import_export,
+        test_metrics_endpoint,
+        test_occupancy_ledger,
+        test_revenue_rollups,
+        test_booking_receipts,
+        test_customer_search,
+        test_schema_migrations,
+        test_load_test,
+        test_lazy_startup,
+        test_writer_group_commit,
+        test_session_store,
+        test_json_api,
+        test_group_booking,
+        test_room_assignment,
+        test_dynamic_pricing,
+        test_event_log,
+        test_archival
+    ]
+    
+    passed = 0
+    failed = 0
+    
+    for test in tests:
+        try:
+            if test():
+                passed += 1
+            else:
+                failed += 1
+        except Exception as e:
+            print(f"❌ Test {test.__name__} failed with exception: {e}")
+            failed += 1
+        print()
+    
+    print("=" * 40)
+    print(f"Test Results: {passed} passed, {failed} failed")
+    
+    if failed == 0:
+        print("🎉 All tests passed! The application is ready to use.")
+        return True
+    else:
+        print("⚠️  Some tests failed. Please check the issues above.")
+        return False
+
+if __name__ == '__main__':
+    success = main()
     sys.exit(0 if success else 1)
\ No newline at end of file
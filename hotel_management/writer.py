@@ -0,0 +1,322 @@
+"""
+Serialized SQLite writes with group commit.
+
+SQLite has one writer at a time.  When several worker processes each
+write on their own connection they queue on the database lock, and past
+busy_timeout a request fails with 'database is locked'.  Instead, the
+app's writes (bookings, room changes, registrations, customer records and
+password upgrades) are all handed to a single writer that owns the only
+write connection.  The writer drains its queue in batches: one BEGIN
+IMMEDIATE, each write in its own SAVEPOINT (so a failing write is undone
+without touching the rest of the batch), then one COMMIT, which is one
+sync to disk for the whole batch.  Writes that arrive while a batch is
+committing form the next batch, so batches grow with the load.
+
+Reads are unaffected: they keep using each process's connection pool and,
+in WAL mode, never wait for the writer.
+
+In a single process the writer is a background thread.  Under server.py
+it runs in the parent process and the worker processes reach it over a
+local socket (multiprocessing.connection), so there is exactly one writer
+however many workers there are.  Bulk imports still write directly, in
+their own chunked transactions.
+
+A write is a function op(conn, *args) registered by name with @operation.
+It runs inside the batch's transaction and must not commit; its return
+value (or exception) is handed back to the caller, so both must pickle.
+Functions registered with @before_batch run on the write connection
+before each batch's transaction begins, for what SQLite does not allow
+inside one (ATTACHing the archive, see archive.py).
+
+Configuration (app.config):
+    WRITER_ADDRESS      address of the server's writer; unset runs one in-process
+    WRITER_AUTHKEY      key shared with the server's writer
+    WRITER_MAX_BATCH    writes committed together at most (default 64)
+    WRITER_TIMEOUT      seconds a request waits for its write (default 30)
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+from flask import current_app
+
+from db import PRAGMAS, extension
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_TIMEOUT = 30.0
+
+# name -> function(conn, *args)
+OPERATIONS = {}
+
+# function(conn), run before each batch
+BEFORE_BATCH = []
+
+
+class WriterError(Exception):
+    """The writer could not be reached or has stopped"""
+
+
+def operation(func):
+    """Register func(conn, *args) as a write the writer can run by name"""
+    OPERATIONS[func.__name__] = func
+    return func
+
+
+def before_batch(func):
+    """Register func(conn) to run on the write connection before each batch's transaction"""
+    BEFORE_BATCH.append(func)
+    return func
+
+
+class Writer:
+    """The single write connection, committing queued writes in batches"""
+
+    def __init__(self, database, max_batch=DEFAULT_MAX_BATCH, timeout=DEFAULT_TIMEOUT):
+        self.database = database
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.writes = 0
+        self.failed = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.commit_seconds = 0.0
+
+    def _connect(self):
+        # timeout: switching to WAL has to wait out a writer that holds the lock
+        conn = sqlite3.connect(self.database, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def submit(self, name, *args):
+        """Queue a write; returns a Future for its result"""
+        if name not in OPERATIONS:
+            raise KeyError(f'Unknown write operation: {name}')
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise WriterError('The writer has been stopped')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='writer', daemon=True)
+                self._thread.start()
+            self._queue.put((name, args, future))
+        return future
+
+    def call(self, name, *args):
+        """Run a write and return its result, raising whatever it raised"""
+        return self.submit(name, *args).result(timeout=self.timeout)
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            # Fail what is queued; the next submit starts a fresh thread
+            with self._lock:
+                self._thread = None
+                jobs = []
+                while not self._queue.empty():
+                    jobs.append(self._queue.get_nowait())
+            for job in jobs:
+                if job is not None:
+                    job[2].set_exception(e)
+            return
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                batch = [job]
+                while len(batch) < self.max_batch:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(job)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        """Run a batch of writes in one transaction and resolve their futures"""
+        start = time.perf_counter()
+        outcomes = []
+        try:
+            for prepare in BEFORE_BATCH:
+                prepare(conn)
+            conn.execute('BEGIN IMMEDIATE')
+            for name, args, future in batch:
+                conn.execute('SAVEPOINT write')
+                try:
+                    result = OPERATIONS[name](conn, *args)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO write')
+                    conn.execute('RELEASE write')
+                    outcomes.append((future, None, e))
+                else:
+                    conn.execute('RELEASE write')
+                    outcomes.append((future, result, None))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            outcomes = [(future, None, e) for _, _, future in batch]
+
+        with self._lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.failed += sum(1 for _, _, error in outcomes if error is not None)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.commit_seconds += time.perf_counter() - start
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        """Write, batch and commit-time counters"""
+        with self._lock:
+            return {
+                'writes': self.writes,
+                'failed': self.failed,
+                'batches': self.batches,
+                'largest_batch': self.largest_batch,
+                'mean_batch': round(self.writes / self.batches, 2) if self.batches else 0.0,
+                'queued': self._queue.qsize(),
+                'commit_seconds_total': self.commit_seconds,
+            }
+
+    def close(self):
+        """Finish the queued writes and stop the writer thread"""
+        with self._lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+
+class WriterServer:
+    """Serves a Writer to other processes over multiprocessing.connection"""
+
+    def __init__(self, writer, authkey, address=None):
+        self.writer = writer
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._thread = None
+
+    def start(self):
+        """Accept connections in the background"""
+        self._thread = threading.Thread(target=self._accept, name='writer-server', daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return
+            except Exception:
+                # a client that failed the authkey handshake
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    name, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = ('ok', self.writer.call(name, *args))
+                except Exception as e:
+                    reply = ('error', e)
+                conn.send(reply)
+
+    def close(self):
+        self.listener.close()
+
+
+class WriterClient:
+    """A worker process's handle on the server's Writer"""
+
+    def __init__(self, address, authkey, timeout=DEFAULT_TIMEOUT):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = self._local.conn = Client(self.address, authkey=self.authkey)
+            except OSError as e:
+                raise WriterError(f'Cannot reach the writer at {self.address}: {e}')
+        return conn
+
+    def call(self, name, *args):
+        """Run a write on the server's writer and return its result"""
+        conn = self._connection()
+        try:
+            conn.send((name, args))
+            replied = conn.poll(self.timeout)
+            if replied:
+                status, value = conn.recv()
+        except (EOFError, OSError):
+            replied = False
+        with self._lock:
+            self.calls += 1
+            self.errors += not replied
+        if not replied:
+            # The reply may still come: never reuse a connection that is out of step
+            self._local.conn = None
+            conn.close()
+            raise WriterError(f'No reply from the writer at {self.address}')
+        if status == 'error':
+            raise value
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'errors': self.errors}
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def get_writer(app=None):
+    """Return the app's writer: the server's if WRITER_ADDRESS is set, else an in-process one"""
+    app = app or current_app
+
+    def create():
+        address = app.config.get('WRITER_ADDRESS')
+        if address:
+            return WriterClient(address, app.config['WRITER_AUTHKEY'],
+                                timeout=app.config.get('WRITER_TIMEOUT', DEFAULT_TIMEOUT))
+        return Writer(app.config['DATABASE'],
+                      max_batch=app.config.get('WRITER_MAX_BATCH', DEFAULT_MAX_BATCH),
+                      timeout=app.config.get('WRITER_TIMEOUT', DEFAULT_TIMEOUT))
+
+    # one writer per process: two would mean two write connections and threads
+    return extension(app, 'writer', create)